@@ -29,6 +29,7 @@ from .hal_bar import HAL_HBar, HAL_VBar
 from .hal_meter import HAL_Meter
 from .hal_gremlin import HAL_Gremlin
 from .hal_graph import HAL_Graph
+from .hal_scope import HAL_Scope
 from .hal_lightbutton import HAL_LightButton
 from .overridewidget import Override
 
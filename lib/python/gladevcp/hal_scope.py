@@ -0,0 +1,266 @@
+# vim: sts=4 sw=4 et
+# GladeVcp Widgets
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+import gi
+gi.require_version("Gtk","3.0")
+from gi.repository import Gtk
+from gi.repository import Gdk
+from gi.repository import GObject
+from gi.repository import GLib
+import os
+import time
+import numpy
+
+import stream_scope
+
+if __name__ == "__main__":
+    from hal_widgets import _HalWidgetBase, hal
+else:
+    from .hal_widgets import _HalWidgetBase, hal
+
+MAX_INT = 0x7fffffff
+
+# trace colors, one per channel
+COLORS = ((1, 0.2, 0.2), (0.2, 0.9, 0.2), (0.3, 0.5, 1), (1, 0.9, 0.2),
+          (1, 0.3, 1), (0.2, 1, 1), (1, 0.6, 0.2), (0.8, 0.8, 0.8))
+
+class HAL_Scope(Gtk.DrawingArea, _HalWidgetBase):
+    '''Plots the channels of a sampler component at the rate of its thread
+
+    Load a sampler and connect the signals to show to its pins, e.g.
+        loadrt sampler depth=4096 cfg=ff
+        addf sampler.0 servo-thread
+    Button 1 holds/releases the display, button 3 saves what is shown to
+    snapshot_file.'''
+    __gtype_name__ = 'HAL_Scope'
+    __gproperties__ = {
+        'sampler' : ( GObject.TYPE_INT, 'Sampler', 'Number of the sampler instance to read',
+                    0, 15, 0, GObject.ParamFlags.READWRITE | GObject.ParamFlags.CONSTRUCT),
+        'sample_period' : ( GObject.TYPE_FLOAT, 'Sample period', 'Period of the thread running the sampler, in seconds',
+                    0, MAX_INT, 0.001, GObject.ParamFlags.READWRITE | GObject.ParamFlags.CONSTRUCT),
+        'window' : ( GObject.TYPE_INT, 'Window', 'Number of samples shown',
+                    2, MAX_INT, 1000, GObject.ParamFlags.READWRITE | GObject.ParamFlags.CONSTRUCT),
+        'capacity' : ( GObject.TYPE_INT, 'Capacity', 'Number of samples kept',
+                    2, MAX_INT, 1 << 20, GObject.ParamFlags.READWRITE | GObject.ParamFlags.CONSTRUCT),
+        'tick' : ( GObject.TYPE_INT, 'Tick period', 'Period of reading and drawing in ms',
+                    10, 10000, 40, GObject.ParamFlags.READWRITE | GObject.ParamFlags.CONSTRUCT),
+        'min' : ( GObject.TYPE_FLOAT, 'Min', 'Minimum value',
+                    -MAX_INT, MAX_INT, -1, GObject.ParamFlags.READWRITE | GObject.ParamFlags.CONSTRUCT),
+        'max' : ( GObject.TYPE_FLOAT, 'Max', 'Maximum value',
+                    -MAX_INT, MAX_INT, 1, GObject.ParamFlags.READWRITE | GObject.ParamFlags.CONSTRUCT),
+        'autoscale' : ( GObject.TYPE_BOOLEAN, 'Autoscale', 'Autoscale Y axis',
+                    False, GObject.ParamFlags.READWRITE | GObject.ParamFlags.CONSTRUCT),
+        'trigger_mode' : ( GObject.TYPE_STRING, 'Trigger mode', 'auto, normal or single',
+                    "auto", GObject.ParamFlags.READWRITE | GObject.ParamFlags.CONSTRUCT),
+        'trigger_channel' : ( GObject.TYPE_INT, 'Trigger channel', 'Channel the trigger watches',
+                    0, 63, 0, GObject.ParamFlags.READWRITE | GObject.ParamFlags.CONSTRUCT),
+        'trigger_level' : ( GObject.TYPE_FLOAT, 'Trigger level', 'Value the channel crosses to trigger',
+                    -MAX_INT, MAX_INT, 0, GObject.ParamFlags.READWRITE | GObject.ParamFlags.CONSTRUCT),
+        'trigger_edge' : ( GObject.TYPE_STRING, 'Trigger edge', 'rising, falling or both',
+                    "rising", GObject.ParamFlags.READWRITE | GObject.ParamFlags.CONSTRUCT),
+        'trigger_position' : ( GObject.TYPE_FLOAT, 'Trigger position', 'Part of the window shown before the trigger',
+                    0, 1, 0.5, GObject.ParamFlags.READWRITE | GObject.ParamFlags.CONSTRUCT),
+        'channel_names' : ( GObject.TYPE_STRING, 'Channel names', 'Comma separated names of the channels',
+                    "", GObject.ParamFlags.READWRITE | GObject.ParamFlags.CONSTRUCT),
+        'snapshot_file' : ( GObject.TYPE_STRING, 'Snapshot file',
+                    'CSV file button 3 saves to; strftime formatting is applied',
+                    "~/scope-%Y%m%d-%H%M%S.csv", GObject.ParamFlags.READWRITE | GObject.ParamFlags.CONSTRUCT),
+        'bg_color' : ( Gdk.Color.__gtype__, 'Background', "Choose background color",
+                        GObject.ParamFlags.READWRITE),
+    }
+    __gproperties = __gproperties__
+
+    def __init__(self):
+        super(HAL_Scope, self).__init__()
+
+        self.bg_color = Gdk.Color.parse('black')[1]
+        self.scope = None
+        self.held = None
+        self.message = ""
+        self.tick_idx = 0
+        self.arm_pin = None
+        self.last_arm = False
+
+        self.connect("button-press-event", self.button_press)
+        self.connect("draw", self.expose)
+        self.add_events(Gdk.EventMask.BUTTON_PRESS_MASK)
+
+    def _hal_init(self):
+        _HalWidgetBase._hal_init(self)
+        self.arm_pin = self.hal.newpin(self.hal_name + "-arm", hal.HAL_BIT, hal.HAL_IN)
+        self.triggered_pin = self.hal.newpin(self.hal_name + "-triggered", hal.HAL_BIT, hal.HAL_OUT)
+        self.overruns_pin = self.hal.newpin(self.hal_name + "-overruns", hal.HAL_S32, hal.HAL_OUT)
+        try:
+            stream = stream_scope.attach_sampler(self.hal, self.sampler)
+        except (IOError, OSError) as e:
+            self.message = "sampler.%d not found: %s" % (self.sampler, e)
+            return
+        self.scope = stream_scope.StreamScope(stream, self.window, self.capacity,
+                                              self.sample_period)
+        self.configure()
+        self.tick_idx += 1
+        GLib.timeout_add(self.tick, self.tick_poll, self.tick_idx)
+
+    def configure(self):
+        scope = self.scope
+        if scope is None: return
+        scope.window = self.window
+        scope.period = self.sample_period
+        scope.channel = min(self.trigger_channel, scope.channels - 1)
+        scope.level = self.trigger_level
+        scope.edge = self.trigger_edge
+        scope.position = self.trigger_position
+        if scope.mode != self.trigger_mode:
+            try:
+                scope.set_mode(self.trigger_mode)
+            except ValueError as e:
+                self.message = str(e)
+
+    def tick_poll(self, idx):
+        if self.tick_idx != idx:
+            return False
+        scope = self.scope
+        scope.poll()
+        arm = self.arm_pin.get()
+        if arm and not self.last_arm:
+            scope.arm()
+        self.last_arm = arm
+        self.triggered_pin.set(scope.captured is not None)
+        self.overruns_pin.set(scope.overruns)
+        self.queue_draw()
+        return True
+
+    def names(self):
+        names = [n.strip() for n in self.channel_names.split(",") if n.strip()]
+        return names + ["channel%d" % i for i in range(len(names), self.scope.channels)]
+
+    def button_press(self, widget, event):
+        if self.scope is None: return
+        if event.button == 1:
+            self.held = None if self.held else self.scope.view()
+            self.queue_draw()
+        elif event.button == 3:
+            filename = os.path.expanduser(time.strftime(self.snapshot_file))
+            try:
+                n = self.scope.export(filename, self.names())
+                self.message = "saved %d samples to %s" % (n, filename)
+            except (IOError, OSError) as e:
+                self.message = str(e)
+            self.queue_draw()
+
+    def expose(self, widget, cr):
+        w = self.get_allocated_width()
+        h = self.get_allocated_height()
+
+        cr.set_source_rgb(self.bg_color.red_float, self.bg_color.green_float, self.bg_color.blue_float)
+        cr.rectangle(0, 0, w, h)
+        cr.fill()
+
+        # graticule: 10 by 8 divisions
+        cr.set_line_width(1)
+        cr.set_source_rgba(0.5, 0.5, 0.5, 0.5)
+        for i in range(1, 10):
+            cr.move_to(int(w * i / 10) + 0.5, 0)
+            cr.line_to(int(w * i / 10) + 0.5, h)
+        for i in range(1, 8):
+            cr.move_to(0, int(h * i / 8) + 0.5)
+            cr.line_to(w, int(h * i / 8) + 0.5)
+        cr.stroke()
+
+        cr.set_font_size(12)
+        if self.scope is None:
+            cr.set_source_rgb(1, 1, 1)
+            cr.move_to(5, 15)
+            cr.show_text(self.message)
+            return True
+
+        start, data = self.held or self.scope.view()
+        ymin, ymax = self.min, self.max
+        if self.autoscale and len(data):
+            ymin, ymax = float(data.min()), float(data.max())
+        if ymax <= ymin:
+            ymin, ymax = ymin - 1, ymax + 1
+        xscale = w / float(max(self.window - 1, 1))
+        yscale = h / (ymax - ymin)
+
+        for c in range(data.shape[1]):
+            offsets, values = stream_scope.min_max(data[:, c], max(w, 1))
+            x = offsets * xscale
+            y = numpy.clip(h - (values - ymin) * yscale, -1, h + 1)
+            cr.set_source_rgb(*COLORS[c % len(COLORS)])
+            points = list(zip(x.tolist(), y.tolist()))
+            if not points: continue
+            cr.move_to(*points[0])
+            for p in points[1:]:
+                cr.line_to(*p)
+            cr.stroke()
+
+        # trigger level and position
+        if self.scope.mode != 'auto':
+            cr.set_source_rgba(1, 1, 1, 0.5)
+            cr.set_dash([4, 4])
+            y = h - (self.scope.level - ymin) * yscale
+            cr.move_to(0, y)
+            cr.line_to(w, y)
+            x = int(self.window * self.scope.position) * xscale
+            cr.move_to(x, 0)
+            cr.line_to(x, h)
+            cr.stroke()
+            cr.set_dash([])
+
+        # legend and scale
+        text = ["%s" % n for n in self.names()]
+        y = 15
+        for c, name in enumerate(text):
+            cr.set_source_rgb(*COLORS[c % len(COLORS)])
+            cr.move_to(5, y)
+            cr.show_text(name)
+            y += 15
+        cr.set_source_rgb(1, 1, 1)
+        status = "%s  %g/div  %gs/div" % (
+            "HOLD" if self.held else self.scope.mode,
+            (ymax - ymin) / 8, self.window * self.scope.period / 10)
+        if self.scope.overruns:
+            status += "  overruns %d" % self.scope.overruns
+        cr.move_to(5, h - 5)
+        cr.show_text(status)
+        if self.message:
+            cr.move_to(5, h - 20)
+            cr.show_text(self.message)
+        return True
+
+    def do_get_property(self, property):
+        name = property.name.replace('-', '_')
+        if name in self.__gproperties.keys():
+            return getattr(self, name)
+        else:
+            raise AttributeError('unknown property %s' % property.name)
+
+    def do_set_property(self, property, value):
+        name = property.name.replace('-', '_')
+
+        if name in ['bg_color']:
+            if not value:
+                return False
+
+        if name in self.__gproperties.keys():
+            setattr(self, name, value)
+        else:
+            raise AttributeError('unknown property %s' % property.name)
+
+        if name == 'tick' and self.scope is not None:
+            self.tick_idx += 1
+            GLib.timeout_add(value, self.tick_poll, self.tick_idx)
+        self.configure()
+        self.queue_draw()
+        return True
@@ -69,4 +69,36 @@ class component(_hal.component):
 
     def getpin(self, *a, **kw): return Pin(_hal.component.getpin(self, *a, **kw))
     def getparam(self, *a, **kw): return Param(_hal.component.getparam(self, *a, **kw))
-    def getpins(self, *a, **kw): return _hal.component.getpins(self, *a, **kw)
\ No newline at end of file
+    def getpins(self, *a, **kw): return _hal.component.getpins(self, *a, **kw)
+
+def stream_dtype(element_types, names=None):
+    """The numpy dtype of one sample of a stream, as stream.read_into and
+    stream.write_from lay samples out in their buffers
+
+    element_types is the stream's element_types, names the names of the
+    fields (by default f0, f1, ...).  Each element takes 8 bytes, of which
+    the value uses the first."""
+    import numpy
+    if isinstance(element_types, bytes):
+        element_types = element_types.decode()
+    if names is None:
+        names = ["f%d" % i for i in range(len(element_types))]
+    formats = {'b': numpy.bool_, 'f': numpy.float64, 's': numpy.int32, 'u': numpy.uint32}
+    return numpy.dtype({'names': list(names),
+                        'formats': [formats[t] for t in element_types],
+                        'offsets': [8 * i for i in range(len(element_types))],
+                        'itemsize': 8 * len(element_types)})
+
+# halcmd commands, run in this process by the same parser halcmd uses;
+# each returns what the command prints and raises hal.error if it fails
+
+def source(filename, inifile=None):
+    """Run the HAL file filename, like 'halcmd -i inifile -f filename'"""
+    return _hal.command_file(filename, inifile)
+
+def net(signal, *pins): return _hal.command('net', signal, *pins)
+def getp(name): return _hal.command('getp', name).strip()
+def setp(name, value): return _hal.command('setp', name, str(value))
+def sets(name, value): return _hal.command('sets', name, str(value))
+def loadusr(*args): return _hal.command('loadusr', *args)
+def show(*args): return _hal.command('show', *args)
@@ -247,11 +247,23 @@ class _GStat(GObject.GObject):
     STATE_ON = linuxcnc.STATE_ON
     STATE_OFF = linuxcnc.STATE_OFF
 
+    # read by merge()
+    HAL_PINS = ('iocontrol.0.tool-prepare', 'iocontrol.0.tool-prep-number',
+                'spindle.0.speed-in', 'spindle.0.at-speed', 'spindle.0.speed-out')
+
     def __init__(self, stat = None):
         GObject.Object.__init__(self)
         self.stat = stat or linuxcnc.stat()
         self.cmd = linuxcnc.command()
         self._status_active = False
+        self._merged_generation = 0
+        # parts of the status merged since the positions were last emitted
+        self._merged_changes = linuxcnc.STAT_CHANGED_ALL
+        self._positions = None
+        # true while update() emits, so the handlers share the status it polled
+        self._in_update = False
+        # linuxcnc.commands_sent() when the status was last polled
+        self._commands_sent = 0
         self.old = {}
         self.old['tool-prep-number'] = 0
         self.previous_mode = self.MANUAL
@@ -277,133 +289,167 @@ class _GStat(GObject.GObject):
     def set_timer(self):
         GLib.timeout_add(CYCLE_TIME, self.update)
 
-    def merge(self):
-        self.old['command-state'] = self.stat.state
-        self.old['state'] = self.stat.task_state
-        self.old['mode']  = self.stat.task_mode
-        self.old['interp']= self.stat.interp_state
-        # Only update file if call level is 0, which
-        # means we are not executing a subroutine/remap
-        # This avoids emitting signals for bogus file names below
-        if self.stat.call_level == 0:
-            self.old['file']  = self.stat.file
-        self.old['paused']= self.stat.paused
-        self.old['line']  = self.stat.motion_line
-        self.old['homed'] = self.stat.homed
-        self.old['tool-in-spindle'] = self.stat.tool_in_spindle
-        try:
-            if hal.get_value('iocontrol.0.tool-prepare'):
-                self.old['tool-prep-number'] = hal.get_value('iocontrol.0.tool-prep-number')
-        except RuntimeError:
-             self.old['tool-prep-number'] = -1
-        self.old['motion-mode'] = self.stat.motion_mode
-        self.old['motion-type'] = self.stat.motion_type
-        self.old['spindle-or'] = self.stat.spindle[0]['override']
-        self.old['feed-or'] = self.stat.feedrate
-        self.old['rapid-or'] = self.stat.rapidrate
-        self.old['max-velocity-or'] = self.stat.max_velocity
-        self.old['feed-hold']  = self.stat.feed_hold_enabled
-        self.old['g5x-index']  = self.stat.g5x_index
-        self.old['spindle-enabled']  = self.stat.spindle[0]['enabled']
-        self.old['spindle-direction']  = self.stat.spindle[0]['direction']
-        self.old['block-delete']= self.stat.block_delete
-        self.old['optional-stop']= self.stat.optional_stop
-        try:
-            self.old['actual-spindle-speed'] = hal.get_value('spindle.0.speed-in') * 60
-        except RuntimeError:
-             self.old['actual-spindle-speed'] = 0
+    def merge(self, changed=None):
+        # refresh only what depends on the parts of the status changed
+        # since the last merge, however many polls ago that was
+        if changed is None:
+            changed = self.stat.changed_since(self._merged_generation)
+        self._merged_generation = self.stat.generation
+        self._merged_changes |= changed
+        task = changed & (linuxcnc.STAT_CHANGED_TASK | linuxcnc.STAT_CHANGED_COMMAND)
+        traj = changed & linuxcnc.STAT_CHANGED_TRAJ
+        joints = changed & (linuxcnc.STAT_CHANGED_JOINT | linuxcnc.STAT_CHANGED_TRAJ)
+        spindle = changed & linuxcnc.STAT_CHANGED_SPINDLE
+        io = changed & linuxcnc.STAT_CHANGED_IO
+
+        if changed & linuxcnc.STAT_CHANGED_COMMAND:
+            self.old['command-state'] = self.stat.state
+        if task:
+            self.old['state'] = self.stat.task_state
+            self.old['mode']  = self.stat.task_mode
+            self.old['interp']= self.stat.interp_state
+            # Only update file if call level is 0, which
+            # means we are not executing a subroutine/remap
+            # This avoids emitting signals for bogus file names below
+            if self.stat.call_level == 0:
+                self.old['file']  = self.stat.file
+            self.old['line']  = self.stat.motion_line
+            self.old['g5x-index']  = self.stat.g5x_index
+            self.old['block-delete']= self.stat.block_delete
+            self.old['optional-stop']= self.stat.optional_stop
+            self.old['current-z-rotation'] = self.stat.rotation_xy
+            self.old['current-tool-offset'] = self.stat.tool_offset
+        if traj:
+            self.old['paused']= self.stat.paused
+            self.old['motion-mode'] = self.stat.motion_mode
+            self.old['motion-type'] = self.stat.motion_type
+            self.old['feed-or'] = self.stat.feedrate
+            self.old['rapid-or'] = self.stat.rapidrate
+            self.old['max-velocity-or'] = self.stat.max_velocity
+            self.old['feed-hold']  = self.stat.feed_hold_enabled
+        if joints:
+            self.old['homed'] = self.stat.homed
+        if spindle:
+            spindle_0 = self.stat.spindle[0]
+            self.old['spindle-or'] = spindle_0['override']
+            self.old['spindle-enabled']  = spindle_0['enabled']
+            self.old['spindle-direction']  = spindle_0['direction']
+        if io:
+            self.old['tool-in-spindle'] = self.stat.tool_in_spindle
+            self.old['flood']= self.stat.flood
+            self.old['mist']= self.stat.mist
+
+        # HAL pins are not part of the status, read them every time,
+        # all under one lock; the missing ones read as None
         try:
-            self.old['spindle-at-speed'] = hal.get_value('spindle.0.at-speed')
+            prepare, prep_number, speed_in, at_speed, speed_out = \
+                hal.get_values(self.HAL_PINS, None)
         except RuntimeError:
+            prepare = prep_number = speed_in = at_speed = speed_out = None
+        if prepare is None or (prepare and prep_number is None):
+            self.old['tool-prep-number'] = -1
+        elif prepare:
+            self.old['tool-prep-number'] = prep_number
+        if speed_in is None:
+            self.old['actual-spindle-speed'] = 0
+        else:
+            self.old['actual-spindle-speed'] = speed_in * 60
+        if at_speed is None:
             self.old['spindle-at-speed'] = False
-        self.old['flood']= self.stat.flood
-        self.old['mist']= self.stat.mist
-        self.old['current-z-rotation'] = self.stat.rotation_xy
-        self.old['current-tool-offset'] = self.stat.tool_offset
+        else:
+            self.old['spindle-at-speed'] = at_speed
 
         # override limits / hard limits
-        or_limit_list=[]
-        hard_limit_list = []
-        ferror = []
-        hard_limit = False
-        or_limit_set = False
-        for j in range(0, self.stat.joints):
-            or_limit_list.append( self.stat.joint[j]['override_limits'])
-            or_limit_set = or_limit_set or self.stat.joint[j]['override_limits']
-            min_hard_limit = self.stat.joint[j]['min_hard_limit']
-            max_hard_limit = self.stat.joint[j]['max_hard_limit']
-            hard_limit = hard_limit or min_hard_limit or max_hard_limit
-            hard_limit_list.append([min_hard_limit,max_hard_limit])
-            ferror.append(self.stat.joint[j]['ferror_current'])
-        self.old['override-limits'] = or_limit_list
-        self.old['override-limits-set'] = bool(or_limit_set)
-        self.old['hard-limits-tripped'] = bool(hard_limit)
-        self.old['hard-limits-list'] = hard_limit_list
-        self.old['ferror-current'] = ferror
+        if joints:
+            or_limit_list=[]
+            hard_limit_list = []
+            ferror = []
+            hard_limit = False
+            or_limit_set = False
+            for j in range(0, self.stat.joints):
+                joint = self.stat.joint[j]
+                or_limit_list.append( joint['override_limits'])
+                or_limit_set = or_limit_set or joint['override_limits']
+                min_hard_limit = joint['min_hard_limit']
+                max_hard_limit = joint['max_hard_limit']
+                hard_limit = hard_limit or min_hard_limit or max_hard_limit
+                hard_limit_list.append([min_hard_limit,max_hard_limit])
+                ferror.append(joint['ferror_current'])
+            self.old['override-limits'] = or_limit_list
+            self.old['override-limits-set'] = bool(or_limit_set)
+            self.old['hard-limits-tripped'] = bool(hard_limit)
+            self.old['hard-limits-list'] = hard_limit_list
+            self.old['ferror-current'] = ferror
 
         # active G-codes
-        active_gcodes = []
-        codes =''
-        for i in sorted(self.stat.gcodes[1:]):
-            if i == -1: continue
-            if i % 10 == 0:
-                    active_gcodes.append("G%d" % (i/10))
-            else:
-                    active_gcodes.append("G%d.%d" % (i/10, i%10))
-        for i in active_gcodes:
-            codes = codes +('%s '%i)
-        self.old['g-code'] = codes
-        # extract specific G-code modes
-        itime = fpm = fpr = css = rpm = metric = False
-        radius = diameter = adm = idm = False
-        for num,i in enumerate(active_gcodes):
-            if i == 'G90': adm = True
-            elif i == 'G91': idm = True
-            elif i == 'G93': itime = True
-            elif i == 'G94': fpm = True
-            elif i == 'G95': fpr = True
-            elif i == 'G96': css = True
-            elif i == 'G97': rpm = True
-            elif i == 'G21': metric = True
-            elif i == 'G7': diameter  = True
-            elif i == 'G8': radius = True
-        self.old['g90'] = adm
-        self.old['g91'] = idm
-        self.old['itime'] = itime
-        self.old['fpm'] = fpm
-        self.old['fpr'] = fpr
-        self.old['css'] = css
-        self.old['rpm'] = rpm
-        self.old['metric'] = metric
-        self.old['radius'] = radius
-        self.old['diameter'] = diameter
-        if css:
-            try:
-                self.old['spindle-speed']= hal.get_value('spindle.0.speed-out')
-            except RuntimeError:
+        if task:
+            active_gcodes = []
+            codes =''
+            for i in sorted(self.stat.gcodes[1:]):
+                if i == -1: continue
+                if i % 10 == 0:
+                        active_gcodes.append("G%d" % (i/10))
+                else:
+                        active_gcodes.append("G%d.%d" % (i/10, i%10))
+            for i in active_gcodes:
+                codes = codes +('%s '%i)
+            self.old['g-code'] = codes
+            # extract specific G-code modes
+            itime = fpm = fpr = css = rpm = metric = False
+            radius = diameter = adm = idm = False
+            for num,i in enumerate(active_gcodes):
+                if i == 'G90': adm = True
+                elif i == 'G91': idm = True
+                elif i == 'G93': itime = True
+                elif i == 'G94': fpm = True
+                elif i == 'G95': fpr = True
+                elif i == 'G96': css = True
+                elif i == 'G97': rpm = True
+                elif i == 'G21': metric = True
+                elif i == 'G7': diameter  = True
+                elif i == 'G8': radius = True
+            self.old['g90'] = adm
+            self.old['g91'] = idm
+            self.old['itime'] = itime
+            self.old['fpm'] = fpm
+            self.old['fpr'] = fpr
+            self.old['css'] = css
+            self.old['rpm'] = rpm
+            self.old['metric'] = metric
+            self.old['radius'] = radius
+            self.old['diameter'] = diameter
+        if self.old.get('css'):
+            if speed_out is None:
                 self.old['spindle-speed']= self.stat.spindle[0]['speed']
-        else:
+            else:
+                self.old['spindle-speed']= speed_out
+        elif task or spindle:
             self.old['spindle-speed']= self.stat.spindle[0]['speed']
 
         # active M-codes
-        active_mcodes = []
-        mcodes = ''
-        for i in sorted(self.stat.mcodes[1:]):
-            if i == -1: continue
-            active_mcodes.append("M%d"%i )
-        for i in active_mcodes:
-            mcodes = mcodes + ("%s "%i)
-            #active_mcodes.append("M%s "%i)
-        self.old['m-code'] = mcodes
-        self.old['tool-info']  = self.stat.tool_table[0]
-        settings = self.stat.settings
-        self.old['f-code'] = settings[1]
-        self.old['s-code'] = settings[2]
-        self.old['blend-tolerance-code'] = settings[3]
-        self.old['nativecam-tolerance-code'] = settings[4]
+        if task:
+            active_mcodes = []
+            mcodes = ''
+            for i in sorted(self.stat.mcodes[1:]):
+                if i == -1: continue
+                active_mcodes.append("M%d"%i )
+            for i in active_mcodes:
+                mcodes = mcodes + ("%s "%i)
+                #active_mcodes.append("M%s "%i)
+            self.old['m-code'] = mcodes
+            settings = self.stat.settings
+            self.old['f-code'] = settings[1]
+            self.old['s-code'] = settings[2]
+            self.old['blend-tolerance-code'] = settings[3]
+            self.old['nativecam-tolerance-code'] = settings[4]
+        # the tool table is not part of the status; it is only changed
+        # by commands, which change the task status too
+        if task or io:
+            self.old['tool-info']  = self.stat.tool_table[0]
 
     def update(self):
         try:
+            self._commands_sent = linuxcnc.commands_sent()
             self.stat.poll()
         except:
             self._status_active = False
@@ -412,8 +458,21 @@ class _GStat(GObject.GObject):
             # Reschedule
             return True
         self._status_active = True
+        self._in_update = True
+        try:
+            self._emit_changes()
+        finally:
+            self._in_update = False
+        return True
+
+    def _emit_changes(self):
         old = dict(self.old)
         self.merge()
+        if self.old == old:
+            # nothing changed, only the periodic signals are due
+            self._emit_motion()
+            self.emit('periodic')
+            return
         cmd_state_old = old.get('command-state')
         cmd_state_new = self.old['command-state']
         if cmd_state_new != cmd_state_old:
@@ -554,21 +613,7 @@ class _GStat(GObject.GObject):
         if t_list_new != t_list_old:
             hard_limits_tripped_new = self.old['hard-limits-tripped']
             self.emit('hard-limits-tripped',hard_limits_tripped_new, t_list_new)
-        # current velocity
-        self.emit('current-feed-rate',self.stat.current_vel * 60.0)
-        # X relative position
-        position = self.stat.actual_position[0]
-        g5x_offset = self.stat.g5x_offset[0]
-        tool_offset = self.stat.tool_offset[0]
-        g92_offset = self.stat.g92_offset[0]
-        self.emit('current-x-rel-position',position-g5x_offset-tool_offset-g92_offset)
-
-        # calculate position offsets (native units)
-        p,rel_p,dtg = self.get_position()
-        self.emit('current-position',p, rel_p, dtg, self.stat.joint_actual_position)
-
-        # ferror
-        self.emit('following-error', self.old['ferror-current'])
+        self._emit_motion()
 
         # spindle control
         spindle_enabled_old = old.get('spindle-enabled', None)
@@ -742,17 +787,48 @@ class _GStat(GObject.GObject):
            blend_code_new != blend_code_old:
                 self.emit('blend-code-changed',blend_code_new, cam_code_new)
 
-        # AND DONE... Return true to continue timeout
+        # AND DONE...
         self.emit('periodic')
-        return True
+
+    # emitted every cycle, changed or not
+    def _emit_motion(self):
+        moved = self._merged_changes & (linuxcnc.STAT_CHANGED_TRAJ |
+                    linuxcnc.STAT_CHANGED_TASK | linuxcnc.STAT_CHANGED_JOINT)
+        if moved or self._positions is None:
+            # X relative position
+            position = self.stat.actual_position[0]
+            g5x_offset = self.stat.g5x_offset[0]
+            tool_offset = self.stat.tool_offset[0]
+            g92_offset = self.stat.g92_offset[0]
+            x_rel = position-g5x_offset-tool_offset-g92_offset
+            # calculate position offsets (native units)
+            p,rel_p,dtg = self.get_position()
+            self._positions = (self.stat.current_vel * 60.0, x_rel,
+                               (p, rel_p, dtg, self.stat.joint_actual_position))
+        self._merged_changes = 0
+        feed_rate, x_rel, position = self._positions
+        # current velocity
+        self.emit('current-feed-rate',feed_rate)
+        self.emit('current-x-rel-position',x_rel)
+        self.emit('current-position',*position)
+        # ferror
+        self.emit('following-error', self.old['ferror-current'])
 
     def forced_update(self):
         try:
+            self._commands_sent = linuxcnc.commands_sent()
             self.stat.poll()
         except:
             # Reschedule
             return True
-        self.merge()
+        self._in_update = True
+        try:
+            self._emit_all()
+        finally:
+            self._in_update = False
+
+    def _emit_all(self):
+        self.merge(linuxcnc.STAT_CHANGED_ALL)
         cmd_state_new = self.old['command-state']
         if cmd_state_new == linuxcnc.RCS_EXEC:
             self.emit('command-running')
@@ -910,6 +986,14 @@ class _GStat(GObject.GObject):
         self.emit('forced-update')
 
     # ********** Helper function ********************
+    # signal handlers run by update() see the status it just polled,
+    # instead of each of them polling again, until one sends a command
+    def _poll_stat(self):
+        sent = linuxcnc.commands_sent()
+        if not self._in_update or sent != self._commands_sent:
+            self._commands_sent = sent
+            self.stat.poll()
+
     def get_position(self):
         p = self.stat.actual_position
         mp = self.stat.position
@@ -953,7 +1037,7 @@ class _GStat(GObject.GObject):
     def check_for_modes(self, *modes):
         def running(s):
             return s.task_mode == linuxcnc.MODE_AUTO and s.interp_state != linuxcnc.INTERP_IDLE
-        self.stat.poll()
+        self._poll_stat()
         premode = self.stat.task_mode
         if not modes: return (None, premode)
         try:
@@ -1029,7 +1113,7 @@ class _GStat(GObject.GObject):
         return self.selected_axis
 
     def is_joint_homed(self, joint):
-        self.stat.poll()
+        self._poll_stat()
         return bool(self.stat.homed[joint])
 
     def is_all_homed(self):
@@ -1045,55 +1129,55 @@ class _GStat(GObject.GObject):
         return self.old['state']  > linuxcnc.STATE_OFF
 
     def estop_is_clear(self):
-        self.stat.poll()
+        self._poll_stat()
         return self.stat.task_state > linuxcnc.STATE_ESTOP
 
     def is_man_mode(self):
-        self.stat.poll()
+        self._poll_stat()
         return self.stat.task_mode  == linuxcnc.MODE_MANUAL
 
     def is_mdi_mode(self):
-        self.stat.poll()
+        self._poll_stat()
         return self.stat.task_mode  == linuxcnc.MODE_MDI
 
     def is_auto_mode(self):
-        self.stat.poll()
+        self._poll_stat()
         return self.stat.task_mode  == linuxcnc.MODE_AUTO
 
     def is_on_and_idle(self):
-        self.stat.poll()
+        self._poll_stat()
         return self.stat.task_state > linuxcnc.STATE_OFF and self.stat.interp_state == linuxcnc.INTERP_IDLE
 
     def is_auto_running(self):
-        self.stat.poll()
+        self._poll_stat()
         return self.stat.task_mode == linuxcnc.MODE_AUTO and self.stat.interp_state != linuxcnc.INTERP_IDLE
 
     def is_auto_paused(self):
-        self.stat.poll()
+        self._poll_stat()
         return self.stat.paused
 
     def is_interp_running(self):
-        self.stat.poll()
+        self._poll_stat()
         return self.stat.interp_state != linuxcnc.INTERP_IDLE
 
     def is_interp_paused(self):
-        self.stat.poll()
+        self._poll_stat()
         return self.stat.interp_state == linuxcnc.INTERP_PAUSED
 
     def is_interp_reading(self):
-        self.stat.poll()
+        self._poll_stat()
         return self.stat.interp_state == linuxcnc.INTERP_READING
 
     def is_interp_waiting(self):
-        self.stat.poll()
+        self._poll_stat()
         return self.stat.interp_state == linuxcnc.INTERP_WAITING
 
     def is_interp_idle(self):
-        self.stat.poll()
+        self._poll_stat()
         return self.stat.interp_state == linuxcnc.INTERP_IDLE
 
     def is_file_loaded(self):
-        self.stat.poll()
+        self._poll_stat()
         if self.stat.file:
             return True
         else:
@@ -1103,23 +1187,23 @@ class _GStat(GObject.GObject):
         return self.old['metric']
 
     def is_spindle_on(self, num = 0):
-        self.stat.poll()
+        self._poll_stat()
         return self.stat.spindle[num]['enabled']
 
     def get_spindle_speed(self, num=0):
-        self.stat.poll()
+        self._poll_stat()
         return self.stat.spindle[num]['speed']
 
     def is_joint_mode(self):
         try:
-            self.stat.poll()
+            self._poll_stat()
         except:
             return None
         return bool(self.stat.motion_mode == linuxcnc.TRAJ_MODE_FREE)
 
     def is_world_mode(self):
         try:
-            self.stat.poll()
+            self._poll_stat()
         except:
             return None
         return bool(self.stat.motion_mode == linuxcnc.TRAJ_MODE_TELEOP)
@@ -1134,13 +1218,13 @@ class _GStat(GObject.GObject):
         return self.old['hard-limits-tripped']
 
     def get_current_tool(self):
-        self.stat.poll()
+        self._poll_stat()
         return self.stat.tool_in_spindle
 
     def set_tool_touchoff(self,tool,axis,value):
         premode = None
         m = "G10 L10 P%d %s%f"%(tool,axis,value)
-        self.stat.poll()
+        self._poll_stat()
         if self.stat.task_mode != linuxcnc.MODE_MDI:
             premode = self.stat.task_mode
             self.cmd.mode(linuxcnc.MODE_MDI)
@@ -1155,7 +1239,7 @@ class _GStat(GObject.GObject):
     def set_axis_origin(self,axis,value):
         premode = None
         m = "G10 L20 P0 %s%f"%(axis,value)
-        self.stat.poll()
+        self._poll_stat()
         if self.stat.task_mode != linuxcnc.MODE_MDI:
             premode = self.stat.task_mode
             self.cmd.mode(linuxcnc.MODE_MDI)
@@ -1181,7 +1265,7 @@ class _GStat(GObject.GObject):
                 self.cmd.jog(linuxcnc.JOG_INCREMENT, jjogmode, j_or_a, direction * rate, distance)
 
     def get_jjogmode(self):
-        self.stat.poll()
+        self._poll_stat()
         if self.stat.motion_mode == linuxcnc.TRAJ_MODE_FREE:
             return JOGJOINT
         if self.stat.motion_mode == linuxcnc.TRAJ_MODE_TELEOP:
@@ -1211,11 +1295,11 @@ class _GStat(GObject.GObject):
         return jjogmode,j_or_a
 
     def get_probed_position(self):
-        self.stat.poll()
+        self._poll_stat()
         return list(self.stat.probed_position)
 
     def get_probed_position_with_offsets(self) :
-        self.stat.poll()
+        self._poll_stat()
         probed_position=list(self.stat.probed_position)
         coord=list(self.stat.probed_position)
         g5x_offset=list(self.stat.g5x_offset)
@@ -886,5 +886,80 @@ class InputDevice:
         elif e.type == 'EV_LED': e.code = decode(LED_invert, 'LED', e.code)
         return e
 
+    def read_events(self, count=64):
+        """Read at most count waiting events in one go, returning them as
+        (type, code, value) tuples of integers.  Only call this when the
+        device is readable, or it blocks."""
+        buf = os.read(self.f, Event.size * count)
+        return [e[2:] for e in struct.iter_unpack(Event.format, buf)]
+
     def write_event(self, *args):
         Event.write(self.f, *args)
+
+def encode(type, name):
+    """The integer code of a key, axis or LED name as returned by get_bits"""
+    if isinstance(name, int): return name
+    if type == 'EV_KEY': maps = KEY, BTN
+    elif type == 'EV_ABS': maps = ABS,
+    elif type == 'EV_REL': maps = REL,
+    elif type == 'EV_LED': maps = LED,
+    else: raise ValueError("encode: unexpected map %s" % type)
+    for map in maps:
+        if name in map: return map[name]
+    # codes without a name are called like KEY_%d by decode
+    return int(name.rsplit("_", 1)[1])
+
+class RecordedDevice:
+    """Stands in for an InputDevice, replaying the events recorded from one,
+    for example with 'cat /dev/input/eventN > recording'.
+
+    The device reports the keys and axes the recording uses, the absolute
+    axes ranging over the values recorded.  Events written to it are kept in
+    the written list."""
+    def __init__(self, filename):
+        with open(filename, 'rb') as f:
+            buf = f.read()
+        buf = buf[:len(buf) - len(buf) % Event.size]
+        self.events = [e[2:] for e in struct.iter_unpack(Event.format, buf)]
+        self.position = 0
+        self.written = []
+        self.codes = {}
+        self.ranges = {}
+        for type, code, value in self.events:
+            self.codes.setdefault(type, set()).add(code)
+            if type == EV['EV_ABS']:
+                low, high = self.ranges.get(code, (value, value))
+                self.ranges[code] = min(low, value), max(high, value)
+
+    def rewind(self):
+        self.position = 0
+
+    def fileno(self): return -1
+    def readable(self): return self.position < len(self.events)
+
+    def get_bits(self, arg):
+        maps = {'EV_KEY': (KEYBTN_invert, 'KEY'), 'EV_ABS': (ABS_invert, 'ABS'),
+                'EV_REL': (REL_invert, 'REL'), 'EV_LED': (LED_invert, 'LED')}
+        if arg not in maps: raise ValueError("get_bits: unexpected map %s" % arg)
+        fmap, prefix = maps[arg]
+        return set(decode(fmap, prefix, code) for code in self.codes.get(EV[arg], ()))
+
+    def get_absinfo(self, arg):
+        low, high = self.ranges.get(encode('EV_ABS', arg), (0, 0))
+        return AbsInfo(0, low, high, 0, 0)
+
+    def read_event(self):
+        e = Event(struct.pack(Event.format, 0, 0, *self.read_events(1)[0]))
+        if e.type == 'EV_KEY': e.code = decode(KEYBTN_invert, 'KEY', e.code)
+        elif e.type == 'EV_ABS': e.code = decode(ABS_invert, 'ABS', e.code)
+        elif e.type == 'EV_REL': e.code = decode(REL_invert, 'REL', e.code)
+        elif e.type == 'EV_LED': e.code = decode(LED_invert, 'LED', e.code)
+        return e
+
+    def read_events(self, count=64):
+        events = self.events[self.position:self.position + count]
+        self.position += len(events)
+        return events
+
+    def write_event(self, *args):
+        self.written.append(args)
@@ -0,0 +1,285 @@
+#    This program is free software; you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation; either version 2 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program; if not, write to the Free Software
+#    Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+import os
+import re
+import time
+import array
+
+# Text log files that screens append to and show, e.g. the QtVCP machine log.
+#
+# LogTail follows a log the way 'tail -f' does: it remembers the inode of
+# the file and how far it has read it, and each read returns only the lines
+# appended since.  A file that was replaced (a new inode) or got shorter
+# (truncated) is read again, from its last lines only.
+#
+# LogRotator keeps a log from growing forever: when it gets bigger than
+# max_size bytes or older than max_age seconds it is renamed to log.1, log.1
+# to log.2 and so on, keeping the last keep of them.  When the log was
+# started is kept in a stamp file, log.started, across restarts.
+#
+# LogIndex searches a log and its rotated copies.  Each file is read once, in
+# chunks, to note where its lines start and which lines each word is on;
+# later only what was appended is read.  A search looks up the lines holding
+# the words of the text and reads just those lines to check them.  Indexes
+# are kept by inode, so rotating a log does not index it again.
+
+# bytes read at a time
+CHUNK = 1 << 16
+# lines read again after a reset
+LINES = 1000
+MAX_SIZE = 1 << 20
+MAX_AGE = 30 * 24 * 3600
+KEEP = 5
+
+WORD_RE = re.compile(rb'\w+')
+
+def rotated_names(path, keep=KEEP):
+    """path and its rotated copies, newest first"""
+    return [path] + ['%s.%d' % (path, i) for i in range(1, keep + 1)]
+
+def last_lines(f, size, count):
+    """The bytes of the last count lines of the first size bytes of the
+    binary file f, read backwards a chunk at a time"""
+    start = size
+    data = b''
+    while start > 0 and data.count(b'\n', 0, -1) < count:
+        n = min(CHUNK, start)
+        start -= n
+        f.seek(start)
+        data = f.read(n) + data
+    if data.count(b'\n', 0, -1) >= count:
+        cut = len(data) - 1
+        for i in range(count):
+            cut = data.rindex(b'\n', 0, cut)
+        data = data[cut + 1:]
+    return data
+
+class LogTail:
+    """Follows the log file path, reading only what is appended to it"""
+    def __init__(self, path, lines=LINES):
+        self.path = path
+        self.lines = lines
+        self.inode = None
+        self.offset = 0
+        self.seen = None
+
+    def stat(self):
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            return None
+        return st.st_ino, st.st_size, st.st_mtime_ns
+
+    def changed(self):
+        """Whether the file changed since it was last read"""
+        return self.stat() != self.seen
+
+    def reset(self):
+        """Read the file again from its last lines on the next read()"""
+        self.inode = None
+        self.seen = None
+
+    def read(self):
+        """(reset, text): the complete lines appended since the last read,
+        or, with reset True, the last lines of a file replaced, truncated or
+        not read before, to show instead of the text read so far"""
+        try:
+            f = open(self.path, 'rb')
+        except OSError:
+            self.inode, self.offset, self.seen = None, 0, None
+            return True, ''
+        with f:
+            st = os.fstat(f.fileno())
+            self.seen = st.st_ino, st.st_size, st.st_mtime_ns
+            reset = st.st_ino != self.inode or st.st_size < self.offset
+            if reset:
+                self.inode = st.st_ino
+                data = last_lines(f, st.st_size, self.lines)
+            else:
+                f.seek(self.offset)
+                data = f.read(st.st_size - self.offset)
+        # leave a line being written for the next read
+        end = data.rfind(b'\n') + 1
+        self.offset = st.st_size - len(data) + end
+        return reset, data[:end].decode('utf-8', 'replace')
+
+class LogRotator:
+    """Rotates the log file path by size and age
+
+    The age of a log counts from when it was started: rotated, or first
+    written while empty.  That time is kept as the modification time of a
+    stamp file next to the log, path + '.started', so it outlives the
+    screen; the log's own modification time changes with every line.  A
+    max_size or max_age of 0 turns that limit off."""
+    def __init__(self, path, max_size=MAX_SIZE, max_age=MAX_AGE, keep=KEEP):
+        self.path = path
+        self.stamp = path + '.started'
+        self.max_size = max_size
+        self.max_age = max_age
+        self.keep = keep
+        try:
+            self.started = os.stat(self.stamp).st_mtime
+        except OSError:
+            # a log from before the stamp was kept: its best guess
+            try:
+                self.started = os.stat(path).st_mtime
+            except OSError:
+                self.started = time.time()
+
+    def restart(self):
+        """Start counting the age of the log from now"""
+        self.started = time.time()
+        with open(self.stamp, 'a'):
+            pass
+        os.utime(self.stamp, (self.started, self.started))
+
+    def due(self):
+        try:
+            size = os.stat(self.path).st_size
+        except OSError:
+            size = 0
+        if not size:
+            # the lines about to be written start a new log
+            if self.max_age:
+                self.restart()
+            return False
+        if self.max_size and size >= self.max_size:
+            return True
+        return bool(self.max_age) and time.time() - self.started >= self.max_age
+
+    def rotate(self):
+        names = rotated_names(self.path, self.keep)
+        for i in range(len(names) - 1, 0, -1):
+            if os.path.exists(names[i - 1]):
+                os.replace(names[i - 1], names[i])
+        self.restart()
+
+    def check(self):
+        """Rotate the log if it is due; returns whether it was"""
+        if self.keep < 1 or not self.due():
+            return False
+        self.rotate()
+        return True
+
+class FileIndex:
+    """Where the lines of one log file start and which lines each word is
+    on, for the part of the file read so far"""
+    def __init__(self, inode):
+        self.inode = inode
+        self.offset = 0
+        self.starts = array.array('Q')
+        self.words = {}
+        # the bytes before offset, to tell a file truncated and written again
+        self.last = b''
+
+    def update(self, f, size):
+        if size < self.offset or self.last and self.read_last(f) != self.last:
+            self.__init__(self.inode)
+        f.seek(self.offset)
+        rest = b''
+        while self.offset + len(rest) < size:
+            data = rest + f.read(min(CHUNK, size - self.offset - len(rest)))
+            end = data.rfind(b'\n') + 1
+            if not end:
+                if len(data) == len(rest):
+                    break
+                rest = data
+                continue
+            rest = data[end:]
+            for line in data[:end - 1].split(b'\n'):
+                number = len(self.starts)
+                self.starts.append(self.offset)
+                self.offset += len(line) + 1
+                for word in set(WORD_RE.findall(line.lower())):
+                    try:
+                        self.words[word].append(number)
+                    except KeyError:
+                        self.words[word] = array.array('I', (number,))
+        self.last = self.read_last(f)
+
+    def read_last(self, f):
+        start = max(0, self.offset - 64)
+        f.seek(start)
+        return f.read(self.offset - start)
+
+    def candidates(self, words):
+        """Numbers of the lines that may hold text with the (word, whole)
+        pairs of words, newest first
+
+        A whole word of the text is looked up as it is; only when there is
+        none are the words of the file searched for the other ones."""
+        found = None
+        whole = [w for w, exact in words if exact]
+        for w, exact in words:
+            if whole and not exact:
+                continue
+            if exact:
+                lines = set(self.words.get(w, ()))
+            else:
+                lines = set()
+                for word in [word for word in self.words if w in word]:
+                    lines.update(self.words[word])
+            found = lines if found is None else found & lines
+            if not found:
+                return []
+        if found is None:
+            return range(len(self.starts) - 1, -1, -1)
+        return sorted(found, reverse=True)
+
+    def line(self, f, number):
+        f.seek(self.starts[number])
+        end = self.starts[number + 1] if number + 1 < len(self.starts) else self.offset
+        return f.read(end - self.starts[number])
+
+class LogIndex:
+    """Searches the log file path and its rotated copies"""
+    def __init__(self, path, keep=KEEP):
+        self.path = path
+        self.keep = keep
+        self.indexes = {}
+
+    def search(self, text, limit=100):
+        """The lines containing text, ignoring case, newest first, as
+        (file name, line number, line) tuples; at most limit of them"""
+        needle = text.encode('utf-8').lower()
+        # words of text with a character that is not part of a word on both
+        # sides must be whole words of the line too
+        words = [(m.group(), 0 < m.start() and m.end() < len(needle))
+                 for m in WORD_RE.finditer(needle)]
+        found = []
+        inodes = set()
+        for name in rotated_names(self.path, self.keep):
+            try:
+                f = open(name, 'rb')
+            except OSError:
+                continue
+            with f:
+                st = os.fstat(f.fileno())
+                inodes.add(st.st_ino)
+                index = self.indexes.get(st.st_ino)
+                if index is None:
+                    index = self.indexes[st.st_ino] = FileIndex(st.st_ino)
+                index.update(f, st.st_size)
+                if len(found) >= limit:
+                    continue
+                for number in index.candidates(words):
+                    line = index.line(f, number)
+                    if needle in line.lower():
+                        found.append((name, number + 1, line.rstrip(b'\r\n').decode('utf-8', 'replace')))
+                        if len(found) >= limit:
+                            break
+        for inode in set(self.indexes) - inodes:
+            del self.indexes[inode]
+        return found
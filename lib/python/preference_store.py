@@ -0,0 +1,214 @@
+#    This program is free software; you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation; either version 2 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program; if not, write to the Free Software
+#    Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+import os
+import io
+import atexit
+import tempfile
+import threading
+import weakref
+
+# INI style preference file, kept in memory and written behind changes.
+#
+# Screens set preferences one by one, often several in a row, and used to
+# rewrite the whole file for each of them.  A PreferenceStore only marks
+# itself changed; the first change starts a timer and the file is written
+# once, DELAY seconds later, with everything changed meanwhile.  The file
+# is written to a temporary file next to it, synced and renamed over it,
+# so after a power loss it holds either the old or the new preferences.
+#
+# The changes not written yet are also kept as a list of operations.  If
+# the file was changed by someone else since the store last read or wrote
+# it, it is read again and the operations are replayed on top before it is
+# written, so those changes are not lost.
+#
+# Stores are also written by flush_all(), which screens call when they shut
+# down, and at interpreter exit.
+
+# seconds from the first change to writing the file
+DELAY = 2.0
+
+# the live stores by id (parsers are mappings, so not hashable)
+_stores = weakref.WeakValueDictionary()
+
+def flush_all():
+    """Write the pending changes of all stores"""
+    for store in list(_stores.values()):
+        store.flush()
+
+atexit.register(flush_all)
+
+class PreferenceStore:
+    """Mixed in before a configparser class, e.g.
+
+        class Preferences(PreferenceStore, configparser.RawConfigParser)
+
+    makes the parser read fn and write its changes back behind them."""
+    def __init__(self, fn, delay=DELAY):
+        self.fn = fn
+        self.delay = delay
+        self.dirty = False
+        self._pending = []
+        self._cache = {}
+        self._timer = None
+        # _lock guards the contents, _write_lock keeps the writes in order
+        self._lock = threading.RLock()
+        self._write_lock = threading.Lock()
+        super().__init__()
+        self._stat = self.file_stat()
+        self.read(fn)
+        _stores[id(self)] = self
+
+    def cached(self, section, option, type, convert):
+        """The value of option converted by convert(), cached until the
+        store is changed"""
+        key = section, option, type
+        with self._lock:
+            try:
+                return self._cache[key]
+            except KeyError:
+                value = self._cache[key] = convert()
+                return value
+
+    # reload() runs on the timer thread and empties the parser before it
+    # reads the file again, so reads take the lock too
+
+    def get(self, section, option, **kw):
+        with self._lock:
+            return super().get(section, option, **kw)
+
+    def items(self, *args, **kw):
+        with self._lock:
+            return super().items(*args, **kw)
+
+    def sections(self):
+        with self._lock:
+            return super().sections()
+
+    def options(self, section):
+        with self._lock:
+            return super().options(section)
+
+    def has_section(self, section):
+        with self._lock:
+            return super().has_section(section)
+
+    def has_option(self, section, option):
+        with self._lock:
+            return super().has_option(section, option)
+
+    def add_section(self, section):
+        with self._lock:
+            super().add_section(section)
+            self.changed(('add_section', section))
+
+    def set(self, section, option, value=None):
+        with self._lock:
+            super().set(section, option, value)
+            self.changed(('set', section, option, value))
+
+    def remove_option(self, section, option):
+        with self._lock:
+            removed = super().remove_option(section, option)
+            self.changed(('remove_option', section, option))
+            return removed
+
+    def remove_section(self, section):
+        with self._lock:
+            removed = super().remove_section(section)
+            self.changed(('remove_section', section))
+            return removed
+
+    def changed(self, operation):
+        """Note a change made to the contents and schedule writing them"""
+        with self._lock:
+            self._cache.clear()
+            self._pending.append(operation)
+            self.dirty = True
+            if self._timer is None and self.delay is not None:
+                self._timer = threading.Timer(self.delay, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+
+    def file_stat(self):
+        try:
+            st = os.stat(self.fn)
+        except OSError:
+            return None
+        return st.st_ino, st.st_size, st.st_mtime_ns
+
+    def reload(self):
+        # read the file again and apply the changes not written yet to it
+        for section in self.sections():
+            super().remove_section(section)
+        self.defaults().clear()
+        self.read(self.fn)
+        for operation in self._pending:
+            if operation[0] in ('set', 'add_section'):
+                section = operation[1]
+                if section != self.default_section and not self.has_section(section):
+                    super().add_section(section)
+                if operation[0] == 'set':
+                    super().set(*operation[1:])
+            elif operation[0] == 'remove_option':
+                if self.has_section(operation[1]) or operation[1] == self.default_section:
+                    super().remove_option(*operation[1:])
+            else:
+                super().remove_section(*operation[1:])
+        self._cache.clear()
+
+    def flush(self):
+        """Write the file now if anything changed"""
+        with self._write_lock:
+            with self._lock:
+                if self._timer is not None:
+                    self._timer.cancel()
+                    self._timer = None
+                if not self.dirty:
+                    return
+                if self.file_stat() != self._stat:
+                    self.reload()
+                text = io.StringIO()
+                self.write(text)
+                pending = self._pending
+                self._pending = []
+                self.dirty = False
+            try:
+                self.replace_file(text.getvalue())
+                self._stat = self.file_stat()
+            except OSError as e:
+                print('could not write preference file {}: {}'.format(self.fn, e))
+                with self._lock:
+                    self._pending[:0] = pending
+                    self.dirty = True
+
+    def replace_file(self, text):
+        # write through a symlinked preference file
+        fn = os.path.realpath(self.fn)
+        path = os.path.dirname(fn)
+        fd, tmp = tempfile.mkstemp(prefix='.' + os.path.basename(fn) + '.', dir=path)
+        try:
+            try:
+                mode = os.stat(fn).st_mode & 0o777
+            except OSError:
+                mode = 0o644
+            os.fchmod(fd, mode)
+            with os.fdopen(fd, 'w') as f:
+                f.write(text)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, fn)
+        except:
+            os.unlink(tmp)
+            raise
@@ -132,7 +132,12 @@ class port(pin):
         if self.dir != pinDir.OUT:
            raise HalException("cannot write input port")
 
-        return lib.hal_port_write(self.__port, buff.encode(), len(buff))
+        if isinstance(buff, str):
+            buff = buff.encode()
+        elif not isinstance(buff, bytes):
+            # bytearray, memoryview, numpy array or anything else with the buffer interface
+            buff = bytes(memoryview(buff).cast('B'))
+        return lib.hal_port_write(self.__port, buff, len(buff))
 
     def readable(self):
         if self.dir != pinDir.IN:
@@ -3,6 +3,8 @@ from qtvcp.core import Status, Info
 import os
 import time
 
+from log_tail import LogRotator
+
 # Set up logging
 from qtvcp import logger
 
@@ -18,6 +20,8 @@ class MachineLogger():
     def __init__(self):
         STATUS.connect('update-machine-log', self.log_it)
         self.mlp = os.path.expanduser(INFO.MACHINE_LOG_HISTORY_PATH)
+        self.rotator = LogRotator(self.mlp, INFO.MACHINE_LOG_MAX_SIZE,
+                                  INFO.MACHINE_LOG_MAX_AGE, INFO.MACHINE_LOG_KEEP)
 
         self.initialFormat = "%a, %b %d %Y %X ---"
         self.timeFormat = "%H:%M:%S "
@@ -43,7 +47,7 @@ class MachineLogger():
     def initial_greeting(self):
         try:
             timestamp = time.strftime(self.initialFormat)
-            fp = open(self.mlp, 'a')
+            fp = self.open_log()
 
             # fp.write(""" $$$$$$\  $$$$$$$$\ """)
             # fp.write('\n')
@@ -71,7 +75,7 @@ class MachineLogger():
     def log_message_time(self, message):
         try:
             timestamp = time.strftime(self.timeFormat)
-            fp = open(self.mlp, 'a')
+            fp = self.open_log()
             for num,i in enumerate(message.split('\\n')):
                 if num == 0:
                     fp.write(timestamp + i + "\n")
@@ -85,7 +89,7 @@ class MachineLogger():
     def log_message_date(self, message):
         try:
             timestamp = time.strftime(self.dateFormat)
-            fp = open(self.mlp, 'a')
+            fp = self.open_log()
             for num,i in enumerate(message.split('\\n')):
                 if num == 0:
                     fp.write(timestamp + i + "\n")
@@ -98,7 +102,7 @@ class MachineLogger():
 
     def log_message(self, message):
         try:
-            fp = open(self.mlp, 'a')
+            fp = self.open_log()
             for i in message.split('\\n'):
                     fp.write(i + "\n")
             fp.close()
@@ -106,6 +110,14 @@ class MachineLogger():
             log.warning('machine log history: path valid?')
         STATUS.emit('machine-log-changed')
 
+    # start a new log first if this one got too big or old
+    def open_log(self):
+        try:
+            self.rotator.check()
+        except OSError as e:
+            log.warning('machine log history: could not rotate: {}'.format(e))
+        return open(self.mlp, 'a')
+
     def delete_log(self):
         fp = open(self.mlp, 'w')
         fp.write('')
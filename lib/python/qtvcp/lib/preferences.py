@@ -14,39 +14,43 @@
 import os
 
 import configparser
+from preference_store import PreferenceStore
 
 cp = configparser.RawConfigParser
 cp.optionxform = str
 
 
-class Access(cp):
+class Access(PreferenceStore, cp):
     types = {
         bool: cp.getboolean,
         float: cp.getfloat,
         int: cp.getint,
-        str: cp.get,
-        repr: lambda self, section, option: eval(cp.get(self, section, option)),
+        # through the instance, whose reads take the store's lock
+        str: lambda self, section, option: self.get(section, option),
+        repr: lambda self, section, option: eval(self.get(section, option)),
     }
 
+    # changes are kept in memory and written to the file a moment later
+    # (see preference_store) - call flush() to write them at once
     def __init__(self, path=None):
-        cp.__init__(self)
         if not path:
             path = "~/.qtscreen_preferences"
-        self.fn = os.path.expanduser(path)
-        try:
-            fp = open(self.fn)
-        except:
-            print('preference file does not exist -makeing file - {}'.format(self.fn))
+        fn = os.path.expanduser(path)
+        if not os.path.exists(fn):
+            print('preference file does not exist -makeing file - {}'.format(fn))
             # If not exists, create the file
-            fp = open(self.fn, 'w+')
-        self.read(self.fn)
+            open(fn, 'w+').close()
+        PreferenceStore.__init__(self, fn)
 
     def getpref(self, option, default=False, type=bool, section="DEFAULT"):
         m = self.types.get(type)
         if m is None:
             m = self.types.get(repr)
         try:
-            o = m(self, section, option)
+            if type in (bool, float, int, str):
+                o = self.cached(section, option, type, lambda: m(self, section, option))
+            else:
+                o = m(self, section, option)
         except Exception as detail:
             print(detail)
             try:
@@ -56,7 +60,6 @@ class Access(cp):
                 # Create non-existent section
                 self.add_section(section)
                 self.set(section, option, default)
-            self.write(open(self.fn, "w"))
             if type in (bool, float, int):
                 o = type(default)
             else:
@@ -66,7 +69,7 @@ class Access(cp):
     def getall(self, section='DEFAULT'):
         store = {}
         try:
-            for key, value in cp.items(self, section):
+            for key, value in self.items(section):
                 store[key] = value
             return store
         except configparser.NoSectionError:
@@ -81,7 +84,12 @@ class Access(cp):
             # Create non-existent section
             self.add_section(section)
             self.set(section, option, type(value))
-        self.write(open(self.fn, "w"))
+
+    # set several preferences of a section: prefs is a list of
+    # (option, value, type) like the arguments of putpref
+    def putprefs(self, prefs, section="DEFAULT"):
+        for option, value, type in prefs:
+            self.putpref(option, value, type, section)
 
     def removepref(self, option, section):
         try:
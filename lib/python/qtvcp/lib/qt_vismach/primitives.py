@@ -3,6 +3,7 @@ import OpenGL.GL as GL
 from OpenGL import GLU
 import hal
 import array, itertools
+import vismach_mesh
 from math import *
 
 # functions copied from glnav.py
@@ -1075,111 +1076,27 @@ class HALColorFlip(Collection):
         GL.glPopAttrib()
         GL.glDisable(GL.GL_BLEND)
 
-class AsciiSTL:
-    def __init__(self, filename=None, data=None):
-        if data is None:
-            data = open(filename, "r")
-        elif isinstance(data, str):
-            data = data.split("\n")
-        self.list = None
-        t = []
-        n = [0, 0, 0]
-        self.d = d = []
-        for line in data:
-            if line.find("normal") != -1:
-                line = line.split()
-                x, y, z = list(map(float, line[-3:]))
-                n = [x, y, z]
-            elif line.find("vertex") != -1:
-                line = line.split()
-                x, y, z = list(map(float, line[-3:]))
-                t.append([x, y, z])
-                if len(t) == 3:
-                    if n == [0, 0, 0]:
-                        dx1 = t[1][0] - t[0][0]
-                        dy1 = t[1][1] - t[0][1]
-                        dz1 = t[1][2] - t[0][2]
-                        dx2 = t[2][0] - t[0][0]
-                        dy2 = t[2][1] - t[0][1]
-                        dz2 = t[2][2] - t[0][2]
-                        n = [dy1 * dz2 - dy2 * dz1, dz1 * dx2 - dz2 * dx1, dy1 * dx2 - dy2 * dx1]
-                    d.append((n, t))
-                    t = []
-                    n = [0, 0, 0]
+class AsciiSTL(vismach_mesh.MeshModel):
+    """A model read from an STL file, binary or ASCII, or from STL text
+    given as data
+
+    max_triangles=n draws a decimated copy of big models."""
+    def __init__(self, filename=None, data=None, **kw):
+        super().__init__(filename, data, kind='stl', **kw)
 
     def draw(self):
-        if self.list is None:
-            # OpenGL isn't ready yet in __init__ so the display list
-            # is created during the first draw
-            self.list = GL.glGenLists(1)
-            GL.glNewList(self.list, GL.GL_COMPILE)
-            GL.glBegin(GL.GL_TRIANGLES)
-            for n, t in self.d:
-                GL.glNormal3f(*n)
-                GL.glVertex3f(*t[0])
-                GL.glVertex3f(*t[1])
-                GL.glVertex3f(*t[2])
-            GL.glEnd()
-            GL.glEndList()
-            del self.d
-        GL.glCallList(self.list)
-
-
-class AsciiOBJ:
-    def __init__(self, filename=None, data=None):
-        if data is None:
-            data = open(filename, "r")
-        elif isinstance(data, str):
-            data = data.split("\n")
-
-        self.v = v = []
-        self.vn = vn = []
-        self.f = f = []
-        for line in data:
-            if line.startswith("#"): continue
-            if line.startswith("vn"):
-                vn.append([float(w) for w in line.split()[1:]])
-            elif line.startswith("v"):
-                v.append([float(w) for w in line.split()[1:]])
-            elif line.startswith("f"):
-                f.append(self.parse_face(line))
-
-        #        print v[:5]
-        #        print vn[:5]
-        #        print f[:5]
-
-        self.list = None
-
-    def parse_int(self, i):
-        if i == '': return None
-        return int(i)
-
-    def parse_slash(self, word):
-        return [self.parse_int(i) for i in word.split("/")]
-
-    def parse_face(self, line):
-        return [self.parse_slash(w) for w in line.split()[1:]]
+        self.draw_mesh(GL)
+
+class AsciiOBJ(vismach_mesh.MeshModel):
+    """A model read from an OBJ file, or from OBJ text given as data
+
+    max_triangles=n draws a decimated copy of big models."""
+    def __init__(self, filename=None, data=None, **kw):
+        super().__init__(filename, data, kind='obj', **kw)
 
     def draw(self):
-        if self.list is None:
-            # OpenGL isn't ready yet in __init__ so the display list
-            # is created during the first draw
-            self.list = GL.glGenLists(1)
-            GL.glNewList(self.list, GL.GL_COMPILE)
-            GL.glDisable(GL.GL_CULL_FACE)
-            GL.glBegin(GL.GL_TRIANGLES)
-            # print "obj", len(self.f)
-            for f in self.f:
-                for v, t, n in f:
-                    if n:
-                        GL.glNormal3f(*self.vn[n - 1])
-                    GL.glVertex3f(*self.v[v - 1])
-            GL.glEnd()
-            GL.glEndList()
-            del self.v
-            del self.vn
-            del self.f
-        GL.glCallList(self.list)
+        GL.glDisable(GL.GL_CULL_FACE)
+        self.draw_mesh(GL)
 
 ################################################################
 # animated objects
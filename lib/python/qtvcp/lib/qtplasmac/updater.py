@@ -112,7 +112,7 @@ def move_default_material(prefs, materials, unitsPerMm):
                     if valid:
                         f_out.write(line)
     prefs.remove_section('DEFAULT MATERIAL')
-    prefs.write(open(prefs.fn, 'w'))
+    prefs.flush()
     return(False, False, 'Updated to V2.9-236.278')
 
 
@@ -126,7 +126,7 @@ def move_port(prefs):
         data = prefs.getpref('Port', '', str, 'GUI_OPTIONS')
         prefs.putpref('Port', data, str, 'POWERMAX')
     prefs.removepref('Port', 'GUI_OPTIONS')
-    prefs.write(open(prefs.fn, 'w'))
+    prefs.flush()
     return(False, False, 'Updated to V2.9-232.240')
 
 
@@ -140,7 +140,7 @@ def move_options_to_prefs_file(inifile, prefs):
         text = prefs.getpref('shutdown_msg_detail', '', str, 'SHUTDOWN_OPTIONS')
         prefs.putpref('Exit warning text', text, str, 'GUI_OPTIONS')
         prefs.remove_section('SHUTDOWN_OPTIONS')
-        prefs.write(open(prefs.fn, 'w'))
+        prefs.flush()
         data = inifile.find('QTPLASMAC', 'MODE') or None
         if data:
             prefs.putpref('Mode', data, int, 'GUI_OPTIONS')
@@ -114,12 +114,17 @@ import binascii
 import getopt
 import webbrowser
 import struct
+import numpy
 
 #import gcode_ripper_lib
 
 Zero      = 0.0000001
 STOP_CALC = 0
 
+# A word of a g-code line: its letter and the text up to the next letter
+WORD_RE  = re.compile(r'([A-Z#=])([^A-Z#=]*)')
+UCODE_RE = re.compile(r'[ABCDELOQUVW]')
+
 #Setting QUIET to True will stop almost all console messages
 QUIET = False
 DEBUG = False
@@ -3769,6 +3774,158 @@ class Application(Frame):
 #################
 ### START LIB ###
 #################
+############################################################################
+# Array model of the moves in a code list (g_code_data, scaled_trans,      #
+# left_side ...).  The G0-G3 entries are held as numpy arrays so the       #
+# transforms run over all of them at once; everything else in the list    #
+# passes through untouched.  In the lists a coordinate the g-code has not  #
+# set yet is a complex number whose real part is carried along; the        #
+# arrays hold the real part and an "unset" mask of the coordinates with an #
+# imaginary part, and give complex numbers back for the unset ones.        #
+############################################################################
+def is_move(line):
+    return isinstance(line, list) and (line[0] in (0, 1, 2, 3))
+
+def point_list(xyz, unset):
+    rows = xyz.tolist()
+    for i, j in zip(*numpy.nonzero(unset)):
+        rows[i][j] = complex(rows[i][j], 1)
+    return rows
+
+def rotate_points(xyz, unset, angle):
+    # Transform() over all points: a rotated x or y is unset when either was
+    c = cos(angle)
+    s = sin(angle)
+    out = xyz.copy()
+    out[:,0] = xyz[:,0] * c - xyz[:,1] * s
+    out[:,1] = xyz[:,0] * s + xyz[:,1] * c
+    unset = unset.copy()
+    unset[:,0] = unset[:,1] = unset[:,0] | unset[:,1]
+    return out, unset
+
+class Moves:
+    def __init__(self, code):
+        self.code  = code
+        self.index = [i for i in range(len(code)) if is_move(code[i])]
+        moves = [code[i] for i in self.index]
+        n = len(moves)
+        self.kind = numpy.array([m[0] for m in moves], dtype=int)
+        self.feed = numpy.array([m[3] if m[0] == 1 else m[4] if m[0] > 1 else 0
+                                 for m in moves], dtype=float)
+        centers = [m[3][:3] if m[0] > 1 else (0, 0, 0) for m in moves]
+        points = {}
+        for name, p in (("start", [m[1][:3] for m in moves]),
+                        ("end", [m[2][:3] for m in moves]),
+                        ("center", centers)):
+            xyz = numpy.array(p, dtype=complex).reshape(n, 3)
+            points[name] = xyz.real.copy(), xyz.imag != 0
+        self.start, self.start_unset = points["start"]
+        self.end, self.end_unset = points["end"]
+        self.center, self.center_unset = points["center"]
+
+    def __len__(self):
+        return len(self.index)
+
+    def copy(self):
+        other = Moves.__new__(Moves)
+        other.__dict__.update(self.__dict__)
+        return other
+
+    def points(self):
+        return ((self.start, self.start_unset), (self.end, self.end_unset),
+                (self.center, self.center_unset))
+
+    def set_points(self, points):
+        ((self.start, self.start_unset), (self.end, self.end_unset),
+         (self.center, self.center_unset)) = points
+
+    def scaled(self, scale, feed_scale=1.0):
+        other = self.copy()
+        other.set_points([(xyz * scale, unset) for xyz, unset in self.points()])
+        other.feed = self.feed * feed_scale
+        return other
+
+    def rotated(self, angle):
+        # angle in degrees, like coordop / scale_rot_coords
+        other = self.copy()
+        other.set_points([rotate_points(xyz, unset, radians(angle))
+                          for xyz, unset in self.points()])
+        return other
+
+    def translated(self, offset):
+        other = self.copy()
+        other.set_points([(xyz - offset, unset) for xyz, unset in self.points()])
+        return other
+
+    def bounds(self):
+        # minx,maxx,miny,maxy,minz,maxz of the cutting moves, arcs included
+        # with their extents, as scale_rotate_code always computed them
+        big = [99999, -99999, 99999, -99999, 99999, -99999]
+        cut = self.kind != 0
+        for axis in range(3):
+            ok = cut & ~self.start_unset[:,axis] & ~self.end_unset[:,axis]
+            if ok.any():
+                values = numpy.concatenate([self.start[ok,axis], self.end[ok,axis]])
+                big[2*axis]   = min(big[2*axis],   float(values.min()))
+                big[2*axis+1] = max(big[2*axis+1], float(values.max()))
+
+        arc = self.kind >= 2
+        if arc.any():
+            ccw = (self.kind[arc] == 3)[:,None]
+            pos, last, cen = self.end[arc], self.start[arc], self.center[arc]
+            first = numpy.where(ccw, last, pos) - cen
+            other = numpy.where(ccw, pos, last) - cen
+            ang1 = get_angles(first[:,0], first[:,1])
+            a = numpy.radians(-ang1)
+            xtmp = other[:,0] * numpy.cos(a) - other[:,1] * numpy.sin(a)
+            ytmp = other[:,0] * numpy.sin(a) + other[:,1] * numpy.cos(a)
+            ang2 = get_angles(xtmp, ytmp)
+            ang2[ang2 == 0] = 359.999
+            radius = numpy.sqrt((pos[:,0]-cen[:,0])**2 + (pos[:,1]-cen[:,1])**2)
+            da = numpy.select([ang1 > 270, ang1 > 180, ang1 > 90], [270, 180, 90], 0)
+            reached = {90: [], 180: [], 270: [], 360: []}
+            for side in [90,180,270,360]:
+                spd = side + da
+                hit = ang2 > (spd - ang1)
+                spd = numpy.where(spd > 360, spd - 360, spd)
+                for quadrant in reached:
+                    reached[quadrant].append(hit & (spd == quadrant))
+            reached = dict((q, numpy.any(v, axis=0)) for q, v in reached.items())
+            for quadrant, bound, axis, sign in ((90, 3, 1, 1), (180, 0, 0, -1),
+                                                (270, 2, 1, -1), (360, 1, 0, 1)):
+                if reached[quadrant].any():
+                    values = cen[reached[quadrant],axis] + sign * radius[reached[quadrant]]
+                    if sign > 0:
+                        big[bound] = max(big[bound], float(values.max()))
+                    else:
+                        big[bound] = min(big[bound], float(values.min()))
+        return big
+
+    def entry(self, kind, start, end, center, feed):
+        if kind == 0:
+            return [kind, start, end]
+        if kind == 1:
+            return [kind, start, end, feed]
+        return [kind, start, end, center, feed]
+
+    def to_code(self):
+        out = list(self.code)
+        starts = point_list(self.start, self.start_unset)
+        ends = point_list(self.end, self.end_unset)
+        # only the arcs have a center
+        arc = self.kind > 1
+        centers = iter(point_list(self.center[arc], self.center_unset[arc]))
+        for i, kind, start, end, feed in zip(self.index, self.kind.tolist(), starts, ends,
+                                             self.feed.tolist()):
+            out[i] = self.entry(kind, start, end, next(centers) if kind > 1 else None, feed)
+        return out
+
+def get_angles(x, y):
+    # Get_Angle2() over arrays
+    angle = 90.0 - numpy.degrees(numpy.arctan2(x, y))
+    return numpy.where(angle < 0, 360 + angle, angle)
+
+
 ############################################################################
 class G_Code_Rip:
     def __init__(self):
@@ -3838,19 +3995,21 @@ class G_Code_Rip:
             #####################
             ### FIND COMMENTS ###
             #####################
-            if line.find("(") != -1:
-                s = line.find("(")
-                p_cnt=0
-                e = len(line)
-                for i_txt in range(s,len(line)):
-                    if line[i_txt]=="(":
-                        p_cnt=p_cnt+1
-                    if line[i_txt]==")":
-                        p_cnt=p_cnt-1
-                    if p_cnt==0:
-                        e=i_txt
-                        #print(e,line[s:e+1])
-                        break
+            s = line.find("(")
+            if s != -1:
+                e = line.find(")",s)
+                if e == -1 or line.find("(",s+1,e) != -1:
+                    # unclosed or nested comment, count the parentheses
+                    p_cnt=0
+                    e = len(line)
+                    for i_txt in range(s,len(line)):
+                        if line[i_txt]=="(":
+                            p_cnt=p_cnt+1
+                        if line[i_txt]==")":
+                            p_cnt=p_cnt-1
+                        if p_cnt==0:
+                            e=i_txt
+                            break
                 code_line.append([ ";", line[s:e+1] ])
                 line = self.rm_text(line,s,e)
             
@@ -3959,13 +4118,11 @@ class G_Code_Rip:
             # V V axis of machine
             # W W axis of machine
 
-            UCODES = ("A","B","C","D","E","L","O","Q","U","V","W")
-            skip = False
-            for code in UCODES:
-                if line.find(code) != -1:
-                    READ_MSG.append("Warning: %s Codes are not supported ( G-Code File Line: %d )" %(code,line_number))
-                    skip = True
-            if skip:
+            if UCODE_RE.search(line):
+                UCODES = ("A","B","C","D","E","L","O","Q","U","V","W")
+                for code in UCODES:
+                    if line.find(code) != -1:
+                        READ_MSG.append("Warning: %s Codes are not supported ( G-Code File Line: %d )" %(code,line_number))
                 continue
                     
 
@@ -3986,33 +4143,8 @@ class G_Code_Rip:
             # Y Y axis of machine
             # Z Z axis of machine
             
-            ALL = ("A","B","C","D","E","F","G","H","I","J",\
-                   "K","L","M","N","O","P","Q","R","S","T",\
-                   "U","V","W","X","Y","Z","#","=")
-            temp = []
-            line = line.replace(" ","")
-            for code in ALL:
-                index=-1
-                index = line.find(code,index+1)
-                while index != -1:
-                    temp.append([code,index])
-                    index = line.find(code,index+1)
-            temp.sort(key=lambda a:a[1])
-
-            code_line=[]
-            if temp != []:
-                x = 0
-                while x <= len(temp)-1:
-                    s = temp[x][1]+1
-                    if x == len(temp)-1:
-                        e = len(line)
-                    else:    
-                        e = temp[x+1][1]
-                    
-                    CODE  = temp[x][0]
-                    VALUE = line[s:e]
-                    code_line.append([ CODE, VALUE ])
-                    x = x + 1
+            # Each of A-Z, # and = starts a word; text before the first is dropped
+            code_line = [[CODE, VALUE] for CODE, VALUE in WORD_RE.findall(line)]
 
             #################################
                     
@@ -4300,375 +4432,204 @@ class G_Code_Rip:
     #######################################
     def split_code(self,code2split,shift=[0,0,0],angle=0.0):
         xsplit=0.0
-        mvtype = -1  # G0 (Rapid), G1 (linear), G2 (clockwise arc) or G3 (counterclockwise arc).
-
-        passthru = ""
-        POS     =[0,0,0]
-        feed = 0
         self.right_side = []
         self.left_side  = []
 
         L = 0
         R = 1
+        moves = Moves(code2split)
+        offset = numpy.array(shift, dtype=float)
+        # moves in the split coordinates, and back again (coordop / coordunop)
+        split = moves.translated(offset).rotated(angle)
+        back = split.rotated(-angle).translated(-offset)
+        pos_last, pos, center = split.start, split.end, split.center
+        A = point_list(back.start, back.start_unset)
+        C = point_list(back.end, back.end_unset)
+        D = point_list(back.center, back.center_unset)
+
+        ### Side of each move ###
+        kind = moves.kind
+        arc_side = numpy.where(numpy.abs(pos_last[:,1]-center[:,1]) < self.Zero,
+                               numpy.where(center[:,0] > xsplit, R, L),
+                               numpy.where((pos_last[:,1] >= center[:,1]) == (kind == 2), R, L))
+        on_split = numpy.where(kind == 1, numpy.where(pos[:,0] >= xsplit, R, L), arc_side)
+        flag_side = numpy.where(pos_last[:,0] > xsplit+self.Zero, R,
+                    numpy.where(pos_last[:,0] < xsplit-self.Zero, L, on_split)).tolist()
+
+        ### Where lines cross the boundary (get_line_intersect) ###
+        dx = pos[:,0] - pos_last[:,0]
+        with numpy.errstate(divide='ignore', invalid='ignore'):
+            my = (pos[:,1] - pos_last[:,1])/dx
+            mz = (pos[:,2] - pos_last[:,2])/dx
+            ycross = numpy.where(dx != 0, my*xsplit + (pos_last[:,1] - my*pos_last[:,0]), pos_last[:,1])
+            zcross = numpy.where(dx != 0, mz*xsplit + (pos_last[:,2] - mz*pos_last[:,0]), pos_last[:,2])
+        crosses = ((xsplit > numpy.minimum(pos_last[:,0], pos[:,0])+self.Zero) &
+                   (xsplit < numpy.maximum(pos_last[:,0], pos[:,0])-self.Zero)).tolist()
+        cross = numpy.column_stack([numpy.full(len(moves), xsplit), ycross, zcross])
+        # a crossing is unset where either end of the line is, as the complex
+        # numbers in get_line_intersect are; x is the split itself
+        cross_unset = split.start_unset | split.end_unset
+        cross_unset[:,2] |= cross_unset[:,0]
+        cross_unset[:,0] = False
+        cross, cross_unset = rotate_points(cross, cross_unset, radians(-angle))
+        B = point_list(cross + offset, cross_unset)
+
+        # the z of an arc crossing is unset where either end of the arc is
+        arc_z_unset = (split.start_unset[:,2] | split.end_unset[:,2]).tolist()
+
+        app=[self.apright, self.apleft]
+        feed = moves.feed.tolist()
+        k = -1
         for line in code2split:
-            if line[0] == 1:
-                mvtype   = line[0]
-                POS_LAST = line[1][:]
-                POS      = line[2][:]
-                CENTER   = ['','','']
-                feed     = line[3]
-
-            elif line[0] == 3 or line[0] == 2:
-                mvtype   = line[0]
-                POS_LAST = line[1][:]
-                POS      = line[2][:]
-                CENTER   = line[3][:]
-                feed     = line[4]
+            if not is_move(line):
+                if line != '':
+                    self.apboth(line)
+                continue
+            k = k + 1
+            mvtype = line[0]
+            if mvtype == 0:
+                self.apboth(line)
+                continue
 
+            if flag_side[k] == R:
+                this  = 1
+                other = 0
             else:
-                mvtype  = -1
-                passthru = line
-                
-            ###############################################################################
-            if mvtype >= 1 and mvtype <= 3:
-                pos      = self.coordop(POS,shift,angle)
-                pos_last = self.coordop(POS_LAST,shift,angle)
+                this  = 0
+                other = 1
 
-                if CENTER[0]!='' and CENTER[1]!='':
-                    center = self.coordop(CENTER,shift,angle)
+            #############################
+            if mvtype == 1:
+                if crosses[k]: ### Line crosses boundary ###
+                    app[this] ( [mvtype,A[k],B[k],feed[k]] )
+                    app[other]( [mvtype,B[k][:],C[k],feed[k]] )
                 else:
-                    center = CENTER
+                    app[this] ( [mvtype,A[k],C[k],feed[k]] )
 
-                this=""
-                other=""
-                
-                if pos_last[0] > xsplit+self.Zero:
-                    flag_side = R
-                elif pos_last[0] < xsplit-self.Zero:
-                    flag_side = L
-                else:
-                    if mvtype == 1:
-                        if pos[0] >= xsplit:
-                            flag_side = R
-                        else:
-                            flag_side = L
-                            
-                    elif mvtype == 2:
+            else:
+                cross = self.get_arc_intersects(pos_last[k].tolist(), pos[k].tolist(), xsplit,
+                                                center[k].tolist(), "G%d" %(mvtype))
+                if arc_z_unset[k]:
+                    cross = [[x, y, complex(z, 1)] for x, y, z in cross]
+                a, c, d = A[k], C[k], D[k]
+                if len(cross) > 0: ### Arc crosses boundary at least once ###
+                    b  = self.coordunop(cross[0]   ,shift,angle)
+                    #Check length of arc before writing
+                    if sqrt((a[0]-b[0])**2 + (a[1]-b[1])**2) > self.accuracy:
+                        app[this]( [mvtype,a,b,d,feed[k]])
                         
-                        if abs(pos_last[1]-center[1]) < self.Zero:
-                            if center[0] > xsplit:
-                                flag_side = R
-                            else:
-                                flag_side = L
-                        else:
-                            if   pos_last[1] >= center[1]:
-                                flag_side = R
-                            else:
-                                flag_side = L
-                                
-                    else: #(mvtype == 3)
-                        if abs(pos_last[1]-center[1]) < self.Zero:
-                            if center[0] > xsplit:
-                                flag_side = R
-                            else:
-                                flag_side = L
-                        else:
-                            if   pos_last[1] >= center[1]:
-                                flag_side = L
-                            else:
-                                flag_side = R
-
-                if flag_side == R:
-                    this  = 1
-                    other = 0
-                else:
-                    this  = 0
-                    other = 1
-                    
-                app=[self.apright, self.apleft]
-                
-                #############################
-                if mvtype == 0:
-                    pass
-
-                if mvtype == 1:
-                    A  = self.coordunop(pos_last[:],shift,angle)
-                    C  = self.coordunop(pos[:]     ,shift,angle)
-                    cross = self.get_line_intersect(pos_last, pos, xsplit)
-
-                    if len(cross) > 0: ### Line crosses boundary ###
-                        B  = self.coordunop(cross[0]   ,shift,angle)
-                        app[this] ( [mvtype,A,B,feed] )
-                        app[other]( [mvtype,B,C,feed] )
-                    else:
-                        app[this] ( [mvtype,A,C,feed] )
-
-                if mvtype == 2 or mvtype == 3:
-                    A  = self.coordunop(pos_last[:],shift,angle)
-                    C  = self.coordunop(pos[:]     ,shift,angle)
-                    D  = self.coordunop(center     ,shift,angle)
-                    cross = self.get_arc_intersects(pos_last[:], pos[:], xsplit, center[:], "G%d" %(mvtype))
-
-                    if len(cross) > 0: ### Arc crosses boundary at least once ###
-                        B  = self.coordunop(cross[0]   ,shift,angle)
+                    if len(cross) == 1: ### Arc crosses boundary only once ###
                         #Check length of arc before writing
-                        if sqrt((A[0]-B[0])**2 + (A[1]-B[1])**2) > self.accuracy:
-                            app[this]( [mvtype,A,B,D,feed])
-                            
-                        if len(cross) == 1: ### Arc crosses boundary only once ###
-                            #Check length of arc before writing
-                            if sqrt((B[0]-C[0])**2 + (B[1]-C[1])**2) > self.accuracy:
-                                app[other]([ mvtype,B,C,D, feed] )
-                        if len(cross) == 2: ### Arc crosses boundary twice ###
-                            E  = self.coordunop(cross[1],shift,angle)
-                            #Check length of arc before writing
-                            if sqrt((B[0]-E[0])**2 + (B[1]-E[1])**2) > self.accuracy:
-                                app[other]([ mvtype,B,E,D, feed] )
-                            #Check length of arc before writing
-                            if sqrt((E[0]-C[0])**2 + (E[1]-C[1])**2) > self.accuracy:
-                                app[this] ([ mvtype,E,C,D, feed] )
-                    else: ### Arc does not cross boundary ###
-                        app[this]([ mvtype,A,C,D, feed])
-
-            ###############################################################################
-            else:
-                if passthru != '':
-                    self.apboth(passthru)
+                        if sqrt((b[0]-c[0])**2 + (b[1]-c[1])**2) > self.accuracy:
+                            app[other]([ mvtype,b,c,d[:], feed[k]] )
+                    if len(cross) == 2: ### Arc crosses boundary twice ###
+                        e  = self.coordunop(cross[1],shift,angle)
+                        #Check length of arc before writing
+                        if sqrt((b[0]-e[0])**2 + (b[1]-e[1])**2) > self.accuracy:
+                            app[other]([ mvtype,b,e,d[:], feed[k]] )
+                        #Check length of arc before writing
+                        if sqrt((e[0]-c[0])**2 + (e[1]-c[1])**2) > self.accuracy:
+                            app[this] ([ mvtype,e,c,d[:], feed[k]] )
+                else: ### Arc does not cross boundary ###
+                    app[this]([ mvtype,a,c,d, feed[k]])
 
     #######################################
     def probe_code(self,code2probe,nX,nY,probe_istep,minx,miny,xPartitionLength,yPartitionLength): #,Xoffset,Yoffset):
     #def probe_code(self,code2probe,nX,nY,probe_istep,minx,miny,xPartitionLength,yPartitionLength,Xoffset,Yoffset,Zoffset):
         #print "nX,nY =",nX,nY 
-        probe_coords = []
         BPN=500
-        POINT_LIST = [False for i in range(int((nY)*(nX)))]
         
         if code2probe == []:
             return 
         
-        mvtype = -1  # G0 (Rapid), G1 (linear), G2 (clockwise arc) or G3 (counterclockwise arc).
-        passthru = ""
-        POS      = [0,0,0]
-        feed     = 0
-        out      = []
-
         min_length = min(xPartitionLength,yPartitionLength) / probe_istep
         if (min_length < Zero):
             min_length = max(xPartitionLength,yPartitionLength) / probe_istep
         if (min_length < Zero):
             min_length = 1
 
-        for line in code2probe:
-            if line[0] == 0  or line[0] == 1:
-                mvtype   = line[0]
-                POS_LAST = line[1][:]
-                POS      = line[2][:]
-                CENTER   = ['','','']
-                if line[0] == 1:
-                    feed     = line[3]
-
-            elif line[0] == 3 or line[0] == 2:
-                mvtype   = line[0]
-                POS_LAST = line[1][:]
-                POS      = line[2][:]
-                CENTER   = line[3][:]
-                feed     = line[4]
-            else:
-                mvtype  = -1
-                passthru = line
-
-            ###############################################################################
-            if mvtype >= 0 and mvtype <=3:
-                pos = POS[:]
-                pos_last = POS_LAST[:]
-                center = CENTER[:]
-                
-                #############################
-                if mvtype == 0:
-                    out.append( [mvtype,pos_last,pos] )
-                    
-                if mvtype == 1:
-                    dx = pos[0]-pos_last[0]
-                    dy = pos[1]-pos_last[1]
-                    dz = pos[2]-pos_last[2]
-                    length = sqrt(dx*dx + dy*dy)
-                    if (length <= min_length):
-                        out.append( [mvtype,pos_last,pos,feed] )
-                    else:
-                        Lsteps = max(2,int(ceil(length / min_length)))
-                        xstp0 = float(pos_last[0])
-                        ystp0 = float(pos_last[1])
-                        zstp0 = float(pos_last[2])
-                        for n in range(1,Lsteps+1):
-                            xstp1 = n/float(Lsteps)*dx + pos_last[0] 
-                            ystp1 = n/float(Lsteps)*dy + pos_last[1]
-                            zstp1 = n/float(Lsteps)*dz + pos_last[2]
-                            out.append( [mvtype,[xstp0,ystp0,zstp0],[xstp1,ystp1,zstp1],feed] )
-                            xstp0 = float(xstp1)
-                            ystp0 = float(ystp1)
-                            zstp0 = float(zstp1)
-                            
-                if mvtype == 2 or mvtype == 3:
-                    out.append( [ mvtype,pos_last,pos,center, feed] )                    
-            ###############################################################################
-            else:
-                if passthru != '':
-                    out.append(passthru)
-
         ################################
-        ##  Loop through output to    ##
-        ##  find needed probe points  ##
+        ##  Split long G1 moves into  ##
+        ##  pieces of min_length      ##
         ################################
-        for i in range(len(out)):
-            line = out[i]
-            if line[0] == 0  or line[0] == 1:
-                mvtype   = line[0]
-                POS_LAST = line[1][:]
-                POS      = line[2][:]
-                CENTER   = ['','','']
-                if line[0] == 1:
-                    feed     = line[3]
-
-            elif line[0] == 3 or line[0] == 2:
-                mvtype   = line[0]
-                POS_LAST = line[1][:]
-                POS      = line[2][:]
-                CENTER   = line[3][:]
-                feed     = line[4]
-            else:
-                mvtype  = -1
-                passthru = line
-
-            if mvtype >= 1 and mvtype <=3:
-                pos = POS[:]
-                pos_last = POS_LAST[:]
-                center = CENTER[:]
-
-
-                #### ADD ADDITIONAL DATA TO POS_LAST DATA ####
-                i_x,i_y = self.get_ix_iy((pos_last[0]-minx),(pos_last[1]-miny),xPartitionLength,yPartitionLength)
-                #i_x = i_x+Xoffset
-                #i_y = i_y+Yoffset
-                if i_x < 0:
-                    i_x=0
-                if i_y < 0:
-                    i_y=0
-                if (i_x+1 >= nX):
-                    i_x = nX-2
-                    #i_x = i_x-1 #commented 02/22
-                    #print "adjust i_x POS_LAST"
-                i_x2 = i_x+1
-                if (i_y+1 >= nY):
-                    i_y = nY-2
-                    #i_y = i_y-1  #commented 02/22
-                    #print "adjust i_y POS_LAST"
-                i_y2 = i_y+1
-                
-                p_index_A =  int(i_y* nX + i_x )
-                p_index_B =  int(i_y2*nX + i_x )
-                p_index_C =  int(i_y *nX + i_x2)
-                p_index_D =  int(i_y2*nX + i_x2)                    
-                
-                Xfraction=((pos_last[0]-minx)-(i_x*xPartitionLength))/xPartitionLength
-                Yfraction=((pos_last[1]-miny)-(i_y*yPartitionLength))/yPartitionLength
-
-                if Xfraction>1.0:
-                    #print "ERROR POS_LAST: Xfraction = ", Xfraction
-                    Xfraction = 1.0
-                if Xfraction <0.0:
-                    #print "ERROR POS_LAST: Xfraction = ", Xfraction
-                    Xfraction = 0.0
-                if Yfraction > 1.0:
-                    #print "ERROR POS_LAST: Yfraction = ", Yfraction
-                    Yfraction = 1.0
-                if Yfraction<0.0:
-                    #print "ERROR POS_LAST: Yfraction = ", Yfraction
-                    Yfraction = 0.0
-
-                BPN=500
-                out[i][1].append(p_index_A+BPN)
-                out[i][1].append(p_index_B+BPN)
-                out[i][1].append(p_index_C+BPN)
-                out[i][1].append(p_index_D+BPN)
-                out[i][1].append(Xfraction)
-                out[i][1].append(Yfraction)
+        moves = Moves(code2probe)
+        d = moves.end - moves.start
+        g1 = moves.kind == 1
+        long_line = numpy.zeros(len(moves), dtype=bool)
+        long_line[g1] = numpy.sqrt(d[g1,0]**2 + d[g1,1]**2) > min_length
+        steps = numpy.ones(len(moves), dtype=int)
+        steps[long_line] = numpy.maximum(2, numpy.ceil(
+            numpy.sqrt(d[long_line,0]**2 + d[long_line,1]**2) / min_length)).astype(int)
+        first = numpy.cumsum(steps) - steps
+        src = numpy.repeat(numpy.arange(len(moves)), steps)
+        n = numpy.arange(len(src)) - first[src] + 1
+        split = long_line[src]
+        L = steps[src][:,None].astype(float)
+        start = moves.start[src]
+        end = moves.end[src]
+        end[split] = (n[split,None]/L[split])*d[src[split]] + start[split]
+        start[split & (n > 1)] = ((n[split & (n > 1),None]-1)/L[split & (n > 1)])*d[src[split & (n > 1)]] \
+                                 + moves.start[src[split & (n > 1)]]
+        start_unset = moves.start_unset[src] & ~split[:,None]
+        end_unset = moves.end_unset[src] & ~split[:,None]
 
-                try:
-                    POINT_LIST[p_index_A ] = True
-                    POINT_LIST[p_index_B ] = True
-                    POINT_LIST[p_index_C ] = True
-                    POINT_LIST[p_index_D ] = True
-                except:
-                    pass 
-                #### ADD ADDITIONAL DATA TO POS_LAST DATA ####
-                i_x,i_y = self.get_ix_iy((pos[0]-minx),(pos[1]-miny),xPartitionLength,yPartitionLength)
-                #i_x = i_x+Xoffset
-                #i_y = i_y+Yoffset
-                if i_x < 0:
-                    i_x=0
-                if i_y < 0:
-                    i_y=0
-                if (i_x+1 >= nX):
-                    i_x = nX-2
-                    #i_x = i_x-1 #commented 02/22
-                    #print "adjust i_x POS"
-                i_x2 = i_x+1
-                if (i_y+1 >= nY):
-                    i_y = nY-2
-                    #i_y = i_y-1#commented 02/22
-                    #print "adjust i_y POS"
-                i_y2 = i_y+1
-                
-                p_index_A =  int(i_y* nX + i_x )
-                p_index_B =  int(i_y2*nX + i_x )
-                p_index_C =  int(i_y *nX + i_x2)
-                p_index_D =  int(i_y2*nX + i_x2)
-                Xfraction=((pos[0]-minx)-(i_x*xPartitionLength))/xPartitionLength
-                Yfraction=((pos[1]-miny)-(i_y*yPartitionLength))/yPartitionLength
-                
-                if Xfraction>1.0:
-                    Xfraction = 1.0
-                    #print "ERROR POS: Xfraction = ", Xfraction
-                if Xfraction <0.0:
-                    Xfraction = 0.0
-                    #print "ERROR POS: Xfraction = ", Xfraction
-                if Yfraction > 1.0:
-                    Yfraction = 1.0
-                    #print "ERROR POS: Yfraction = ", Yfraction
-                if Yfraction<0.0:
-                    Yfraction = 0.0
-                    #print "ERROR POS: Yfraction = ", Yfraction
-                    
-                out[i][2].append(p_index_A+BPN)
-                out[i][2].append(p_index_B+BPN)
-                out[i][2].append(p_index_C+BPN)
-                out[i][2].append(p_index_D+BPN)
-                out[i][2].append(Xfraction)
-                out[i][2].append(Yfraction)
-                try:
-                    POINT_LIST[p_index_A ] = True
-                    POINT_LIST[p_index_B ] = True
-                    POINT_LIST[p_index_C ] = True
-                    POINT_LIST[p_index_D ] = True
-                except:
-                    pass
+        ################################
+        ##  Find needed probe points  ##
+        ################################
+        def probe_points(p):
+            i_x = numpy.trunc((p[:,0]-minx)/xPartitionLength).astype(int)
+            i_y = numpy.trunc((p[:,1]-miny)/yPartitionLength).astype(int)
+            i_x = numpy.maximum(i_x, 0)
+            i_y = numpy.maximum(i_y, 0)
+            i_x = numpy.where(i_x+1 >= nX, nX-2, i_x)
+            i_y = numpy.where(i_y+1 >= nY, nY-2, i_y)
+            index = numpy.column_stack([i_y*nX + i_x, (i_y+1)*nX + i_x,
+                                        i_y*nX + i_x+1, (i_y+1)*nX + i_x+1])
+            Xfraction = numpy.clip(((p[:,0]-minx)-(i_x*xPartitionLength))/xPartitionLength, 0.0, 1.0)
+            Yfraction = numpy.clip(((p[:,1]-miny)-(i_y*yPartitionLength))/yPartitionLength, 0.0, 1.0)
+            return index, numpy.column_stack([Xfraction, Yfraction])
+
+        kind = moves.kind[src]
+        cut = kind != 0
+        POINT_LIST = numpy.zeros(int(nY*nX), dtype=bool)
+        data = []
+        for p in (start, end):
+            index, fraction = probe_points(p[cut])
+            used = index[(index >= 0) & (index < len(POINT_LIST))]
+            POINT_LIST[used] = True
+            rows = [[]] * len(p)
+            for k, idx, frac in zip(numpy.flatnonzero(cut).tolist(), (index+BPN).tolist(), fraction.tolist()):
+                rows[k] = idx + frac
+            data.append(rows)
+
+        starts = point_list(start, start_unset)
+        ends = point_list(end, end_unset)
+        centers = point_list(moves.center, moves.center_unset)
+        kinds = moves.kind.tolist()
+        feeds = moves.feed.tolist()
+        out = []
+        k = 0
+        m = 0
+        for line in code2probe:
+            if not is_move(line):
+                if line != '':
+                    out.append(line)
+                continue
+            for k in range(k, k+int(steps[m])):
+                out.append(moves.entry(kinds[m], starts[k] + data[0][k], ends[k] + data[1][k],
+                                       centers[m][:], feeds[m]))
+            k = k + 1
+            m = m + 1
         self.probe_gcode = out
-        #for line in out:
-        #    print line
         
         ################################
         ##  Generate Probing Code     ##
         ##  For needed points         ##
         ################################
-
-        for i in range(len(POINT_LIST)):
-            i_x = i % nX
-            i_y = int(i / nX)
-            xp  = i_x * xPartitionLength + minx
-            yp  = i_y * yPartitionLength + miny
-            probe_coords.append([POINT_LIST[i],i+BPN,xp,yp])
-
-        self.probe_coords = probe_coords
+        i = numpy.arange(len(POINT_LIST))
+        xp  = (i % nX) * xPartitionLength + minx
+        yp  = (i // nX) * yPartitionLength + miny
+        self.probe_coords = [list(c) for c in zip(POINT_LIST.tolist(), (i+BPN).tolist(), xp.tolist(), yp.tolist())]
         return
 
     def get_ix_iy(self,x,y,xPartitionLength,yPartitionLength):
@@ -4680,123 +4641,9 @@ class G_Code_Rip:
     def scale_rotate_code(self,code2scale,scale=[1.0,1.0,1.0,1.0],angle=0.0):
         if code2scale == []:
             return code2scale,0,0,0,0,0,0
-        minx =  99999
-        maxx = -99999
-        miny =  99999
-        maxy = -99999
-        minz =  99999
-        maxz = -99999
-        mvtype = -1  # G0 (Rapid), G1 (linear), G2 (clockwise arc) or G3 (counterclockwise arc).
-
-        passthru = ""
-        POS     =[0,0,0]
-        feed = 0
-        out = []
-
-        L = 0
-        R = 1
-        flag_side = 1  
-
-        for line in code2scale:
-            if line[0] == 0  or line[0] == 1:
-                mvtype   = line[0]
-                POS_LAST = line[1][:]
-                POS      = line[2][:]
-                CENTER   = ['','','']
-                if line[0] == 1:
-                    feed     = line[3] * scale[3]
-
-            elif line[0] == 3 or line[0] == 2:
-                mvtype   = line[0]
-                POS_LAST = line[1][:]
-                POS      = line[2][:]
-                CENTER   = line[3][:]
-                feed     = line[4] * scale[3]
-            else:
-                mvtype  = -1
-                passthru = line
-
-            ###############################################################################
-            if mvtype >= 0 and mvtype <=3:
-
-                pos      = self.scale_rot_coords(POS,scale,angle)
-                pos_last = self.scale_rot_coords(POS_LAST,scale,angle)
-
-
-                if CENTER[0]!='' and CENTER[1]!='':
-                    center = self.scale_rot_coords(CENTER,scale,angle)
-                else:
-                    center = CENTER
-                 
-                #############################
-                if mvtype != 0:
-                    try:
-                        minx = min( minx, min(pos[0],pos_last[0]) ) 
-                        maxx = max( maxx, max(pos[0],pos_last[0]) )
-                    except:
-                        pass
-                    try:
-                        miny = min( miny, min(pos[1],pos_last[1]) ) 
-                        maxy = max( maxy, max(pos[1],pos_last[1]) )
-                    except:
-                        pass
-                    try:
-                        minz = min( minz, min(pos[2],pos_last[2]) ) 
-                        maxz = max( maxz, max(pos[2],pos_last[2]) )
-                    except:
-                        pass
-
-                if mvtype == 0:
-                    out.append( [mvtype,pos_last,pos] )
-                
-                if mvtype == 1:
-                    out.append( [mvtype,pos_last,pos,feed] )
-
-                if mvtype == 2 or mvtype == 3:
-                    out.append( [ mvtype,pos_last,pos,center, feed] )
-                    
-                    if mvtype == 3:
-                        ang1 = self.Get_Angle2(pos_last[0]-center[0],pos_last[1]-center[1])
-                        xtmp,ytmp = self.Transform(pos[0]-center[0],pos[1]-center[1],radians(-ang1))
-                        ang2 = self.Get_Angle2(xtmp,ytmp)
-
-                    else:
-                        ang1 = self.Get_Angle2(pos[0]-center[0],pos[1]-center[1])
-                        xtmp,ytmp = self.Transform(pos_last[0]-center[0],pos_last[1]-center[1],radians(-ang1))
-                        ang2 = self.Get_Angle2(xtmp,ytmp)
-                        
-                    if ang2 == 0:
-                        ang2=359.999
-                        
-                    Radius = sqrt( (pos[0]-center[0])**2 +(pos[1]-center[1])**2 )
-                            
-                    if ang1 > 270:
-                        da = 270
-                    elif ang1 > 180:
-                        da = 180
-                    elif ang1 > 90:
-                        da = 90
-                    else:
-                        da = 0
-                    for side in [90,180,270,360]:
-                        spd = side + da
-                        if ang2 > (spd-ang1):
-                            if spd > 360:
-                                spd=spd-360
-                            if spd==90:
-                                maxy = max( maxy, center[1]+Radius )
-                            if spd==180:
-                                minx = min( minx, center[0]-Radius)
-                            if spd==270:
-                                miny = min( miny, center[1]-Radius )
-                            if spd==360:
-                                maxx = max( maxx, center[0]+Radius )           
-            ###############################################################################
-            else:
-                if passthru != '':
-                    out.append(passthru)
-                    
-        return out,minx,maxx,miny,maxy,minz,maxz
+        moves = Moves(code2scale).scaled(numpy.array(scale[:3]), scale[3]).rotated(angle)
+        minx,maxx,miny,maxy,minz,maxz = moves.bounds()
+        return moves.to_code(),minx,maxx,miny,maxy,minz,maxz
 
 
     #######################################
@@ -4804,61 +4651,7 @@ class G_Code_Rip:
         
         if translate[0]==0 and translate[1]==0 and translate[2]==0:
             return code2translate
-        
-        mvtype = -1  # G0 (Rapid), G1 (linear), G2 (clockwise arc) or G3 (counterclockwise arc).
-        passthru = ""
-        POS     =[0,0,0]
-        pos     =[0,0,0]
-        pos_last=[0,0,0]
-        feed = 0
-        out = []
-
-        L = 0
-        R = 1
-        flag_side = 1  
-
-        for line in code2translate:
-            if line[0] == 1 or line[0] == 0:
-                mvtype   = line[0]
-                POS_LAST = line[1][:]
-                POS      = line[2][:]
-                CENTER   = ['','','']
-                if line[0] == 1:
-                    feed     = line[3]
-
-            elif line[0] == 3 or line[0] == 2:
-                mvtype   = line[0]
-                POS_LAST = line[1][:]
-                POS      = line[2][:]
-                CENTER   = line[3][:]
-                feed     = line[4]
-            else:
-                mvtype  = -1
-                passthru = line
-
-            ###############################################################################
-            if mvtype >= 0 and mvtype <=3:
-                pos      = self.scale_trans_coords(POS,translate)
-                pos_last      = self.scale_trans_coords(POS_LAST,translate)
-                if CENTER[0]!='' and CENTER[1]!='':
-                    center      = self.scale_trans_coords(CENTER,translate)
-                else:
-                    center = CENTER[:]
-                 
-                #############################
-                if mvtype == 0:
-                    out.append( [mvtype,pos_last,pos] )
-                
-                if mvtype == 1:
-                    out.append( [mvtype,pos_last,pos,feed] )
-
-                if mvtype == 2 or mvtype == 3:
-                    out.append( [ mvtype,pos_last,pos,center, feed] )
-            ###############################################################################
-            else:
-                if passthru != '':
-                    out.append(passthru)
-        return out
+        return Moves(code2translate).translated(numpy.array(translate)).to_code()
 
     def scale_trans_coords(self,coords,trans):
         x = coords[0] - trans[0]
@@ -5080,6 +4873,20 @@ class G_Code_Rip:
                     First_Z_Safe = line[1][2]
                     break
             
+        if probe_data!=[]:
+            # bilinear interpolation of the probed heights at the end of
+            # every move, from the probe points and fractions probe_code added
+            moves = [line for line in side if line[0] == 1 or line[0] == 2 or line[0] == 3]
+            Zp = numpy.array([point[2] for point in probe_data], dtype=float)
+            ends = numpy.array([line[2][3:9] for line in moves], dtype=float).reshape(-1, 6)
+            corner = ends[:,0:4].astype(int) - 500
+            Z1, Z2, Z3, Z4 = Zp[corner[:,0]], Zp[corner[:,1]], Zp[corner[:,2]], Zp[corner[:,3]]
+            F1 = ends[:,4]
+            F2 = ends[:,5]
+            v102 = Z1 + F2*Z2 - F2*Z1
+            v101 = Z3 + F2*Z4 - F2*Z3
+            probe_Z = iter((v102 + F1*v101 - F1*v102).tolist())
+
         for line in side:
             if line[0] == 1 or line[0] == 2 or line[0] == 3 or (line[0] == 0):
                 D0 = line[2][0]-line[1][0] 
@@ -5104,16 +4911,7 @@ class G_Code_Rip:
                 LINE = "G%d" %(line[0])
                 if probe_data!=[]:
                     # Write probe adjusted values
-                    Z1 = probe_data[line[2][3]-500][2] 
-                    Z2 = probe_data[line[2][4]-500][2] 
-                    Z3 = probe_data[line[2][5]-500][2] 
-                    Z4 = probe_data[line[2][6]-500][2] 
-                    F1 = line[2][7]
-                    F2 = line[2][8]
-
-                    v102 = Z1 + F2*Z2 - F2*Z1
-                    v101 = Z3 + F2*Z4 - F2*Z3
-                    v100 = v102 + F1*v101 - F1*v102
+                    v100 = next(probe_Z)
                     Z_calculated = coordB[2] + v100 - probe_offsetZ
                     
                     LINE = self.app_gcode_line(LINE,AXIS[0],coordB[0],DECP[0],WriteAll)
@@ -6375,58 +6173,59 @@ def main_is_frozen():
 ################################################################################
 #                          Startup Application                                 #
 ################################################################################
-root = Tk()
-root.wm_attributes("-topmost", 1)
-app = Application(root)
-app.master.title("G-Code-Ripper V"+version)
-app.master.iconname("G-Code-Ripper")
-app.master.minsize(780,540)
-try:
+if __name__ == "__main__":
+    root = Tk()
+    root.wm_attributes("-topmost", 1)
+    app = Application(root)
+    app.master.title("G-Code-Ripper V"+version)
+    app.master.iconname("G-Code-Ripper")
+    app.master.minsize(780,540)
     try:
-        import tkFont
-        default_font = tkFont.nametofont("TkDefaultFont")
+        try:
+            import tkFont
+            default_font = tkFont.nametofont("TkDefaultFont")
+        except:
+            import tkinter.font
+            default_font = tkinter.font.nametofont("TkDefaultFont")
+
+        default_font.configure(size=9)
+        default_font.configure(family='arial')
+        #print(default_font.cget("size"))
+        #print(default_font.cget("family"))
+        debug_message("Font Set success!")
     except:
-        import tkinter.font
-        default_font = tkinter.font.nametofont("TkDefaultFont")
-
-    default_font.configure(size=9)
-    default_font.configure(family='arial')
-    #print(default_font.cget("size"))
-    #print(default_font.cget("family"))
-    debug_message("Font Set success!")
-except:
-    debug_message("Font Set Failed.")
+        debug_message("Font Set Failed.")
 
-################################## Set Icon  ########################################
-Icon_Set=False
-if main_is_frozen():
-    print("frozen")
-    try:
-        root.iconbitmap(default=sys.argv[0])
-        Icon_Set=True
-    except:
-        Icon_Set=False
+    ################################## Set Icon  ########################################
+    Icon_Set=False
+    if main_is_frozen():
+        print("frozen")
+        try:
+            root.iconbitmap(default=sys.argv[0])
+            Icon_Set=True
+        except:
+            Icon_Set=False
         
-if not Icon_Set:
-    try:
-        scorch_ico_B64=b'R0lGODlhEAAQAIYAAA\
-        AAABAQEBYWFhcXFxsbGyUlJSYmJikpKSwsLC4uLi8vLzExMTMzMzc3Nzg4ODk5OTs7Oz4+PkJCQkRERE\
-        VFRUtLS0xMTE5OTlNTU1dXV1xcXGBgYGVlZWhoaGtra3FxcXR0dHh4eICAgISEhI+Pj5mZmZ2dnaKioq\
-        Ojo62tra6urrS0tLi4uLm5ub29vcLCwsbGxsjIyMzMzM/Pz9PT09XV1dbW1tjY2Nzc3OHh4eLi4uXl5e\
-        fn5+jo6Ovr6+/v7/Hx8fLy8vT09PX19fn5+fv7+/z8/P7+/v///wAAAAAAAAAAAAAAAAAAAAAAAAAAAA\
-        AAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAA\
-        AAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAA\
-        AAAAAAAAAAAAAAAAAAAAAAAAAAAAAAACH5BAEKAEkALAAAAAAQABAAQAj/AJMIFBhBQYAACRIkWbgwAA\
-        4kEFEECACAxBAkGH8ESEKgBZIiAIQECBAjAA8kNwIkScKgQhAkRggAIJACCZIaJxgk2clgAY4OAAoEAO\
-        ABCIIDSZIwkIHEBw0YFAAA6IGDCBIkLAhMyICka9cAKZCIRTLEBIMkaA0MSNGjSBEVIgpESEK3LgMCI1\
-        aAWCFDA4EDSQInwaDACBEAImLwCAFARw4HFJJcgGADyZEAL3YQcMGBBpIjHx4EeIGkRoMFJgakWADABx\
-        IkPwIgcIGkdm0AMJDo1g3jQBIBRZAINyKAwxEkyHEUSMIcwYYbEgwYmQGgyI8SD5Jo327hgIIAAQ5cBs\
-        CQpHySgAA7'
-        icon_im =PhotoImage(data=scorch_ico_B64, format='gif')
-        root.call('wm', 'iconphoto', root._w, '-default', icon_im)
-    except:
-        pass
-#####################################################################################
+    if not Icon_Set:
+        try:
+            scorch_ico_B64=b'R0lGODlhEAAQAIYAAA\
+            AAABAQEBYWFhcXFxsbGyUlJSYmJikpKSwsLC4uLi8vLzExMTMzMzc3Nzg4ODk5OTs7Oz4+PkJCQkRERE\
+            VFRUtLS0xMTE5OTlNTU1dXV1xcXGBgYGVlZWhoaGtra3FxcXR0dHh4eICAgISEhI+Pj5mZmZ2dnaKioq\
+            Ojo62tra6urrS0tLi4uLm5ub29vcLCwsbGxsjIyMzMzM/Pz9PT09XV1dbW1tjY2Nzc3OHh4eLi4uXl5e\
+            fn5+jo6Ovr6+/v7/Hx8fLy8vT09PX19fn5+fv7+/z8/P7+/v///wAAAAAAAAAAAAAAAAAAAAAAAAAAAA\
+            AAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAA\
+            AAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAA\
+            AAAAAAAAAAAAAAAAAAAAAAAAAAAAAAACH5BAEKAEkALAAAAAAQABAAQAj/AJMIFBhBQYAACRIkWbgwAA\
+            4kEFEECACAxBAkGH8ESEKgBZIiAIQECBAjAA8kNwIkScKgQhAkRggAIJACCZIaJxgk2clgAY4OAAoEAO\
+            ABCIIDSZIwkIHEBw0YFAAA6IGDCBIkLAhMyICka9cAKZCIRTLEBIMkaA0MSNGjSBEVIgpESEK3LgMCI1\
+            aAWCFDA4EDSQInwaDACBEAImLwCAFARw4HFJJcgGADyZEAL3YQcMGBBpIjHx4EeIGkRoMFJgakWADABx\
+            IkPwIgcIGkdm0AMJDo1g3jQBIBRZAINyKAwxEkyHEUSMIcwYYbEgwYmQGgyI8SD5Jo327hgIIAAQ5cBs\
+            CQpHySgAA7'
+            icon_im =PhotoImage(data=scorch_ico_B64, format='gif')
+            root.call('wm', 'iconphoto', root._w, '-default', icon_im)
+        except:
+            pass
+    #####################################################################################
         
     
-root.mainloop()
+    root.mainloop()
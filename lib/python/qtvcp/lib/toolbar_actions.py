@@ -19,6 +19,7 @@ from qtvcp.core import Status, Action, Info
 from qtvcp.qt_makegui import VCPWindow
 from qtvcp.lib.aux_program_loader import Aux_program_loader
 from qtvcp import logger
+from rs274.properties import property_names
 
 # Instantiate the libraries with global reference
 # INFO holds INI file details
@@ -424,20 +425,7 @@ class ToolBarActions():
         STATUS.emit('reload-display')
 
     def actOnProperties(self, widget, state=None):
-        # substitute nice looking text:
-        property_names = {
-            'name': "Name:", 'size': "Size:",
-    '       tools': "Tool order:", 'g0': "Rapid distance:",
-            'g1': "Feed distance:", 'g': "Total distance:",
-            'run': "Run time:",'machine_unit_sys':"Machine Unit System:",
-            'x': "X bounds:",'x_zero_rxy':'X @ Zero Rotation:',
-            'y': "Y bounds:",'y_zero_rxy':'Y @ Zero Rotation:',
-            'z': "Z bounds:",'z_zero_rxy':'Z @ Zero Rotation:',
-            'a': "A bounds:", 'b': "B bounds:",
-            'c': "C bounds:",'toollist':'Tool Change List:',
-            'gcode_units':"Gcode Units:"
-        }
-
+        # substitute nice looking text (see rs274.properties)
         mess = ''
         if self.gcode_properties:
             for i in self.gcode_properties:
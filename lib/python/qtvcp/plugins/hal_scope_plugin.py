@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+
+from PyQt5 import QtGui
+from PyQt5.QtDesigner import QPyDesignerCustomWidgetPlugin
+from qtvcp.widgets.hal_scope import HALScope
+
+from qtvcp.widgets.qtvcp_icons import Icon
+
+ICON = Icon()
+
+####################################
+# HAL Scope
+####################################
+class HALScopePlugin(QPyDesignerCustomWidgetPlugin):
+    def __init__(self, parent=None):
+        super(HALScopePlugin, self).__init__(parent)
+        self.initialized = False
+
+    def initialize(self, formEditor):
+        if self.initialized:
+            return
+        self.initialized = True
+
+    def isInitialized(self):
+        return self.initialized
+
+    def createWidget(self, parent):
+        return HALScope(parent)
+
+    def name(self):
+        return "HALScope"
+
+    def group(self):
+        return "Linuxcnc - HAL"
+
+    def icon(self):
+        return QtGui.QIcon(QtGui.QPixmap(ICON.get_path('gcodegraphics')))
+
+    def toolTip(self):
+        return "HAL Scope Widget"
+
+    def whatsThis(self):
+        return ""
+
+    def isContainer(self):
+        return False
+
+    def domXml(self):
+        return '<widget class="HALScope" name="hal_scope" />\n'
+
+    def includeFile(self):
+        return "qtvcp.widgets.hal_scope"
+
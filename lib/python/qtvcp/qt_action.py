@@ -8,6 +8,7 @@ from PyQt5.QtWidgets import (QApplication, QTabWidget, QStackedWidget,
 from PyQt5.QtCore import Qt, QProcess
 
 import linuxcnc
+from preference_store import flush_all
 
 # Set up logging
 from . import logger
@@ -993,6 +994,8 @@ class _Lcnc_Action(object):
         if not self.tmp:
             self._mktemp()
         tmp = os.path.join(self.tmp, os.path.basename(fname))
+        # filters may read the preference files, e.g. qtplasmac's materials
+        flush_all()
         flt = FilterProgram(flt, fname, tmp, lambda r: r or self._load_filter_result(tmp))
 
     def _load_filter_result(self, fname):
@@ -106,6 +106,9 @@ class _IStat(object):
         self.MDI_HISTORY_PATH = self.INI.find('DISPLAY', 'MDI_HISTORY_FILE') or '~/.axis_mdi_history'
         self.QTVCP_LOG_HISTORY_PATH = self.INI.find('DISPLAY', 'LOG_FILE') or '~/qtvcp.log'
         self.MACHINE_LOG_HISTORY_PATH = self.INI.find('DISPLAY', 'MACHINE_LOG_PATH') or '~/.machine_log_history'
+        self.MACHINE_LOG_MAX_SIZE = int(float(self.INI.find('DISPLAY', 'MACHINE_LOG_MAX_SIZE') or 1024) * 1024) # kB in the INI
+        self.MACHINE_LOG_MAX_AGE = int(float(self.INI.find('DISPLAY', 'MACHINE_LOG_MAX_AGE') or 30) * 86400) # days in the INI
+        self.MACHINE_LOG_KEEP = int(self.INI.find('DISPLAY', 'MACHINE_LOG_KEEP') or 5)
         self.PREFERENCE_PATH = self.INI.find("DISPLAY", "PREFERENCE_FILE_PATH") or None
         self.PROGRAM_PREFIX = self.get_error_safe_setting("DISPLAY", "PROGRAM_PREFIX", '~/linuxcnc/nc_files')
         if not os.path.exists(os.path.expanduser(self.PROGRAM_PREFIX)):
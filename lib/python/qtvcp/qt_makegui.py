@@ -2,9 +2,10 @@ import os
 import sys
 import subprocess
 
-from PyQt5 import QtGui, QtCore, QtWidgets, uic
+from PyQt5 import QtGui, QtCore, QtWidgets
 import traceback
 from qtvcp.widgets.widget_baseclass import _HalWidgetBase
+from qtvcp import qt_startup
 # Set up logging
 from . import logger
 
@@ -183,13 +184,11 @@ class _VCPWindow(QtWidgets.QMainWindow):
                 qrccompile(qrcname, qrcpy)
 
         # is there a resource.py in the directory?
-        # if so add a path to it so we can import it.
+        # if so register its resources, kept as a binary resource file in the cache
         if qrcpy is not None and os.path.isfile(qrcpy):
             try:
-                sys.path.insert(0, os.path.split(qrcpy)[0])
-                import importlib
-                importlib.import_module('resources', os.path.split(qrcpy)[0])
-                log.info('Imported resources.py file: yellow<{}>'.format(qrcpy))
+                qt_startup.load_resources(qrcpy)
+                log.info('Loaded resources of resources.py file: yellow<{}>'.format(qrcpy))
             except Exception as e:
                 log.warning('Could not load {} resource file: yellow<{}>'.format(qrcpy, e))
         else:
@@ -197,11 +196,12 @@ class _VCPWindow(QtWidgets.QMainWindow):
 
     def instance(self, filename):
         self.load_resources()
+        qt_startup.PROFILE.mark('load resources')
         try:
-            instance = uic.loadUi(filename, self)
+            instance = qt_startup.load_ui(filename, self)
         except AttributeError as e:
             formatted_lines = traceback.format_exc().splitlines()
-            if 'slotname' in formatted_lines[-2]:
+            if isinstance(e, qt_startup.MissingSlot) or 'slotname' in formatted_lines[-2]:
                 log.critical('Missing slot name in handler file: {}'.format(e))
                 message = '''A widget in the ui file, was assigned a signal \
 call to a missing function name in the handler file?\n
@@ -294,7 +294,7 @@ Python Error:\n {}'''.format(str(e))
                 log.debug('Adding import dir: yellow<{}>'.format(directory))
 
             try:
-                mod = __import__(basename)
+                mod = qt_startup.import_file(basename, u)
                 # inject/class patch function to read an override file
                 # this will be called from qtvcp.py later
                 mod.HandlerClass.call_user_command_ = self.call_user_command_
@@ -356,7 +356,7 @@ Python Error:\n {}'''.format(str(e))
             log.info('Handler Override file found at: yellow<{}>'.format(rcfile))
             try:
                 local = {'self': klass, 'rcfile': rcfile}
-                exec(compile(open(rcfile, "rb").read(), rcfile, 'exec'),local)
+                exec(qt_startup.code(rcfile), local)
             except Exception as e:
                 log.exception(e)
         else:
@@ -384,10 +384,10 @@ class MainPage(QtWidgets.QMainWindow):
 
     def instance(self, filename):
         try:
-            instance = uic.loadUi(filename, self)
+            instance = qt_startup.load_ui(filename, self)
         except AttributeError as e:
             formatted_lines = traceback.format_exc().splitlines()
-            if 'slotname' in formatted_lines[-2]:
+            if isinstance(e, qt_startup.MissingSlot) or 'slotname' in formatted_lines[-2]:
                 log.critical('{}: Missing slot name in handler file: {}'.format(self._name, e))
                 message = '''A widget in the ui file, {} was assigned a signal \
 call to a missing function name in the handler file?\n
@@ -427,7 +427,7 @@ Python Error:\n {}'''.format(self._name, str(e))
                 log.debug('{}: adding import dir: yellow<{}>'.format(self._name, directory))
 
             try:
-                mod = __import__(basename)
+                mod = qt_startup.import_file(basename, u)
             except ImportError as e:
                 log.critical("{}: module '{}' skipped - import error: "
                         .format(self._name, basename), exc_info=e)
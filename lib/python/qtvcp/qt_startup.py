@@ -0,0 +1,241 @@
+#!/usr/bin/env python3
+# Qtvcp startup cache
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+###############################################################################
+
+import os
+import sys
+import io
+import re
+import time
+import struct
+import marshal
+import hashlib
+import tempfile
+import importlib.util
+import importlib.machinery
+
+from PyQt5 import QtCore, uic
+
+# Set up logging
+from . import logger
+
+LOG = logger.getLogger(__name__)
+
+# Force the log level for this module
+# LOG.setLevel(logger.DEBUG) # One of DEBUG, INFO, WARNING, ERROR, CRITICAL
+
+# What a screen parses at every start, kept ready to use in a cache folder:
+#   - .ui files compiled to Python code by uic, then to bytecode,
+#     instead of being interpreted by uic.loadUi,
+#   - the resources of a pyrcc5 made resources.py as a binary .rcc file,
+#     mapped by QResource.registerResource instead of importing megabytes
+#     of Python byte strings,
+#   - the bytecode of handler and user command files, which are often
+#     installed where Python can not write its own __pycache__.
+# Each cached file ends with a key: the modification time and size of the
+# source, and a hash of its contents.  When the time or size changed, the
+# source is hashed again and only rebuilt if its contents changed too.
+#
+# PROFILE notes the time each phase of the startup took, reported by
+# qtvcp's --profile-startup option.
+
+CACHE_DIR = os.path.join(os.environ.get('XDG_CACHE_HOME') or os.path.expanduser('~/.cache'), 'qtvcp')
+
+# changes with the Python, Qt and PyQt versions, which the cached files depend on
+MAGIC = hashlib.sha1(importlib.util.MAGIC_NUMBER + ' {} {} 1'.format(
+    QtCore.QT_VERSION_STR, QtCore.PYQT_VERSION_STR).encode()).digest()[:8]
+# magic, source modification time and size, sha1 of the source
+KEY = struct.Struct('<8sQQ20s')
+# binary resource file header: magic, version, tree, data and name offsets
+RCC_HEADER = struct.Struct('>4sIIII')
+# pyrcc5 resource modules uic adds imports of
+RC_IMPORT = re.compile(r'^import \w+_rc$', re.M)
+
+class MissingSlot(AttributeError):
+    pass
+
+class StartupProfile():
+    def __init__(self):
+        self.start = self.last = time.time()
+        self.phases = []
+
+    def mark(self, phase):
+        """Note the time since the last mark as the time phase took"""
+        now = time.time()
+        self.phases.append((phase, now - self.last))
+        self.last = now
+
+    def report(self, out=sys.stderr):
+        total = 0
+        print('QtVCP startup profile:', file=out)
+        for phase, t in self.phases:
+            total += t
+            print('  {:>8.1f} ms {:>8.1f} ms  {}'.format(t * 1000, total * 1000, phase), file=out)
+
+PROFILE = StartupProfile()
+
+def cache_name(path, suffix):
+    key = hashlib.sha1(os.path.realpath(path).encode('utf-8', 'surrogateescape')).hexdigest()
+    return os.path.join(CACHE_DIR, key + suffix)
+
+def lookup(path, suffix):
+    """The name of the cached file made of path, or None if there is none
+    for its current contents"""
+    fn = cache_name(path, suffix)
+    try:
+        st = os.stat(path)
+        with open(fn, 'r+b') as f:
+            f.seek(-KEY.size, 2)
+            magic, mtime, size, digest = KEY.unpack(f.read(KEY.size))
+            if magic != MAGIC:
+                return None
+            if (mtime, size) == (st.st_mtime_ns, st.st_size):
+                return fn
+            # touched, maybe not changed
+            with open(path, 'rb') as source:
+                if hashlib.sha1(source.read()).digest() != digest:
+                    return None
+            f.seek(-KEY.size, 2)
+            f.write(KEY.pack(MAGIC, st.st_mtime_ns, st.st_size, digest))
+            return fn
+    except (OSError, struct.error):
+        return None
+
+def build(path, suffix, make):
+    """The name of the cached file made of path by make(source), and its
+    data; the name is None when the cache can not be written"""
+    st = os.stat(path)
+    with open(path, 'rb') as f:
+        source = f.read()
+    data = make(source)
+    key = KEY.pack(MAGIC, st.st_mtime_ns, st.st_size, hashlib.sha1(source).digest())
+    fn = cache_name(path, suffix)
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(prefix='.', dir=CACHE_DIR)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+                f.write(key)
+            os.replace(tmp, fn)
+        except:
+            os.unlink(tmp)
+            raise
+    except OSError as e:
+        LOG.debug('Could not cache {}: {}'.format(path, e))
+        fn = None
+    return fn, data
+
+def cached(path, suffix, make):
+    """The data make(source) makes of the contents of path, from the cache
+    when it is there"""
+    fn = lookup(path, suffix)
+    if fn is not None:
+        try:
+            with open(fn, 'rb') as f:
+                return f.read()[:-KEY.size]
+        except OSError:
+            pass
+    return build(path, suffix, make)[1]
+
+def code(path, make=None):
+    """The code object compiled from the Python file path, or from the
+    Python source make(source) makes of it"""
+    def compile_code(source):
+        if make is not None:
+            source = make(source)
+        return marshal.dumps(compile(source, path, 'exec', dont_inherit=True))
+    suffix = '.pyc' if make is None else make.suffix
+    try:
+        return marshal.loads(cached(path, suffix, compile_code))
+    except (EOFError, ValueError, TypeError):
+        # a damaged cache file
+        return marshal.loads(build(path, suffix, compile_code)[1])
+
+def compile_ui(source):
+    text = io.StringIO()
+    uic.compileUi(io.BytesIO(source), text)
+    # resources are registered by load_resources()
+    return RC_IMPORT.sub('', text.getvalue())
+compile_ui.suffix = '.ui.pyc'
+
+def load_ui(filename, baseinstance):
+    """Build the widgets of the .ui file filename into baseinstance, like
+    uic.loadUi() does, from code compiled once"""
+    try:
+        ui_code = code(filename, compile_ui)
+    except Exception as e:
+        LOG.warning('Could not compile {}, loading it uncached: {}'.format(filename, e))
+        return uic.loadUi(filename, baseinstance)
+    namespace = {'__name__': 'qtvcp_ui'}
+    exec(ui_code, namespace)
+    form = [v for k, v in namespace.items() if k.startswith('Ui_') and isinstance(v, type)][0]()
+    try:
+        form.setupUi(baseinstance)
+    except AttributeError as e:
+        # connections to slots the window does not have
+        if "'{}' object has no attribute".format(type(baseinstance).__name__) in str(e):
+            raise MissingSlot(str(e))
+        raise
+    finally:
+        # the widgets are attributes of the window, as with uic.loadUi()
+        for name, value in vars(form).items():
+            setattr(baseinstance, name, value)
+    return baseinstance
+
+def rcc(source):
+    """A binary resource file of the resources of the pyrcc5 made module
+    source"""
+    namespace = {'__name__': 'resources'}
+    exec(compile(source, 'resources.py', 'exec'), namespace)
+    namespace['qCleanupResources']()
+    tree = namespace['qt_resource_struct']
+    names = namespace['qt_resource_name']
+    data = namespace['qt_resource_data']
+    start = RCC_HEADER.size
+    return RCC_HEADER.pack(b'qres', namespace['rcc_version'], start, start + len(tree),
+                           start + len(tree) + len(data)) + tree + data + names
+
+def load_resources(qrcpy):
+    """Register the resources of the pyrcc5 made module qrcpy"""
+    fn = lookup(qrcpy, '.rcc')
+    if fn is None:
+        fn = build(qrcpy, '.rcc', rcc)[0]
+    if fn is None or not QtCore.QResource.registerResource(fn):
+        LOG.debug('Importing resources from: {}'.format(qrcpy))
+        sys.path.insert(0, os.path.split(qrcpy)[0])
+        importlib.import_module('resources')
+
+class CachedLoader(importlib.machinery.SourceFileLoader):
+    """Imports a Python file with its bytecode cached in CACHE_DIR"""
+    def get_code(self, fullname):
+        return code(self.get_filename(fullname))
+
+def import_file(name, path):
+    """The module name imported from the file path, like __import__(name)
+    would when path's folder is first in sys.path"""
+    if name in sys.modules:
+        return sys.modules[name]
+    if not path.endswith('.py') or not os.path.isfile(path):
+        return __import__(name)
+    loader = CachedLoader(name, path)
+    spec = importlib.util.spec_from_file_location(name, path, loader=loader)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    try:
+        loader.exec_module(module)
+    except:
+        del sys.modules[name]
+        raise
+    return module
@@ -16,7 +16,6 @@
 ###############################################################################
 
 import os
-import hashlib
 
 from qtvcp.core import Status, Info, Action
 # Set up logging
@@ -40,7 +39,15 @@ class _TStat(object):
             return
         self.__class__._instanceNum += 1
         self._delay = 0
-        self._hash_code = None
+        # (mtime, size, inode) of the tool file when it was last parsed or checked
+        self._file_stamp = None
+        self._checked_stamp = None
+        # parsed tool file: (tool_model, wear_model) of row lists, rows
+        # indexed by tool number and pocket, and parsed rows by raw line
+        self._models = None
+        self._by_number = {}
+        self._by_pocket = {}
+        self._parsed_lines = {}
         self.NUM = 0
         self.POCKET = 1
         self.X = 2
@@ -67,9 +74,20 @@ class _TStat(object):
 
     def GET_TOOL_INFO(self, toolnum):
         self.current_tool_num = int(toolnum)
-        self._reload()
+        self._update_models()
+        row = self._by_number.get(self.current_tool_num)
+        if row is None:
+            self.toolinfo = [0, 0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 0, 'No Tool']
+        else:
+            self.toolinfo = list(row)
         return self.toolinfo
 
+    # the tool in pocket or None
+    def GET_POCKET_INFO(self, pocket):
+        self._update_models()
+        row = self._by_pocket.get(int(pocket))
+        return None if row is None else list(row)
+
     def GET_TOOL_ARRAY(self):
         info = self.GET_TOOL_MODELS()
         return info[0] + info[1]
@@ -109,84 +127,110 @@ class _TStat(object):
     # [15] = tool comments
     # Reload the tool file into the array model and update tool_info
     def _reload(self):
-        if self.toolfile is None or not os.path.exists(self.toolfile):
-            LOG.debug("Toolfile does not exist' {}".format(self.toolfile))
+        if not self._update_models():
+            return None
+        self.GET_TOOL_INFO(self.current_tool_num)
+        # copies, the callers are free to change them
+        tool_model, wear_model = self._models
+        return ([list(row) for row in tool_model], [list(row) for row in wear_model])
+
+    def _stamp(self):
+        try:
+            st = os.stat(self.toolfile)
+        except (OSError, TypeError):
             return None
-        # print 'file',self.toolfile
-        # clear the current liststore, search the tool file, and add each tool
+        return st.st_mtime_ns, st.st_size, st.st_ino
+
+    # parse the tool file again if it changed since it was last parsed
+    # returns False if there is no tool file
+    def _update_models(self):
+        stamp = self._stamp()
+        if stamp is None:
+            LOG.debug("Toolfile does not exist' {}".format(self.toolfile))
+            self._models = None
+            self._file_stamp = None
+            self._by_number = {}
+            self._by_pocket = {}
+            return False
+        if stamp == self._file_stamp and self._models is not None:
+            return True
+        self._file_stamp = stamp
         tool_model = []
         wear_model = []
-        logfile = open(self.toolfile, "r").readlines()
-        self.toolinfo = None
-        toolinfo_flag = False
+        by_number = {}
+        by_pocket = {}
+        parsed_lines = {}
+        with open(self.toolfile, "r") as f:
+            logfile = f.readlines()
         for rawline in logfile:
-            # ignore blank lines
-            if rawline == '':
-                continue
-            # print 'raw:',rawline
-            # strip the comments from line and add directly to array
-            # if index = -1 the delimiter ; is missing - clear comments
-            index = rawline.find(";")
-            comment = ''
-            if not index == -1:
-                comment = (rawline[index + 1:])
-                comment = comment.rstrip("\n")
-                line = rawline.rstrip(comment)
-            else:
-                line = rawline
-            array = [0, 0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 0, comment]
-            wear_flag = False
-            # search beginning of each word for keyword letters
-            # if i = ';' that is the comment and we have already added it
-            # offset 0 and 1 are integers the rest floats
-            # we strip leading and following spaces from the comments
-            for offset, i in enumerate(KEYWORDS):
-                if i == ';': continue
-                for word in line.split():
-                    if word.startswith(';'): break
-                    if word.startswith(i):
-                        if offset == 0:
-                            if int(word.lstrip(i)) == self.current_tool_num:
-                                toolinfo_flag = True
-                                # This array's tool num is the current tool num
-                                # remember it for later
-                                temp = array
-                            # check if tool is greater then 10000 -then it's a wear tool
-                            if int(word.lstrip(i)) > 10000:
-                                wear_flag = True
-                        if offset in (0, 1, 14):
-                            try:
-                                array[offset] = int(word.lstrip(i))
-                            except ValueError as e:
-                                try:
-                                    array[offset] = int(float(word.lstrip(i)))
-                                except Exception as e:
-                                    LOG.error("toolfile integer access: {} : {}".format(word.lstrip(i), e))
-                        else:
-                            try:
-                                # we will call this range zero:
-                                if float(word.lstrip(i)) < 0.000001 and float(word.lstrip(i)) > -0.000001:
-                                    array[offset] = 0.0
-                                else:
-                                    array[offset] = float(word.lstrip(i))
-                            except:
-                                LOG.error("toolfile float access: {}".format(self.toolfile))
-                        break
-
+            # only the lines that changed are parsed again
+            parsed = self._parsed_lines.get(rawline)
+            if parsed is None:
+                parsed = self._parse_line(rawline)
+            parsed_lines[rawline] = parsed
+            array, wear_flag = parsed
             # add array line to model array
             if wear_flag:
                 wear_model.append(array)
             else:
                 tool_model.append(array)
-        if toolinfo_flag:
-            self.toolinfo = temp
+            # the last line of a tool number wins
+            by_number[array[self.NUM]] = array
+            # wear offsets are not in a pocket, whatever their P word says
+            if not wear_flag:
+                by_pocket[array[self.POCKET]] = array
+        self._parsed_lines = parsed_lines
+        self._models = (tool_model, wear_model)
+        self._by_number = by_number
+        self._by_pocket = by_pocket
+        return True
+
+    # parse one tool file line into a (tool array, is wear offset) tuple
+    def _parse_line(self, rawline):
+        # strip the comments from line and add directly to array
+        # if index = -1 the delimiter ; is missing - clear comments
+        index = rawline.find(";")
+        comment = ''
+        if not index == -1:
+            comment = (rawline[index + 1:])
+            comment = comment.rstrip("\n")
+            line = rawline.rstrip(comment)
         else:
-            self.toolinfo = [0, 0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 0, 'No Tool']
-        # print 'load'
-        # for i in tool_model:
-        #    print i
-        # print wear_model
-        return (tool_model, wear_model)
+            line = rawline
+        array = [0, 0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 0, comment]
+        wear_flag = False
+        # search beginning of each word for keyword letters
+        # if i = ';' that is the comment and we have already added it
+        # offset 0 and 1 are integers the rest floats
+        # we strip leading and following spaces from the comments
+        for offset, i in enumerate(KEYWORDS):
+            if i == ';': continue
+            for word in line.split():
+                if word.startswith(';'): break
+                if word.startswith(i):
+                    if offset == 0:
+                        # check if tool is greater then 10000 -then it's a wear tool
+                        if int(word.lstrip(i)) > 10000:
+                            wear_flag = True
+                    if offset in (0, 1, 14):
+                        try:
+                            array[offset] = int(word.lstrip(i))
+                        except ValueError as e:
+                            try:
+                                array[offset] = int(float(word.lstrip(i)))
+                            except Exception as e:
+                                LOG.error("toolfile integer access: {} : {}".format(word.lstrip(i), e))
+                    else:
+                        try:
+                            # we will call this range zero:
+                            if float(word.lstrip(i)) < 0.000001 and float(word.lstrip(i)) > -0.000001:
+                                array[offset] = 0.0
+                            else:
+                                array[offset] = float(word.lstrip(i))
+                        except:
+                            LOG.error("toolfile float access: {}".format(self.toolfile))
+                    break
+        return tuple(array), wear_flag
 
     # converts from linuxcnc toolfile array to toolwear array
     # linuxcnc handles toolwear by having tool wear as extra tools with tool numbers above 10000 (fanuc style)
@@ -340,15 +384,6 @@ class _TStat(object):
             LOG.error("reloading of tool table into linuxcnc: {}".format(self.toolfile))
             return True
 
-        # create a hash code
-
-    def md5sum(self, filename):
-        try:
-            f = open(filename, "rb")
-        except:
-            return None
-        else:
-            return hashlib.md5(f.read()).hexdigest()
 
     # push the update to whoever using STATUS
     def emit_update(self):
@@ -356,8 +391,8 @@ class _TStat(object):
         if data is not None:
             STATUS.emit('toolfile-stale', data)
 
-    # check the hash code on the toolfile against
-    # the saved hash code when last reloaded.
+    # check the modification time, size and inode of the toolfile
+    # against the ones it had when last checked.
     def periodic_check(self, w):
         if self._delay < 9:
             self._delay += 1
@@ -365,7 +400,7 @@ class _TStat(object):
         if STATUS.is_status_valid() == False:
             return
         self._delay = 0
-        m1 = self.md5sum(self.toolfile)
-        if m1 and self._hash_code != m1:
-            self._hash_code = m1
+        stamp = self._stamp()
+        if stamp and self._checked_stamp != stamp:
+            self._checked_stamp = stamp
             self.emit_update()
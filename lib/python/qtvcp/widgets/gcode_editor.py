@@ -30,6 +30,7 @@
 import sys
 import os
 import re
+import zlib
 
 from PyQt5.QtCore import pyqtProperty, pyqtSignal, QSize
 from PyQt5.QtGui import QFont, QFontMetrics, QColor, QIcon
@@ -61,8 +62,30 @@ except ImportError as e:
     sys.exit(1)
 
 
+# G-code tokens, tried in this order at each position; the group name
+# is the lexer style of the token
+GCODE_TOKENS = re.compile(
+    r"(?P<Comment>[N]\d+|\(.*?\)|;.*)"                                     # LineNo and Comment
+    r"|(?P<Gcode>[G]\d{1,2}\.\d|[G]\d{1,2})"                                # Gcode
+    r"|(?P<Mcode>[M]\d{1,3})"                                                # Mcode
+    r"|(?P<Axis>[XYZABCUVW]{1}(?:[+-]?[\d\.]+|\#\<.*\>|\[.*\]|\#\d+))"      # Axis
+    r"|(?P<Other>[EFHIJKDQLRPST$]{1}(?:[+-]?[\d\.]+|\#\<.*\>|\[.*\]|\#\d+))" # Other (feed,rpm,radius,etc)
+    r"|(?P<Default>\s+|\w+|\W)",                                            # Default (fallback)
+    re.IGNORECASE)
+
+COMMENT_CMD = re.compile(r"(?:\(\s*(?:print,|debug,|msg,|logopen,|logappend,|logclose|log,|pyrun,|pyreload|abort,|probeopen|probeclose)|^\s*\;py,)",
+    re.IGNORECASE)
+
 class GcodeLexer(QsciLexerCustom):
-    """ QSciLexer for parsing and highlighting G-code """
+    """ QSciLexer for parsing and highlighting G-code
+
+    G-code has no state carried from one line to the next, so lines are
+    styled on their own: the styles of a line are cached by its text and
+    set in one go.  With defer_styling set only the lines on screen are
+    styled; the editor calls style_visible() as others come into view. """
+
+    # number of line stylings kept in the cache
+    CACHE_LINES = 20000
 
     def __init__(self, parent):
         super(GcodeLexer, self).__init__(parent)
@@ -82,80 +105,141 @@ class GcodeLexer(QsciLexerCustom):
         for key, value in self._styles.items():
             setattr(self, value, key)
 
+        self._cache = {}
+        self.defer_styling = False
+
     def language(self):
         return "G-code"
 
     def description(self, style):
         return self._styles.get(style, "")
 
-    def styleText(self, start, end):
+    # styles of one line of encoded text, one byte per byte of text
+    def line_styles(self, line):
+        styles = self._cache.get(line)
+        if styles is not None:
+            return styles
+
+        # scintilla works with encoded bytes, not decoded characters.
+        # this matters if the source contains non-ascii characters and
+        # a multi-byte encoding is used (e.g. utf-8)
+        text = line.decode("utf-8", "surrogateescape")
+        if text.isascii():
+            size = len
+        else:
+            size = lambda token: len(token.encode("utf-8", "surrogateescape"))
+        num_comment_cmds = len(COMMENT_CMD.findall(text)) if ('(' in text or ';' in text) else 0
+
+        styles = bytearray()
+        for m in GCODE_TOKENS.finditer(text):
+            token = m.group()
+            length = size(token)
+            kind = m.lastgroup
+            if kind == 'Comment':
+                cmd = COMMENT_CMD.search(token) if num_comment_cmds > 0 else None
+                if cmd:
+                    num_comment_cmds -= 1
+
+                if cmd and num_comment_cmds == 0:
+                    # Only highlight last comment_cmd on line
+                    head = size(token[:cmd.end()])
+                    styles.append(self.Comment)
+                    styles.extend(bytes((self.Other,)) * (head - 1))
+                    styles.extend(bytes((self.Comment,)) * (length - head))
+                else:
+                    styles.extend(bytes((self.Comment,)) * length)
+            elif kind == 'Axis':
+                styles.append(self.Axis)
+                styles.extend(bytes((self.AxisValue,)) * (length - 1))
+            elif kind == 'Other':
+                styles.append(self.Other)
+                styles.extend(bytes((self.OtherValue,)) * (length - 1))
+            else:
+                styles.extend(bytes((getattr(self, kind),)) * length)
+
+        styles = bytes(styles)
+        if len(self._cache) >= self.CACHE_LINES:
+            self._cache.clear()
+        self._cache[line] = styles
+        return styles
+
+    # the state kept for a styled line: a hash of its text
+    def line_state(self, line):
+        return (zlib.crc32(line) >> 1) | 1
+
+    # encoded text of lines first to last, split in lines
+    def get_lines(self, first, last):
         editor = self.editor()
-        if editor is None:
+        start = editor.SendScintilla(QsciScintilla.SCI_POSITIONFROMLINE, first)
+        if last + 1 < editor.lines():
+            end = editor.SendScintilla(QsciScintilla.SCI_POSITIONFROMLINE, last + 1)
+        else:
+            end = editor.length()
+        source = bytearray(end - start)
+        if end > start:
+            editor.SendScintilla(QsciScintilla.SCI_GETTEXTRANGE, start, end, source)
+        return start, bytes(source).splitlines(True)
+
+    def style_lines(self, first, last):
+        editor = self.editor()
+        start, lines = self.get_lines(first, last)
+        if not lines:
             return
 
         self.startStyling(start)
+        styles = b''.join([self.line_styles(line) for line in lines])
+        editor.SendScintilla(QsciScintilla.SCI_SETSTYLINGEX, len(styles), styles)
+        if self.defer_styling:
+            for n, line in enumerate(lines, first):
+                editor.SendScintilla(QsciScintilla.SCI_SETLINESTATE, n, self.line_state(line))
+
+    def visible_lines(self):
+        editor = self.editor()
+        first = editor.SendScintilla(QsciScintilla.SCI_DOCLINEFROMVISIBLE, editor.firstVisibleLine())
+        last = first + editor.SendScintilla(QsciScintilla.SCI_LINESONSCREEN) + 1
+        return first, min(last, editor.lines() - 1)
+
+    # style the lines on screen that changed or were never styled
+    def style_visible(self):
+        editor = self.editor()
+        if editor is None:
+            return
+        first, last = self.visible_lines()
+        if last < first:
+            return
+        start, lines = self.get_lines(first, last)
+        stale = [n for n, line in enumerate(lines, first)
+                 if editor.SendScintilla(QsciScintilla.SCI_GETLINESTATE, n) != self.line_state(line)]
+        # restyle each run of stale lines
+        while stale:
+            run = 1
+            while run < len(stale) and stale[run] == stale[0] + run:
+                run += 1
+            self.style_lines(stale[0], stale[run - 1])
+            stale = stale[run:]
+
+    def styleText(self, start, end):
+        editor = self.editor()
+        if editor is None:
+            return
 
-        # scintilla works with encoded bytes, not decoded characters.
-        # this matters if the source contains non-ascii characters and
-        # a multi-byte encoding is used (e.g. utf-8)
-        source = ''
         if end > editor.length():
             end = editor.length()
-        if end > start:
-            if sys.hexversion >= 0x02060000:
-                # faster when styling big files, but needs python 2.6
-                source = bytearray(end - start)
-                editor.SendScintilla(
-                    editor.SCI_GETTEXTRANGE, start, end, source)
-                source = source.decode("utf-8", "ignore")
-            else:
-                source = str(editor.text())[start:end]
-        if not source:
+        if end <= start:
             return
+        first = editor.SendScintilla(QsciScintilla.SCI_LINEFROMPOSITION, start)
+        last = editor.SendScintilla(QsciScintilla.SCI_LINEFROMPOSITION, end - 1)
 
-        re_tokens = {
-            1: r"(?:[N]\d+|\(.*?\)|;.*)",                                       # LineNo and Comment
-            2: r"[G]\d{1,2}\.\d|[G]\d{1,2}",                                    # Gcode
-            3: r"[M]\d{1,3}",                                                   # Mcode
-            4: r"[XYZABCUVW]{1}(?:[+-]?[\d\.]+|\#\<.*\>|\[.*\]|\#\d+)",         # Axis
-            5: r"[EFHIJKDQLRPST$]{1}(?:[+-]?[\d\.]+|\#\<.*\>|\[.*\]|\#\d+)",    # Other (feed,rpm,radius,etc)
-            0: r"\s+|\w+|\W",                                                   # Default (fallback)
-        }
+        if self.defer_styling:
+            # leave the lines off screen for style_visible()
+            top, bottom = self.visible_lines()
+            first = max(first, top)
+            last = min(last, bottom)
 
-        re_comment_cmd = r"(?:\(\s*(?:print,|debug,|msg,|logopen,|logappend,|logclose|log,|pyrun,|pyreload|abort,|probeopen|probeclose)|^\s*\;py,)"
-
-        re_string = "|".join(re_tokens.values())
-        p = re.compile(re_string, re.IGNORECASE)
-
-        for line in source.splitlines(True):
-            token_list = [(token, len(bytearray(token, "utf-8"))) for token in p.findall(line)]
-            num_comment_cmds = len(re.findall(re_comment_cmd, line, re.IGNORECASE))
-
-            for token in token_list:
-                if re.match(re_tokens[self.Comment], token[0], re.IGNORECASE):
-                    m = re.search(re_comment_cmd, token[0], re.IGNORECASE)
-                    if m:
-                        num_comment_cmds -= 1
-
-                    if m and num_comment_cmds == 0:
-                        # Only highlight last comment_cmd on line
-                        self.setStyling(1, self.Comment)
-                        self.setStyling(m.span()[1] - 1, self.Other)
-                        self.setStyling(len(token[0]) - m.span()[1], self.Comment)
-                    else:
-                        self.setStyling(token[1], self.Comment)
-                elif re.match(re_tokens[self.Gcode], token[0], re.IGNORECASE):
-                    self.setStyling(token[1], self.Gcode)
-                elif re.match(re_tokens[self.Mcode], token[0], re.IGNORECASE):
-                    self.setStyling(token[1], self.Mcode)
-                elif re.match(re_tokens[self.Axis], token[0], re.IGNORECASE):
-                    self.setStyling(1, self.Axis)
-                    self.setStyling(token[1] - 1, self.AxisValue)
-                elif re.match(re_tokens[self.Other], token[0], re.IGNORECASE):
-                    self.setStyling(1, self.Other)
-                    self.setStyling(token[1] - 1, self.OtherValue)
-                else:
-                    self.setStyling(token[1], self.Default)
+        if first <= last:
+            self.style_lines(first, last)
+        # mark the whole range as done
+        self.startStyling(end)
 
 
 ##########################################################
@@ -164,6 +248,8 @@ class GcodeLexer(QsciLexerCustom):
 class EditorBase(QsciScintilla):
     CURRENT_MARKER_NUM = 0
     USER_MARKER_NUM = 1
+    # files bigger than this (in bytes) are styled as they are shown
+    LARGE_FILE_SIZE = 4 * 1024 * 1024
 
     # Default Styles
     # get/set function for font and colors styles will return
@@ -254,6 +340,9 @@ class EditorBase(QsciScintilla):
         self.setMinimumSize(200, 100)
         self.filepath = None
 
+        # style lines of large files as they scroll into view
+        self.SCN_UPDATEUI.connect(self.on_update_ui)
+
     def set_lexer(self, lexer_type=None):
         self.lexer = None
         self.lexer_num_styles = 0
@@ -305,6 +394,10 @@ class EditorBase(QsciScintilla):
             self._marginWidth = str(self.lines())+'0'
         self.setMarginWidth(0, self._marginWidth)
 
+    def on_update_ui(self, *args):
+        if isinstance(self.lexer, GcodeLexer) and self.lexer.defer_styling:
+            self.lexer.style_visible()
+
     def on_margin_clicked(self, nmargin, nline, modifiers):
         # Toggle marker for the line the margin was clicked on
         # 2 means it's already there
@@ -332,8 +425,19 @@ class EditorBase(QsciScintilla):
             return
         try:
             fp = os.path.expanduser(filepath)
+            large = os.path.getsize(fp) > self.LARGE_FILE_SIZE
+            if isinstance(self.lexer, GcodeLexer):
+                self.lexer.defer_styling = large
             with open(fp) as f:
-                self.setText(f.read())
+                text = f.read()
+            if large:
+                # no undo copy of the whole file
+                self.SendScintilla(QsciScintilla.SCI_SETUNDOCOLLECTION, False)
+                self.setText(text)
+                self.SendScintilla(QsciScintilla.SCI_SETUNDOCOLLECTION, True)
+                self.SendScintilla(QsciScintilla.SCI_EMPTYUNDOBUFFER)
+            else:
+                self.setText(text)
         except OSError as e:
             LOG.error("load_text(): {}".format(e))
             self.setText('')
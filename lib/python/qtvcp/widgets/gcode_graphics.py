@@ -218,10 +218,15 @@ class  GCodeGraphics(Lcnc_3dGraphics, _HalWidgetBase):
         LOG.debug('load the display: {}'.format(fname))
         self._reload_filename = fname
         result = self.load(fname)
+        # a background load reports from background_load_done
+        if self.preview_loader is None:
+            self.background_load_done()
+        return result
+
+    def background_load_done(self):
         STATUS.emit('graphics-gcode-properties',self.gcode_properties)
         # reset the current view to standard calculated zoom and position
         self.set_current_view()
-        return result
 
     def set_metric_units(self, w, state):
         self.metric_units = state
@@ -261,7 +266,8 @@ class  GCodeGraphics(Lcnc_3dGraphics, _HalWidgetBase):
         try:
             self.load(self._reload_filename)
             self.clear_live_plotter()
-            STATUS.emit('graphics-gcode-properties',self.gcode_properties)
+            if self.preview_loader is None:
+                STATUS.emit('graphics-gcode-properties',self.gcode_properties)
         except:
             print('error', self._reload_filename)
             pass
@@ -545,6 +551,15 @@ class  GCodeGraphics(Lcnc_3dGraphics, _HalWidgetBase):
         self._invertWheelZoom = False
     MouseWheelInvertZoom = pyqtProperty(bool, getMouseWheelInvertZoom, setMouseWheelInvertZoom, resetMouseWheelInvertZoom)
 
+    # parse programs in a worker thread, drawing them as they load
+    def setBackgroundLoad(self, state):
+        self.background_load = state
+    def getBackgroundLoad(self):
+        return self.background_load
+    def resetBackgroundLoad(self):
+        self.background_load = False
+    BackgroundLoad = pyqtProperty(bool, getBackgroundLoad, setBackgroundLoad, resetBackgroundLoad)
+
 # For testing purposes, include code to allow a widget to be created and shown
 # if this file is run.
 
@@ -0,0 +1,347 @@
+#!/usr/bin/env python3
+#
+# QTVcp Widget
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+import os
+import time
+import numpy
+
+from PyQt5 import QtWidgets
+from PyQt5.QtGui import QColor, QPainter, QPen
+from PyQt5.QtCore import Qt, QTimer, QPointF, QRectF, QSize, pyqtProperty
+
+from qtvcp.widgets.widget_baseclass import _HalWidgetBase
+import hal
+import stream_scope
+
+# Set up logging
+from qtvcp import logger
+LOG = logger.getLogger(__name__)
+
+# Force the log level for this module
+#LOG.setLevel(logger.DEBUG) # One of DEBUG, INFO, WARNING, ERROR, CRITICAL
+
+# trace colors, one per channel
+COLORS = ('#ff3333', '#33e633', '#4d80ff', '#ffe633',
+          '#ff4dff', '#33ffff', '#ff9933', '#cccccc')
+
+class HALScope(QtWidgets.QWidget, _HalWidgetBase):
+    """Plots the channels of a sampler component at the rate of its thread
+
+    Load a sampler and connect the signals to show to its pins, e.g.
+        loadrt sampler depth=4096 cfg=ff
+        addf sampler.0 servo-thread
+    Left click holds/releases the display, right click saves what is shown
+    to snapshotFile."""
+    def __init__(self, parent=None):
+        super(HALScope, self).__init__(parent)
+        self._sampler = 0
+        self._sample_period = 0.001
+        self._window = 1000
+        self._capacity = 1 << 20
+        self._tick = 40
+        self._min = -1.
+        self._max = 1.
+        self._autoscale = False
+        self._trigger_mode = 'auto'
+        self._trigger_channel = 0
+        self._trigger_level = 0.
+        self._trigger_edge = 'rising'
+        self._trigger_position = 0.5
+        self._channel_names = ''
+        self._snapshot_file = '~/scope-%Y%m%d-%H%M%S.csv'
+        self._background_color = QColor('black')
+
+        self.scope = None
+        self.held = None
+        self.message = ''
+        self.last_arm = False
+        self.timer = QTimer(self)
+        self.timer.timeout.connect(self.poll)
+        self.setSizePolicy(QtWidgets.QSizePolicy.MinimumExpanding,
+                           QtWidgets.QSizePolicy.MinimumExpanding)
+
+    def _hal_init(self):
+        pname = self.HAL_NAME_
+        self.arm_pin = self.HAL_GCOMP_.newpin(pname + '-arm', hal.HAL_BIT, hal.HAL_IN)
+        self.triggered_pin = self.HAL_GCOMP_.newpin(pname + '-triggered', hal.HAL_BIT, hal.HAL_OUT)
+        self.overruns_pin = self.HAL_GCOMP_.newpin(pname + '-overruns', hal.HAL_S32, hal.HAL_OUT)
+        try:
+            stream = stream_scope.attach_sampler(self.HAL_GCOMP_, self._sampler)
+        except (IOError, OSError) as e:
+            self.message = 'sampler.%d not found: %s' % (self._sampler, e)
+            LOG.warning(self.message)
+            return
+        self.scope = stream_scope.StreamScope(stream, self._window, self._capacity,
+                                              self._sample_period)
+        self.configure()
+        self.timer.start(self._tick)
+
+    def configure(self):
+        scope = self.scope
+        if scope is None: return
+        scope.window = self._window
+        scope.period = self._sample_period
+        scope.channel = min(self._trigger_channel, scope.channels - 1)
+        scope.level = self._trigger_level
+        scope.edge = self._trigger_edge
+        scope.position = self._trigger_position
+        if scope.mode != self._trigger_mode:
+            try:
+                scope.set_mode(self._trigger_mode)
+            except ValueError as e:
+                self.message = str(e)
+        self.update()
+
+    def poll(self):
+        scope = self.scope
+        scope.poll()
+        arm = self.arm_pin.get()
+        if arm and not self.last_arm:
+            scope.arm()
+        self.last_arm = arm
+        self.triggered_pin.set(scope.captured is not None)
+        self.overruns_pin.set(scope.overruns)
+        self.update()
+
+    def names(self):
+        names = [n.strip() for n in self._channel_names.split(',') if n.strip()]
+        return names + ['channel%d' % i for i in range(len(names), self.scope.channels)]
+
+    def snapshot(self):
+        """Save the window shown as a CSV file named by snapshotFile"""
+        filename = os.path.expanduser(time.strftime(self._snapshot_file))
+        try:
+            n = self.scope.export(filename, self.names())
+            self.message = 'saved %d samples to %s' % (n, filename)
+        except (IOError, OSError) as e:
+            self.message = str(e)
+            LOG.warning(self.message)
+        self.update()
+
+    def mousePressEvent(self, event):
+        if self.scope is None: return
+        if event.button() == Qt.LeftButton:
+            self.held = None if self.held else self.scope.view()
+            self.update()
+        elif event.button() == Qt.RightButton:
+            self.snapshot()
+
+    def sizeHint(self):
+        return QSize(400, 200)
+
+    def paintEvent(self, event):
+        w = self.width()
+        h = self.height()
+        painter = QPainter(self)
+        painter.fillRect(QRectF(0, 0, w, h), self._background_color)
+
+        # graticule: 10 by 8 divisions
+        painter.setPen(QPen(QColor(128, 128, 128, 128), 1))
+        for i in range(1, 10):
+            painter.drawLine(int(w * i / 10), 0, int(w * i / 10), h)
+        for i in range(1, 8):
+            painter.drawLine(0, int(h * i / 8), w, int(h * i / 8))
+
+        if self.scope is None:
+            painter.setPen(QColor('white'))
+            painter.drawText(5, 15, self.message)
+            return
+
+        start, data = self.held or self.scope.view()
+        ymin, ymax = self._min, self._max
+        if self._autoscale and len(data):
+            ymin, ymax = float(data.min()), float(data.max())
+        if ymax <= ymin:
+            ymin, ymax = ymin - 1, ymax + 1
+        xscale = w / float(max(self._window - 1, 1))
+        yscale = h / (ymax - ymin)
+
+        painter.setRenderHint(QPainter.Antialiasing)
+        for c in range(data.shape[1]):
+            offsets, values = stream_scope.min_max(data[:, c], max(w, 1))
+            x = offsets * xscale
+            y = numpy.clip(h - (values - ymin) * yscale, -1, h + 1)
+            painter.setPen(QPen(QColor(COLORS[c % len(COLORS)]), 1))
+            painter.drawPolyline(*[QPointF(*p) for p in zip(x.tolist(), y.tolist())])
+
+        # trigger level and position
+        if self.scope.mode != 'auto':
+            painter.setPen(QPen(QColor(255, 255, 255, 128), 1, Qt.DashLine))
+            y = h - (self.scope.level - ymin) * yscale
+            painter.drawLine(QPointF(0, y), QPointF(w, y))
+            x = int(self._window * self.scope.position) * xscale
+            painter.drawLine(QPointF(x, 0), QPointF(x, h))
+
+        # legend and scale
+        for c, name in enumerate(self.names()):
+            painter.setPen(QColor(COLORS[c % len(COLORS)]))
+            painter.drawText(5, 15 * (c + 1), name)
+        painter.setPen(QColor('white'))
+        status = '%s  %g/div  %gs/div' % (
+            'HOLD' if self.held else self.scope.mode,
+            (ymax - ymin) / 8, self._window * self.scope.period / 10)
+        if self.scope.overruns:
+            status += '  overruns %d' % self.scope.overruns
+        painter.drawText(5, h - 5, status)
+        if self.message:
+            painter.drawText(5, h - 20, self.message)
+
+    #########################################################################
+    # This is how designer can interact with our widget properties.
+    # designer will show the pyqtProperty properties in the editor
+    # it will use the get set and reset calls to do those actions
+    #########################################################################
+
+    def set_sampler(self, data):
+        self._sampler = data
+    def get_sampler(self):
+        return self._sampler
+    def reset_sampler(self):
+        self._sampler = 0
+
+    def set_sample_period(self, data):
+        self._sample_period = data
+        self.configure()
+    def get_sample_period(self):
+        return self._sample_period
+    def reset_sample_period(self):
+        self.set_sample_period(0.001)
+
+    def set_window(self, data):
+        self._window = max(data, 2)
+        self.configure()
+    def get_window(self):
+        return self._window
+    def reset_window(self):
+        self.set_window(1000)
+
+    def set_capacity(self, data):
+        self._capacity = max(data, 2)
+    def get_capacity(self):
+        return self._capacity
+    def reset_capacity(self):
+        self._capacity = 1 << 20
+
+    def set_tick(self, data):
+        self._tick = max(data, 10)
+        if self.timer.isActive():
+            self.timer.start(self._tick)
+    def get_tick(self):
+        return self._tick
+    def reset_tick(self):
+        self.set_tick(40)
+
+    def set_min(self, data):
+        self._min = data
+        self.update()
+    def get_min(self):
+        return self._min
+    def reset_min(self):
+        self.set_min(-1.)
+
+    def set_max(self, data):
+        self._max = data
+        self.update()
+    def get_max(self):
+        return self._max
+    def reset_max(self):
+        self.set_max(1.)
+
+    def set_autoscale(self, data):
+        self._autoscale = data
+        self.update()
+    def get_autoscale(self):
+        return self._autoscale
+    def reset_autoscale(self):
+        self.set_autoscale(False)
+
+    def set_trigger_mode(self, data):
+        self._trigger_mode = data
+        self.configure()
+    def get_trigger_mode(self):
+        return self._trigger_mode
+    def reset_trigger_mode(self):
+        self.set_trigger_mode('auto')
+
+    def set_trigger_channel(self, data):
+        self._trigger_channel = max(data, 0)
+        self.configure()
+    def get_trigger_channel(self):
+        return self._trigger_channel
+    def reset_trigger_channel(self):
+        self.set_trigger_channel(0)
+
+    def set_trigger_level(self, data):
+        self._trigger_level = data
+        self.configure()
+    def get_trigger_level(self):
+        return self._trigger_level
+    def reset_trigger_level(self):
+        self.set_trigger_level(0.)
+
+    def set_trigger_edge(self, data):
+        self._trigger_edge = data
+        self.configure()
+    def get_trigger_edge(self):
+        return self._trigger_edge
+    def reset_trigger_edge(self):
+        self.set_trigger_edge('rising')
+
+    def set_trigger_position(self, data):
+        self._trigger_position = min(max(data, 0.), 1.)
+        self.configure()
+    def get_trigger_position(self):
+        return self._trigger_position
+    def reset_trigger_position(self):
+        self.set_trigger_position(0.5)
+
+    def set_channel_names(self, data):
+        self._channel_names = data
+        self.update()
+    def get_channel_names(self):
+        return self._channel_names
+    def reset_channel_names(self):
+        self.set_channel_names('')
+
+    def set_snapshot_file(self, data):
+        self._snapshot_file = data
+    def get_snapshot_file(self):
+        return self._snapshot_file
+    def reset_snapshot_file(self):
+        self._snapshot_file = '~/scope-%Y%m%d-%H%M%S.csv'
+
+    def set_background_color(self, value):
+        self._background_color = value
+        self.update()
+    def get_background_color(self):
+        return self._background_color
+    def reset_background_color(self):
+        self.set_background_color(QColor('black'))
+
+    sampler = pyqtProperty(int, get_sampler, set_sampler, reset_sampler)
+    samplePeriod = pyqtProperty(float, get_sample_period, set_sample_period, reset_sample_period)
+    window = pyqtProperty(int, get_window, set_window, reset_window)
+    capacity = pyqtProperty(int, get_capacity, set_capacity, reset_capacity)
+    tick = pyqtProperty(int, get_tick, set_tick, reset_tick)
+    minimum = pyqtProperty(float, get_min, set_min, reset_min)
+    maximum = pyqtProperty(float, get_max, set_max, reset_max)
+    autoscale = pyqtProperty(bool, get_autoscale, set_autoscale, reset_autoscale)
+    triggerMode = pyqtProperty(str, get_trigger_mode, set_trigger_mode, reset_trigger_mode)
+    triggerChannel = pyqtProperty(int, get_trigger_channel, set_trigger_channel, reset_trigger_channel)
+    triggerLevel = pyqtProperty(float, get_trigger_level, set_trigger_level, reset_trigger_level)
+    triggerEdge = pyqtProperty(str, get_trigger_edge, set_trigger_edge, reset_trigger_edge)
+    triggerPosition = pyqtProperty(float, get_trigger_position, set_trigger_position, reset_trigger_position)
+    channelNames = pyqtProperty(str, get_channel_names, set_channel_names, reset_channel_names)
+    snapshotFile = pyqtProperty(str, get_snapshot_file, set_snapshot_file, reset_snapshot_file)
+    backgroundColor = pyqtProperty(QColor, get_background_color, set_background_color, reset_background_color)
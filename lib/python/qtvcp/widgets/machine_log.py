@@ -15,10 +15,12 @@
 ###############################################################################
 
 import os
-import hashlib
 
 from PyQt5.QtWidgets import QTextEdit
-from PyQt5.QtCore import QFile, pyqtProperty
+from PyQt5.QtGui import QTextCursor
+from PyQt5.QtCore import pyqtProperty
+
+from log_tail import LogTail, LogIndex
 
 from qtvcp.widgets.widget_baseclass import _HalWidgetBase
 from qtvcp.core import Status, Info
@@ -35,20 +37,30 @@ INFO = Info()
 LOG = logger.getLogger(__name__)
 
 
+# Only the lines added to the log are read and appended to the display, which
+# keeps the last max_lines of them; older ones are reached with showSearch().
 class MachineLog(QTextEdit, _HalWidgetBase):
     def __init__(self, parent=None):
         super(MachineLog, self).__init__(parent)
         self._delay = 0
-        self._hash_code = None
         self._machine_log = True
         self._integrator_log = False
+        self._max_lines = 1000
+        self._searching = False
+        self.document().setMaximumBlockCount(self._max_lines)
         self.integratorPath = os.path.expanduser(INFO.QTVCP_LOG_HISTORY_PATH)
         self.machineLogPath = os.path.expanduser(INFO.MACHINE_LOG_HISTORY_PATH)
+        self.tail = None
+        self.index = None
 
     def _hal_init(self):
         if self._machine_log:
+            self.tail = LogTail(self.machineLogPath, self._max_lines)
+            self.index = LogIndex(self.machineLogPath, INFO.MACHINE_LOG_KEEP)
             STATUS.connect('machine-log-changed',lambda w: self.loadLog())
         elif self._integrator_log:
+            self.tail = LogTail(self.integratorPath, self._max_lines)
+            self.index = LogIndex(self.integratorPath, 0)
             STATUS.connect('periodic', self._periodicCheck)
 
     def _periodicCheck(self, w):
@@ -58,37 +70,47 @@ class MachineLog(QTextEdit, _HalWidgetBase):
         if STATUS.is_status_valid() == False:
             return
         self._delay = 0
-        m1 = self.md5sum(self.integratorPath)
-        if m1 and self._hash_code != m1:
-            self._hash_code = m1
+        if self.tail.changed():
             self.loadIntegratorLog()
 
-       # create a hash code
-    def md5sum(self,filename):
-        try:
-            f = open(filename, "rb")
-        except:
-            return None
-        else:
-            return hashlib.md5(f.read()).hexdigest()
-
+    # append the lines added to the log since the last load
     def loadLog(self):
-        file = QFile(self.machineLogPath)
-        file.open(QFile.ReadOnly)
-        logText = file.readAll()
-        file.close()
-        self.setPlainText(str(logText, encoding='utf8'))
+        if self.tail is None:
+            self.tail = LogTail(self.machineLogPath, self._max_lines)
+        if self._searching:
+            return
+        reset, text = self.tail.read()
+        if reset:
+            self.setPlainText(text)
+        elif text:
+            cursor = QTextCursor(self.document())
+            cursor.movePosition(QTextCursor.End)
+            cursor.insertText(text)
         # scroll down to show last entry
         self.verticalScrollBar().setSliderPosition(self.verticalScrollBar().maximum())
 
     def loadIntegratorLog(self):
-        file = QFile(self.integratorPath)
-        file.open(QFile.ReadOnly)
-        logText = file.readAll()
-        file.close()
-        self.setPlainText(str(logText, encoding='utf8'))
-        # scroll down to show last entry
+        if self.tail is None:
+            self.tail = LogTail(self.integratorPath, self._max_lines)
+        self.loadLog()
+
+    # show the lines of the log and its rotated copies containing text
+    # instead of the log, until showLog() is called
+    def showSearch(self, text, limit=1000):
+        if self.index is None:
+            return []
+        found = self.index.search(text, limit)
+        self._searching = True
+        self.setPlainText('\n'.join('{}:{}: {}'.format(os.path.basename(name), number, line)
+                                    for name, number, line in reversed(found)))
         self.verticalScrollBar().setSliderPosition(self.verticalScrollBar().maximum())
+        return found
+
+    def showLog(self):
+        self._searching = False
+        if self.tail is not None:
+            self.tail.reset()
+            self.loadLog()
 
     def showEvent(self, ev):
         # scroll down to show last entry
@@ -123,6 +145,17 @@ class MachineLog(QTextEdit, _HalWidgetBase):
         self._integrator_log = False
     integrator_log_option = pyqtProperty(bool, get_integrator_log, set_integrator_log, reset_integrator_log)
 
+    def set_max_lines(self, value):
+        self._max_lines = max(value, 1)
+        self.document().setMaximumBlockCount(self._max_lines)
+        if self.tail is not None:
+            self.tail.lines = self._max_lines
+    def get_max_lines(self):
+        return self._max_lines
+    def reset_max_lines(self):
+        self.set_max_lines(1000)
+    max_lines = pyqtProperty(int, get_max_lines, set_max_lines, reset_max_lines)
+
     ##############################
     # required class boiler code #
     ##############################
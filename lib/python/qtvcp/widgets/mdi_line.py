@@ -19,7 +19,6 @@ import linuxcnc
 import hal
 import time
 
-import subprocess
 
 from PyQt5.QtWidgets import QLineEdit, QApplication
 from PyQt5.QtCore import Qt, QEvent, pyqtProperty
@@ -226,17 +225,14 @@ class MDI(QLineEdit):
     def net(self, netString):
         arguments = len(netString.lower().replace('net',' ').split())
         if arguments >= 2:
-            args = ['halcmd', 'net']
-            split = netString.lower().replace('net',' ').split()
-            for arg in split:
-                args.append(arg)
+            args = netString.lower().replace('net',' ').split()
         else:
             ACTION.SET_ERROR_MESSAGE('NET ERROR:\nnet requires at least 2 arguments, {} given\n'.format(arguments))
             return
-        reply = subprocess.Popen(args, stderr=subprocess.PIPE)
-        stdout, stderr = reply.communicate()
-        if stderr:
-            error = stderr.decode().replace('<commandline>:0:', '').strip()
+        try:
+            hal.net(*args)
+        except hal.error as e:
+            error = str(e).replace('<commandline>:0:', '').strip()
             ACTION.SET_ERROR_MESSAGE('NET ERROR:\n{}\n'.format(error))
 
     def spindle_inhibit(self, state):
@@ -3,8 +3,10 @@
 """
 from re import match
 from enum import Enum
+from collections import deque, namedtuple
 from pyhal import *
 from struct import *
+import numpy
 import time
 
 class ProgrammerException(Exception):
@@ -23,6 +25,56 @@ class FaultCodes(Enum):
 
 """the fault code representing no error from raster"""
 
+BINARY_HEADER = Struct("=4siidd")
+"""header of a binary program line: magic, bpp, count, offset, ppu"""
+BINARY_MAGIC = b"RSTB"
+
+ALLOWED_BPP = set([4, 8, 12, 16, 20, 24, 28, 32])
+
+LineStatistics = namedtuple("LineStatistics", "line bytes fill underrun")
+"""
+    What happened to a line of a queued image when it was started:
+        line - the index of the line in the image
+        bytes - the size of the line in the port
+        fill - the fraction of the port used, the line and those queued behind it
+        underrun - True if the line was not in the port yet and had to be written first
+"""
+
+
+def pack_pixels(pixels, bpp):
+    """
+        Packs integer pixel values for binary programming, returning an array of bytes with one row per line.
+
+        pixels - a 2D array with one line of pixel values per row, or a single line. A value with all bpp bits set is off.
+        bpp - bits per pixel in increments of 4 bits, up to 32 bits
+
+        Each pixel takes bpp / 4 nibbles, most significant first, two nibbles to a byte: the same digits as the
+        hexadecimal text format.
+    """
+    if bpp not in ALLOWED_BPP:
+        raise ProgrammerException("bpp must be one of {0}. Given: {1}".format(ALLOWED_BPP, bpp))
+
+    pixels = numpy.asarray(pixels)
+    if pixels.ndim == 1:
+        pixels = pixels[None]
+    if pixels.ndim != 2 or pixels.dtype.kind not in "ui":
+        raise ProgrammerException("pixels must be lines of integer pixel values")
+    if pixels.size and (pixels.min() < 0 or int(pixels.max()) >= 1 << bpp):
+        raise ProgrammerException("pixel values must fit in {0} bits".format(bpp))
+
+    lines, count = pixels.shape
+    if bpp in (8, 16, 32):
+        # whole bytes, big endian so the most significant nibble comes first
+        return pixels.astype(">u{0}".format(bpp // 8)).view(numpy.uint8).reshape(lines, -1)
+
+    nibbles = bpp // 4
+    shifts = numpy.arange(nibbles - 1, -1, -1, dtype=numpy.uint32) * 4
+    digits = ((pixels.astype(numpy.uint32)[..., None] >> shifts) & 0xF).astype(numpy.uint8)
+    digits = digits.reshape(lines, count * nibbles)
+    if digits.shape[1] % 2:
+        digits = numpy.concatenate([digits, numpy.zeros((lines, 1), numpy.uint8)], axis=1)
+    return (digits[:, 0::2] << 4) | digits[:, 1::2]
+
 
 class RasterProgrammer(object):
     """
@@ -62,6 +114,12 @@ class RasterProgrammer(object):
 
         self.run.value = False
 
+        self.__frames = None
+        self.__queued = deque()
+        self.__lookahead = 1
+        self.__line = 0
+        self.statistics = []
+
     def __del__(self):
         self.component.exit()
 
@@ -79,7 +137,93 @@ class RasterProgrammer(object):
             if self.faultCode.value != FaultCodes.OK.value:
                 self.run.value = False
                 raise ProgrammerException("Raster faulted with error {0}".format(FaultCodes(self.faultCode.value)))
-        
+
+    def __waitWritable(self, count):
+        timeout = time.process_time() + self.__timeout
+        while self.port.writable() < count:
+            if time.process_time() > timeout:
+                self.run.value = False
+                raise ProgrammerException("raster port appears to be full. Try enlarging the port buffer size")
+
+            if self.faultCode.value != FaultCodes.OK.value:
+                self.run.value = False
+                raise ProgrammerException("Raster faulted with error {0}".format(FaultCodes(self.faultCode.value)))
+
+    def __fill(self):
+        """writes queued image lines to the port while there is room and lookahead allows"""
+        while self.__frames and len(self.__queued) < self.__lookahead \
+              and self.port.writable() >= len(self.__frames[0]):
+            frame = self.__frames.popleft()
+            if not self.port.write(frame):
+                self.__frames.appendleft(frame)
+                break
+            self.__queued.append(frame)
+
+    def image(self, pixels, bpp, ppu, offset, width=None, lookahead=1):
+        """
+            Queues a whole image for binary programming, one program line per row of pixels.
+            Each following start() runs the next line; stop() ends it as usual.
+
+            pixels - integer pixel values: a 2D array with one line per row, or a buffer of values (such as bytes
+                     of 8 bit pixels) together with width
+            bpp - Bits per pixel in increments of 4 bits, up to 32 bits
+            ppu - pixels per unit
+            offset - the relative starting position of every line, or a sequence with one per line
+            width - the number of pixels per line when pixels is a flat buffer
+            lookahead - how many lines are written to the port ahead of the running line. The default of 1 keeps
+                        the next line in the port while one runs. The port must hold lookahead + 1 lines.
+
+            Statistics of each line started are added to the statistics list as LineStatistics.
+        """
+        self.__waitEnabled(False)
+        if self.__queued or self.__frames:
+            raise ProgrammerException("Another image is still queued")
+
+        if not isinstance(bpp, int) or not bpp in ALLOWED_BPP:
+            raise ProgrammerException("bpp must be one of {0}. Given: {1}".format(ALLOWED_BPP, bpp))
+
+        if ppu <= 0.0:
+            raise ProgrammerException("ppu must be greater than 0. Given: {0}".format(ppu))
+
+        if width is not None:
+            if isinstance(pixels, (bytes, bytearray, memoryview)):
+                pixels = numpy.frombuffer(pixels, numpy.uint8)
+            pixels = numpy.asarray(pixels).reshape(-1, width)
+        pixels = numpy.asarray(pixels)
+        if pixels.ndim == 1:
+            pixels = pixels[None]
+        packed = pack_pixels(pixels, bpp)
+        lines, count = pixels.shape
+
+        if count < 2:
+            raise ProgrammerException("count must be greater than 1. Given: {0}".format(count))
+
+        offsets = numpy.broadcast_to(numpy.asarray(offset, numpy.float64), (lines,))
+        frames = deque(BINARY_HEADER.pack(BINARY_MAGIC, bpp, count, o, ppu) + row.tobytes()
+                       for o, row in zip(offsets.tolist(), packed))
+        if frames and len(frames[0]) > self.port.size():
+            raise ProgrammerException("a line of {0} bytes does not fit the raster port of {1} bytes".format(
+                len(frames[0]), self.port.size()))
+
+        self.bpp = bpp
+        self.ppu = ppu
+        self.__frames = frames
+        self.__queued = deque()
+        self.__lookahead = max(1, lookahead)
+        self.__line = 0
+        self.statistics = []
+        self.__fill()
+
+    @property
+    def linesLeft(self):
+        """the number of lines of the queued image not started yet"""
+        return len(self.__queued) + len(self.__frames or ())
+
+    @property
+    def underruns(self):
+        """the number of lines of the image that were not in the port when they were started"""
+        return sum(1 for s in self.statistics if s.underrun)
+
     def begin(self, offset, bpp, ppu, count):
         """
             Sends the program begin command along with relevant parameters.
@@ -92,7 +236,11 @@ class RasterProgrammer(object):
         self.run.value = False
         self.__waitEnabled(False)
 
-        allowedbpp = set([4, 8, 12, 16, 20, 24, 28, 32])
+        if self.__queued or self.__frames:
+            raise ProgrammerException("An image is still queued")
+        self.__frames = None
+
+        allowedbpp = ALLOWED_BPP
         if not isinstance(bpp, int):
             raise ProgrammerException("bpp must be an integer")
 
@@ -142,8 +290,26 @@ class RasterProgrammer(object):
             self.enabled.value = False
             raise ProgrammerException("Raster cannot start. It is already running.")
 
+        if self.__frames is not None:
+            underrun = not self.__queued
+            if underrun:
+                if not self.__frames:
+                    raise ProgrammerException("All lines of the image have been run")
+                frame = self.__frames.popleft()
+                self.__waitWritable(len(frame))
+                self.port.write(frame)
+                self.__queued.append(frame)
+            frame = self.__queued.popleft()
+            size = self.port.size()
+            self.statistics.append(LineStatistics(self.__line, len(frame),
+                                                  (size - self.port.writable()) / size, underrun))
+            self.__line += 1
+
         self.run.value = True
         self.__waitEnabled(True)
+        if self.__frames is not None:
+            # write the next lines while this one runs
+            self.__fill()
 
     def stop(self):
         """
@@ -152,3 +318,5 @@ class RasterProgrammer(object):
         """
         self.run.value = False
         self.__waitEnabled(False)
+        if self.__frames is not None:
+            self.__fill()
@@ -16,16 +16,21 @@
 #    Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
 
 from rs274 import Translated, ArcsToSegmentsMixin
+from rs274.segments import SegmentStore, motion_dtype
+from rs274.loader import PreviewLoader, parse_lock
+from rs274.vbo import ProgramRenderer
+from rs274.spatial import SegmentGrid, display_coords
 from OpenGL.GL import *
 from OpenGL.GLU import *
 import math
+import numpy
 import hershey
 import linuxcnc
 import array
 import gcode
 import os
 import re
-from functools import reduce
+import time
 
 def minmax(*args):
     return min(*args), max(*args)
@@ -95,20 +100,36 @@ VY = 1
 VZ = 2
 VP = 3
 
+# motions handed to the preview canons at a time
+MOTION_BATCH_SIZE = 4096
+
 class GLCanon(Translated, ArcsToSegmentsMixin):
     lineno = -1
+    # set to a positive number of records, e.g. MOTION_BATCH_SIZE, to let
+    # gcode.parse hand motions over in batches (see motion_batch) instead of
+    # one callback per move.  Only suitable when straight_traverse,
+    # straight_feed, straight_probe, arc_feed and rotate_and_translate are not
+    # overridden.
+    motion_batch_size = 0
     def __init__(self, colors, geometry, is_foam=0, foam_w=1.5, foam_z=0.0):
-        # traverse list of tuples - [(line number, (start position), (end position), (tlo x, tlo y, tlo z))]
-        self.traverse = []
-        # feed list of tuples - [(line number, (start position), (end position), feedrate, (tlo x, tlo y, tlo z))]
-        self.feed = []
-        # arcfeed list of tuples - [(line number, (start position), (end position), feedrate, (tlo x, tlo y, tlo z))]
-        self.arcfeed = []
+        # the segment lists are SegmentStores - columns of line number, start position,
+        # end position, feedrate and (tlo x, tlo y, tlo z); iterating one still gives
+        # the tuples (line number, (start position), (end position), [feedrate,] (tlo x, tlo y, tlo z))
+        # traverse segments - the feedrate column is unused
+        self.traverse = SegmentStore(has_feedrate=False)
+        # feed segments
+        self.feed = SegmentStore()
+        # arcfeed segments
+        self.arcfeed = SegmentStore()
         # dwell list - [line number, color, pos x, pos y, pos z, plane]
         self.dwells = []
         self.tool_list = []
-        # preview list - combines the unrotated points of the lists: self.traverse, self.feed, self.arcfeed
-        self.preview_zero_rxy = []
+        # where the tools change - (tool, number of traverse, feed and arcfeed segments before the change)
+        self.tool_changes = []
+        # dwell times - (line number, seconds, number of tool changes before the dwell)
+        self.dwell_durations = []
+        # preview segments - combines the unrotated points of self.feed, self.arcfeed, self.traverse
+        self.preview_zero_rxy = SegmentStore()
         self.choice = None
         self.feedrate = 1
         self.lo = (0,) * 9
@@ -157,7 +178,11 @@ class GLCanon(Translated, ArcsToSegmentsMixin):
         self.foam_w = foam_w
         self.notify = 0
         self.notify_message = ""
+        # every notify message of the program, for previews restored from a cache
+        self.notify_history = []
         self.highlight_line = None
+        self._spatial_index = None
+        self._spatial_built = False
 
     def comment(self, arg):
         if arg.startswith("AXIS,") or arg.startswith("PREVIEW,"):
@@ -187,6 +212,7 @@ class GLCanon(Translated, ArcsToSegmentsMixin):
                 self.notify_message = "(AXIS,notify):" + str(self.notify)
                 if len(parts) > 2:
                     if len(parts[2]): self.notify_message = parts[2]
+                self.notify_history.append(self.notify_message)
 
     def message(self, message): pass
 
@@ -221,7 +247,9 @@ class GLCanon(Translated, ArcsToSegmentsMixin):
     def draw_dwells(self, dwells, alpha, for_selection, j0=0):
         return linuxcnc.draw_dwells(self.geometry, dwells, alpha, for_selection, self.is_lathe())
 
-    def calc_extents(self):
+    # zero_rxy=False skips the extents at zero rotation, which need a copy of every segment;
+    # that is good enough for the partial preview shown while a program is loading
+    def calc_extents(self, zero_rxy=True):
         # in the event of a "blank" gcode file (M2 only for example) this sets each of the extents to [0,0,0]
         # to prevent passing the very large [9e99,9e99,9e99] values and populating the gcode properties with
         # unusably large values. Some screens use the extents information to set the view distance so 0 values are preferred.
@@ -236,8 +264,9 @@ class GLCanon(Translated, ArcsToSegmentsMixin):
             self.max_extents_notool_zero_rxy = [0,0,0]
             return
         self.min_extents, self.max_extents, self.min_extents_notool, self.max_extents_notool = gcode.calc_extents(self.arcfeed, self.feed, self.traverse)
-        self.unrotate_preview()
-        self.min_extents_zero_rxy, self.max_extents_zero_rxy, self.min_extents_notool_zero_rxy, self.max_extents_notool_zero_rxy = gcode.calc_extents(self.preview_zero_rxy)
+        if zero_rxy:
+            self.unrotate_preview()
+            self.min_extents_zero_rxy, self.max_extents_zero_rxy, self.min_extents_notool_zero_rxy, self.max_extents_notool_zero_rxy = gcode.calc_extents(self.preview_zero_rxy)
         if self.is_foam:
             min_z = min(self.foam_z, self.foam_w)
             max_z = max(self.foam_z, self.foam_w)
@@ -250,34 +279,19 @@ class GLCanon(Translated, ArcsToSegmentsMixin):
 
     # unrotates the current preview points defined by self.feed, self.arcfeed, self.traverse
     # by the current rotation_xy amount and populates self.preview_zero_rxy. Because this is
-    # only used to calculate the extents and not to draw to the screen, this can all be contained in the same list.
+    # only used to calculate the extents and not to draw to the screen, this can all be contained in the same store.
     def unrotate_preview(self):
         angle = math.radians(-self.rotation_xy)
         cos = math.cos(angle)
         sin = math.sin(angle)
-        g5x_x = self.g5x_offset_x
-        g5x_y = self.g5x_offset_y
-        for movelist in self.feed, self.arcfeed:
-            for linenum, start, end, feed, tooloffset in movelist:
-                tsx = start[0] - g5x_x
-                tsy = start[1] - g5x_y
-                tex = end[0] - g5x_x
-                tey = end[1] - g5x_y
-                rsx = (tsx * cos) - (tsy * sin) + g5x_x
-                rsy = (tsx * sin) + (tsy * cos) + g5x_y
-                rex = (tex * cos) - (tey * sin) + g5x_x
-                rey = (tex * sin) + (tey * cos) + g5x_y
-                self.preview_zero_rxy.append((linenum, (rsx, rsy) + start[2:], (rex, rey) + end[2:], feed, tooloffset))
-        for linenum, start, end, tooloffset in self.traverse:
-            tsx = start[0] - g5x_x
-            tsy = start[1] - g5x_y
-            tex = end[0] - g5x_x
-            tey = end[1] - g5x_y
-            rsx = (tsx * cos) - (tsy * sin) + g5x_x
-            rsy = (tsx * sin) + (tsy * cos) + g5x_y
-            rex = (tex * cos) - (tey * sin) + g5x_x
-            rey = (tex * sin) + (tey * cos) + g5x_y
-            self.preview_zero_rxy.append((linenum, (rsx, rsy) + start[2:], (rex, rey) + end[2:], tooloffset))
+        g5x_xy = numpy.array([self.g5x_offset_x, self.g5x_offset_y])
+        rot = numpy.array([[cos, sin], [-sin, cos]])
+        preview = SegmentStore(capacity=len(self.feed) + len(self.arcfeed) + len(self.traverse))
+        for movelist in self.feed, self.arcfeed, self.traverse:
+            preview.extend(movelist)
+        for points in preview.start, preview.end:
+            points[:, :2] = (points[:, :2] - g5x_xy) @ rot + g5x_xy
+        self.preview_zero_rxy = preview
 
     def tool_offset(self, xo, yo, zo, ao, bo, co, uo, vo, wo):
         self.first_move = True
@@ -302,6 +316,7 @@ class GLCanon(Translated, ArcsToSegmentsMixin):
         self.first_move = True
         try:
             self.tool_list.append(arg)
+            self.tool_changes.append((arg, len(self.traverse), len(self.feed), len(self.arcfeed)))
         except Exception as e:
             print(e)
 
@@ -309,7 +324,7 @@ class GLCanon(Translated, ArcsToSegmentsMixin):
         if self.suppress > 0: return
         l = self.rotate_and_translate(x,y,z,a,b,c,u,v,w)
         if not self.first_move:
-                self.traverse.append((self.lineno, self.lo, l, (self.xo, self.yo, self.zo)))
+                self.traverse.append(self.lineno, self.lo, l, 0, (self.xo, self.yo, self.zo))
         self.lo = l
 
     def rigid_tap(self, x, y, z):
@@ -318,9 +333,9 @@ class GLCanon(Translated, ArcsToSegmentsMixin):
         l = self.rotate_and_translate(x,y,z,0,0,0,0,0,0)[:3]
         l += (self.lo[3], self.lo[4], self.lo[5],
                self.lo[6], self.lo[7], self.lo[8])
-        self.feed.append((self.lineno, self.lo, l, self.feedrate, (self.xo, self.yo, self.zo)))
+        self.feed.append(self.lineno, self.lo, l, self.feedrate, (self.xo, self.yo, self.zo))
         # self.dwells.append((self.lineno, self.colors['dwell'], x + self.offset_x, y + self.offset_y, z + self.offset_z, 0))
-        self.feed.append((self.lineno, l, self.lo, self.feedrate, (self.xo, self.yo, self.zo)))
+        self.feed.append(self.lineno, l, self.lo, self.feedrate, (self.xo, self.yo, self.zo))
 
     def arc_feed(self, *args):
         if self.suppress > 0: return
@@ -333,28 +348,53 @@ class GLCanon(Translated, ArcsToSegmentsMixin):
 
     def straight_arcsegments(self, segs):
         self.first_move = False
-        lo = self.lo
-        lineno = self.lineno
-        feedrate = self.feedrate
-        to = (self.xo, self.yo, self.zo)
-        append = self.arcfeed.append
-        for l in segs:
-            append((lineno, lo, l, feedrate, to))
-            lo = l
-        self.lo = lo
+        self.lo = self.arcfeed.extend_path(self.lineno, self.lo, segs,
+                    self.feedrate, (self.xo, self.yo, self.zo))
 
     def straight_feed(self, x,y,z, a,b,c, u,v,w):
         if self.suppress > 0: return
         self.first_move = False
         l = self.rotate_and_translate(x,y,z,a,b,c,u,v,w)
-        self.feed.append((self.lineno, self.lo, l, self.feedrate, (self.xo, self.yo, self.zo)))
+        self.feed.append(self.lineno, self.lo, l, self.feedrate, (self.xo, self.yo, self.zo))
         self.lo = l
 
+    def motion_batch(self, buffer):
+        if self.suppress > 0: return
+        records = numpy.frombuffer(buffer, motion_dtype)
+        if not len(records): return
+        kind = records['kind']
+        end = records['pos']
+        start = numpy.empty_like(end)
+        start[0] = self.lo
+        start[1:] = end[:-1]
+        moves = numpy.flatnonzero(kind != gcode.MOTION_TRAVERSE)
+        # like straight_traverse, drop the rapids before the first move after a tool change
+        if self.first_move and len(moves):
+            first = moves[0]
+        elif self.first_move:
+            first = len(kind)
+        else:
+            first = 0
+        if len(moves): self.first_move = False
+        to = (self.xo, self.yo, self.zo)
+        for movekind, movelist in ((gcode.MOTION_TRAVERSE, self.traverse),
+                                   (gcode.MOTION_FEED, self.feed),
+                                   (gcode.MOTION_ARC, self.arcfeed)):
+            idx = numpy.flatnonzero(kind == movekind)
+            feedrate = self.feedrate
+            if movekind == gcode.MOTION_TRAVERSE:
+                idx = idx[idx >= first]
+                feedrate = 0
+            if len(idx):
+                movelist.extend_arrays(records['lineno'][idx], start[idx], end[idx],
+                        feedrate, to)
+        self.lo = tuple(end[-1].tolist())
+
     def straight_probe(self, x,y,z, a,b,c, u,v,w):
         if self.suppress > 0: return
         self.first_move = False
         l = self.rotate_and_translate(x,y,z,a,b,c,u,v,w)
-        self.feed.append((self.lineno, self.lo, l, self.feedrate, (self.xo, self.yo, self.zo)))
+        self.feed.append(self.lineno, self.lo, l, self.feedrate, (self.xo, self.yo, self.zo))
         self.lo = l
 
     def user_defined_function(self, i, p, q):
@@ -365,45 +405,88 @@ class GLCanon(Translated, ArcsToSegmentsMixin):
     def dwell(self, arg):
         if self.suppress > 0: return
         self.dwell_time += arg
+        self.dwell_durations.append((self.lineno, arg, len(self.tool_changes)))
         color = self.colors['dwell']
         self.dwells.append((self.lineno, color, self.lo[0], self.lo[1], self.lo[2], int(self.state.plane/10-17)))
 
-    def highlight(self, lineno, geometry):
+    # draw_segments=False only draws the dwells, for renderers that draw
+    # the highlighted segments themselves
+    def highlight(self, lineno, geometry, draw_segments=True):
         glLineWidth(3)
         glColor3f(*self.colors['selected'])
-        glBegin(GL_LINES)
+        if draw_segments: glBegin(GL_LINES)
         coords = []
-        for line in self.traverse:
-            if line[0] != lineno: continue
-            linuxcnc.line9(geometry, line[1], line[2])
-            coords.append(line[1][:3])
-            coords.append(line[2][:3])
-        for line in self.arcfeed:
-            if line[0] != lineno: continue
-            linuxcnc.line9(geometry, line[1], line[2])
-            coords.append(line[1][:3])
-            coords.append(line[2][:3])
-        for line in self.feed:
-            if line[0] != lineno: continue
-            linuxcnc.line9(geometry, line[1], line[2])
-            coords.append(line[1][:3])
-            coords.append(line[2][:3])
-        glEnd()
+        for movelist in self.traverse, self.arcfeed, self.feed:
+            idx = movelist.segments_for_line(lineno)
+            if not len(idx): continue
+            start = movelist.start[idx]
+            end = movelist.end[idx]
+            if draw_segments:
+                for p1, p2 in zip(start.tolist(), end.tolist()):
+                    linuxcnc.line9(geometry, p1, p2)
+            coords.append(start[:, :3])
+            coords.append(end[:, :3])
+        if draw_segments: glEnd()
         for line in self.dwells:
             if line[0] != lineno: continue
             self.draw_dwells([(line[0], self.colors['selected']) + line[2:]], 2, 0)
-            coords.append(line[2:5])
+            coords.append(numpy.array([line[2:5]]))
         glLineWidth(1)
         if coords:
-            x = reduce(lambda _x, _y: _x+_y, [p[0] for p in coords]) / len(coords)
-            y = reduce(lambda _x, _y: _x+_y, [p[1] for p in coords]) / len(coords)
-            z = reduce(lambda _x, _y: _x+_y, [p[2] for p in coords]) / len(coords)
+            x, y, z = numpy.concatenate(coords).mean(axis=0).tolist()
         else:
             x = (self.min_extents[X] + self.max_extents[X])/2
             y = (self.min_extents[Y] + self.max_extents[Y])/2
             z = (self.min_extents[Z] + self.max_extents[Z])/2
         return x, y, z
 
+    # kinds of segment in the spatial index
+    INDEX_TRAVERSE, INDEX_FEED, INDEX_ARC, INDEX_DWELL = range(4)
+
+    def spatial_index(self):
+        """SegmentGrid of the displayed segments and dwells, or None when
+        the preview can't be indexed (foam, rotary axes in the geometry)
+
+        The grid is built on first use and kept until build_indexes, so
+        picks during a background load don't rebuild it every time."""
+        if self._spatial_built: return self._spatial_index
+        self._spatial_built = True
+        self._spatial_index = None
+        if self.is_foam or display_coords(numpy.zeros((0, 9)), self.geometry) is None:
+            return None
+        start = []
+        end = []
+        lineno = []
+        kind = []
+        for k, movelist in enumerate((self.traverse, self.feed, self.arcfeed)):
+            start.append(display_coords(movelist.start, self.geometry))
+            end.append(display_coords(movelist.end, self.geometry))
+            lineno.append(movelist.lineno)
+            kind.append(numpy.full(len(movelist), k))
+        if self.dwells:
+            dwells = numpy.array([d[2:5] for d in self.dwells], numpy.float64)
+            start.append(dwells)
+            end.append(dwells)
+            lineno.append(numpy.array([d[0] for d in self.dwells]))
+            kind.append(numpy.full(len(self.dwells), self.INDEX_DWELL))
+        self._spatial_index = SegmentGrid(numpy.concatenate(start), numpy.concatenate(end),
+                numpy.concatenate(lineno), numpy.concatenate(kind))
+        return self._spatial_index
+
+    # built once loading is done, so the first highlight or pick doesn't wait
+    def build_indexes(self):
+        for movelist in self.traverse, self.feed, self.arcfeed:
+            movelist.line_index()
+        self._spatial_built = False
+        self.spatial_index()
+
+    def line_near(self, pos):
+        """Line number of the feed or arc nearest pos, a 9-axis position"""
+        index = self.spatial_index()
+        if index is None: return None
+        p = display_coords(numpy.array([pos], numpy.float64), self.geometry)[0]
+        return index.nearest(p, (self.INDEX_FEED, self.INDEX_ARC))
+
     def color_with_alpha(self, colorname):
         glColor4f(*(self.colors[colorname] + (self.colors.get(colorname+'_alpha', 1/3.),)))
     def color(self, colorname):
@@ -623,6 +706,24 @@ class GlCanonDraw:
 
     def select(self, x_view, y_view):
         if self.canon is None: return
+        index = self.canon.spatial_index()
+        if index is not None:
+            vport = glGetIntegerv(GL_VIEWPORT)
+            kinds = None
+            if not self.get_show_rapids():
+                kinds = (self.canon.INDEX_FEED, self.canon.INDEX_ARC, self.canon.INDEX_DWELL)
+            self.set_highlight_line(index.pick(x_view, vport[3]-y_view,
+                glGetDoublev(GL_MODELVIEW_MATRIX), glGetDoublev(GL_PROJECTION_MATRIX),
+                vport, kinds=kinds))
+            return
+        renderer = self.get_program_renderer()
+        # the program renderer picks by color instead of GL_SELECT, but only
+        # its lines: the dwells are picked from the selection lists
+        if renderer and not self.canon.dwells:
+            vport = glGetIntegerv(GL_VIEWPORT)
+            self.set_highlight_line(renderer.select(self.canon, self.canon.colors,
+                self.get_show_rapids(), x_view, vport[3]-y_view))
+            return
         pmatrix = glGetDoublev(GL_PROJECTION_MATRIX)
         glMatrixMode(GL_PROJECTION)
         glPushMatrix()
@@ -659,6 +760,14 @@ class GlCanonDraw:
         glPopMatrix()
         glMatrixMode(GL_MODELVIEW)
 
+    def line_near_tool(self):
+        """Line number of the feed or arc nearest the commanded tool position,
+        or None"""
+        if self.canon is None: return None
+        s = self.stat
+        position = [p - o for p, o in zip(s.position, s.tool_offset)]
+        return self.canon.line_near(self.to_internal_units(position))
+
     def dlist(self, listname, n=1, gen=lambda n: None):
         if listname not in self._dlists:
             base = glGenLists(n)
@@ -683,20 +792,23 @@ class GlCanonDraw:
         if line == self.get_highlight_line(): return
         self.update_highlight_variable(line)
         highlight = self.dlist('highlight')
+        # the program renderer draws highlighted segments from a uniform,
+        # leaving only the dwells to the list
+        draw_segments = self.get_program_renderer() is None
         glNewList(highlight, GL_COMPILE)
         if line is not None and self.canon is not None:
             if self.is_foam():
                 glPushMatrix()
                 glTranslatef(0, 0, self.get_foam_z())
-                x, y, z = self.canon.highlight(line, "XY")
+                x, y, z = self.canon.highlight(line, "XY", draw_segments)
                 glTranslatef(0, 0, self.get_foam_w()-self.get_foam_z())
-                u, v, w = self.canon.highlight(line, "UV")
+                u, v, w = self.canon.highlight(line, "UV", draw_segments)
                 glPopMatrix()
                 x = (x+u)/2
                 y = (y+v)/2
                 z = (self.get_foam_z() + self.get_foam_w())/2
             else:
-                x, y, z = self.canon.highlight(line, self.get_geometry())
+                x, y, z = self.canon.highlight(line, self.get_geometry(), draw_segments)
         elif self.canon is not None:
             x = (self.canon.min_extents[X] + self.canon.max_extents[X])/2
             y = (self.canon.min_extents[Y] + self.canon.max_extents[Y])/2
@@ -706,6 +818,21 @@ class GlCanonDraw:
         glEndList()
         self.set_centerpoint(x, y, z)
 
+    # set to draw the program with vertex buffers and shaders (see rs274.vbo)
+    # instead of display lists
+    use_vbo = False
+    program_renderer = None
+
+    def get_program_renderer(self):
+        if not self.use_vbo: return None
+        if self.program_renderer is None:
+            try:
+                self.program_renderer = ProgramRenderer()
+            except Exception as e:
+                print("Vertex buffer preview not available, using display lists:", e)
+                self.use_vbo = False
+        return self.program_renderer
+
     @with_context_swap
     def redraw_perspective(self):
 
@@ -1315,9 +1442,15 @@ class GlCanonDraw:
                 glEnable(GL_BLEND)
                 glBlendFunc(GL_SRC_ALPHA, GL_ONE_MINUS_SRC_ALPHA)
 
-            if self.get_show_rapids():
-                glCallList(self.dlist('program_rapids', gen=self.make_main_list))
-            glCallList(self.dlist('program_norapids', gen=self.make_main_list))
+            renderer = self.get_program_renderer()
+            if renderer:
+                renderer.draw(self.canon, self.canon.colors if self.canon else self.colors,
+                        self.get_show_rapids(), self.get_highlight_line())
+                glCallList(self.dlist('program_dwells', gen=self.make_dwell_list))
+            else:
+                if self.get_show_rapids():
+                    glCallList(self.dlist('program_rapids', gen=self.make_main_list))
+                glCallList(self.dlist('program_norapids', gen=self.make_main_list))
             glCallList(self.dlist('highlight'))
 
             if self.get_program_alpha():
@@ -1999,20 +2132,134 @@ class GlCanonDraw:
         if self.canon: self.canon.draw(0, False)
         glEndList()
 
+    def make_dwell_list(self, n):
+        glNewList(n, GL_COMPILE)
+        if self.canon:
+            glLineWidth(2)
+            self.canon.draw_dwells(self.canon.dwells,
+                int(self.canon.colors.get('dwell_alpha', 1/3.)), 0)
+            glLineWidth(1)
+        glEndList()
+
+    def stale_program_dlists(self):
+        self.stale_dlist('program_rapids')
+        self.stale_dlist('program_norapids')
+        self.stale_dlist('select_rapids')
+        self.stale_dlist('select_norapids')
+        self.stale_dlist('program_dwells')
+        if self.program_renderer is not None:
+            self.program_renderer.set_stale()
+
+    # set to an rs274.previewcache.PreviewCache to reuse the previews of
+    # programs parsed before in the same context
+    preview_cache = None
+
+    def preview_cache_key(self, f, canon, args):
+        if self.preview_cache is None: return None
+        canon_key = (type(canon).__name__, canon.geometry, canon.is_lathe(),
+                canon.is_foam, canon.foam_z, canon.foam_w, canon.arcdivision)
+        try:
+            return self.preview_cache.key(f, args, canon_key)
+        except Exception as e:
+            print("preview cache: %s" % e)
+            return None
+
+    def store_preview(self, key, canon, result, seq):
+        if key is None or getattr(canon, "aborted", False) or result > gcode.MIN_ERROR: return
+        try:
+            self.preview_cache.store(key, canon, result, seq)
+        except Exception as e:
+            print("preview cache: %s" % e)
+
     def load_preview(self, f, canon, *args):
+        # a background load would hold the parser until it is done
+        self.cancel_preview()
         self.set_canon(canon)
-        result, seq = gcode.parse(f, canon, *args)
+        key = self.preview_cache_key(f, canon, args)
+        cached = key and self.preview_cache.load(key, canon)
+        if cached:
+            result, seq = cached
+        else:
+            with parse_lock:
+                result, seq = gcode.parse(f, canon, *args)
+            self.store_preview(key, canon, result, seq)
 
         if result <= gcode.MIN_ERROR:
             self.canon.progress.nextphase(1)
             canon.calc_extents()
-            self.stale_dlist('program_rapids')
-            self.stale_dlist('program_norapids')
-            self.stale_dlist('select_rapids')
-            self.stale_dlist('select_norapids')
+            canon.build_indexes()
+            self.stale_program_dlists()
 
         return result, seq
 
+    # Background loading: start_preview parses the program in a worker thread
+    # (see rs274.loader) and the GUI calls poll_preview from its periodic
+    # timer.  While the load runs, the program display lists are rebuilt from
+    # the segments stored so far, but no more often than it takes to build
+    # them a few times over, so big programs don't spend their time redrawing.
+    preview_loader = None
+    preview_refresh_interval = .5
+
+    def start_preview(self, f, canon, *args):
+        self.cancel_preview()
+        self.set_canon(canon)
+        self.stale_program_dlists()
+        self._preview_shown = 0
+        self._preview_refresh_time = time.time()
+        self._preview_refresh_cost = 0
+        loader = PreviewLoader(f, canon, *args)
+        loader.cache_key = self.preview_cache_key(f, canon, args)
+        cached = loader.cache_key and self.preview_cache.load(loader.cache_key, canon)
+        if cached:
+            loader.cache_key = None
+            loader.finish(*cached)
+        else:
+            loader.start()
+        self.preview_loader = loader
+        return loader
+
+    def cancel_preview(self, wait=True):
+        loader = self.preview_loader
+        if loader is None: return
+        loader.cancel()
+        if wait:
+            loader.wait()
+            self.preview_loader = None
+
+    def poll_preview(self):
+        """Update the display of a background load.
+
+        Returns None while the load is running, otherwise the loader, whose
+        result/seq/exception hold the outcome of gcode.parse."""
+        loader = self.preview_loader
+        if loader is None: return None
+        if not loader.done():
+            now = time.time()
+            count = loader.segment_count()
+            if count != self._preview_shown and now - self._preview_refresh_time > \
+                    max(self.preview_refresh_interval, 4 * self._preview_refresh_cost):
+                self._preview_shown = count
+                self.canon.calc_extents(zero_rxy=False)
+                self.stale_program_dlists()
+                self.redraw_preview()
+                self._preview_refresh_time = time.time()
+                self._preview_refresh_cost = self._preview_refresh_time - now
+            return None
+        self.preview_loader = None
+        if loader.exception is None and loader.result <= gcode.MIN_ERROR:
+            if not loader.interrupted:
+                self.store_preview(loader.cache_key, self.canon, loader.result, loader.seq)
+            self.canon.calc_extents()
+        else:
+            self.canon.calc_extents(zero_rxy=False)
+        # also drops an index built by a pick while the load ran
+        self.canon.build_indexes()
+        self.stale_program_dlists()
+        return loader
+
+    # called to show the partial program while loading in the background
+    def redraw_preview(self): pass
+
     def from_internal_units(self, pos, unit=None):
         if unit is None:
             unit = self.stat.linear_units
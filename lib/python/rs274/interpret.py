@@ -14,7 +14,7 @@
 #    You should have received a copy of the GNU General Public License
 #    along with this program; if not, write to the Free Software
 #    Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
-import math, gcode
+import bisect, math, gcode
 
 class Translated:
     g92_offset_x = g92_offset_y = g92_offset_z = 0
@@ -139,6 +139,10 @@ class StatMixin:
         self.s = s
         self.tools = list(s.tool_table)
         self.random = r
+        # tool number -> the indexes in self.tools[1:] holding it, in order
+        self.tool_indexes = {}
+        for index, tool in enumerate(self.tools[1:], 1):
+            self.tool_indexes.setdefault(tool.id, []).append(index)
 
     def change_tool(self, tool_nr):
         global tool_in_spindle
@@ -146,6 +150,8 @@ class StatMixin:
         if self.random:
             self.tools[0], self.tools[idx] = self.tools[idx], self.tools[0]
             tool_in_spindle = idx
+            if idx:
+                self.move_index(self.tools[0].id, self.tools[idx].id, idx)
         elif idx==0:
             self.tools[0] = empty_spindle_data
         else:
@@ -160,13 +166,19 @@ class StatMixin:
         return empty_spindle_data
 
     def get_index(self, tool_nr):
-        index = 1
-        for tool in self.tools[1:]:
-            if tool.id == tool_nr:
-                return index
-            index = index + 1
+        indexes = self.tool_indexes.get(tool_nr)
+        if indexes:
+            return indexes[0]
         return 0
 
+    def move_index(self, old_id, new_id, index):
+        # self.tools[index] now holds tool new_id instead of old_id
+        indexes = self.tool_indexes[old_id]
+        indexes.remove(index)
+        if not indexes:
+            del self.tool_indexes[old_id]
+        bisect.insort(self.tool_indexes.setdefault(new_id, []), index)
+
     def get_external_angular_units(self):
         return self.s.angular_units or 1.0
 
@@ -0,0 +1,101 @@
+#    This is a component of AXIS, a front-end for emc
+#
+#    This program is free software; you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation; either version 2 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program; if not, write to the Free Software
+#    Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+import threading
+import gcode
+
+# gcode.parse keeps the interpreter and the canon in global variables, so
+# only one parse may run at a time, whatever thread it runs in.
+parse_lock = threading.Lock()
+
+def parse_if_idle(f, canon, *args):
+    """Run gcode.parse unless another parse is running.
+
+    Returns None right away instead of waiting when the parser is busy, e.g.
+    with a background load, so GUI-thread callers don't freeze until it is
+    done."""
+    if not parse_lock.acquire(blocking=False): return None
+    try:
+        return gcode.parse(f, canon, *args)
+    finally:
+        parse_lock.release()
+
+class PreviewLoader:
+    """Run gcode.parse for a canon in a worker thread.
+
+    The canon's segment stores fill up while the program is parsed.  The GUI
+    polls the loader from its own timer, draws whatever has been stored so
+    far and finishes up once done() is true, so its event loop keeps running
+    during the load.
+
+    All the canon callbacks run in the worker thread, so they must not call
+    into the GUI toolkit while a loader is running them.  The canon is told to
+    stop by setting its 'aborted' attribute; its check_abort (called by
+    gcode.parse about once a second) is expected to raise KeyboardInterrupt
+    when it sees it."""
+
+    def __init__(self, f, canon, *args):
+        self.f = f
+        self.canon = canon
+        self.args = args
+        self.result = None
+        self.seq = 0
+        self.exception = None
+        self.cancelled = False
+        self.interrupted = False
+        self.cache_key = None
+        self._done = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True,
+                                        name="preview-loader")
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def _run(self):
+        try:
+            with parse_lock:
+                if self.cancelled: raise KeyboardInterrupt
+                self.result, self.seq = gcode.parse(self.f, self.canon, *self.args)
+        except KeyboardInterrupt:
+            self.interrupted = True
+            self.result, self.seq = 0, 0
+        except Exception as e:
+            self.exception = e
+        finally:
+            self._done.set()
+
+    def finish(self, result, seq):
+        """Mark the load done without running it, e.g. when it was cached"""
+        self.result, self.seq = result, seq
+        self._done.set()
+        return self
+
+    def cancel(self):
+        self.cancelled = True
+        self.canon.aborted = True
+
+    def done(self):
+        return self._done.is_set()
+
+    def wait(self, timeout=None):
+        return self._done.wait(timeout)
+
+    def segment_count(self):
+        canon = self.canon
+        return len(canon.traverse) + len(canon.feed) + len(canon.arcfeed) + len(canon.dwells)
+
+# vim:ts=8:sts=4:sw=4:et:
@@ -0,0 +1,300 @@
+#    This is a component of AXIS, a front-end for emc
+#
+#    This program is free software; you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation; either version 2 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program; if not, write to the Free Software
+#    Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import numpy
+
+from rs274.segments import SegmentStore
+
+# On-disk cache of parsed previews.
+#
+# Parsing a big program is by far the slowest part of showing its preview,
+# and the result only depends on the program and on the interpreter context
+# it is parsed in.  A PreviewCache stores the segments, dwells, tool list and
+# final interpreter state a canon ends up with, under a key that covers
+#   - the contents of the program,
+#   - the arguments to gcode.parse (the init codes and interpreter name),
+#   - the canon settings that change what is stored (geometry, lathe, foam..),
+#   - the INI sections the interpreter and the preview read,
+#   - the parameter file and the tool table,
+#   - the files in the subroutine directories and the program's directory.
+# Any change to any of them gives a new key, so a stale entry is never used;
+# old entries are dropped once the cache grows past its size limit.
+#
+# Each entry is a directory holding one .npy file per segment column and an
+# info.json file with everything else.  The columns are memory mapped when an
+# entry is loaded, so a hit costs little more than opening the files; the
+# stores copy them into ordinary arrays if anything is appended later.
+
+# bump when the layout of an entry or what goes into a key changes
+CACHE_VERSION = 3
+
+# INI sections that can change how a program is parsed or previewed
+CONTEXT_SECTIONS = ('EMC', 'RS274NGC', 'EMCIO', 'TRAJ', 'DISPLAY', 'PYTHON')
+
+# Translated/GLCanon attributes that are restored along with the segments
+CANON_ATTRIBUTES = (
+    'g5x_offset_x', 'g5x_offset_y', 'g5x_offset_z',
+    'g5x_offset_a', 'g5x_offset_b', 'g5x_offset_c',
+    'g5x_offset_u', 'g5x_offset_v', 'g5x_offset_w',
+    'g92_offset_x', 'g92_offset_y', 'g92_offset_z',
+    'g92_offset_a', 'g92_offset_b', 'g92_offset_c',
+    'g92_offset_u', 'g92_offset_v', 'g92_offset_w',
+    'g5x_index', 'xo', 'yo', 'zo', 'ao', 'bo', 'co', 'uo', 'vo', 'wo',
+    'rotation_xy', 'rotation_sin', 'rotation_cos', 'lo', 'first_move',
+    'foam_z', 'foam_w', 'dwell_time', 'lineno',
+    'tool_changes', 'dwell_durations', 'notify_history')
+
+STORES = ('traverse', 'feed', 'arcfeed')
+COLUMNS = ('lineno', 'start', 'end', 'feedrate', 'tooloffset')
+
+def default_directory():
+    base = os.environ.get('XDG_CACHE_HOME') or os.path.expanduser('~/.cache')
+    return os.path.join(base, 'linuxcnc', 'preview')
+
+class CachedState:
+    """Stands in for the gcode.linecode last passed to next_line"""
+    _gcode_fields = {'sequence_number': 0, 'motion_mode': 1, 'block': 2,
+        'plane': 3, 'cutter_side': 4, 'units': 5, 'distance_mode': 6,
+        'feed_mode': 7, 'origin': 8, 'tool_length_offset': 9,
+        'retract_mode': 10, 'path_mode': 11}
+    _mcode_fields = {'stopping': 1, 'spindle': 2, 'toolchange': 3,
+        'mist': 4, 'flood': 5, 'overrides': 6}
+
+    def __init__(self, gcodes, mcodes, feed_rate, speed):
+        self.gcodes = tuple(gcodes)
+        self.mcodes = tuple(mcodes)
+        self.feed_rate = feed_rate
+        self.speed = speed
+
+    @classmethod
+    def from_state(cls, st):
+        return cls(st.gcodes, st.mcodes, st.feed_rate, st.speed)
+
+    def __getattr__(self, name):
+        if name in self._gcode_fields:
+            return self.gcodes[self._gcode_fields[name]]
+        if name in self._mcode_fields:
+            return self.mcodes[self._mcode_fields[name]]
+        raise AttributeError(name)
+
+def ini_sections(filename, sections):
+    """Return the text of the named sections of an INI file"""
+    result = []
+    keep = False
+    try:
+        f = open(filename, errors='replace')
+    except OSError:
+        return ''
+    with f:
+        for line in f:
+            stripped = line.strip()
+            if stripped.startswith('['):
+                keep = stripped.strip('[]').strip() in sections
+            elif keep and stripped and not stripped.startswith(('#', ';')):
+                result.append(stripped)
+    return '\n'.join(result)
+
+class PreviewCache:
+    def __init__(self, directory=None, max_bytes=256<<20, inifile=None, inipath=None):
+        self.directory = directory or default_directory()
+        self.max_bytes = max_bytes
+        self.inifile = inifile
+        self.inipath = inipath
+        # path -> (size, mtime, digest), so an unchanged program is not hashed twice
+        self._digests = {}
+
+    def file_digest(self, path):
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        stamp = st.st_size, st.st_mtime_ns, st.st_ino
+        cached = self._digests.get(path)
+        if cached and cached[0] == stamp: return cached[1]
+        h = hashlib.blake2b(digest_size=20)
+        with open(path, 'rb') as f:
+            while True:
+                block = f.read(1<<20)
+                if not block: break
+                h.update(block)
+        digest = h.hexdigest()
+        self._digests[path] = stamp, digest
+        return digest
+
+    def _ini_path(self, value):
+        if self.inipath and not os.path.isabs(value):
+            return os.path.join(os.path.dirname(self.inipath), value)
+        return value
+
+    def directory_listing(self, path, suffix=None):
+        """Names, sizes and modification times of the files in a directory"""
+        try:
+            names = sorted(os.listdir(path))
+        except OSError:
+            return ()
+        result = []
+        for name in names:
+            if suffix and not name.lower().endswith(suffix): continue
+            try:
+                st = os.stat(os.path.join(path, name))
+            except OSError:
+                continue
+            result.append((name, st.st_size, st.st_mtime_ns))
+        return result
+
+    def context(self, f):
+        """Everything outside the program itself that the preview depends on"""
+        ini = self.inifile
+        parts = []
+        if self.inipath:
+            parts.append(ini_sections(self.inipath, CONTEXT_SECTIONS))
+        if ini is not None:
+            for section, option in (('RS274NGC', 'PARAMETER_FILE'),
+                                    ('EMCIO', 'TOOL_TABLE')):
+                value = ini.find(section, option)
+                if value:
+                    path = self._ini_path(value)
+                    parts.append((path, self.file_digest(path)))
+            for section, option in (('RS274NGC', 'SUBROUTINE_PATH'),
+                                    ('RS274NGC', 'USER_M_PATH')):
+                for value in (ini.find(section, option) or '').split(':'):
+                    if not value: continue
+                    path = self._ini_path(value)
+                    parts.append((path, self.directory_listing(path)))
+        # called subroutines may also be found next to the program
+        program_dir = os.path.dirname(os.path.abspath(f))
+        parts.append((program_dir, self.directory_listing(program_dir, '.ngc')))
+        return parts
+
+    def key(self, f, args, canon_key):
+        program = self.file_digest(f)
+        if program is None: return None
+        text = repr((CACHE_VERSION, program, args, canon_key, self.context(f)))
+        return hashlib.blake2b(text.encode(), digest_size=20).hexdigest()
+
+    def load(self, key, canon):
+        """Fill canon from the entry for key
+
+        Returns (result, seq) as gcode.parse would have, or None on a miss."""
+        path = os.path.join(self.directory, key)
+        try:
+            with open(os.path.join(path, 'info.json')) as f:
+                info = json.load(f)
+            if info.get('version') != CACHE_VERSION: return None
+            stores = {}
+            for name in STORES:
+                columns = [numpy.load(os.path.join(path, '%s.%s.npy' % (name, column)),
+                                      mmap_mode='r')
+                           for column in COLUMNS]
+                stores[name] = SegmentStore.wrap(*columns,
+                                      has_feedrate=name != 'traverse')
+        except (OSError, ValueError, KeyError):
+            return None
+        for name, store in stores.items():
+            setattr(canon, name, store)
+        canon.dwells = [(d[0], tuple(d[1])) + tuple(d[2:]) for d in info['dwells']]
+        canon.tool_list = info['tool_list']
+        for name, value in info['attributes'].items():
+            setattr(canon, name, value)
+        if info['state'] is not None:
+            canon.state = CachedState(*info['state'])
+        # the messages a parse would have shown, for the GUI to show again
+        messages = getattr(canon, 'notify_messages', None)
+        if messages is not None:
+            messages.extend(getattr(canon, 'notify_history', ()))
+        # mark the entry as recently used
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return info['result'], info['seq']
+
+    def store(self, key, canon, result, seq):
+        """Save what canon holds after parsing under key"""
+        state = getattr(canon, 'state', None)
+        if state is not None:
+            state = CachedState.from_state(state)
+            state = [state.gcodes, state.mcodes, state.feed_rate, state.speed]
+        info = {
+            'version': CACHE_VERSION,
+            'result': result,
+            'seq': seq,
+            'dwells': canon.dwells,
+            'tool_list': canon.tool_list,
+            'attributes': {name: getattr(canon, name) for name in CANON_ATTRIBUTES
+                           if hasattr(canon, name)},
+            'state': state,
+        }
+        path = os.path.join(self.directory, key)
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            tmp = tempfile.mkdtemp(prefix='.tmp-', dir=self.directory)
+            try:
+                for name in STORES:
+                    store = getattr(canon, name)
+                    for column in COLUMNS:
+                        numpy.save(os.path.join(tmp, '%s.%s.npy' % (name, column)),
+                                   getattr(store, column))
+                with open(os.path.join(tmp, 'info.json'), 'w') as f:
+                    json.dump(info, f)
+                # readers only ever see complete entries
+                os.rename(tmp, path)
+            except Exception:
+                shutil.rmtree(tmp, ignore_errors=True)
+                raise
+        except OSError as e:
+            # another instance may have stored the same entry meanwhile
+            if not os.path.isdir(path):
+                print("preview cache: could not store %s: %s" % (key, e))
+            return False
+        self.trim()
+        return True
+
+    def trim(self):
+        """Drop the least recently used entries beyond max_bytes"""
+        entries = []
+        total = 0
+        try:
+            names = os.listdir(self.directory)
+        except OSError:
+            return
+        for name in names:
+            # entries still being written
+            if name.startswith('.tmp-'): continue
+            path = os.path.join(self.directory, name)
+            try:
+                mtime = os.stat(path).st_mtime
+                size = sum(os.stat(os.path.join(path, n)).st_size
+                           for n in os.listdir(path))
+            except OSError:
+                continue
+            entries.append((mtime, size, path))
+            total += size
+        entries.sort()
+        while entries and total > self.max_bytes:
+            mtime, size, path = entries.pop(0)
+            shutil.rmtree(path, ignore_errors=True)
+            total -= size
+
+    def clear(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+# vim:ts=8:sts=4:sw=4:et:
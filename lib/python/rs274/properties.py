@@ -0,0 +1,214 @@
+#    This is a component of AXIS, a front-end for emc
+#
+#    This program is free software; you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation; either version 2 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program; if not, write to the Free Software
+#    Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+import numpy
+
+# Program properties (distances, run time) computed from the preview segments
+# of a GLCanon, shared by the G-code properties of AXIS, gremlin and the Qt
+# graphics.  Everything is in the canon's internal units: inches, and inches
+# per second for the feed rates.
+#
+# Two run time models are provided:
+#   - the simple one the GUIs have always shown: each move at its feed rate
+#     (rapids at the maximum speed), capped by the maximum speed, plus the
+#     dwells;
+#   - a trapezoidal one when the machine's limits are known: each move
+#     accelerates to its feed rate and decelerates again, limited by the
+#     velocity and acceleration of the axes it moves.  Moves that join in a
+#     straight line (like the segments of an arc) don't stop at the joint:
+#     the speed there is the lower of the two feed rates, scaled by the
+#     cosine of the angle between the moves and kept low enough that either
+#     move can stop from it.  Moves held in different segment lists are not
+#     known to be consecutive, so feeds stop before arcs and rapids.
+# Rotary-only moves count as no distance and take no time, as before.
+
+# labels of the G-code properties the Qt graphics emit, for screens that show them
+property_names = {
+    'name': "Name:", 'size': "Size:",
+    'tools': "Tool order:", 'g0': "Rapid distance:",
+    'g1': "Feed distance:", 'g': "Total distance:",
+    'run': "Run time:", 'machine_unit_sys': "Machine Unit System:",
+    'run_accel': "Run time with acceleration:",
+    'tooltimes': "Run time per tool:",
+    'x': "X bounds:", 'x_zero_rxy': 'X @ Zero Rotation:',
+    'y': "Y bounds:", 'y_zero_rxy': 'Y @ Zero Rotation:',
+    'z': "Z bounds:", 'z_zero_rxy': 'Z @ Zero Rotation:',
+    'a': "A bounds:", 'b': "B bounds:",
+    'c': "C bounds:", 'toollist': 'Tool Change List:',
+    'gcode_units': "Gcode Units:"
+}
+
+class MotionLimits:
+    """Per-axis velocity and acceleration limits of X, Y and Z, plus the
+    trajectory limits, in internal units"""
+    def __init__(self, max_velocity, max_acceleration,
+                 max_linear_velocity=numpy.inf, max_linear_acceleration=numpy.inf):
+        self.max_velocity = numpy.array(max_velocity, numpy.float64)
+        self.max_acceleration = numpy.array(max_acceleration, numpy.float64)
+        self.max_linear_velocity = max_linear_velocity
+        self.max_linear_acceleration = max_linear_acceleration
+
+    @classmethod
+    def from_ini(cls, inifile, units_per_inch):
+        """Read [AXIS_X/Y/Z]MAX_VELOCITY, MAX_ACCELERATION and
+        [TRAJ]MAX_LINEAR_VELOCITY, MAX_LINEAR_ACCELERATION; units_per_inch
+        converts the machine units to inches.  Returns None when no axis
+        acceleration is given."""
+        def get(section, option):
+            value = inifile.find(section, option)
+            try:
+                return float(value) / units_per_inch
+            except (TypeError, ValueError):
+                return numpy.inf
+        velocity = [get("AXIS_" + a, "MAX_VELOCITY") for a in "XYZ"]
+        acceleration = [get("AXIS_" + a, "MAX_ACCELERATION") for a in "XYZ"]
+        if numpy.isinf(acceleration).all(): return None
+        return cls(velocity, acceleration,
+                   get("TRAJ", "MAX_LINEAR_VELOCITY"),
+                   get("TRAJ", "MAX_LINEAR_ACCELERATION"))
+
+    def along(self, unit):
+        """Velocity and acceleration limits along the unit vectors unit"""
+        with numpy.errstate(divide='ignore'):
+            u = numpy.abs(unit)
+            velocity = (self.max_velocity / u).min(axis=1)
+            acceleration = (self.max_acceleration / u).min(axis=1)
+        return (numpy.minimum(velocity, self.max_linear_velocity),
+                numpy.minimum(acceleration, self.max_linear_acceleration))
+
+def count_lines(filename):
+    """Number of lines in a file, counted without decoding it"""
+    count = 0
+    last = b'\n'
+    with open(filename, 'rb') as f:
+        while True:
+            block = f.read(1<<20)
+            if not block: break
+            count += block.count(b'\n')
+            last = block[-1:]
+    return count + (last != b'\n')
+
+def lengths(movelist):
+    d = movelist.end[:, :3] - movelist.start[:, :3]
+    return numpy.sqrt((d * d).sum(axis=1))
+
+def simple_times(movelist, length, max_speed, rapid=False):
+    if rapid or not movelist.has_feedrate:
+        return length / max_speed
+    feed = movelist.feedrate
+    speed = numpy.where(feed > 0, numpy.minimum(feed, max_speed), max_speed)
+    return length / speed
+
+def trapezoid_times(movelist, length, max_speed, limits, rapid=False):
+    n = len(movelist)
+    if not n: return numpy.zeros(0)
+    start = movelist.start
+    end = movelist.end
+    moving = length > 0
+    unit = numpy.zeros((n, 3))
+    unit[moving] = (end[moving, :3] - start[moving, :3]) / length[moving, None]
+    velocity, acceleration = limits.along(unit)
+    velocity = numpy.minimum(velocity, max_speed)
+    if not rapid and movelist.has_feedrate:
+        feed = movelist.feedrate
+        velocity = numpy.where(feed > 0, numpy.minimum(velocity, feed), velocity)
+
+    # speed at the joint between move i and move i+1
+    joined = (end[:-1] == start[1:]).all(axis=1) & moving[:-1] & moving[1:]
+    cos = numpy.clip((unit[:-1] * unit[1:]).sum(axis=1), 0, 1)
+    with numpy.errstate(invalid='ignore'):
+        stop = numpy.sqrt(acceleration * length)
+    joint = numpy.minimum(velocity[:-1], velocity[1:]) * cos
+    joint = numpy.minimum(joint, numpy.minimum(stop[:-1], stop[1:]))
+    joint = numpy.where(joined, joint, 0)
+    v0 = numpy.concatenate([[0], joint])
+    v1 = numpy.concatenate([joint, [0]])
+
+    times = numpy.zeros(n)
+    finite = moving & numpy.isfinite(acceleration) & (acceleration > 0)
+    unlimited = moving & ~finite
+    times[unlimited] = length[unlimited] / velocity[unlimited]
+    a = acceleration[finite]
+    v = velocity[finite]
+    L = length[finite]
+    v0 = v0[finite]
+    v1 = v1[finite]
+    # the top speed reached if the move never cruised
+    peak = numpy.sqrt(a * L + (v0 * v0 + v1 * v1) / 2)
+    cruise = peak > v
+    ramp = (2 * v * v - v0 * v0 - v1 * v1) / (2 * a)
+    times[finite] = numpy.where(cruise,
+        (2 * v - v0 - v1) / a + (L - ramp) / v,
+        (2 * peak - v0 - v1) / a)
+    return times
+
+class ProgramProperties:
+    """Distances and run times of the program previewed by canon
+
+    max_speed is the maximum linear speed in inches per second; with limits
+    (a MotionLimits) the trapezoidal model is computed too, and the per-tool
+    and per-line times use it."""
+    def __init__(self, canon, max_speed, limits=None):
+        self.max_speed = max_speed
+        stores = ((canon.traverse, True), (canon.feed, False), (canon.arcfeed, False))
+        length = [lengths(movelist) for movelist, rapid in stores]
+        self.g0 = float(length[0].sum())
+        self.g1 = float(length[1].sum() + length[2].sum())
+
+        times = [simple_times(movelist, l, max_speed, rapid)
+                 for (movelist, rapid), l in zip(stores, length)]
+        dwell_time = getattr(canon, 'dwell_time', 0)
+        self.run_time = float(sum(t.sum() for t in times)) + dwell_time
+        self.accel_run_time = None
+        if limits is not None:
+            times = [trapezoid_times(movelist, l, max_speed, limits, rapid)
+                     for (movelist, rapid), l in zip(stores, length)]
+            self.accel_run_time = float(sum(t.sum() for t in times)) + dwell_time
+
+        dwells = numpy.array(getattr(canon, 'dwell_durations', []) or
+                             numpy.zeros((0, 3)), numpy.float64).reshape(-1, 3)
+        tool_changes = getattr(canon, 'tool_changes', [])
+
+        # time by tool: the index of a segment's tool is the number of tool
+        # changes stored before it
+        ntools = len(tool_changes) + 1
+        tool_time = numpy.zeros(ntools)
+        for k, ((movelist, rapid), t) in enumerate(zip(stores, times)):
+            counts = numpy.array([change[1 + k] for change in tool_changes], numpy.int64)
+            index = numpy.searchsorted(counts, numpy.arange(len(movelist)), 'right')
+            tool_time += numpy.bincount(index, t, ntools)
+        tool_time += numpy.bincount(dwells[:, 2].astype(numpy.int64), dwells[:, 1], ntools)
+        self.tool_times = [(tool_changes[i-1][0] if i else None, float(tool_time[i]))
+                           for i in range(ntools) if i or tool_time[i]]
+
+        # time by line number
+        last = max([int(movelist.lineno.max()) for movelist, rapid in stores if len(movelist)]
+                   + [int(dwells[:, 0].max()) if len(dwells) else 0, 0])
+        line_time = numpy.zeros(last + 1)
+        for (movelist, rapid), t in zip(stores, times):
+            line_time += numpy.bincount(movelist.lineno.clip(0), t, last + 1)
+        line_time += numpy.bincount(dwells[:, 0].astype(numpy.int64).clip(0), dwells[:, 1], last + 1)
+        self.line_times = line_time
+
+    def cumulative_times(self):
+        """Time spent up to the end of each line, in line number order"""
+        return numpy.cumsum(self.line_times)
+
+    def time_to_line(self, lineno):
+        """Time spent before reaching line lineno, in line number order"""
+        return float(self.line_times[:max(lineno, 0)].sum())
+
+# vim:ts=8:sts=4:sw=4:et:
@@ -0,0 +1,198 @@
+#    This is a component of AXIS, a front-end for emc
+#
+#    This program is free software; you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation; either version 2 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program; if not, write to the Free Software
+#    Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+import numpy
+
+# Columnar storage for preview segments.
+#
+# GLCanon used to keep one tuple per segment:
+#   (line number, (9 start coords), (9 end coords), feedrate, (tlo x, tlo y, tlo z))
+# which costs several hundred bytes per segment once all the float objects
+# are counted.  A SegmentStore keeps the same information in growable
+# contiguous arrays, one per field, so a segment costs the size of its
+# numbers and nothing more.  The arrays are exposed as numpy views sized to
+# the number of stored segments; gcode.calc_extents and linuxcnc.draw_lines
+# read them through the buffer protocol.
+#
+# Blocks of motions from the batched protocol of gcode.parse (see
+# GLCanon.motion_batch) are arrays of motion_dtype.  Each record is the
+# kind of move (gcode.MOTION_TRAVERSE, MOTION_FEED or MOTION_ARC), the line
+# number and the rotated and translated end point; each move starts where
+# the previous one ended.
+motion_dtype = numpy.dtype([('kind', numpy.int32), ('lineno', numpy.int32),
+                            ('pos', numpy.float64, 9)])
+
+# segments_for_line looks segments up through an index sorted by line
+# number, built on first use and again after the store changes.
+#
+# For compatibility, iterating or indexing a store still produces the old
+# tuples (without the feedrate for traverse stores), but code that cares
+# about speed should use the column views.
+
+class SegmentStore:
+    initial_capacity = 1024
+
+    def __init__(self, has_feedrate=True, capacity=None):
+        self.has_feedrate = has_feedrate
+        self.count = 0
+        capacity = capacity or self.initial_capacity
+        self._lineno = numpy.empty(capacity, numpy.int32)
+        self._start = numpy.empty((capacity, 9), numpy.float64)
+        self._end = numpy.empty((capacity, 9), numpy.float64)
+        self._feedrate = numpy.empty(capacity, numpy.float64)
+        self._tooloffset = numpy.empty((capacity, 3), numpy.float64)
+        self._line_index = None
+
+    @classmethod
+    def wrap(cls, lineno, start, end, feedrate, tooloffset, has_feedrate=True):
+        """Make a store that uses the given arrays without copying them
+
+        The arrays may be read-only (memory mapped, for instance): the store
+        is full, so the first append moves it to new arrays."""
+        self = cls.__new__(cls)
+        self.has_feedrate = has_feedrate
+        self.count = len(lineno)
+        self._lineno = lineno
+        self._start = start
+        self._end = end
+        self._feedrate = feedrate
+        self._tooloffset = tooloffset
+        self._line_index = None
+        return self
+
+    def _reserve(self, need):
+        capacity = len(self._lineno)
+        if need <= capacity: return
+        capacity = max(need, capacity * 2)
+        n = self.count
+        for name in '_lineno', '_start', '_end', '_feedrate', '_tooloffset':
+            old = getattr(self, name)
+            new = numpy.empty((capacity,) + old.shape[1:], old.dtype)
+            new[:n] = old[:n]
+            setattr(self, name, new)
+
+    def append(self, lineno, start, end, feedrate, tooloffset):
+        n = self.count
+        if n == len(self._lineno): self._reserve(n + 1)
+        self._lineno[n] = lineno
+        self._start[n] = start
+        self._end[n] = end
+        self._feedrate[n] = feedrate
+        self._tooloffset[n] = tooloffset
+        self.count = n + 1
+
+    def extend_path(self, lineno, lo, points, feedrate, tooloffset):
+        """Append the connected segments lo-points[0], points[0]-points[1], ...
+
+        Returns the last point, which becomes the start of the next move."""
+        points = numpy.asarray(points, numpy.float64).reshape(-1, 9)
+        k = len(points)
+        if not k: return lo
+        n = self.count
+        self._reserve(n + k)
+        self._lineno[n:n+k] = lineno
+        self._start[n] = lo
+        self._start[n+1:n+k] = points[:-1]
+        self._end[n:n+k] = points
+        self._feedrate[n:n+k] = feedrate
+        self._tooloffset[n:n+k] = tooloffset
+        self.count = n + k
+        return tuple(points[-1].tolist())
+
+    def extend_arrays(self, lineno, start, end, feedrate, tooloffset):
+        k = len(lineno)
+        n = self.count
+        self._reserve(n + k)
+        self._lineno[n:n+k] = lineno
+        self._start[n:n+k] = start
+        self._end[n:n+k] = end
+        self._feedrate[n:n+k] = feedrate
+        self._tooloffset[n:n+k] = tooloffset
+        self.count = n + k
+
+    def extend(self, other):
+        self.extend_arrays(other.lineno, other.start, other.end,
+                other.feedrate, other.tooloffset)
+
+    def clear(self):
+        self.count = 0
+        self._line_index = None
+
+    def line_index(self):
+        """(count, order, sorted line numbers) for the stored segments"""
+        index = self._line_index
+        if index is None or index[0] != self.count:
+            lineno = self.lineno
+            if self.count < 2 or (lineno[1:] >= lineno[:-1]).all():
+                order = numpy.arange(self.count)
+            else:
+                order = numpy.argsort(lineno, kind='stable')
+            index = self._line_index = self.count, order, lineno[order]
+        return index
+
+    def segments_for_line(self, lineno):
+        """Indices of the segments of line lineno, in program order"""
+        count, order, lines = self.line_index()
+        lo = numpy.searchsorted(lines, lineno, 'left')
+        hi = numpy.searchsorted(lines, lineno, 'right')
+        return order[lo:hi]
+
+    def compact(self):
+        """Release the unused tail of the arrays once loading is done"""
+        n = self.count
+        for name in '_lineno', '_start', '_end', '_feedrate', '_tooloffset':
+            setattr(self, name, getattr(self, name)[:n].copy())
+
+    @property
+    def lineno(self): return self._lineno[:self.count]
+    @property
+    def start(self): return self._start[:self.count]
+    @property
+    def end(self): return self._end[:self.count]
+    @property
+    def feedrate(self): return self._feedrate[:self.count]
+    @property
+    def tooloffset(self): return self._tooloffset[:self.count]
+
+    @property
+    def nbytes(self):
+        return (self._lineno.nbytes + self._start.nbytes + self._end.nbytes
+                + self._feedrate.nbytes + self._tooloffset.nbytes)
+
+    def __len__(self):
+        return self.count
+
+    def _tuple(self, i):
+        lineno = int(self._lineno[i])
+        start = tuple(self._start[i].tolist())
+        end = tuple(self._end[i].tolist())
+        tooloffset = tuple(self._tooloffset[i].tolist())
+        if self.has_feedrate:
+            return lineno, start, end, float(self._feedrate[i]), tooloffset
+        return lineno, start, end, tooloffset
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self._tuple(j) for j in range(*i.indices(self.count))]
+        if i < 0: i += self.count
+        if not 0 <= i < self.count: raise IndexError(i)
+        return self._tuple(i)
+
+    def __iter__(self):
+        for i in range(self.count):
+            yield self._tuple(i)
+
+# vim:ts=8:sts=4:sw=4:et:
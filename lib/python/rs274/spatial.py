@@ -0,0 +1,246 @@
+#    This is a component of AXIS, a front-end for emc
+#
+#    This program is free software; you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation; either version 2 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program; if not, write to the Free Software
+#    Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+import numpy
+
+# Uniform grid over the bounding boxes of the preview segments.
+#
+# Picking a line in the preview used to draw the whole program in GL_SELECT
+# mode.  The grid finds the few segments near the ray under the cursor
+# instead, and only those are projected to the window and measured.
+#
+# The grid has about as many cells as there are segments.  Each segment is
+# listed in every cell its bounding box touches, except segments touching
+# more than max_cells_per_segment cells (long rapids, mostly), which are
+# kept apart and always tested.  The lists are flattened into one array of
+# segment numbers sorted by cell, so finding a cell is a binary search.
+
+def display_coords(points, geometry):
+    """Map 9-axis points to the preview's x, y, z like linuxcnc.vertex9
+
+    Only geometries without rotations can be mapped this way; returns None
+    for the others."""
+    if any(c in geometry for c in 'ABC'): return None
+    result = numpy.zeros((len(points), 3))
+    sign = 1
+    for c in geometry:
+        if c == '-':
+            sign = -1
+            continue
+        if c in 'XYZUVW':
+            i = 'XYZUVW'.index(c)
+            result[:, i % 3] += sign * points[:, i if i < 3 else i + 3]
+        sign = 1
+    return result
+
+class SegmentGrid:
+    max_cells_per_segment = 64
+
+    def __init__(self, start, end, lineno, kind):
+        """start, end: (n, 3) display coordinates, lineno and kind: (n,)"""
+        self.start = numpy.asarray(start, numpy.float64)
+        self.end = numpy.asarray(end, numpy.float64)
+        self.lineno = numpy.asarray(lineno)
+        self.kind = numpy.asarray(kind)
+        n = len(self.lineno)
+        lo = numpy.minimum(self.start, self.end)
+        hi = numpy.maximum(self.start, self.end)
+        if n:
+            self.origin = lo.min(axis=0)
+            extent = hi.max(axis=0) - self.origin
+        else:
+            self.origin = numpy.zeros(3)
+            extent = numpy.zeros(3)
+        largest = max(extent.max(), 1e-9)
+        flat = extent < largest * 1e-6
+        dims = (~flat).sum()
+        volume = numpy.prod(extent[~flat])
+        cell = (volume / max(n, 1)) ** (1. / dims) if dims else largest
+        # keep the grid within 2**20 cells on a side
+        self.cell = max(cell, largest / (1 << 20), 1e-9)
+        self.shape = (extent // self.cell).astype(numpy.int64) + 1
+
+        clo = self._cell(lo)
+        chi = self._cell(hi)
+        span = chi - clo + 1
+        count = span.prod(axis=1)
+        big = count > self.max_cells_per_segment
+        self.big = numpy.flatnonzero(big)
+        small = numpy.flatnonzero(~big)
+        count = count[small]
+        segments = numpy.repeat(small, count)
+        # position of each listed cell within its segment's box
+        local = numpy.arange(count.sum()) - numpy.repeat(numpy.cumsum(count) - count, count)
+        sx = span[segments, 0]
+        sy = span[segments, 1]
+        cells = clo[segments] + numpy.stack(
+            [local % sx, local // sx % sy, local // (sx * sy)], axis=1)
+        ids = self._id(cells)
+        order = numpy.argsort(ids, kind='stable')
+        self.cell_ids = ids[order]
+        self.cell_segments = segments[order]
+
+    def __len__(self):
+        return len(self.lineno)
+
+    def _cell(self, points):
+        cells = numpy.floor((points - self.origin) / self.cell).astype(numpy.int64)
+        return numpy.clip(cells, 0, self.shape - 1)
+
+    def _id(self, cells):
+        return (cells[:, 2] * self.shape[1] + cells[:, 1]) * self.shape[0] + cells[:, 0]
+
+    def segments_in_cells(self, ids):
+        """Segment numbers listed in any of the cells ids"""
+        left = numpy.searchsorted(self.cell_ids, ids, 'left')
+        right = numpy.searchsorted(self.cell_ids, ids, 'right')
+        count = right - left
+        local = numpy.arange(count.sum()) - numpy.repeat(numpy.cumsum(count) - count, count)
+        found = self.cell_segments[numpy.repeat(left, count) + local]
+        return numpy.union1d(found, self.big)
+
+    def segments_in_boxes(self, lo, hi):
+        """Segment numbers listed in the cells touching any of the boxes lo-hi
+
+        Returns None when that means looking at more cells than there are
+        segments, in which case testing all of them is as quick."""
+        clo = self._cell(lo)
+        chi = self._cell(hi)
+        span = chi - clo + 1
+        count = span.prod(axis=1)
+        if count.sum() > max(len(self.cell_ids), 1024): return None
+        boxes = numpy.repeat(numpy.arange(len(lo)), count)
+        local = numpy.arange(count.sum()) - numpy.repeat(numpy.cumsum(count) - count, count)
+        sx = span[boxes, 0]
+        sy = span[boxes, 1]
+        cells = clo[boxes] + numpy.stack(
+            [local % sx, local // sx % sy, local // (sx * sy)], axis=1)
+        return self.segments_in_cells(numpy.unique(self._id(cells)))
+
+    def pick(self, x, y, modelview, projection, viewport, radius=2.5, kinds=None):
+        """Line number of the segment nearest the viewer within radius pixels
+        of window position x, y (counted from the bottom), or None
+
+        modelview and projection are the matrices as returned by glGetDoublev;
+        kinds limits the search to segments of those kinds."""
+        if not len(self): return None
+        matrix = numpy.dot(numpy.asarray(modelview, numpy.float64).reshape(4, 4),
+                           numpy.asarray(projection, numpy.float64).reshape(4, 4))
+        vx, vy, vw, vh = [float(v) for v in viewport[:4]]
+        inverse = numpy.linalg.inv(matrix)
+
+        def unproject(wx, wy, depth):
+            ndc = numpy.array([2 * (wx - vx) / vw - 1, 2 * (wy - vy) / vh - 1, 2 * depth - 1, 1])
+            p = numpy.dot(ndc, inverse)
+            return p[:3] / p[3]
+
+        near = unproject(x, y, 0)
+        far = unproject(x, y, 1)
+        # the pick radius in model units grows linearly from the near plane to the far one
+        tol_near = numpy.linalg.norm(unproject(x + radius, y, 0) - near)
+        tol_far = numpy.linalg.norm(unproject(x + radius, y, 1) - far)
+
+        candidates = self._ray_candidates(near, far, tol_near, tol_far)
+        if candidates is None:
+            candidates = numpy.arange(len(self))
+        if kinds is not None:
+            candidates = candidates[numpy.isin(self.kind[candidates], kinds)]
+        if not len(candidates): return None
+
+        def project(points):
+            clip = numpy.dot(numpy.hstack([points, numpy.ones((len(points), 1))]), matrix)
+            w = clip[:, 3:]
+            ndc = clip[:, :3] / numpy.where(w == 0, 1e-300, w)
+            win = numpy.empty_like(ndc)
+            win[:, 0] = vx + (ndc[:, 0] + 1) * vw / 2
+            win[:, 1] = vy + (ndc[:, 1] + 1) * vh / 2
+            win[:, 2] = (ndc[:, 2] + 1) / 2
+            return win, w[:, 0] > 0
+
+        a, a_ok = project(self.start[candidates])
+        b, b_ok = project(self.end[candidates])
+        d = b[:, :2] - a[:, :2]
+        length2 = (d * d).sum(axis=1)
+        t = ((x - a[:, 0]) * d[:, 0] + (y - a[:, 1]) * d[:, 1]) / numpy.where(length2 == 0, 1, length2)
+        t = numpy.clip(t, 0, 1)
+        px = a[:, 0] + t * d[:, 0] - x
+        py = a[:, 1] + t * d[:, 1] - y
+        depth = a[:, 2] + t * (b[:, 2] - a[:, 2])
+        hit = a_ok & b_ok & (px * px + py * py <= radius * radius) & (depth >= 0) & (depth <= 1)
+        if not hit.any(): return None
+        hits = numpy.flatnonzero(hit)
+        return int(self.lineno[candidates[hits[numpy.argmin(depth[hits])]]])
+
+    def _ray_candidates(self, near, far, tol_near, tol_far):
+        # clip the ray to the grid's box, grown by the pick radius
+        direction = far - near
+        tol = max(tol_near, tol_far)
+        box_lo = self.origin - self.cell - tol
+        box_hi = self.origin + self.shape * self.cell + tol
+        with numpy.errstate(divide='ignore', invalid='ignore'):
+            t1 = (box_lo - near) / direction
+            t2 = (box_hi - near) / direction
+        t1 = numpy.where(direction == 0, -numpy.inf, t1)
+        t2 = numpy.where(direction == 0, numpy.inf, t2)
+        outside = (direction == 0) & ((near < box_lo) | (near > box_hi))
+        if outside.any(): return numpy.zeros(0, numpy.int64)
+        t0 = max(numpy.minimum(t1, t2).max(), 0)
+        t3 = min(numpy.maximum(t1, t2).min(), 1)
+        if t0 > t3: return numpy.zeros(0, numpy.int64)
+        # sample the ray every half cell; each sample covers a box of the
+        # pick radius at its depth, plus half a step
+        length = numpy.linalg.norm(direction) * (t3 - t0)
+        samples = int(min(length / (self.cell / 2), 1 << 20)) + 2
+        t = numpy.linspace(t0, t3, samples)
+        points = near + t[:, None] * direction
+        reach = (tol_near + t * (tol_far - tol_near))[:, None] + self.cell / 2
+        return self.segments_in_boxes(points - reach, points + reach)
+
+    def _candidates_near(self, point, reach, kinds):
+        candidates = self.segments_in_boxes(point[None] - reach, point[None] + reach)
+        if candidates is None:
+            candidates = numpy.arange(len(self))
+        if kinds is not None:
+            candidates = candidates[numpy.isin(self.kind[candidates], kinds)]
+        return candidates
+
+    def _distance2(self, candidates, point):
+        a = self.start[candidates]
+        d = self.end[candidates] - a
+        length2 = (d * d).sum(axis=1)
+        t = ((point - a) * d).sum(axis=1) / numpy.where(length2 == 0, 1, length2)
+        t = numpy.clip(t, 0, 1)
+        return ((a + t[:, None] * d - point) ** 2).sum(axis=1)
+
+    def nearest(self, point, kinds=None):
+        """Line number of the segment nearest point (display coordinates)"""
+        if not len(self): return None
+        point = numpy.asarray(point, numpy.float64)
+        # grow a box around the point until it holds some segments
+        reach = self.cell
+        while True:
+            candidates = self._candidates_near(point, reach, kinds)
+            if len(candidates) or reach > self.cell * self.shape.max(): break
+            reach *= 4
+        if not len(candidates): return None
+        # the nearest segment may lie outside that box, but not further
+        # away than the nearest one in it
+        reach = numpy.sqrt(self._distance2(candidates, point).min()) + self.cell
+        candidates = self._candidates_near(point, reach, kinds)
+        distance = self._distance2(candidates, point)
+        return int(self.lineno[candidates[numpy.argmin(distance)]])
+
+# vim:ts=8:sts=4:sw=4:et:
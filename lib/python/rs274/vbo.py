@@ -0,0 +1,237 @@
+#    This is a component of AXIS, a front-end for emc
+#
+#    This program is free software; you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation; either version 2 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program; if not, write to the Free Software
+#    Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+from OpenGL.GL import *
+from OpenGL.GL import shaders
+import ctypes
+import numpy
+import linuxcnc
+
+# Vertex buffer renderer for the program preview.
+#
+# The display list renderer compiles the program twice over (with and
+# without rapids) and twice more for selection, and compiles the highlighted
+# line into another list whenever it changes.  This one uploads the
+# program's line vertices once, with the line number and a color index for
+# each vertex, and leaves the rest to a small shader:
+#   - the colors are a table of uniforms,
+#   - the rapids are a separate range of the buffer, drawn or not,
+#   - the highlighted line is a uniform; it is drawn again over the program
+#     with every other line moved out of the clip volume,
+#   - selection draws the line numbers as colors around the cursor and
+#     reads them back, instead of GL_SELECT.
+# Changing any of these only changes what is drawn, never the buffers.
+# The shaders are GLSL 1.20 using the compatibility profile matrices, so
+# they run everywhere the rest of the preview does, Mesa's llvmpipe
+# software rasterizer included.
+
+vertex_shader = """
+#version 120
+attribute vec3 position;
+attribute vec2 line_kind;
+uniform vec4 colors[%(ncolors)d];
+uniform vec4 highlight_color;
+uniform float highlight;
+// 0: program, 1: only the highlighted line, 2: line numbers for selection
+uniform int mode;
+varying vec4 color;
+
+void main() {
+    gl_Position = gl_ModelViewProjectionMatrix * vec4(position, 1.0);
+    if(mode == 2) {
+        float n = line_kind.x + 1.0;
+        color = vec4(mod(n, 256.0), mod(floor(n / 256.0), 256.0),
+                     floor(n / 65536.0), 255.0) / 255.0;
+    } else if(mode == 1) {
+        color = highlight_color;
+        if(line_kind.x != highlight) gl_Position = vec4(2.0, 2.0, 2.0, 1.0);
+    } else {
+        color = colors[int(line_kind.y)];
+    }
+}
+"""
+
+fragment_shader = """
+#version 120
+varying vec4 color;
+
+void main() {
+    gl_FragColor = color;
+}
+"""
+
+# color names, indexed by the color index of a vertex
+color_names = ('traverse', 'straight_feed', 'arc_feed',
+               'traverse_xy', 'straight_feed_xy', 'arc_feed_xy',
+               'traverse_uv', 'straight_feed_uv', 'arc_feed_uv')
+
+def program_vertices(canon):
+    """The vertex buffers of the canon's traverse, feed and arcfeed stores
+
+    Returns (positions, attributes, rapids): the (n, 3) float32 vertices of
+    GL_LINES, an (n, 2) float32 line number and color index for each vertex
+    (see color_names), and the number of vertices at the start that are
+    rapids."""
+    positions = []
+    attributes = []
+    rapids = 0
+    def add(store, kind, geometry, z=None):
+        vertices, lines = linuxcnc.line_vertices(geometry, store)
+        vertices = numpy.frombuffer(vertices, numpy.float32).reshape(-1, 3)
+        lines = numpy.frombuffer(lines, numpy.int32)
+        if z is not None:
+            vertices = vertices.copy()
+            vertices[:, 2] += z
+        attribute = numpy.empty((len(lines), 2), numpy.float32)
+        attribute[:, 0] = lines
+        attribute[:, 1] = kind
+        positions.append(vertices)
+        attributes.append(attribute)
+    stores = (canon.traverse, canon.feed, canon.arcfeed) if canon else ()
+    for kind, store in enumerate(stores):
+        if canon.is_foam:
+            add(store, kind + 3, 'XY', canon.foam_z)
+            add(store, kind + 6, 'UV', canon.foam_w)
+        else:
+            add(store, kind, canon.geometry)
+        # the rapids are drawn from the start of the buffer
+        if kind == 0: rapids = sum(len(p) for p in positions)
+    if not positions:
+        return numpy.zeros((0, 3), numpy.float32), numpy.zeros((0, 2), numpy.float32), 0
+    return numpy.concatenate(positions), numpy.concatenate(attributes), rapids
+
+def color_table(colors):
+    """The colors uniform: an RGBA row for each of color_names"""
+    table = []
+    for name in color_names:
+        color = colors.get(name, colors.get(name[:-3], (1, 1, 1)))
+        alpha = colors.get(name + '_alpha', 1/3.)
+        table.append(tuple(color[:3]) + (alpha,))
+    return numpy.array(table, numpy.float32)
+
+class ProgramRenderer:
+    # half the size of the square around the cursor searched by select,
+    # the same as the pick matrix of the display list renderer
+    pick_radius = 2
+
+    def __init__(self):
+        self.program = shaders.compileProgram(
+            shaders.compileShader(vertex_shader % {'ncolors': len(color_names)},
+                GL_VERTEX_SHADER),
+            shaders.compileShader(fragment_shader, GL_FRAGMENT_SHADER))
+        self.position = glGetAttribLocation(self.program, 'position')
+        self.line_kind = glGetAttribLocation(self.program, 'line_kind')
+        self.uniforms = dict((name, glGetUniformLocation(self.program, name))
+            for name in ('colors', 'highlight_color', 'highlight', 'mode'))
+        self.buffers = glGenBuffers(2)
+        self.canon = None
+        self.stale = True
+        self.rapids = 0
+        self.count = 0
+
+    def set_stale(self):
+        self.stale = True
+
+    def build(self, canon):
+        """Upload the vertices of the canon's traverse, feed and arcfeed stores"""
+        positions, attributes, self.rapids = program_vertices(canon)
+        self.count = len(positions)
+        glBindBuffer(GL_ARRAY_BUFFER, self.buffers[0])
+        glBufferData(GL_ARRAY_BUFFER, positions.nbytes, positions, GL_STATIC_DRAW)
+        glBindBuffer(GL_ARRAY_BUFFER, self.buffers[1])
+        glBufferData(GL_ARRAY_BUFFER, attributes.nbytes, attributes, GL_STATIC_DRAW)
+        glBindBuffer(GL_ARRAY_BUFFER, 0)
+        self.canon = canon
+        self.stale = False
+
+    def set_colors(self, colors):
+        table = color_table(colors)
+        glUniform4fv(self.uniforms['colors'], len(table), table)
+        glUniform4f(self.uniforms['highlight_color'],
+                    *(tuple(colors['selected'][:3]) + (1,)))
+
+    def _begin(self, canon, colors, mode):
+        if self.stale or canon is not self.canon: self.build(canon)
+        glUseProgram(self.program)
+        self.set_colors(colors)
+        glUniform1i(self.uniforms['mode'], mode)
+        glBindBuffer(GL_ARRAY_BUFFER, self.buffers[0])
+        glEnableVertexAttribArray(self.position)
+        glVertexAttribPointer(self.position, 3, GL_FLOAT, GL_FALSE, 0, ctypes.c_void_p(0))
+        glBindBuffer(GL_ARRAY_BUFFER, self.buffers[1])
+        glEnableVertexAttribArray(self.line_kind)
+        glVertexAttribPointer(self.line_kind, 2, GL_FLOAT, GL_FALSE, 0, ctypes.c_void_p(0))
+        glBindBuffer(GL_ARRAY_BUFFER, 0)
+
+    def _end(self):
+        glDisableVertexAttribArray(self.position)
+        glDisableVertexAttribArray(self.line_kind)
+        glUseProgram(0)
+
+    def _draw_lines(self, show_rapids):
+        first = 0 if show_rapids else self.rapids
+        if self.count > first:
+            glDrawArrays(GL_LINES, first, self.count - first)
+
+    def draw(self, canon, colors, show_rapids, highlight=None):
+        self._begin(canon, colors, 0)
+        self._draw_lines(show_rapids)
+        if highlight is not None:
+            glUniform1i(self.uniforms['mode'], 1)
+            glUniform1f(self.uniforms['highlight'], highlight)
+            glLineWidth(3)
+            self._draw_lines(True)
+            glLineWidth(1)
+        self._end()
+
+    def select(self, canon, colors, show_rapids, x, y):
+        """Return the line number of the segment drawn nearest to window
+        position x, y (counted from the bottom), or None"""
+        r = self.pick_radius
+        size = 2*r + 1
+        glPushAttrib(GL_ENABLE_BIT | GL_COLOR_BUFFER_BIT | GL_DEPTH_BUFFER_BIT
+                     | GL_SCISSOR_BIT | GL_LINE_BIT)
+        try:
+            glDisable(GL_BLEND)
+            glDisable(GL_DITHER)
+            glDisable(GL_LINE_SMOOTH)
+            glEnable(GL_DEPTH_TEST)
+            glDepthMask(GL_TRUE)
+            glEnable(GL_SCISSOR_TEST)
+            glScissor(x - r, y - r, size, size)
+            glClearColor(0, 0, 0, 0)
+            glClear(GL_COLOR_BUFFER_BIT | GL_DEPTH_BUFFER_BIT)
+            # thick lines, so one passing between pixel centers is still seen
+            glLineWidth(3)
+            self._begin(canon, colors, 2)
+            self._draw_lines(show_rapids)
+            self._end()
+            pixels = glReadPixels(x - r, y - r, size, size, GL_RGBA, GL_UNSIGNED_BYTE)
+        finally:
+            glPopAttrib()
+        pixels = numpy.frombuffer(pixels, numpy.uint8).reshape(size, size, 4).astype(numpy.int32)
+        names = pixels[..., 0] + (pixels[..., 1] << 8) + (pixels[..., 2] << 16)
+        hits = numpy.argwhere(names)
+        if not len(hits): return None
+        # the hit nearest the center of the square
+        nearest = hits[numpy.argmin(((hits - r) ** 2).sum(axis=1))]
+        return int(names[tuple(nearest)]) - 1
+
+    def delete(self):
+        glDeleteBuffers(2, self.buffers)
+        glDeleteProgram(self.program)
+
+# vim:ts=8:sts=4:sw=4:et:
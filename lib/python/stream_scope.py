@@ -0,0 +1,227 @@
+#    This program is free software; you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation; either version 2 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program; if not, write to the Free Software
+#    Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+import numpy
+import hal
+
+# Data side of the scope widgets of GladeVCP (HAL_Scope) and QtVCP (HALScope).
+#
+# Polling a pin from a GUI timer sees a few values a second at best.  The
+# scope widgets read a sampler component instead: the sampler copies its pins
+# into a HAL stream every period of the thread it runs in, and the widget
+# drains the stream on each of its ticks, so no sample is missed as long as
+# the stream is deep enough to hold one tick's worth.
+#
+# The samples go to a ring buffer of numpy arrays.  The widgets show one
+# window of samples at a time:
+#   - in 'auto' mode the latest window, rolling as samples come in,
+#   - in 'normal' mode the window around the latest trigger, held until the
+#     next one,
+#   - in 'single' mode the window around the first trigger after the scope
+#     is armed, held until it is armed again.
+# A trigger is the channel's value crossing the level on the chosen edge;
+# position is the fraction of the window shown before the trigger.  Windows
+# are drawn reduced to the minimum and maximum of each pixel column, so
+# spikes shorter than a column still show.
+
+MODES = ('auto', 'normal', 'single')
+EDGES = ('rising', 'falling', 'both')
+# samples read from the stream at a time
+BATCH = 4096
+
+def attach_sampler(comp, sampler=0):
+    """The stream of sampler instance number sampler, attached as a reader
+
+    comp is the HAL component of the panel."""
+    comp = getattr(comp, 'comp', comp)
+    return hal.stream(comp, hal.sampler_base + sampler)
+
+class ScopeBuffer:
+    """The last capacity samples of some channels
+
+    Samples are numbered from 0 as they are appended; a window is asked for
+    by sample numbers."""
+    def __init__(self, channels, capacity):
+        self.capacity = capacity
+        self.data = numpy.zeros((capacity, channels))
+        self.total = 0
+        self.first = 0
+
+    @property
+    def channels(self):
+        return self.data.shape[1]
+
+    @property
+    def oldest(self):
+        """The number of the oldest sample held"""
+        return max(self.first, self.total - self.capacity)
+
+    def extend(self, block):
+        """Append the (n, channels) array block"""
+        count = len(block)
+        block = block[-self.capacity:]
+        n = len(block)
+        start = (self.total + count - n) % self.capacity
+        head = min(n, self.capacity - start)
+        self.data[start:start + head] = block[:head]
+        self.data[:n - head] = block[head:]
+        self.total += count
+
+    def window(self, start, stop):
+        """Samples start up to stop, which must be held"""
+        return self.data[numpy.arange(start, stop) % self.capacity]
+
+    def clear(self):
+        self.first = self.total
+
+def crossings(values, level, edge):
+    """Indices i where values crosses level between values[i-1] and
+    values[i], on the given edge"""
+    before = values[:-1]
+    after = values[1:]
+    rising = (before < level) & (after >= level)
+    falling = (before > level) & (after <= level)
+    hit = {'rising': rising, 'falling': falling}.get(edge, rising | falling)
+    return numpy.flatnonzero(hit) + 1
+
+def min_max(values, columns):
+    """values reduced to the minimum and maximum of each of columns
+    columns, as (offsets, values) of a polyline through both
+
+    Short runs are returned as they are."""
+    n = len(values)
+    if n <= 2 * columns:
+        return numpy.arange(n), values
+    edges = numpy.arange(columns + 1) * n // columns
+    lo = numpy.minimum.reduceat(values, edges[:-1])
+    hi = numpy.maximum.reduceat(values, edges[:-1])
+    offsets = numpy.repeat((edges[:-1] + edges[1:]) / 2., 2)
+    result = numpy.empty(2 * columns)
+    result[0::2] = lo
+    result[1::2] = hi
+    return offsets, result
+
+class StreamScope:
+    """Samples of a sampler read from its stream, with the trigger logic
+    shared by the scope widgets"""
+    def __init__(self, stream, window=1000, capacity=1<<20, period=0.001):
+        self.stream = stream
+        self.types = stream.element_types
+        if isinstance(self.types, bytes):
+            self.types = self.types.decode()
+        self.buffer = ScopeBuffer(len(self.types), max(capacity, window))
+        self.batch = numpy.zeros(BATCH, hal.stream_dtype(self.types))
+        self.window = window
+        self.period = period
+        self.mode = 'auto'
+        self.channel = 0
+        self.level = 0.
+        self.edge = 'rising'
+        self.position = 0.5
+        # the first sample not searched for a trigger yet
+        self.searched = 0
+        self.armed = True
+        self.captured = None
+        self.trigger = None
+
+    @property
+    def channels(self):
+        return self.buffer.channels
+
+    @property
+    def overruns(self):
+        """Samples the sampler dropped because the stream was full"""
+        return self.stream.num_overruns
+
+    def read(self, limit):
+        """Up to limit samples from the stream, as an (n, channels) array"""
+        blocks = [numpy.zeros((0, self.channels))]
+        batch = self.batch
+        while limit > 0:
+            n = self.stream.read_into(batch, min(limit, len(batch)))
+            if n:
+                blocks.append(numpy.column_stack([batch[name][:n] for name in batch.dtype.names]))
+            limit -= n
+            if n < len(batch): break
+        return numpy.concatenate(blocks).astype(numpy.float64, copy=False)
+
+    def poll(self, limit=None):
+        """Move the samples waiting in the stream to the buffer and look for
+        triggers in them; returns the number of samples read"""
+        block = self.read(limit or self.buffer.capacity)
+        if len(block):
+            self.buffer.extend(block)
+            if self.mode != 'auto' and self.armed:
+                self.search()
+        return len(block)
+
+    def arm(self):
+        """Wait for the next trigger; in single mode, after one was shown"""
+        self.armed = True
+        self.searched = self.buffer.total
+
+    def set_mode(self, mode):
+        if mode not in MODES:
+            raise ValueError("scope mode must be one of %s" % ", ".join(MODES))
+        self.mode = mode
+        self.captured = self.trigger = None
+        self.arm()
+
+    def search(self):
+        buf = self.buffer
+        pre = int(self.window * self.position)
+        post = self.window - pre
+        # a trigger needs the sample before it, and a whole window around it;
+        # with position 1.0 the trigger sample itself must be held too
+        lo = max(self.searched, buf.oldest + max(pre, 1))
+        hi = buf.total - max(post, 1)
+        if hi < lo: return
+        values = buf.window(lo - 1, hi + 1)[:, self.channel]
+        found = crossings(values, self.level, self.edge)
+        if not len(found):
+            self.searched = hi + 1
+            return
+        # normal mode shows the latest trigger, single mode the first
+        t = lo - 1 + found[0 if self.mode == 'single' else -1]
+        self.trigger = t
+        self.captured = t - pre, buf.window(t - pre, t + post)
+        self.searched = t + post
+        if self.mode == 'single':
+            self.armed = False
+
+    def view(self):
+        """The window to show, as (number of its first sample, (n, channels)
+        array); empty while no trigger was found"""
+        if self.mode == 'auto':
+            start = max(self.buffer.oldest, self.buffer.total - self.window)
+            return start, self.buffer.window(start, self.buffer.total)
+        if self.captured is None:
+            return 0, numpy.zeros((0, self.channels))
+        return self.captured
+
+    def clear(self):
+        self.buffer.clear()
+        self.captured = self.trigger = None
+        self.arm()
+
+    def export(self, filename, names=None):
+        """Save the window shown as a CSV file, one column per channel after
+        the time in seconds; returns the number of samples saved"""
+        start, data = self.view()
+        if names is None:
+            names = ["channel%d" % i for i in range(self.channels)]
+        t = (start + numpy.arange(len(data))) * self.period
+        numpy.savetxt(filename, numpy.column_stack([t, data]), fmt='%.9g', delimiter=',',
+                      header=','.join(['time'] + list(names)), comments='')
+        return len(data)
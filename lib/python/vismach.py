@@ -17,7 +17,11 @@
 import copy
 import sys, rs274.OpenGLTk, signal, hal
 import tkinter
+import ctypes
+import numpy
+import vismach_mesh
 
+import OpenGL.GL
 from OpenGL.GL import *
 from OpenGL.GLU import *
 from math import *
@@ -158,7 +162,7 @@ class Track(Collection):
         
     def apply(self):
         #make sure we have something to work with first
-        if (self.world2view.t == []):
+        if len(self.world2view.t) == 0:
                 #something's borkled - give up
                 print("vismach.py: Track: why am i here? world is not in the scene yet")
                 glPushMatrix()
@@ -661,20 +665,111 @@ class Capture(object):
 # not do scaling
 
 def invert(src):
-        # make a copy
-        inv=copy.deepcopy(src)
+        src = numpy.asarray(src, numpy.float64).reshape(4, 4)
+        inv = src.copy()
         # The inverse of the upper 3x3 is the transpose (since the basis
         # vectors are orthogonal to each other.
-        inv[0][1],inv[1][0] = inv[1][0],inv[0][1]
-        inv[0][2],inv[2][0] = inv[2][0],inv[0][2]
-        inv[1][2],inv[2][1] = inv[2][1],inv[1][2]
+        inv[:3, :3] = src[:3, :3].T
         # The inverse of the translation component is just the negation
-        # of the translation after dotting with the new upper3x3 rows. */        
-        inv[3][0] = -(src[3][0]*inv[0][0] + src[3][1]*inv[1][0] + src[3][2]*inv[2][0])
-        inv[3][1] = -(src[3][0]*inv[0][1] + src[3][1]*inv[1][1] + src[3][2]*inv[2][1])
-        inv[3][2] = -(src[3][0]*inv[0][2] + src[3][1]*inv[1][2] + src[3][2]*inv[2][2])
+        # of the translation after dotting with the new upper3x3 rows.
+        inv[3, :3] = -numpy.dot(src[3, :3], inv[:3, :3])
         return inv
 
+class Backplot(object):
+        '''the last points of the tool tip path, kept in a ring buffer
+        and drawn as one line strip'''
+        def __init__(self, length):
+                self.length = length
+                # every point is stored twice, at i and i+length, so the
+                # last count points are always one contiguous run
+                self.points = numpy.zeros((2 * length, 3), numpy.float32)
+                self.head = 0
+                self.count = 0
+                # points appended since the vertex buffer was updated
+                self.pending = 0
+                self.buffer = None
+
+        def append(self, point):
+                point = numpy.asarray(point, numpy.float32)
+                if self.count and (self.points[self.head - 1 + self.length] == point).all():
+                        return
+                self.points[self.head] = self.points[self.head + self.length] = point
+                self.head = (self.head + 1) % self.length
+                self.count = min(self.count + 1, self.length)
+                self.pending = min(self.pending + 1, self.length)
+
+        def clear(self):
+                self.count = 0
+
+        def upload(self):
+                if self.buffer is None:
+                        # OpenGL isn't ready before the first draw
+                        try:
+                                self.buffer = glGenBuffers(1)
+                        except Exception:
+                                self.buffer = 0
+                                return
+                        glBindBuffer(GL_ARRAY_BUFFER, self.buffer)
+                        glBufferData(GL_ARRAY_BUFFER, self.points.nbytes, self.points, GL_DYNAMIC_DRAW)
+                        self.pending = 0
+                        return
+                glBindBuffer(GL_ARRAY_BUFFER, self.buffer)
+                # both copies of the new points, wrapping around the end
+                n = self.pending
+                end = 2 * self.length
+                first = (self.head - n) % self.length
+                for lo in (first, first + self.length):
+                        for a, b in ((lo, min(lo + n, end)), (0, lo + n - end)):
+                                if b > a:
+                                        glBufferSubData(GL_ARRAY_BUFFER, a * 12, (b - a) * 12, self.points[a:b])
+                self.pending = 0
+
+        def draw(self):
+                if not self.count: return
+                if self.buffer is None or (self.buffer and self.pending):
+                        self.upload()
+                glPushClientAttrib(GL_CLIENT_VERTEX_ARRAY_BIT)
+                glEnableClientState(GL_VERTEX_ARRAY)
+                if self.buffer:
+                        glBindBuffer(GL_ARRAY_BUFFER, self.buffer)
+                        glVertexPointer(3, GL_FLOAT, 0, ctypes.c_void_p(0))
+                else:
+                        glVertexPointer(3, GL_FLOAT, 0, self.points)
+                glDrawArrays(GL_LINE_STRIP, (self.head - self.count) % self.length, self.count)
+                if self.buffer:
+                        glBindBuffer(GL_ARRAY_BUFFER, 0)
+                glPopClientAttrib()
+
+class PinWatch(object):
+        '''tells whether a pin or parameter of some HAL components moved by
+        more than threshold since changed() last returned True'''
+        def __init__(self, comps, threshold):
+                self.comps = comps
+                self.threshold = threshold
+                self.last = None
+
+        def values(self):
+                return numpy.concatenate([numpy.fromiter(c.getpins().values(), numpy.float64)
+                                          for c in self.comps])
+
+        def changed(self):
+                values = self.values()
+                if (self.last is not None and values.shape == self.last.shape
+                        and not (abs(values - self.last) > self.threshold).any()):
+                        return False
+                self.last = values
+                return True
+
+def hal_components(part, found=None):
+        '''the HAL components read by the parts of a model'''
+        if found is None: found = []
+        comp = getattr(part, "comp", None)
+        if isinstance(comp, hal.component) and comp not in found:
+                found.append(comp)
+        for p in getattr(part, "parts", ()):
+                hal_components(p, found)
+        return found
+
 class Hud(object):
         '''head up display - draws a semi-transparent text box.
         use HUD.strs for things that must be updated constantly,
@@ -775,8 +870,8 @@ class O(rs274.OpenGLTk.Opengl):
         #self.q1 = gluNewQuadric()
         #self.q2 = gluNewQuadric()
         #self.q3 = gluNewQuadric()
-        self.plotdata = []
         self.plotlen = 16000
+        self.backplot = None
         #does not show HUD by default
         self.hud = Hud()
 
@@ -822,18 +917,12 @@ class O(rs274.OpenGLTk.Opengl):
         # since backplot lines only need vertices, not orientation,
         # and the tooltip is at the origin, getting the tool coords
         # is easy
-        tx, ty, tz = self.tool2view.t[3][:3]
-        # now we have to transform them to the work frame
-        wx = tx*view2work[0][0]+ty*view2work[1][0]+tz*view2work[2][0]+view2work[3][0]
-        wy = tx*view2work[0][1]+ty*view2work[1][1]+tz*view2work[2][1]+view2work[3][1]
-        wz = tx*view2work[0][2]+ty*view2work[1][2]+tz*view2work[2][2]+view2work[3][2]
-        # wx, wy, wz are the values to use for backplot
-        # so we save them in a buffer
-        if len(self.plotdata) == self.plotlen:
-            del self.plotdata[:self.plotlen / 10]
-        point = [ wx, wy, wz ]
-        if not self.plotdata or point != self.plotdata[-1]:
-            self.plotdata.append(point)
+        tool = numpy.asarray(self.tool2view.t, numpy.float64).reshape(4, 4)[3, :3]
+        # now we have to transform them to the work frame, and save
+        # them in the backplot's buffer
+        if self.backplot is None:
+            self.backplot = Backplot(self.plotlen)
+        self.backplot.append(numpy.dot(tool, view2work[:3, :3]) + view2work[3, :3])
 
         # now lets draw something in the tool coordinate system
         #glPushMatrix()
@@ -873,10 +962,7 @@ class O(rs274.OpenGLTk.Opengl):
         glLineWidth(2)
         glColor3f(1.0,0.5,0.5)
 
-        glBegin(GL_LINE_STRIP)
-        for p in self.plotdata:
-            glVertex3f(*p)
-        glEnd()
+        self.backplot.draw()
 
         glEnable(GL_LIGHTING)
         glColor3f(1,1,1)
@@ -888,7 +974,8 @@ class O(rs274.OpenGLTk.Opengl):
         glPopMatrix()
 
     def plotclear(self):
-        del self.plotdata[:self.plotlen]
+        if self.backplot is not None:
+            self.backplot.clear()
 
 class Color(Collection):
     def __init__(self, color, parts):
@@ -902,119 +989,37 @@ class Color(Collection):
     def unapply(self):
         glPopAttrib()
 
-class AsciiSTL:
-    def __init__(self, filename=None, data=None):
-        if data is None:
-            data = open(filename, "r")
-        elif isinstance(data, str):
-            data = data.split("\n")
-        self.list = None
-        t = []
-        n = [0,0,0]
-        self.d = d = []
-        for line in data:
-            if line.find("normal") != -1:
-                line = line.split()
-                x, y, z = list(map(float, line[-3:]))
-                n = [x,y,z] 
-            elif line.find("vertex") != -1:
-                line = line.split()
-                x, y, z = list(map(float, line[-3:]))
-                t.append([x,y,z])
-                if len(t) == 3:
-                    if n == [0,0,0]:
-                        dx1 = t[1][0] - t[0][0]
-                        dy1 = t[1][1] - t[0][1]
-                        dz1 = t[1][2] - t[0][2]
-                        dx2 = t[2][0] - t[0][0]
-                        dy2 = t[2][1] - t[0][1]
-                        dz2 = t[2][2] - t[0][2]
-                        n = [dy1*dz2 - dy2*dz1, dz1*dx2 - dz2*dx1, dy1*dx2 - dy2*dx1]
-                    d.append((n, t))
-                    t = []
-                    n = [0,0,0]
+class AsciiSTL(vismach_mesh.MeshModel):
+    """A model read from an STL file, binary or ASCII, or from STL text
+    given as data
+
+    max_triangles=n draws a decimated copy of big models."""
+    def __init__(self, filename=None, data=None, **kw):
+        super().__init__(filename, data, kind='stl', **kw)
 
     def draw(self):
-        if self.list is None:
-            # OpenGL isn't ready yet in __init__ so the display list
-            # is created during the first draw
-            self.list = glGenLists(1)
-            glNewList(self.list, GL_COMPILE)
-            glBegin(GL_TRIANGLES)
-            for n, t in self.d:
-                glNormal3f(*n)
-                glVertex3f(*t[0])
-                glVertex3f(*t[1])
-                glVertex3f(*t[2])
-            glEnd()
-            glEndList()
-            del self.d
-        glCallList(self.list)
-
-class AsciiOBJ:
-    def __init__(self, filename=None, data=None):
-        if data is None:
-            data = open(filename, "r")
-        elif isinstance(data, str):
-            data = data.split("\n")
-
-        self.v = v = []
-        self.vn = vn = []
-        self.f = f = []
-        for line in data:
-            if line.startswith("#"): continue
-            if line.startswith("vn"):
-                vn.append([float(w) for w in line.split()[1:]])
-            elif line.startswith("v"):
-                v.append([float(w) for w in line.split()[1:]])
-            elif line.startswith("f"):
-                f.append(self.parse_face(line))
-
-#        print v[:5]
-#        print vn[:5]
-#        print f[:5]
-
-        self.list = None
-
-
-    def parse_int(self, i):
-        if i == '': return None
-        return int(i)
-
-    def parse_slash(self, word):
-        return [self.parse_int(i) for i in word.split("/")]
-
-    def parse_face(self, line):
-        return [self.parse_slash(w) for w in line.split()[1:]]
+        self.draw_mesh(OpenGL.GL)
+
+class AsciiOBJ(vismach_mesh.MeshModel):
+    """A model read from an OBJ file, or from OBJ text given as data
+
+    max_triangles=n draws a decimated copy of big models."""
+    def __init__(self, filename=None, data=None, **kw):
+        super().__init__(filename, data, kind='obj', **kw)
 
     def draw(self):
-        if self.list is None:
-            # OpenGL isn't ready yet in __init__ so the display list
-            # is created during the first draw
-            self.list = glGenLists(1)
-            glNewList(self.list, GL_COMPILE)
-            glDisable(GL_CULL_FACE)
-            glBegin(GL_TRIANGLES)
-            #print "obj", len(self.f)
-            for f in self.f:
-                for v, t, n in f:
-                    if n:
-                        glNormal3f(*self.vn[n-1])
-                    glVertex3f(*self.v[v-1])
-            glEnd()
-            glEndList()
-            del self.v
-            del self.vn
-            del self.f
-        glCallList(self.list)
+        glDisable(GL_CULL_FACE)
+        self.draw_mesh(OpenGL.GL)
 
 
 old_plotclear = False
 
-def main(model, tool, work, size=10, hud=0, rotation_vectors=None, lat=0, lon=0):
+def main(model, tool, work, size=10, hud=0, rotation_vectors=None, lat=0, lon=0,
+         plotlen=16000, redraw_threshold=1e-4):
     app = tkinter.Tk()
 
     t = O(app, double=1, depth=1)
+    t.plotlen = plotlen
     # set which axes to rotate around
     if rotation_vectors: t.rotation_vectors = rotation_vectors
     # we want to be able to see the model from all angles
@@ -1049,14 +1054,21 @@ def main(model, tool, work, size=10, hud=0, rotation_vectors=None, lat=0, lon=0)
 
     t.pack(fill="both", expand=1)
 
+    # only redraw when a pin the model reads has moved; models that read
+    # no component's pins are redrawn every time
+    comps = hal_components(model)
+    watch = PinWatch(comps, redraw_threshold) if comps else None
+
     def update():
         global old_plotclear
-        t.tkRedraw()
         new_plotclear = vcomp["plotclear"]
-        if new_plotclear and not old_plotclear:
+        cleared = new_plotclear and not old_plotclear
+        if cleared:
             t.plotclear()
         old_plotclear=new_plotclear
-        t.after(100, update)
+        if cleared or watch is None or watch.changed():
+            t.tkRedraw()
+        t.after(30 if watch else 100, update)
     update()
 
     def quit(*args):
@@ -0,0 +1,323 @@
+#    This program is free software; you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation; either version 2 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program; if not, write to the Free Software
+#    Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+import ctypes
+import hashlib
+import os
+import re
+import tempfile
+import numpy
+
+# Triangle meshes for the vismach and qt_vismach models.
+#
+# STL (binary or ASCII) and OBJ files are read straight into arrays: a binary
+# STL is memory mapped, the text formats are tokenized in bulk.  A mesh is
+# kept as one float32 array of triangle corners, each row the position and
+# the normal of a corner, which is the layout it is drawn from: a vertex
+# buffer where OpenGL has them, client vertex arrays otherwise.
+#
+# Models exported from CAD can hold millions of triangles, more than is
+# useful on screen.  A mesh can be decimated to a triangle budget by
+# clustering its vertices on a grid.  Loaded (and decimated) meshes are
+# cached as .npy files under ~/.cache/linuxcnc/vismach, keyed by the model
+# file's path, size and modification time, so the next start maps the cached
+# array instead of parsing the file again.
+
+# bump when the layout of a cached mesh or what goes into a key changes
+CACHE_VERSION = 1
+
+STL_HEADER = 80
+STL_FACET = numpy.dtype([('normal', '<f4', 3), ('corners', '<f4', (3, 3)),
+                         ('attribute', '<u2')])
+
+def cache_directory():
+    base = os.environ.get('XDG_CACHE_HOME') or os.path.expanduser('~/.cache')
+    return os.path.join(base, 'linuxcnc', 'vismach')
+
+def face_normals(corners):
+    """Unit normals of the (n, 3, 3) triangles corners, following their
+    winding; degenerate triangles get a zero normal"""
+    corners = numpy.asarray(corners, numpy.float32)
+    n = numpy.cross(corners[:, 1] - corners[:, 0], corners[:, 2] - corners[:, 0])
+    length = numpy.sqrt((n * n).sum(axis=1))
+    with numpy.errstate(invalid='ignore', divide='ignore'):
+        n = n / length[:, None]
+    n[length == 0] = 0
+    return n
+
+def _fill_normals(corners, normals):
+    """Replace the zero rows of the per-triangle normals with face normals"""
+    missing = ~normals.any(axis=1)
+    if missing.any():
+        normals[missing] = face_normals(corners[missing])
+    return normals
+
+class Mesh:
+    """Triangles as an (n*3, 6) float32 array of corner positions and normals"""
+    def __init__(self, data):
+        self.data = data
+
+    @classmethod
+    def from_triangles(cls, corners, normals):
+        """corners: (n, 3, 3); normals: (n, 3) per triangle or (n, 3, 3) per
+        corner"""
+        corners = numpy.asarray(corners, numpy.float32).reshape(-1, 3, 3)
+        normals = numpy.asarray(normals, numpy.float32)
+        data = numpy.empty((len(corners), 3, 6), numpy.float32)
+        data[:, :, :3] = corners
+        data[:, :, 3:] = normals[:, None, :] if normals.ndim == 2 else normals
+        return cls(data.reshape(-1, 6))
+
+    def __len__(self):
+        """The number of triangles"""
+        return len(self.data) // 3
+
+    @property
+    def corners(self):
+        return self.data[:, :3].reshape(-1, 3, 3)
+
+    @property
+    def normals(self):
+        return self.data[:, 3:].reshape(-1, 3, 3)
+
+    def decimated(self, max_triangles):
+        """A mesh of at most max_triangles triangles, made by merging the
+        vertices that fall in the same cell of a grid over the mesh and
+        dropping the triangles that collapse.  The grid is made coarser until
+        few enough triangles are left."""
+        if max_triangles is None or len(self) <= max_triangles: return self
+        corners = self.corners.reshape(-1, 3)
+        lo = corners.min(axis=0)
+        extent = max(float((corners.max(axis=0) - lo).max()), 1e-9)
+        # a grid of about one cell per triangle kept, to start with
+        cells = max(int(numpy.sqrt(max_triangles)), 1)
+        while True:
+            size = extent / cells
+            key = numpy.floor((corners - lo) / size).astype(numpy.int64)
+            key = (key[:, 0] * (cells + 1) + key[:, 1]) * (cells + 1) + key[:, 2]
+            unique, cluster = numpy.unique(key, return_inverse=True)
+            cluster = cluster.reshape(-1, 3)
+            kept = ((cluster[:, 0] != cluster[:, 1]) & (cluster[:, 1] != cluster[:, 2])
+                    & (cluster[:, 0] != cluster[:, 2]))
+            if kept.sum() <= max_triangles or cells == 1: break
+            cells = max(int(cells * 0.7), 1)
+        # triangles sharing no vertices (a triangle soup) can all collapse
+        if not kept.any(): return self
+        # each cluster is drawn at the mean of its vertices
+        count = numpy.bincount(cluster.ravel(), minlength=len(unique))
+        centers = numpy.stack([numpy.bincount(cluster.ravel(), corners[:, i], len(unique))
+                               for i in range(3)], axis=1) / count[:, None]
+        triangles = centers[cluster[kept]].astype(numpy.float32)
+        return Mesh.from_triangles(triangles, face_normals(triangles))
+
+def read_stl(filename=None, data=None):
+    """Read a binary or ASCII STL file, or STL text given as data"""
+    if data is None:
+        size = os.path.getsize(filename)
+        with open(filename, 'rb') as f:
+            head = f.read(STL_HEADER + 4)
+        if len(head) == STL_HEADER + 4:
+            count = int(numpy.frombuffer(head, '<u4', 1, STL_HEADER)[0])
+            # ASCII files start with "solid", but so do some binary ones
+            if size == STL_HEADER + 4 + count * STL_FACET.itemsize:
+                facets = numpy.memmap(filename, STL_FACET, 'r', STL_HEADER + 4, (count,))
+                return _stl_mesh(facets['corners'], numpy.array(facets['normal']))
+        with open(filename, 'rb') as f:
+            data = f.read()
+    elif isinstance(data, str):
+        data = data.encode()
+    else:
+        data = '\n'.join(data).encode()
+    tokens = numpy.array(data.split())
+    vertex = numpy.flatnonzero(tokens == b'vertex')
+    normal = numpy.flatnonzero(tokens == b'normal')
+    corners = tokens[vertex[:, None] + [1, 2, 3]].astype(numpy.float32)
+    corners = corners[:len(corners) // 3 * 3].reshape(-1, 3, 3)
+    if len(normal) == len(corners):
+        normals = tokens[normal[:, None] + [1, 2, 3]].astype(numpy.float32)
+    else:
+        normals = numpy.zeros((len(corners), 3), numpy.float32)
+    return _stl_mesh(corners, normals)
+
+def _stl_mesh(corners, normals):
+    # many exporters leave the normals zero
+    corners = numpy.asarray(corners, numpy.float32)
+    return Mesh.from_triangles(corners, _fill_normals(corners, normals))
+
+# the statements of an OBJ file that make up its mesh
+OBJ_STATEMENT = re.compile(rb'^[ \t]*(vn|v|f)[ \t]+([^\r\n#]*)', re.M)
+# corner words without a normal, which get an empty one
+OBJ_NO_TEXTURE = re.compile(rb'(\s[^\s/]+)(?=\s)')
+OBJ_NO_NORMAL = re.compile(rb'(\s[^\s/]+/[^\s/]+)(?=\s)')
+
+def _coordinates(lines):
+    """The first three numbers of each of lines as an (n, 3) array"""
+    values = numpy.fromstring(b' '.join(lines), numpy.float32, sep=' ')
+    if len(values) == 3 * len(lines):
+        return values.reshape(-1, 3)
+    # with w coordinates or vertex colors, only the first three count
+    words = numpy.array(b' \0 '.join(lines).split(), numpy.bytes_)
+    mark = words == b'\0'
+    line = numpy.cumsum(mark)[~mark]
+    words = words[~mark]
+    position = numpy.arange(len(words)) - numpy.searchsorted(line, line)
+    values = words[position < 3]
+    if len(values) != 3 * len(lines):
+        raise ValueError("OBJ vertex with fewer than three coordinates")
+    return values.astype(numpy.float32).reshape(-1, 3)
+
+def _obj_index(index, count):
+    """Zero based indices of OBJ indices, which count from the end of the
+    list so far when negative; -1 where an index is 0 (left out)"""
+    return numpy.where(index > 0, index - 1,
+                       numpy.where(index < 0, count + index, -1))
+
+def read_obj(filename=None, data=None):
+    """Read an OBJ file, or OBJ text given as data; polygons are split into
+    triangle fans"""
+    if data is None:
+        with open(filename, 'rb') as f:
+            data = f.read()
+    elif isinstance(data, str):
+        data = data.encode()
+    else:
+        data = '\n'.join(data).encode()
+    statements = OBJ_STATEMENT.findall(data)
+    # the last letter of each keyword: v, n or f
+    keyword = numpy.frombuffer(b''.join([k[-1:] for k, a in statements]), numpy.uint8)
+    vertices = _coordinates([a for k, a in statements if k == b'v'])
+    normals = _coordinates([a for k, a in statements if k == b'vn'])
+    faces = [a for k, a in statements if k == b'f']
+    if not faces:
+        return Mesh(numpy.zeros((0, 6), numpy.float32))
+    # the number of vertices and normals defined before each face
+    is_f = keyword == ord('f')
+    seen_v = numpy.cumsum(keyword == ord('v'))[is_f]
+    seen_n = numpy.cumsum(keyword == ord('n'))[is_f]
+    # corner words are v, v/vt, v/vt/vn or v//vn; all are made v/vt/vn, 0
+    # standing for a left out index, then every face line is three numbers
+    # per corner
+    text = b' ' + b' \n '.join(faces) + b' \n'
+    text = text.replace(b'//', b'/0/')
+    if text.count(b'/') != 2 * len(text.split()):
+        text = OBJ_NO_TEXTURE.sub(rb'\1/0/0', text)
+        text = OBJ_NO_NORMAL.sub(rb'\1/0', text)
+    buffer = numpy.frombuffer(text, numpy.uint8)
+    slashes = numpy.cumsum(buffer == ord('/'))[buffer == ord('\n')]
+    size = numpy.diff(slashes, prepend=0) // 2
+    index = numpy.fromstring(text.replace(b'/', b' '), numpy.int64, sep=' ')
+    if len(index) != 3 * size.sum():
+        raise ValueError("OBJ face with a malformed corner")
+    index = index.reshape(-1, 3)
+    # a face of m corners is the fan (0, k, k + 1), k from 1 to m - 2
+    first = numpy.cumsum(size) - size
+    fans = numpy.maximum(size - 2, 0)
+    fan_face = numpy.repeat(numpy.arange(len(fans)), fans)
+    k = numpy.arange(len(fan_face)) - numpy.repeat(numpy.cumsum(fans) - fans, fans) + 1
+    corner = (first[fan_face][:, None] + numpy.stack([numpy.zeros_like(k), k, k + 1], 1)).ravel()
+    corner_face = numpy.repeat(fan_face, 3)
+    v = _obj_index(index[corner, 0], seen_v[corner_face])
+    n = _obj_index(index[corner, 2], seen_n[corner_face])
+    corners = vertices[v].reshape(-1, 3, 3)
+    result = numpy.zeros(corners.shape, numpy.float32)
+    has_normal = (n >= 0).reshape(-1, 3).all(axis=1)
+    result[has_normal] = normals[n.reshape(-1, 3)[has_normal]]
+    result[~has_normal] = face_normals(corners[~has_normal])[:, None, :]
+    return Mesh.from_triangles(corners, result)
+
+def _cache_key(filename, max_triangles):
+    st = os.stat(filename)
+    text = repr((CACHE_VERSION, os.path.realpath(filename), st.st_size,
+                 st.st_mtime_ns, max_triangles))
+    return hashlib.blake2b(text.encode(), digest_size=20).hexdigest()
+
+def load(filename=None, data=None, kind=None, max_triangles=None, cache=True):
+    """Read the mesh of filename (or of the text data), decimated to at most
+    max_triangles triangles when that is given
+
+    kind is 'stl' or 'obj', by default taken from the file name's suffix."""
+    if kind is None:
+        kind = 'obj' if filename and filename.lower().endswith('.obj') else 'stl'
+    reader = read_obj if kind == 'obj' else read_stl
+    if data is not None or not cache:
+        return reader(filename, data).decimated(max_triangles)
+    path = os.path.join(cache_directory(), _cache_key(filename, max_triangles) + '.npy')
+    try:
+        return Mesh(numpy.load(path, mmap_mode='r'))
+    except (OSError, ValueError):
+        pass
+    mesh = reader(filename).decimated(max_triangles)
+    try:
+        os.makedirs(cache_directory(), exist_ok=True)
+        fd, tmp = tempfile.mkstemp(prefix='.tmp-', suffix='.npy', dir=cache_directory())
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                numpy.save(f, numpy.ascontiguousarray(mesh.data))
+            # readers only ever see complete files
+            os.replace(tmp, path)
+        except Exception:
+            os.unlink(tmp)
+            raise
+    except OSError as e:
+        print("vismach: could not cache %s: %s" % (filename, e))
+    return mesh
+
+class MeshModel:
+    """A mesh drawn from a vertex buffer, or from client vertex arrays where
+    vertex buffers are not available
+
+    Besides filename or data, takes the keyword arguments of load()."""
+    def __init__(self, filename=None, data=None, **kw):
+        self.mesh = load(filename, data, **kw)
+        self.buffer = None
+
+    def _upload(self, GL):
+        try:
+            self.buffer = GL.glGenBuffers(1)
+        except Exception:
+            self.buffer = 0
+            # PyOpenGL copies arrays that are not contiguous, so the
+            # positions and normals are kept apart
+            self.positions = numpy.ascontiguousarray(self.mesh.data[:, :3])
+            self.normals = numpy.ascontiguousarray(self.mesh.data[:, 3:])
+            self.count = len(self.positions)
+            del self.mesh
+            return
+        GL.glBindBuffer(GL.GL_ARRAY_BUFFER, self.buffer)
+        data = numpy.ascontiguousarray(self.mesh.data)
+        self.count = len(data)
+        GL.glBufferData(GL.GL_ARRAY_BUFFER, data.nbytes, data, GL.GL_STATIC_DRAW)
+        GL.glBindBuffer(GL.GL_ARRAY_BUFFER, 0)
+        # the buffer holds the triangles now
+        del self.mesh
+
+    def draw_mesh(self, GL):
+        """Draw the triangles with the OpenGL module GL"""
+        # OpenGL isn't ready yet in __init__ so the buffer is filled
+        # during the first draw
+        if self.buffer is None: self._upload(GL)
+        GL.glPushClientAttrib(GL.GL_CLIENT_VERTEX_ARRAY_BIT)
+        GL.glEnableClientState(GL.GL_VERTEX_ARRAY)
+        GL.glEnableClientState(GL.GL_NORMAL_ARRAY)
+        if self.buffer:
+            GL.glBindBuffer(GL.GL_ARRAY_BUFFER, self.buffer)
+            GL.glVertexPointer(3, GL.GL_FLOAT, 24, ctypes.c_void_p(0))
+            GL.glNormalPointer(GL.GL_FLOAT, 24, ctypes.c_void_p(12))
+        else:
+            GL.glVertexPointer(3, GL.GL_FLOAT, 0, self.positions)
+            GL.glNormalPointer(GL.GL_FLOAT, 0, self.normals)
+        GL.glDrawArrays(GL.GL_TRIANGLES, 0, self.count)
+        if self.buffer:
+            GL.glBindBuffer(GL.GL_ARRAY_BUFFER, 0)
+        GL.glPopClientAttrib()
@@ -16,6 +16,7 @@ from qtvcp.lib.gcodes import GCodes
 from qtvcp.lib.qt_pdf import PDFViewer
 from qtvcp.core import Status, Action, Info, Path, Qhal
 from qtvcp import logger
+from rs274.properties import property_names
 from shutil import copyfile
 
 LOG = logger.getLogger(__name__)
@@ -1441,20 +1442,7 @@ class HandlerClass:
         return ''
 
     def update_gcode_properties(self, props ):
-        # substitute nice looking text:
-        property_names = {
-            'name': "Name:", 'size': "Size:",
-    '       tools': "Tool order:", 'g0': "Rapid distance:",
-            'g1': "Feed distance:", 'g': "Total distance:",
-            'run': "Run time:",'machine_unit_sys':"Machine Unit System:",
-            'x': "X bounds:",'x_zero_rxy':'X @ Zero Rotation:',
-            'y': "Y bounds:",'y_zero_rxy':'Y @ Zero Rotation:',
-            'z': "Z bounds:",'z_zero_rxy':'Z @ Zero Rotation:',
-            'a': "A bounds:", 'b': "B bounds:",
-            'c': "C bounds:",'toollist':'Tool Change List:',
-            'gcode_units':"Gcode Units:"
-        }
-
+        # substitute nice looking text (see rs274.properties)
         smallmess = mess = ''
         if props:
             for i in props:
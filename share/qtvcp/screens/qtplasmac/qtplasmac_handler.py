@@ -5049,7 +5049,7 @@ class HandlerClass:
         if not self.dialog_show_yesno(QMessageBox.Question, f'{head}', f'\n{msg0} #{matNum}?\n'):
             return
         self.MATS.remove_section(f'MATERIAL_NUMBER_{matNum}')
-        self.MATS.write(open(self.MATS.fn, 'w'))
+        self.MATS.flush()
         self.materialUpdate = True
         self.load_material_file(True)
         self.materialUpdate = False
@@ -5334,19 +5334,19 @@ class HandlerClass:
 
     def write_one_material(self, mat):
         section = f'MATERIAL_NUMBER_{mat[0]}'
-        self.MATS.putpref('NAME', mat[1], str, section)
-        self.MATS.putpref('KERF_WIDTH', mat[2], float, section)
-        self.MATS.putpref('PIERCE_HEIGHT', mat[3], float, section)
-        self.MATS.putpref('PIERCE_DELAY', mat[4], float, section)
-        self.MATS.putpref('PUDDLE_JUMP_HEIGHT', mat[5], float, section)
-        self.MATS.putpref('PUDDLE_JUMP_DELAY', mat[6], float, section)
-        self.MATS.putpref('CUT_HEIGHT', mat[7], float, section)
-        self.MATS.putpref('CUT_SPEED', mat[8], float, section)
-        self.MATS.putpref('CUT_AMPS', mat[9], float, section)
-        self.MATS.putpref('CUT_VOLTS', mat[10], float, section)
-        self.MATS.putpref('PAUSE_AT_END', mat[11], float, section)
-        self.MATS.putpref('GAS_PRESSURE', mat[12], float, section)
-        self.MATS.putpref('CUT_MODE', mat[13], float, section)
+        self.MATS.putprefs([('NAME', mat[1], str),
+                            ('KERF_WIDTH', mat[2], float),
+                            ('PIERCE_HEIGHT', mat[3], float),
+                            ('PIERCE_DELAY', mat[4], float),
+                            ('PUDDLE_JUMP_HEIGHT', mat[5], float),
+                            ('PUDDLE_JUMP_DELAY', mat[6], float),
+                            ('CUT_HEIGHT', mat[7], float),
+                            ('CUT_SPEED', mat[8], float),
+                            ('CUT_AMPS', mat[9], float),
+                            ('CUT_VOLTS', mat[10], float),
+                            ('PAUSE_AT_END', mat[11], float),
+                            ('GAS_PRESSURE', mat[12], float),
+                            ('CUT_MODE', mat[13], float)], section)
 
     def set_default_material(self):
         self.getMaterialBusy = True
@@ -5531,14 +5531,15 @@ class HandlerClass:
         self.statistics_load()
 
     def statistics_save(self, reset=False):
-        self.PREFS.putpref('Cut time', f'{self.statsSaved["cut"] + hal.get_value("plasmac.cut-time"):0.2f}', float, 'STATISTICS')
-        self.PREFS.putpref('Paused time', f'{self.statsSaved["paused"] + hal.get_value("plasmac.paused-time"):0.2f}', float, 'STATISTICS')
-        self.PREFS.putpref('Probe time', f'{self.statsSaved["probe"] + hal.get_value("plasmac.probe-time"):0.2f}', float, 'STATISTICS')
-        self.PREFS.putpref('Program run time', f'{self.statsSaved["run"] + hal.get_value("plasmac.run-time"):0.2f}', float, 'STATISTICS')
-        self.PREFS.putpref('Torch on time', f'{self.statsSaved["torch"] + hal.get_value("plasmac.torch-time"):0.2f}', float, 'STATISTICS')
-        self.PREFS.putpref('Rapid time', f'{self.statsSaved["rapid"] + hal.get_value("plasmac.rapid-time"):0.2f}', float, 'STATISTICS')
-        self.PREFS.putpref('Cut length', f'{self.statsSaved["length"] + hal.get_value("plasmac.cut-length"):0.2f}', float, 'STATISTICS')
-        self.PREFS.putpref('Pierce count', f'{self.statsSaved["pierce"] + hal.get_value("plasmac.pierce-count"):d}', int, 'STATISTICS')
+        self.PREFS.putprefs([('Cut time', f'{self.statsSaved["cut"] + hal.get_value("plasmac.cut-time"):0.2f}', float),
+                             ('Paused time', f'{self.statsSaved["paused"] + hal.get_value("plasmac.paused-time"):0.2f}', float),
+                             ('Probe time', f'{self.statsSaved["probe"] + hal.get_value("plasmac.probe-time"):0.2f}', float),
+                             ('Program run time', f'{self.statsSaved["run"] + hal.get_value("plasmac.run-time"):0.2f}', float),
+                             ('Torch on time', f'{self.statsSaved["torch"] + hal.get_value("plasmac.torch-time"):0.2f}', float),
+                             ('Rapid time', f'{self.statsSaved["rapid"] + hal.get_value("plasmac.rapid-time"):0.2f}', float),
+                             ('Cut length', f'{self.statsSaved["length"] + hal.get_value("plasmac.cut-length"):0.2f}', float),
+                             ('Pierce count', f'{self.statsSaved["pierce"] + hal.get_value("plasmac.pierce-count"):d}', int)],
+                            'STATISTICS')
         self.statistics_load()
         self.jobRunning = False
 
@@ -5576,10 +5577,9 @@ class HandlerClass:
             self.display_hms(f'{stat}_time', 0)
         self.w.cut_length.setText('0.00')
         self.w.pierce_count.setText('0')
-        for stat in ['Cut time', 'Paused time', 'Probe time', 'Program run time', 'Torch on time',
-                     'Rapid time', 'Cut length']:
-            self.PREFS.putpref(stat, 0.0, float, 'STATISTICS')
-        self.PREFS.putpref('Pierce count', 0, int, 'STATISTICS')
+        self.PREFS.putprefs([(stat, 0.0, float) for stat in ['Cut time', 'Paused time', 'Probe time', 'Program run time',
+                                                              'Torch on time', 'Rapid time', 'Cut length']] +
+                            [('Pierce count', 0, int)], 'STATISTICS')
         self.statistics_load()
 
     def statistics_init(self):
@@ -41,6 +41,8 @@
 
 
 #include <sys/time.h>
+#include <stdint.h>
+#include <vector>
 
 #include <Python.h>
 #include <structmember.h>
@@ -190,26 +192,111 @@ static InterpBase *pinterp;
 
 #define callmethod(o, m, f, ...) PyObject_CallMethod((o), (char*)(m), (char*)(f), ## __VA_ARGS__)
 
+/* Batched motion protocol
+ * -----------------------
+ * A canon that sets a positive 'motion_batch_size' attribute does not get
+ * straight_traverse, straight_feed, straight_probe and arc_feed calls.
+ * Instead the motions are rotated and translated here (arcs are also split
+ * into segments here) and handed over in blocks of up to motion_batch_size
+ * records by calling canon.motion_batch(buffer).  buffer is a bytes object
+ * holding an array of motion_record, see MOTION_* and rs274.segments.
+ *
+ * The state of each line is taken when its first motion is batched.  A
+ * batch is handed over right after next_line is called with the state of
+ * the line of its last motion, so while the canon stores the batch and
+ * after it, canon.state and canon.lineno are what they would be after the
+ * same motions one by one; the lines before it in the batch only have
+ * their line number in the records.  Every other callback first flushes
+ * the pending motions, so the order of events is preserved.  After any
+ * such callback, the position and offsets are read back from the canon.
+ */
+enum { MOTION_TRAVERSE, MOTION_FEED, MOTION_ARC };
+
+struct motion_record {
+    int32_t kind;
+    int32_t lineno;
+    double pos[9];
+};
+
+static std::vector<motion_record> motion_batch;
+static size_t motion_batch_size;
+static bool motion_batch_stale;
+// the state of the line of the last batched motion, not handed over yet
+static PyObject *pending_line;
+static double batch_lo[9], batch_g5x[9], batch_g92[9];
+static double batch_rotation_cos, batch_rotation_sin;
+static int batch_plane, batch_arcdivision;
+static double batch_length_units;
+
+static PyObject *new_line_code(int sequence_number);
+
+static void flush_motion_batch() {
+    if(pending_line) {
+        PyObject *line = pending_line;
+        pending_line = NULL;
+        PyObject *result = callmethod(callback, "next_line", "O", line);
+        Py_DECREF(line);
+        if(result == NULL) { interp_error ++; motion_batch.clear(); return; }
+        Py_DECREF(result);
+    }
+    if(motion_batch.empty()) return;
+    PyObject *buffer = PyBytes_FromStringAndSize(
+            (const char *)motion_batch.data(),
+            motion_batch.size() * sizeof(motion_record));
+    motion_batch.clear();
+    if(!buffer) { interp_error ++; return; }
+    PyObject *result = callmethod(callback, "motion_batch", "O", buffer);
+    Py_DECREF(buffer);
+    if(result == NULL) interp_error ++;
+    Py_XDECREF(result);
+}
+
+static void batch_straight(int kind, int line_number,
+                   double x, double y, double z,
+                   double a, double b, double c,
+                   double u, double v, double w);
+static void batch_arc(int line_number,
+              double first_end, double second_end, double first_axis,
+              double second_axis, int rotation, double axis_end_point,
+              double a, double b, double c, double u, double v, double w);
+
 static void maybe_new_line(int sequence_number=pinterp->sequence_number());
-static void maybe_new_line(int sequence_number) {
-    if(!pinterp) return;
-    if(interp_error) return;
-    if(sequence_number == last_sequence_number)
-        return;
+static PyObject *new_line_code(int sequence_number) {
     LineCode *new_line_code =
         (LineCode*)(PyObject_New(LineCode, &LineCodeType));
+    if(!new_line_code) return NULL;
     pinterp->active_settings(new_line_code->settings);
     pinterp->active_g_codes(new_line_code->gcodes);
     pinterp->active_m_codes(new_line_code->mcodes);
     new_line_code->gcodes[0] = sequence_number;
+    return (PyObject *)new_line_code;
+}
+
+static void send_new_line(int sequence_number) {
+    PyObject *line = new_line_code(sequence_number);
+    if(!line) { interp_error ++; return; }
     last_sequence_number = sequence_number;
     PyObject *result = 
-        callmethod(callback, "next_line", "O", new_line_code);
-    Py_DECREF(new_line_code);
+        callmethod(callback, "next_line", "O", line);
+    Py_DECREF(line);
     if(result == NULL) interp_error ++;
     Py_XDECREF(result);
 }
 
+static void maybe_new_line(int sequence_number) {
+    if(!pinterp) return;
+    if(interp_error) return;
+    if(motion_batch_size) {
+        // a callback other than a batched motion follows
+        flush_motion_batch();
+        motion_batch_stale = true;
+        if(interp_error) return;
+    }
+    if(sequence_number == last_sequence_number)
+        return;
+    send_new_line(sequence_number);
+}
+
 //das ist für die Vorschau
 /* G_5_2/G_5_3*/
 void NURBS_G5_FEED(int line_number, const std::vector<NURBS_CONTROL_POINT>& nurbs_control_points, unsigned int nurbs_order, CANON_PLANE plane)
@@ -329,6 +416,12 @@ void ARC_FEED(int line_number,
         v_position /= 25.4;
         w_position /= 25.4;
     }
+    if(motion_batch_size) {
+        batch_arc(line_number, first_end, second_end, first_axis, second_axis,
+                rotation, axis_end_point, a_position, b_position, c_position,
+                u_position, v_position, w_position);
+        return;
+    }
     maybe_new_line(line_number);
     if(interp_error) return;
     PyObject *result =
@@ -349,6 +442,10 @@ void STRAIGHT_FEED(int line_number,
     _pos_a=a; _pos_b=b; _pos_c=c;
     _pos_u=u; _pos_v=v; _pos_w=w;
     if(metric) { x /= 25.4; y /= 25.4; z /= 25.4; u /= 25.4; v /= 25.4; w /= 25.4; }
+    if(motion_batch_size) {
+        batch_straight(MOTION_FEED, line_number, x, y, z, a, b, c, u, v, w);
+        return;
+    }
     maybe_new_line(line_number);
     if(interp_error) return;
     PyObject *result =
@@ -366,6 +463,10 @@ void STRAIGHT_TRAVERSE(int line_number,
     _pos_a=a; _pos_b=b; _pos_c=c;
     _pos_u=u; _pos_v=v; _pos_w=w;
     if(metric) { x /= 25.4; y /= 25.4; z /= 25.4; u /= 25.4; v /= 25.4; w /= 25.4; }
+    if(motion_batch_size) {
+        batch_straight(MOTION_TRAVERSE, line_number, x, y, z, a, b, c, u, v, w);
+        return;
+    }
     maybe_new_line(line_number);
     if(interp_error) return;
     PyObject *result =
@@ -611,6 +712,10 @@ void STRAIGHT_PROBE(int line_number,
     _pos_a=a; _pos_b=b; _pos_c=c;
     _pos_u=u; _pos_v=v; _pos_w=w;
     if(metric) { x /= 25.4; y /= 25.4; z /= 25.4; u /= 25.4; v /= 25.4; w /= 25.4; }
+    if(motion_batch_size) {
+        batch_straight(MOTION_FEED, line_number, x, y, z, a, b, c, u, v, w);
+        return;
+    }
     maybe_new_line(line_number);
     if(interp_error) return;
     PyObject *result =
@@ -841,6 +946,34 @@ void SET_MOTION_CONTROL_MODE(CANON_MOTION_MODE mode) { motion_mode = mode; }
 CANON_MOTION_MODE GET_EXTERNAL_MOTION_CONTROL_MODE() { return motion_mode; }
 void SET_NAIVECAM_TOLERANCE(double /*tolerance*/) { }
 
+// Decide whether this parse uses the batched motion protocol
+static bool setup_motion_batch() {
+    motion_batch_size = 0;
+    motion_batch.clear();
+    Py_CLEAR(pending_line);
+    motion_batch_stale = true;
+
+    PyObject *attr = PyObject_GetAttrString(callback, "motion_batch_size");
+    if(!attr) { PyErr_Clear(); return true; }
+    long size = PyLong_Check(attr) ? PyLong_AsLong(attr) : 0;
+    Py_DECREF(attr);
+    if(size <= 0) return true;
+
+    batch_arcdivision = 64;
+    PyObject *arcdivision = PyObject_GetAttrString(callback, "arcdivision");
+    if(!arcdivision) PyErr_Clear();
+    else {
+        if(PyLong_Check(arcdivision)) batch_arcdivision = PyLong_AsLong(arcdivision);
+        Py_DECREF(arcdivision);
+    }
+    batch_length_units = GET_EXTERNAL_LENGTH_UNITS();
+    if(interp_error) return false;
+
+    motion_batch_size = size;
+    motion_batch.reserve(motion_batch_size);
+    return true;
+}
+
 #define RESULT_OK (result == INTERP_OK || result == INTERP_EXECUTE_FINISH)
 static PyObject *parse_file(PyObject * /*self*/, PyObject *args) {
     char *f;
@@ -878,6 +1011,8 @@ static PyObject *parse_file(PyObject * /*self*/, PyObject *args) {
     interp_error = 0;
     last_sequence_number = -1;
 
+    if(!setup_motion_batch()) return NULL;
+
     _pos_x = _pos_y = _pos_z = _pos_a = _pos_b = _pos_c = 0;
     _pos_u = _pos_v = _pos_w = 0;
 
@@ -922,6 +1057,8 @@ static PyObject *parse_file(PyObject * /*self*/, PyObject *args) {
         result = pinterp->execute();
     }
 out_error:
+    if(!interp_error) flush_motion_batch();
+    Py_CLEAR(pending_line);
     if(pinterp)
     {
         auto interp = dynamic_cast<Interp*>(pinterp);
@@ -962,6 +1099,31 @@ static PyObject *rs274_strerror(PyObject * /*s*/, PyObject *o) {
     return PyUnicode_FromString(savedError);
 }
 
+// A segment store (rs274.segments.SegmentStore) exposes each column as a
+// C-contiguous numpy array.  Get one of them as a 2-d array of doubles.
+static bool get_segment_column(PyObject *o, const char *attr_name,
+        Py_ssize_t columns, Py_buffer *view) {
+    PyObject *attr = PyObject_GetAttrString(o, attr_name);
+    if(!attr) return false;
+    int r = PyObject_GetBuffer(attr, view, PyBUF_C_CONTIGUOUS | PyBUF_FORMAT);
+    Py_DECREF(attr);
+    if(r < 0) return false;
+    const char *fmt = view->format ? view->format : "B";
+    if(*fmt == '@' || *fmt == '=' || *fmt == '<') fmt++;
+    if(strcmp(fmt, "d") || view->ndim != 2 || view->shape[1] != columns) {
+        PyErr_Format(PyExc_TypeError,
+            "%s: expected a contiguous Nx%zd array of float64", attr_name, columns);
+        PyBuffer_Release(view);
+        return false;
+    }
+    return true;
+}
+
+static bool is_segment_store(PyObject *o) {
+    return !PyList_Check(o) && !PyTuple_Check(o)
+        && PyObject_HasAttrString(o, "tooloffset");
+}
+
 static PyObject *rs274_calc_extents(PyObject * /*self*/, PyObject *args) {
     double min_x = 9e99, min_y = 9e99, min_z = 9e99,
            min_xt = 9e99, min_yt = 9e99, min_zt = 9e99,
@@ -972,6 +1134,58 @@ static PyObject *rs274_calc_extents(PyObject * /*self*/, PyObject *args) {
         if(!si) return NULL;
         int j;
         double xs, ys, zs, xe, ye, ze, xt, yt, zt;
+        if(is_segment_store(si)) {
+            Py_buffer sb, eb, tb;
+            if(!get_segment_column(si, "start", 9, &sb)) return NULL;
+            if(!get_segment_column(si, "end", 9, &eb)) {
+                PyBuffer_Release(&sb);
+                return NULL;
+            }
+            if(!get_segment_column(si, "tooloffset", 3, &tb)) {
+                PyBuffer_Release(&sb);
+                PyBuffer_Release(&eb);
+                return NULL;
+            }
+            const double *start = (const double *)sb.buf;
+            const double *end = (const double *)eb.buf;
+            const double *to = (const double *)tb.buf;
+            Py_ssize_t n = sb.shape[0];
+            for(Py_ssize_t k=0; k<n; k++) {
+                xs = start[9*k]; ys = start[9*k+1]; zs = start[9*k+2];
+                xt = to[3*k]; yt = to[3*k+1]; zt = to[3*k+2];
+                max_x = std::max(max_x, xs);
+                max_y = std::max(max_y, ys);
+                max_z = std::max(max_z, zs);
+                min_x = std::min(min_x, xs);
+                min_y = std::min(min_y, ys);
+                min_z = std::min(min_z, zs);
+                max_xt = std::max(max_xt, xs+xt);
+                max_yt = std::max(max_yt, ys+yt);
+                max_zt = std::max(max_zt, zs+zt);
+                min_xt = std::min(min_xt, xs+xt);
+                min_yt = std::min(min_yt, ys+yt);
+                min_zt = std::min(min_zt, zs+zt);
+            }
+            if(n > 0) {
+                xe = end[9*(n-1)]; ye = end[9*(n-1)+1]; ze = end[9*(n-1)+2];
+                max_x = std::max(max_x, xe);
+                max_y = std::max(max_y, ye);
+                max_z = std::max(max_z, ze);
+                min_x = std::min(min_x, xe);
+                min_y = std::min(min_y, ye);
+                min_z = std::min(min_z, ze);
+                max_xt = std::max(max_xt, xe+xt);
+                max_yt = std::max(max_yt, ye+yt);
+                max_zt = std::max(max_zt, ze+zt);
+                min_xt = std::min(min_xt, xe+xt);
+                min_yt = std::min(min_yt, ye+yt);
+                min_zt = std::min(min_zt, ze+zt);
+            }
+            PyBuffer_Release(&sb);
+            PyBuffer_Release(&eb);
+            PyBuffer_Release(&tb);
+            continue;
+        }
         for(j=0; j<PySequence_Length(si); j++) {
             PyObject *sj = PySequence_GetItem(si, j);
             PyObject *unused;
@@ -1058,6 +1272,27 @@ static bool get_attr(PyObject *o, const char *attr_name, const char *fmt, ...) {
     return result;
 }
 
+static bool get_offsets(PyObject *o, double g5xoffset[9], double g92offset[9]) {
+    return get_attr(o, "g5x_offset_x", &g5xoffset[0])
+        && get_attr(o, "g5x_offset_y", &g5xoffset[1])
+        && get_attr(o, "g5x_offset_z", &g5xoffset[2])
+        && get_attr(o, "g5x_offset_a", &g5xoffset[3])
+        && get_attr(o, "g5x_offset_b", &g5xoffset[4])
+        && get_attr(o, "g5x_offset_c", &g5xoffset[5])
+        && get_attr(o, "g5x_offset_u", &g5xoffset[6])
+        && get_attr(o, "g5x_offset_v", &g5xoffset[7])
+        && get_attr(o, "g5x_offset_w", &g5xoffset[8])
+        && get_attr(o, "g92_offset_x", &g92offset[0])
+        && get_attr(o, "g92_offset_y", &g92offset[1])
+        && get_attr(o, "g92_offset_z", &g92offset[2])
+        && get_attr(o, "g92_offset_a", &g92offset[3])
+        && get_attr(o, "g92_offset_b", &g92offset[4])
+        && get_attr(o, "g92_offset_c", &g92offset[5])
+        && get_attr(o, "g92_offset_u", &g92offset[6])
+        && get_attr(o, "g92_offset_v", &g92offset[7])
+        && get_attr(o, "g92_offset_w", &g92offset[8]);
+}
+
 static void unrotate(double &x, double &y, double c, double s) {
     double tx = x * c + y * s;
     y = -x * s + y * c;
@@ -1070,41 +1305,18 @@ static void rotate(double &x, double &y, double c, double s) {
     x = tx;
 }
 
-static PyObject *rs274_arc_to_segments(PyObject * /*self*/, PyObject *args) {
-    PyObject *canon;
-    double x1, y1, cx, cy, z1, a, b, c, u, v, w;
-    double o[9], n[9], g5xoffset[9], g92offset[9];
-    int rot, plane;
+// Split an arc into straight segments.  o is the start point in translated
+// (canon) coordinates; emit is called with each segment end point, also in
+// translated coordinates.
+template<class F>
+static void arc_to_segments(double o[9], double x1, double y1, double cx, double cy,
+        int rot, double z1, double a, double b, double c,
+        double u, double v, double w, int plane,
+        const double g5xoffset[9], const double g92offset[9],
+        double rotation_cos, double rotation_sin, double length_units,
+        int max_segments, F emit) {
+    double n[9];
     int X, Y, Z;
-    double rotation_cos, rotation_sin;
-    int max_segments = 128;
-
-    if(!PyArg_ParseTuple(args, "Oddddiddddddd|i:arcs_to_segments",
-        &canon, &x1, &y1, &cx, &cy, &rot, &z1, &a, &b, &c, &u, &v, &w, &max_segments)) return NULL;
-    if(!get_attr(canon, "lo", "ddddddddd:arcs_to_segments lo", &o[0], &o[1], &o[2],
-                    &o[3], &o[4], &o[5], &o[6], &o[7], &o[8]))
-        return NULL;
-    if(!get_attr(canon, "plane", &plane)) return NULL;
-    if(!get_attr(canon, "rotation_cos", &rotation_cos)) return NULL;
-    if(!get_attr(canon, "rotation_sin", &rotation_sin)) return NULL;
-    if(!get_attr(canon, "g5x_offset_x", &g5xoffset[0])) return NULL;
-    if(!get_attr(canon, "g5x_offset_y", &g5xoffset[1])) return NULL;
-    if(!get_attr(canon, "g5x_offset_z", &g5xoffset[2])) return NULL;
-    if(!get_attr(canon, "g5x_offset_a", &g5xoffset[3])) return NULL;
-    if(!get_attr(canon, "g5x_offset_b", &g5xoffset[4])) return NULL;
-    if(!get_attr(canon, "g5x_offset_c", &g5xoffset[5])) return NULL;
-    if(!get_attr(canon, "g5x_offset_u", &g5xoffset[6])) return NULL;
-    if(!get_attr(canon, "g5x_offset_v", &g5xoffset[7])) return NULL;
-    if(!get_attr(canon, "g5x_offset_w", &g5xoffset[8])) return NULL;
-    if(!get_attr(canon, "g92_offset_x", &g92offset[0])) return NULL;
-    if(!get_attr(canon, "g92_offset_y", &g92offset[1])) return NULL;
-    if(!get_attr(canon, "g92_offset_z", &g92offset[2])) return NULL;
-    if(!get_attr(canon, "g92_offset_a", &g92offset[3])) return NULL;
-    if(!get_attr(canon, "g92_offset_b", &g92offset[4])) return NULL;
-    if(!get_attr(canon, "g92_offset_c", &g92offset[5])) return NULL;
-    if(!get_attr(canon, "g92_offset_u", &g92offset[6])) return NULL;
-    if(!get_attr(canon, "g92_offset_v", &g92offset[7])) return NULL;
-    if(!get_attr(canon, "g92_offset_w", &g92offset[8])) return NULL;
 
     if(plane == 1) {
         X=0; Y=1; Z=2;
@@ -1130,7 +1342,7 @@ static PyObject *rs274_arc_to_segments(PyObject * /*self*/, PyObject *args) {
     double theta2 = atan2(n[Y]-cy, n[X]-cx);
     /* Issue #1528 1/2/22 andypugh */
     /*_posemath checks for small arcs too, but uses config units */
-    double len = hypot(o[X]-n[X], o[Y]-n[Y]) * (25.4 * GET_EXTERNAL_LENGTH_UNITS());
+    double len = hypot(o[X]-n[X], o[Y]-n[Y]) * (25.4 * length_units);
     /* If the signs of the angles differ, make them the same to allow monotonic progress through the arc */
     /* If start and end points are nearly identical, then interpret as a full turn */
     if(rot < 0) { // CW G2
@@ -1147,7 +1359,6 @@ static PyObject *rs274_arc_to_segments(PyObject * /*self*/, PyObject *args) {
 
     int steps = std::max(3, int(max_segments * fabs(theta1 - theta2) / M_PI));
     double rsteps = 1. / steps;
-    PyObject *segs = PyList_New(steps);
 
     double dtheta = theta2 - theta1;
     double d[9] = {0, 0, 0, n[3]-o[3], n[4]-o[4], n[5]-o[5], n[6]-o[6], n[7]-o[7], n[8]-o[8]};
@@ -1170,17 +1381,125 @@ static PyObject *rs274_arc_to_segments(PyObject * /*self*/, PyObject *args) {
         for(int ax=0; ax<9; ax++) p[ax] += g92offset[ax];
         rotate(p[0], p[1], rotation_cos, rotation_sin);
         for(int ax=0; ax<9; ax++) p[ax] += g5xoffset[ax];
-        PyList_SET_ITEM(segs, i,
-            Py_BuildValue("ddddddddd", p[0], p[1], p[2], p[3], p[4], p[5], p[6], p[7], p[8]));
+        emit(i, steps, p);
     }
     for(int ax=0; ax<9; ax++) n[ax] += g92offset[ax];
     rotate(n[0], n[1], rotation_cos, rotation_sin);
     for(int ax=0; ax<9; ax++) n[ax] += g5xoffset[ax];
-    PyList_SET_ITEM(segs, steps-1,
-        Py_BuildValue("ddddddddd", n[0], n[1], n[2], n[3], n[4], n[5], n[6], n[7], n[8]));
+    emit(steps-1, steps, n);
+}
+
+static PyObject *rs274_arc_to_segments(PyObject * /*self*/, PyObject *args) {
+    PyObject *canon;
+    double x1, y1, cx, cy, z1, a, b, c, u, v, w;
+    double o[9], g5xoffset[9], g92offset[9];
+    int rot, plane;
+    double rotation_cos, rotation_sin;
+    int max_segments = 128;
+
+    if(!PyArg_ParseTuple(args, "Oddddiddddddd|i:arcs_to_segments",
+        &canon, &x1, &y1, &cx, &cy, &rot, &z1, &a, &b, &c, &u, &v, &w, &max_segments)) return NULL;
+    if(!get_attr(canon, "lo", "ddddddddd:arcs_to_segments lo", &o[0], &o[1], &o[2],
+                    &o[3], &o[4], &o[5], &o[6], &o[7], &o[8]))
+        return NULL;
+    if(!get_attr(canon, "plane", &plane)) return NULL;
+    if(!get_attr(canon, "rotation_cos", &rotation_cos)) return NULL;
+    if(!get_attr(canon, "rotation_sin", &rotation_sin)) return NULL;
+    if(!get_offsets(canon, g5xoffset, g92offset)) return NULL;
+
+    PyObject *segs = NULL;
+    arc_to_segments(o, x1, y1, cx, cy, rot, z1, a, b, c, u, v, w, plane,
+        g5xoffset, g92offset, rotation_cos, rotation_sin,
+        GET_EXTERNAL_LENGTH_UNITS(), max_segments,
+        [&segs](int i, int steps, const double p[9]) {
+            if(!segs) segs = PyList_New(steps);
+            PyList_SET_ITEM(segs, i,
+                Py_BuildValue("ddddddddd", p[0], p[1], p[2], p[3], p[4], p[5], p[6], p[7], p[8]));
+        });
     return segs;
 }
 
+// Read the state the batched motion protocol mirrors back from the canon,
+// after the canon has had a chance to change it
+static bool sync_motion_batch() {
+    double rotation_xy;
+    if(!get_attr(callback, "lo", "ddddddddd:motion_batch lo",
+                &batch_lo[0], &batch_lo[1], &batch_lo[2],
+                &batch_lo[3], &batch_lo[4], &batch_lo[5],
+                &batch_lo[6], &batch_lo[7], &batch_lo[8]))
+        return false;
+    if(!get_attr(callback, "plane", &batch_plane)) return false;
+    // an int until the canon gets a set_xy_rotation call
+    PyObject *attr = PyObject_GetAttrString(callback, "rotation_xy");
+    if(!attr) return false;
+    rotation_xy = PyFloat_AsDouble(attr);
+    Py_DECREF(attr);
+    if(rotation_xy == -1 && PyErr_Occurred()) return false;
+    if(!get_offsets(callback, batch_g5x, batch_g92)) return false;
+    batch_rotation_cos = cos(rotation_xy * M_PI / 180.);
+    batch_rotation_sin = sin(rotation_xy * M_PI / 180.);
+    motion_batch_stale = false;
+    return true;
+}
+
+static void batch_point(int kind, int line_number, const double p[9]) {
+    motion_record r;
+    r.kind = kind;
+    r.lineno = line_number;
+    memcpy(r.pos, p, sizeof(r.pos));
+    memcpy(batch_lo, p, sizeof(batch_lo));
+    motion_batch.push_back(r);
+    if(motion_batch.size() >= motion_batch_size)
+        flush_motion_batch();
+}
+
+// Start a batched motion; returns false if the motion should be dropped
+static bool begin_batched_motion(int line_number) {
+    if(interp_error) return false;
+    if(line_number != last_sequence_number) {
+        last_sequence_number = line_number;
+        Py_XDECREF(pending_line);
+        pending_line = new_line_code(line_number);
+        if(!pending_line) {
+            interp_error ++;
+            return false;
+        }
+    }
+    if(motion_batch_stale && !sync_motion_batch()) {
+        interp_error ++;
+        return false;
+    }
+    return true;
+}
+
+static void batch_straight(int kind, int line_number,
+                   double x, double y, double z,
+                   double a, double b, double c,
+                   double u, double v, double w) {
+    if(!begin_batched_motion(line_number)) return;
+    double p[9] = {x, y, z, a, b, c, u, v, w};
+    for(int ax=0; ax<9; ax++) p[ax] += batch_g92[ax];
+    rotate(p[0], p[1], batch_rotation_cos, batch_rotation_sin);
+    for(int ax=0; ax<9; ax++) p[ax] += batch_g5x[ax];
+    batch_point(kind, line_number, p);
+}
+
+static void batch_arc(int line_number,
+              double first_end, double second_end, double first_axis,
+              double second_axis, int rotation, double axis_end_point,
+              double a, double b, double c, double u, double v, double w) {
+    if(!begin_batched_motion(line_number)) return;
+    double o[9];
+    memcpy(o, batch_lo, sizeof(o));
+    arc_to_segments(o, first_end, second_end, first_axis, second_axis,
+        rotation, axis_end_point, a, b, c, u, v, w, batch_plane,
+        batch_g5x, batch_g92, batch_rotation_cos, batch_rotation_sin,
+        batch_length_units, batch_arcdivision,
+        [line_number](int, int, const double p[9]) {
+            if(!interp_error) batch_point(MOTION_ARC, line_number, p);
+        });
+}
+
 static PyMethodDef gcode_methods[] = {
     {"parse", (PyCFunction)parse_file, METH_VARARGS, "Parse a G-Code file"},
     {"strerror", (PyCFunction)rs274_strerror, METH_VARARGS,
@@ -1214,6 +1533,10 @@ PyMODINIT_FUNC PyInit_gcode(void)
     PyObject_SetAttrString(m, "MAX_ERROR", PyLong_FromLong(maxerror));
     PyObject_SetAttrString(m, "MIN_ERROR",
             PyLong_FromLong(INTERP_MIN_ERROR));
+    PyModule_AddIntConstant(m, "MOTION_TRAVERSE", MOTION_TRAVERSE);
+    PyModule_AddIntConstant(m, "MOTION_FEED", MOTION_FEED);
+    PyModule_AddIntConstant(m, "MOTION_ARC", MOTION_ARC);
+    PyModule_AddIntConstant(m, "MOTION_RECORD_SIZE", sizeof(motion_record));
     return m;
 }
 // vim:ts=8:sts=4:sw=4:et:
@@ -44,6 +44,7 @@
 #include <epoxy/gl.h>
 #include <epoxy/glx.h>
 #include <algorithm>
+#include <vector>
 
 #define LOCAL_SPINDLE_FORWARD (1)
 #define LOCAL_SPINDLE_REVERSE (-1)
@@ -82,10 +83,28 @@ struct pyIniFile {
     IniFile *i;
 };
 
+// parts of the status compared by poll()
+#define STAT_PARTS 8
+enum {
+    STAT_CHANGED_COMMAND = 1,   // serial number and state of the last command
+    STAT_CHANGED_TASK = 2,
+    STAT_CHANGED_TRAJ = 4,
+    STAT_CHANGED_JOINT = 8,
+    STAT_CHANGED_AXIS = 16,
+    STAT_CHANGED_SPINDLE = 32,
+    STAT_CHANGED_MOTION = 64,   // the rest of the motion status: dio, aio, misc errors..
+    STAT_CHANGED_IO = 128,      // tool, coolant and aux
+    STAT_CHANGED_ALL = 255
+};
+
 struct pyStatChannel {
     PyObject_HEAD
     RCS_STAT_CHANNEL *c;
     EMC_STAT status;
+    int changed;                // STAT_CHANGED_* parts that differ after the last poll
+    unsigned long generation;   // number of polls that changed anything
+    unsigned long part_generation[STAT_PARTS];  // generation each part last changed in
+    bool polled;
 };
 
 struct pyCommandChannel {
@@ -240,11 +259,15 @@ static RCS_STATUS emcWaitCommandComplete(pyCommandChannel *s, double timeout) {
     return RCS_STATUS::UNINITIALIZED;
 }
 
+// commands written by all the command objects of this process
+static unsigned long commands_sent;
+
 static int emcSendCommand(pyCommandChannel *s, RCS_CMD_MSG & cmd) {
     if (s->c->write(&cmd)) {
         return -1;
     }
     s->serial = cmd.serial_number;
+    commands_sent++;
 
     double start = etime();
     while (etime() - start < EMC_COMMAND_TIMEOUT) {
@@ -295,6 +318,39 @@ static bool check_stat(RCS_STAT_CHANNEL *emcStatusBuffer) {
 
 static bool initialized=0;
 
+static bool bytes_differ(const void *a, const void *b, size_t begin, size_t end) {
+    return memcmp((const char*)a + begin, (const char*)b + begin, end - begin) != 0;
+}
+
+#define PART_DIFFERS(part) \
+    (memcmp(&old->part, &now->part, sizeof(old->part)) != 0)
+#define OFFSET_IN(base, field) ((const char*)&(field) - (const char*)&(base))
+
+// which parts of the status differ between old and now
+static int stat_changes(const EMC_STAT *old, const EMC_STAT *now) {
+    int changed = 0;
+    if(bytes_differ(old, now, 0, OFFSET_IN(*old, old->task))
+            || old->debug != now->debug)
+        changed |= STAT_CHANGED_COMMAND;
+    // the heartbeat counts task cycles, it is not a change of state
+    size_t beat = OFFSET_IN(old->task, old->task.heartbeat);
+    if(bytes_differ(&old->task, &now->task, 0, beat)
+            || bytes_differ(&old->task, &now->task,
+                beat + sizeof(old->task.heartbeat), sizeof(old->task)))
+        changed |= STAT_CHANGED_TASK;
+    if(PART_DIFFERS(motion.traj)) changed |= STAT_CHANGED_TRAJ;
+    if(PART_DIFFERS(motion.joint)) changed |= STAT_CHANGED_JOINT;
+    if(PART_DIFFERS(motion.axis)) changed |= STAT_CHANGED_AXIS;
+    if(PART_DIFFERS(motion.spindle)) changed |= STAT_CHANGED_SPINDLE;
+    if(bytes_differ(&old->motion, &now->motion,
+                0, OFFSET_IN(old->motion, old->motion.traj))
+            || bytes_differ(&old->motion, &now->motion,
+                OFFSET_IN(old->motion, old->motion.synch_di), sizeof(old->motion)))
+        changed |= STAT_CHANGED_MOTION;
+    if(PART_DIFFERS(io)) changed |= STAT_CHANGED_IO;
+    return changed;
+}
+
 static PyObject *poll(pyStatChannel *s, PyObject * /*o*/) {
 #ifdef TOOL_NML //{
     if (!initialized) {
@@ -316,7 +372,16 @@ static PyObject *poll(pyStatChannel *s, PyObject * /*o*/) {
     if(!check_stat(s->c)) return NULL;
     if(s->c->peek() == EMC_STAT_TYPE) {
         EMC_STAT *emcStatus = static_cast<EMC_STAT*>(s->c->get_address());
+        s->changed = s->polled ? stat_changes(&s->status, emcStatus) : STAT_CHANGED_ALL;
+        if(s->changed) {
+            s->generation++;
+            for(int i = 0; i < STAT_PARTS; i++)
+                if(s->changed & (1 << i)) s->part_generation[i] = s->generation;
+        }
         memcpy((char*)&s->status, emcStatus, sizeof(EMC_STAT));
+        s->polled = true;
+    } else {
+        s->changed = 0;
     }
     Py_INCREF(Py_None);
     return Py_None;
@@ -343,6 +408,15 @@ static void dict_add(PyObject *d, const char *name, int v) {
     Py_XDECREF(o);
 }
 
+static PyObject *changed_since(pyStatChannel *s, PyObject *o) {
+    unsigned long generation;
+    if(!PyArg_ParseTuple(o, "k", &generation)) return NULL;
+    int changed = 0;
+    for(int i = 0; i < STAT_PARTS; i++)
+        if(s->part_generation[i] > generation) changed |= 1 << i;
+    return PyLong_FromLong(changed);
+}
+
 static PyObject *toolinfo(pyStatChannel * /*s*/, PyObject *o) {
     /*Note: this method uses the tooldata interface and is included
     **      as a Stat method for convenience.
@@ -404,6 +478,11 @@ static PyObject *toolinfo(pyStatChannel * /*s*/, PyObject *o) {
 
 static PyMethodDef Stat_methods[] = {
     {"poll", (PyCFunction)poll, METH_NOARGS, "Update current machine state"},
+    {"changed_since", (PyCFunction)changed_since, METH_VARARGS,
+         "changed_since(generation):\n"
+         "   returns the STAT_CHANGED_* parts of the status changed by the\n"
+         "   polls made since generation, whoever made them"
+    },
     {"toolinfo", (PyCFunction)toolinfo, METH_VARARGS,
          "toolinfo(toolnumber):\n"
          "   returns dict for toolnumber parameters (pocket,offsets,etc)\n"
@@ -512,6 +591,16 @@ static PyMemberDef Stat_members[] = {
     {(char*)"estop", T_INT, O(io.aux.estop), READONLY, NULL},
 
     {(char*)"debug", T_INT, O(debug), READONLY, NULL},
+
+// change detection
+    {(char*)"changed", T_INT, offsetof(pyStatChannel, changed), READONLY,
+        "The parts of the status changed by the last poll(), a combination of\n"
+        "the STAT_CHANGED_* flags, or 0 if nothing changed."
+    },
+    {(char*)"generation", T_ULONG, offsetof(pyStatChannel, generation), READONLY,
+        "Number of poll() calls that changed the status.  While it stays the\n"
+        "same, no attribute but tool_table can have changed."
+    },
     {}
 };
 
@@ -1976,6 +2065,10 @@ static PyObject *pyline9(PyObject * /*s*/, PyObject *o) {
     Py_RETURN_NONE;
 }
 
+static PyObject *pycommands_sent(PyObject * /*s*/, PyObject * /*o*/) {
+    return PyLong_FromUnsignedLong(commands_sent);
+}
+
 static PyObject *pyvertex9(PyObject * /*s*/, PyObject *o) {
     double pt1[9], pt[3];
     char *geometry;
@@ -2015,19 +2108,97 @@ static PyObject *pygui_rot_offsets(PyObject * /*s*/, PyObject *o) {
     return Py_None;
 }
 
+struct line_strip {
+    int first = 1;
+    int nl = -1;
+    double pl[9];
+};
+
+static void draw_line(line_strip &st, int n, const double p1[9], const double p2[9],
+        const char *geometry, int for_selection) {
+    if(st.first || memcmp(p1, st.pl, sizeof(st.pl))
+            || (for_selection && n != st.nl)) {
+        if(!st.first) glEnd();
+        if(for_selection && n != st.nl) {
+            glLoadName(n);
+            st.nl = n;
+        }
+        glBegin(GL_LINE_STRIP);
+        glvertex9(p1, geometry);
+        st.first = 0;
+    }
+    line9(p1, p2, geometry);
+    memcpy(st.pl, p2, sizeof(st.pl));
+}
+
+// Get one column of a segment store (rs274.segments.SegmentStore) as a
+// C-contiguous buffer with the given element format and column count
+static bool get_segment_column(PyObject *o, const char *attr_name,
+        const char *format, Py_ssize_t columns, Py_buffer *view) {
+    PyObject *attr = PyObject_GetAttrString(o, attr_name);
+    if(!attr) return false;
+    int r = PyObject_GetBuffer(attr, view, PyBUF_C_CONTIGUOUS | PyBUF_FORMAT);
+    Py_DECREF(attr);
+    if(r < 0) return false;
+    const char *fmt = view->format ? view->format : "B";
+    if(*fmt == '@' || *fmt == '=' || *fmt == '<') fmt++;
+    bool ok = !strcmp(fmt, format) && (columns
+        ? view->ndim == 2 && view->shape[1] == columns
+        : view->ndim == 1);
+    if(!ok) {
+        PyErr_Format(PyExc_TypeError,
+            "%s: unexpected array type or shape", attr_name);
+        PyBuffer_Release(view);
+        return false;
+    }
+    return true;
+}
+
+static PyObject *draw_segment_store(PyObject *store, const char *geometry,
+        int for_selection) {
+    Py_buffer lb, sb, eb;
+    if(!get_segment_column(store, "lineno", "i", 0, &lb)) return NULL;
+    if(!get_segment_column(store, "start", "d", 9, &sb)) {
+        PyBuffer_Release(&lb);
+        return NULL;
+    }
+    if(!get_segment_column(store, "end", "d", 9, &eb)) {
+        PyBuffer_Release(&lb);
+        PyBuffer_Release(&sb);
+        return NULL;
+    }
+
+    const int *lineno = (const int *)lb.buf;
+    const double *start = (const double *)sb.buf;
+    const double *end = (const double *)eb.buf;
+    Py_ssize_t n = std::min({lb.shape[0], sb.shape[0], eb.shape[0]});
+    line_strip st;
+    for(Py_ssize_t i=0; i<n; i++)
+        draw_line(st, lineno[i], start + 9*i, end + 9*i, geometry, for_selection);
+    if(!st.first) glEnd();
+
+    PyBuffer_Release(&lb);
+    PyBuffer_Release(&sb);
+    PyBuffer_Release(&eb);
+    Py_RETURN_NONE;
+}
+
 static PyObject *pydraw_lines(PyObject * /*s*/, PyObject *o) {
-    PyListObject *li;
+    PyObject *li;
     int for_selection = 0;
     int i;
-    int first = 1;
-    int nl = -1, n;
-    double p1[9], p2[9], pl[9];
+    int n;
+    double p1[9], p2[9];
     char *geometry;
 
-    if(!PyArg_ParseTuple(o, "sO!|i:draw_lines",
-			    &geometry, &PyList_Type, &li, &for_selection))
+    if(!PyArg_ParseTuple(o, "sO|i:draw_lines",
+			    &geometry, &li, &for_selection))
         return NULL;
 
+    if(!PyList_Check(li))
+        return draw_segment_store(li, geometry, for_selection);
+
+    line_strip st;
     for(i=0; i<PyList_GET_SIZE(li); i++) {
         PyObject *it = PyList_GET_ITEM(li, i);
         PyObject *dummy1, *dummy2, *dummy3;
@@ -2039,30 +2210,101 @@ static PyObject *pydraw_lines(PyObject * /*s*/, PyObject *o) {
                     p2+3, p2+4, p2+5,
                     p2+6, p2+7, p2+8,
                     &dummy1, &dummy2, &dummy3)) {
-            if(!first) glEnd();
+            if(!st.first) glEnd();
             return NULL;
         }
-        if(first || memcmp(p1, pl, sizeof(p1))
-                || (for_selection && n != nl)) {
-            if(!first) glEnd();
-            if(for_selection && n != nl) {
-                glLoadName(n);
-                nl = n;
-            }
-            glBegin(GL_LINE_STRIP);
-            glvertex9(p1, geometry);
-            first = 0;
-        }
-        line9(p1, p2, geometry);
-        memcpy(pl, p2, sizeof(p1));
+        draw_line(st, n, p1, p2, geometry, for_selection);
     }
 
-    if(!first) glEnd();
+    if(!st.first) glEnd();
 
     Py_INCREF(Py_None);
     return Py_None;
 }
 
+// Vertices for drawing a SegmentStore as GL_LINES from vertex buffers: a
+// pair of points per segment, or several pairs where line9 would subdivide
+// a segment that moves a rotary axis.  Returns the vertices as packed
+// float32 x, y, z and the line number of each vertex as packed int32.
+struct vertex_buffer {
+    std::vector<float> vertices;
+    std::vector<int32_t> lines;
+
+    void add(const double pt[9], const char *geometry, int n) {
+        double p[3];
+        vertex9(pt, p, geometry);
+        vertices.push_back(p[0]);
+        vertices.push_back(p[1]);
+        vertices.push_back(p[2]);
+        lines.push_back(n);
+    }
+};
+
+static void segment_vertices(vertex_buffer &vb, int n, const double p1[9],
+        const double p2[9], const char *geometry) {
+    if(p1[3] != p2[3] || p1[4] != p2[4] || p1[5] != p2[5]) {
+        double dc = std::max({
+            fabs(p2[3] - p1[3]),
+            fabs(p2[4] - p1[4]),
+            fabs(p2[5] - p1[5])});
+        int st = (int)ceil(std::max(10.0, dc/10));
+        double prev[9];
+        memcpy(prev, p1, sizeof(prev));
+        for(int i=1; i<=st; i++) {
+            double t = i * 1.0 / st;
+            double v = 1.0 - t;
+            double pt[9];
+            for(int j=0; j<9; j++) { pt[j] = t * p2[j] + v * p1[j]; }
+            vb.add(prev, geometry, n);
+            vb.add(pt, geometry, n);
+            memcpy(prev, pt, sizeof(prev));
+        }
+    } else {
+        vb.add(p1, geometry, n);
+        vb.add(p2, geometry, n);
+    }
+}
+
+static PyObject *pyline_vertices(PyObject * /*s*/, PyObject *o) {
+    PyObject *store;
+    char *geometry;
+
+    if(!PyArg_ParseTuple(o, "sO:line_vertices", &geometry, &store))
+        return NULL;
+
+    Py_buffer lb, sb, eb;
+    if(!get_segment_column(store, "lineno", "i", 0, &lb)) return NULL;
+    if(!get_segment_column(store, "start", "d", 9, &sb)) {
+        PyBuffer_Release(&lb);
+        return NULL;
+    }
+    if(!get_segment_column(store, "end", "d", 9, &eb)) {
+        PyBuffer_Release(&lb);
+        PyBuffer_Release(&sb);
+        return NULL;
+    }
+
+    const int *lineno = (const int *)lb.buf;
+    const double *start = (const double *)sb.buf;
+    const double *end = (const double *)eb.buf;
+    Py_ssize_t n = std::min({lb.shape[0], sb.shape[0], eb.shape[0]});
+    vertex_buffer vb;
+    vb.vertices.reserve(6*n);
+    vb.lines.reserve(2*n);
+    for(Py_ssize_t i=0; i<n; i++)
+        segment_vertices(vb, lineno[i], start + 9*i, end + 9*i, geometry);
+
+    PyBuffer_Release(&lb);
+    PyBuffer_Release(&sb);
+    PyBuffer_Release(&eb);
+
+    return Py_BuildValue("y#y#",
+        (const char *)vb.vertices.data(),
+        (Py_ssize_t)(vb.vertices.size() * sizeof(float)),
+        (const char *)vb.lines.data(),
+        (Py_ssize_t)(vb.lines.size() * sizeof(int32_t)));
+}
+
 static PyObject *pydraw_dwells(PyObject * /*s*/, PyObject *o) {
     PyListObject *li;
     int for_selection = 0, is_lathe = 0, i, n;
@@ -2544,12 +2786,14 @@ static PyTypeObject PositionLoggerType = {
 
 static PyMethodDef emc_methods[] = {
 #define METH(name, doc) { #name, (PyCFunction) py##name, METH_VARARGS, doc }
-METH(draw_lines, "Draw a bunch of lines in the 'rs274.glcanon' format"),
+METH(draw_lines, "Draw a bunch of lines in the 'rs274.glcanon' format, from a list or a SegmentStore"),
 METH(draw_dwells, "Draw a bunch of dwell positions in the 'rs274.glcanon' format"),
+METH(line_vertices, "Get GL_LINES vertices and their line numbers for a SegmentStore, as packed float32 and int32"),
 METH(line9, "Draw a single line in the 'rs274.glcanon' format; assumes glBegin(GL_LINES)"),
 METH(vertex9, "Get the 3d location for a 9d point"),
 METH(gui_rot_offsets, "Set x,y,z offsets for A,B,C rotations"),
 METH(gui_respect_offsets, "Enable rotations about g5x,g92 offsets"),
+METH(commands_sent, "Number of commands sent by the command objects of this process, to tell whether a status polled earlier may be out of date"),
     {}
 #undef METH
 };
@@ -2630,6 +2874,16 @@ PyMODINIT_FUNC PyInit_linuxcnc(void)
     PyModule_AddIntConstant(m, "STATE_ESTOP", (int)EMC_TASK_STATE::ESTOP);
     PyModule_AddIntConstant(m, "STATE_ESTOP_RESET", (int)EMC_TASK_STATE::ESTOP_RESET);
 
+    ENUM(STAT_CHANGED_COMMAND);
+    ENUM(STAT_CHANGED_TASK);
+    ENUM(STAT_CHANGED_TRAJ);
+    ENUM(STAT_CHANGED_JOINT);
+    ENUM(STAT_CHANGED_AXIS);
+    ENUM(STAT_CHANGED_SPINDLE);
+    ENUM(STAT_CHANGED_MOTION);
+    ENUM(STAT_CHANGED_IO);
+    ENUM(STAT_CHANGED_ALL);
+
     ENUMX(6, LOCAL_SPINDLE_FORWARD);
     ENUMX(6, LOCAL_SPINDLE_REVERSE);
     ENUMX(6, LOCAL_SPINDLE_OFF);
@@ -60,7 +60,10 @@ import gcode
 sys.setdlopenflags(old_flags)
 from rs274.OpenGLTk import *
 from rs274.interpret import StatMixin
-from rs274.glcanon import GLCanon, GlCanonDraw
+from rs274.glcanon import GLCanon, GlCanonDraw, MOTION_BATCH_SIZE
+from rs274.loader import parse_if_idle
+from rs274.previewcache import PreviewCache
+from rs274.properties import MotionLimits, ProgramProperties
 from hershey import Hershey
 from propertywindow import properties
 import rs274.options
@@ -80,37 +83,43 @@ if hal_present == 1:
     import hal
 
 import configparser
+from preference_store import PreferenceStore
 
 cp = configparser.ConfigParser
-class AxisPreferences(cp):
+# changes are written to the file a moment after they are made
+class AxisPreferences(PreferenceStore, cp):
     types = {
         bool: cp.getboolean,
         float: cp.getfloat,
         int: cp.getint,
-        str: cp.get,
-        repr: lambda self,section,option: eval(cp.get(self,section,option)),
+        # through the instance, whose reads take the store's lock
+        str: lambda self,section,option: self.get(section,option),
+        repr: lambda self,section,option: eval(self.get(section,option)),
     }
 
     def __init__(self):
-        cp.__init__(self)
-        self.fn = os.path.expanduser("~/.axis_preferences")
-        self.read(self.fn)
+        PreferenceStore.__init__(self, os.path.expanduser("~/.axis_preferences"))
 
     def getpref(self, option, default=False, type=bool):
         m = self.types.get(type)
         if type == repr and len(default) == 0: default=""
         try:
-            o = m(self, "DEFAULT", option)
+            if type == repr:
+                o = m(self, "DEFAULT", option)
+            else:
+                o = self.cached("DEFAULT", option, type, lambda: m(self, "DEFAULT", option))
         except Exception as detail:
             if default != "": print(detail)
             self.set("DEFAULT", option, default)
-            self.write(open(self.fn, "w"))
             o = default
         return o
 
     def putpref(self, option, value, type=bool):
         self.set("DEFAULT", option, str(value))
-        self.write(open(self.fn, "w"))
+
+    def putprefs(self, prefs):
+        for option, value, type in prefs:
+            self.putpref(option, value, type)
 
 if sys.argv[1] != "-ini":
     raise SystemExit("-ini must be first argument")
@@ -512,6 +521,9 @@ class MyOpengl(GlCanonDraw, Opengl):
         else:
             vupdate(vars.highlight_line, -1)
 
+    def redraw_preview(self):
+        self.tkRedraw()
+
     def tkRedraw(self, *dummy):
         if self.after_id:
             # May need to upgrade to an instant redraw
@@ -1000,7 +1012,8 @@ class DummyProgress:
     def done(self): pass
 
 class Progress:
-    def __init__(self, phases, total):
+    # grab=False leaves the rest of the window usable, for background loads
+    def __init__(self, phases, total, grab=True):
         self.num_phases = phases
         self.phase = 0
         self.total = total or 1
@@ -1012,9 +1025,10 @@ class Progress:
                     "-highlightthickness", 0,
                     "-borderwidth", 2, "-relief", "sunken",
                     "-cursor", "watch")
-        root_window.configure(cursor="watch")
-        root_window.tk.call(".menu", "configure", "-cursor", "watch")
-        t.configure(cursor="watch")
+        if grab:
+            root_window.configure(cursor="watch")
+            root_window.tk.call(".menu", "configure", "-cursor", "watch")
+            t.configure(cursor="watch")
         root_window.tk.call("bind", ".info.progress", "<Key>", "break")
         root_window.tk.call("pack", ".info.progress", "-side", "left",
                                 "-fill", "both", "-expand", "1")
@@ -1022,8 +1036,9 @@ class Progress:
                                 (-10, -10, -10, -10),
                                 "-fill", "blue", "-outline", "blue")
         root_window.update_idletasks()
-        root_window.tk.call("focus", "-force", ".info.progress")
-        root_window.tk.call("patient_grab", ".info.progress")
+        if grab:
+            root_window.tk.call("focus", "-force", ".info.progress")
+            root_window.tk.call("patient_grab", ".info.progress")
 
     def update(self, count, force=0):
         if force or count - self.lastcount > 400:
@@ -1066,6 +1081,7 @@ class Progress:
                 "-text", text)
 
 class AxisCanon(GLCanon, StatMixin):
+    motion_batch_size = MOTION_BATCH_SIZE
     def __init__(self, widget, text, linecount, progress, arcdivision):
         GLCanon.__init__(self, widget.colors, geometry, foam)
         StatMixin.__init__(self, s, random_toolchanger)
@@ -1075,6 +1091,9 @@ class AxisCanon(GLCanon, StatMixin):
         self.aborted = False
         self.arcdivision = arcdivision
         self.timeout_time = None
+        # when set, the callbacks run in the preview loader thread and must not touch Tk
+        self.background = False
+        self.notify_messages = []
 
     def set_timeout(self, timeout):
         '''Abort loading of G-code if it takes more than timeout seconds from
@@ -1094,20 +1113,29 @@ class AxisCanon(GLCanon, StatMixin):
         self.aborted = True
 
     def check_abort(self):
-        root_window.update()
+        if not self.background:
+            root_window.update()
 
         if self.timeout_time is not None and self.timeout_time < time.time():
-            notifications.add("info", _("G-code preview loading timed out"))
+            self.notify_messages.append(_("G-code preview loading timed out"))
             self.aborted = True
 
         if self.aborted: raise KeyboardInterrupt
 
     def next_line(self, st):
         GLCanon.next_line(self, st)
-        self.progress.update(self.lineno)
+        if not self.background:
+            self.progress.update(self.lineno)
         if self.notify:
-            notifications.add("info",self.notify_message)
+            self.notify_messages.append(self.notify_message)
             self.notify = 0
+        if not self.background:
+            self.show_notifications()
+
+    def show_notifications(self):
+        for message in self.notify_messages:
+            notifications.add("info", message)
+        del self.notify_messages[:]
 
 
 progress_re = re.compile("^FILTER_PROGRESS=(\\d*)$")
@@ -1173,8 +1201,72 @@ def cancel_open(event=None):
     if o.canon is not None:
         o.canon.aborted = True
 
+# (canon, progress) of the preview being loaded in the background, if any
+background_open = None
+
+def finish_background_open():
+    global background_open
+    if background_open is None: return
+    canon, progress = background_open
+    background_open = None
+    o.cancel_preview()
+    open_file_done(canon, progress)
+
+def poll_background_open(f, canon, progress):
+    if background_open is None or background_open[0] is not canon: return
+    loader = o.poll_preview()
+    if loader is None:
+        progress.update(canon.lineno)
+        canon.show_notifications()
+        root_window.after(100, poll_background_open, f, canon, progress)
+        return
+    try:
+        if loader.exception is not None:
+            raise loader.exception
+        open_file_result(f, loader.result, loader.seq)
+    except Exception as e:
+        notifications.add("error", str(e))
+    finally:
+        finish_background_open()
+
+def open_file_result(f, result, seq):
+    # According to the documentation, MIN_ERROR is the largest value that is
+    # not an error.  Crazy though that sounds...
+    if result > gcode.MIN_ERROR:
+        error_str = _(gcode.strerror(result))
+        root_window.tk.call("nf_dialog", ".error",
+                _("G-Code error in %s") % os.path.basename(f),
+                _("Near line %(seq)d of %(f)s:\n%(error_str)s") % {'seq': seq, 'f': f, 'error_str': error_str},
+                "error",0,_("OK"))
+
+    t.configure(state="disabled")
+    o.lp.set_depth(from_internal_linear_unit(o.get_foam_z()),
+                   from_internal_linear_unit(o.get_foam_w()))
+
+def open_file_done(canon, progress):
+    # Before unbusying, I update again, so that any keystroke events
+    # that reached the program while it was busy are sent to the
+    # label, not to another window in the application.  If this
+    # update call is removed, the events are only handled after that
+    # widget is destroyed and focus has passed to some other widget,
+    # which will handle the keystrokes instead, leading to the
+    # R-while-loading bug.
+    #print "load_time", time.time() - t0
+    root_window.update()
+    root_window.tk.call("destroy", ".info.progress")
+    root_window.tk.call("grab", "release", ".info.progress")
+    if canon:
+        canon.progress = DummyProgress()
+        canon.show_notifications()
+    if progress is not None:
+        progress.done()
+    o.tkRedraw()
+    root_window.tk.call("set_mode_from_tab")
+
 loaded_file = None
 def open_file_guts(f, filtered=False, addrecent=True):
+    global background_open
+    finish_background_open()
     s.poll()
     save_task_mode = s.task_mode
     ensure_mode(linuxcnc.MODE_MANUAL)
@@ -1201,6 +1293,7 @@ def open_file_guts(f, filtered=False, addrecent=True):
     t0 = time.time()
 
     canon = None
+    progress = None
     o.deselect(None) # remove highlight line from last program
     try:
         # Force a sync of the interpreter, which writes out the var file.
@@ -1208,7 +1301,7 @@ def open_file_guts(f, filtered=False, addrecent=True):
         c.wait_complete()
         c.program_open(f)
         lines = open(f).readlines()
-        progress = Progress(2, len(lines))
+        progress = Progress(2, len(lines), not background_preview)
         t.configure(state="normal")
         t.tk.call("delete_all", t)
         code = []
@@ -1223,10 +1316,13 @@ def open_file_guts(f, filtered=False, addrecent=True):
                 progress.update(i)
         if code:
             t.insert("end", *code)
+        # the listing is read-only, also while a background preview runs
+        t.configure(state="disabled")
         progress.nextphase(len(lines))
         f = os.path.abspath(f)
         o.canon = canon = AxisCanon(o, widgets.text, i, progress, arcdivision)
         root_window.bind_class(".info.progress", "<Escape>", cancel_open)
+        root_window.bind_class(".info.progress", "<Button-1>", cancel_open)
 
         parameter = inifile.find("RS274NGC", "PARAMETER_FILE")
         temp_parameter = os.path.join(tempdir, os.path.basename(parameter))
@@ -1288,45 +1384,23 @@ def open_file_guts(f, filtered=False, addrecent=True):
                 if i in (0,1): continue
                 if m == -1: continue
                 initcodes.append("M%d" % m)
+        if background_preview:
+            canon.background = True
+            o.start_preview(f, canon, initcodes, interpname)
+            background_open = canon, progress
+            root_window.after(100, poll_background_open, f, canon, progress)
+            return
         try:
             result, seq = o.load_preview(f, canon, initcodes, interpname)
         except KeyboardInterrupt:
             result, seq = 0, 0
-        # According to the documentation, MIN_ERROR is the largest value that is
-        # not an error.  Crazy though that sounds...
-        if result > gcode.MIN_ERROR:
-            error_str = _(gcode.strerror(result))
-            root_window.tk.call("nf_dialog", ".error",
-                    _("G-Code error in %s") % os.path.basename(f),
-                    _("Near line %(seq)d of %(f)s:\n%(error_str)s") % {'seq': seq, 'f': f, 'error_str': error_str},
-                    "error",0,_("OK"))
-
-        t.configure(state="disabled")
-        o.lp.set_depth(from_internal_linear_unit(o.get_foam_z()),
-                       from_internal_linear_unit(o.get_foam_w()))
+        open_file_result(f, result, seq)
 
     except Exception as e:
         notifications.add("error", str(e))
     finally:
-        # Before unbusying, I update again, so that any keystroke events
-        # that reached the program while it was busy are sent to the
-        # label, not to another window in the application.  If this
-        # update call is removed, the events are only handled after that
-        # widget is destroyed and focus has passed to some other widget,
-        # which will handle the keystrokes instead, leading to the
-        # R-while-loading bug.
-        #print "load_time", time.time() - t0
-        root_window.update()
-        root_window.tk.call("destroy", ".info.progress")
-        root_window.tk.call("grab", "release", ".info.progress")
-        if canon:
-            canon.progress = DummyProgress()
-        try:
-            progress.done()
-        except UnboundLocalError:
-            pass
-        o.tkRedraw()
-        root_window.tk.call("set_mode_from_tab")
+        if background_open is None:
+            open_file_done(canon, progress)
 
 tabs_mdi = str(root_window.tk.call("set", "_tabs_mdi"))
 tabs_manual = str(root_window.tk.call("set", "_tabs_manual"))
@@ -1586,7 +1660,9 @@ def parse_gcode_expression(e):
     shutil.copy(parameter, temp_parameter)
     canon.parameter_file = temp_parameter
 
-    result, seq = gcode.parse("", canon, "M199 P["+e+"]", "M2")
+    parsed = parse_if_idle("", canon, "M199 P["+e+"]", "M2")
+    if parsed is None: return None, _("Busy loading the preview")
+    result, seq = parsed
     if result > gcode.MIN_ERROR: return False, gcode.strerror(result)
     return True, canon.number
 
@@ -1685,6 +1761,9 @@ class _prompt_float:
         self.u.set(False)
         self.t.destroy()
 
+    def recheck_valid(self):
+        if self.t.winfo_exists(): self.check_valid()
+
     def check_valid(self, *args):
         v = self.v.get()
 
@@ -1714,6 +1793,8 @@ class _prompt_float:
                 self.vv.set(value)
             else:
                 self.w.set(value)
+                # the parser is busy with a background load; try again later
+                if ok is None: self.t.after(250, self.recheck_valid)
 
         if ok:
             self.ok.configure(state="normal")
@@ -1819,17 +1900,13 @@ property_names = [
     ('name', _("Name:")), ('size', _("Size:")),
     ('tools', _("Tool order:")), ('g0', _("Rapid distance:")),
     ('g1', _("Feed distance:")), ('g', _("Total distance:")),
-    ('run', _("Run time:")),('toollist',_('Tool Change List:')),
+    ('run', _("Run time:")),('run_accel', _("Run time with acceleration:")),
+    ('tooltimes', _("Run time per tool:")),('toollist',_('Tool Change List:')),
     ('x', _("X bounds:")),('y', _("Y bounds:")),
     ('z', _("Z bounds:")),('a', _("A bounds:")),
     ('b', _("B bounds:")),('c', _("C bounds:"))
 ]
 
-def dist(xxx_todo_changeme, xxx_todo_changeme1):
-    (x,y,z) = xxx_todo_changeme
-    (p,q,r) = xxx_todo_changeme1
-    return ((x-p)**2 + (y-q)**2 + (z-r)**2) ** .5
-
 # returns units/sec
 def get_jog_speed(a):
     if vars.teleop_mode.get():
@@ -2061,24 +2138,27 @@ class TclCommands(nf.TclCommands):
                 units = _("in")
                 fmt = "%.4f"
 
-            mf = vars.max_speed.get()
-            #print o.canon.traverse[0]
-
-            g0 = sum(dist(l[1][:3], l[2][:3]) for l in o.canon.traverse)
-            g1 = (sum(dist(l[1][:3], l[2][:3]) for l in o.canon.feed) +
-                sum(dist(l[1][:3], l[2][:3]) for l in o.canon.arcfeed))
-            gt = (sum(dist(l[1][:3], l[2][:3])/min(mf, l[3]) for l in o.canon.feed) +
-                sum(dist(l[1][:3], l[2][:3])/min(mf, l[3])  for l in o.canon.arcfeed) +
-                sum(dist(l[1][:3], l[2][:3])/mf  for l in o.canon.traverse) +
-                o.canon.dwell_time
-                )
+            # max_speed is in machine units, the canon in inches
+            mf = to_internal_linear_unit(vars.max_speed.get())
+            limits = MotionLimits.from_ini(inifile, from_internal_linear_unit(1))
+            p = ProgramProperties(o.canon, mf, limits)
+            g0 = p.g0
+            g1 = p.g1
+            gt = p.run_time
 
             props['g0'] = "%f %s".replace("%f", fmt) % (from_internal_linear_unit(g0, conv), units)
             props['g1'] = "%f %s".replace("%f", fmt) % (from_internal_linear_unit(g1, conv), units)
-            if gt > 120:
-                props['run'] = _("%.1f minutes") % (gt/60)
-            else:
-                props['run'] = _("%d seconds") % (int(gt))
+            def format_time(t):
+                if t > 120:
+                    return _("%.1f minutes") % (t/60)
+                return _("%d seconds") % (int(t))
+            props['run'] = format_time(gt)
+            if p.accel_run_time is not None:
+                props['run_accel'] = format_time(p.accel_run_time)
+            props['tooltimes'] = "\n".join(
+                (_("T%d: %s") % (tool, format_time(t))) if tool is not None
+                    else format_time(t)
+                for tool, t in p.tool_times)
 
             min_extents = from_internal_units(o.canon.min_extents, conv)
             max_extents = from_internal_units(o.canon.max_extents, conv)
@@ -3747,6 +3827,13 @@ root_window.call(widgets.jogincr._w, "select", 0)
 vcp = inifile.find("DISPLAY", "PYVCP")
 
 arcdivision = int(inifile.find("DISPLAY", "ARCDIVISION") or 64)
+background_preview = bool(int(inifile.find("DISPLAY", "PREVIEW_BACKGROUND") or 0))
+preview_cache_size = float(inifile.find("DISPLAY", "PREVIEW_CACHE_SIZE") or 0)
+if preview_cache_size > 0:
+    preview_cache = PreviewCache(max_bytes=int(preview_cache_size * 1024 * 1024),
+        inifile=inifile, inipath=os.path.abspath(sys.argv[2]))
+else:
+    preview_cache = None
 
 del sys.argv[1:3]
 
@@ -3827,6 +3914,8 @@ c.wait_complete()
 
 o = MyOpengl(widgets.preview_frame, width=400, height=300, double=1, depth=1)
 o.last_line = 1
+o.preview_cache = preview_cache
+o.use_vbo = bool(int(inifile.find("DISPLAY", "PREVIEW_VBO") or 0))
 o.pack(fill="both", expand=1)
 
 def match_grid_size(v):
@@ -3886,13 +3975,17 @@ def rClicker(e):
     def select_run_from(e):
         commands.task_run_line()
 
-    #if no line is selected drop out
-    if vars.highlight_line.get() == -1 :
-        return
+    def select_near_tool(e):
+        line = o.line_near_tool()
+        if line is not None:
+            o.set_highlight_line(line)
+            o.tkRedraw()
+
     nclst=[
         ('        ',None),   #
         (' ------ ',None),   #
         (_('Run from here'), lambda e=e: select_run_from(e)),
+        (_('Select line nearest the tool'), lambda e=e: select_near_tool(e)),
         ]
     rmenu = Tkinter.Menu(None, tearoff=0, takefocus=0)
     cas = {}
@@ -3901,7 +3994,8 @@ def rClicker(e):
             rmenu.add_separator()
         else: rmenu.add_command(label=txt, command=cmd)
     rmenu.entryconfigure(0, label = "AXIS", state = 'disabled')
-    if not manual_ok():
+    #without a selected line there is nowhere to run from
+    if not manual_ok() or vars.highlight_line.get() == -1:
         rmenu.entryconfigure(2, state = 'disabled')
     rmenu.tk_popup(e.x_root-3, e.y_root+3,entry="0")
     return "break"
@@ -30,14 +30,15 @@ try:
 except ImportError:
     import Image
 
-import numpy.core
-plus_inf = numpy.core.Inf
+import numpy
+plus_inf = numpy.inf
 
 from rs274.author import Gcode
 import rs274.options
 
 from math import *
 import operator
+import multiprocessing
 
 epsilon = 1e-5
 
@@ -207,6 +208,65 @@ def progress(a, b):
         print("FILTER_PROGRESS=%d" % int(a*100./b+.5), file=sys.stderr)
         sys.stderr.flush()
 
+# below this many tool cell visits, starting worker processes costs more
+# than it saves
+parallel_work = 1 << 26
+
+def dilate(image, tool):
+    """(image[y:y+ts, x:x+ts] - tool).max() for every position of tool
+    entirely inside image"""
+    th, tw = tool.shape
+    h = image.shape[0] - th + 1
+    w = image.shape[1] - tw + 1
+    result = numpy.full((max(h, 0), max(w, 0)), -plus_inf, dtype=numpy.float32)
+    if h <= 0 or w <= 0: return result
+    shifted = numpy.empty_like(result)
+    # one pass over the image per tool cell instead of one pass over the
+    # tool per pixel; cells outside the tool are +inf and never count
+    for a in range(th):
+        rows = image[a:a+h]
+        for b in range(tw):
+            t = tool[a, b]
+            if t == plus_inf: continue
+            numpy.subtract(rows[:, b:b+w], t, out=shifted)
+            numpy.maximum(result, shifted, out=result)
+    return result
+
+def _dilate_band(args):
+    return dilate(*args)
+
+def tool_heights(image, tool, processes=None):
+    """The lowest height the tip of tool can reach over each pixel of image
+    without cutting into it: a grey-scale dilation of image by the tool.
+
+    Element [y, x] is (image[y:y+ts, x:x+ts] - tool).max().  Large images are
+    split into bands of rows worked out by a pool of processes."""
+    th = tool.shape[0]
+    rows = image.shape[0] - th + 1
+    if processes is None:
+        processes = os.cpu_count() or 1
+    work = max(rows, 0) * image.shape[1] * numpy.isfinite(tool).sum()
+    if processes < 2 or work < parallel_work:
+        return dilate(image, tool)
+    bands = min(processes * 4, rows)
+    edges = numpy.linspace(0, rows, bands + 1).astype(int)
+    # each band takes the th-1 rows below it along, to cover its last row
+    jobs = [(image[start:stop + th - 1], tool)
+            for start, stop in zip(edges[:-1], edges[1:])]
+    result = []
+    # fork, so the workers need not import this script again
+    with multiprocessing.get_context("fork").Pool(processes) as pool:
+        for band in pool.imap(_dilate_band, jobs):
+            result.append(band)
+            progress(len(result), bands)
+    return numpy.concatenate(result)
+
+def gradient(z, axis, pixelsize):
+    """Slope of z along axis: central differences inside, one-sided at the
+    edges"""
+    if z.shape[axis] < 2: return numpy.zeros_like(z)
+    return numpy.gradient(z, pixelsize, axis=axis)
+
 class Converter:
     def __init__(self,
             image, units, tool_shape, pixelsize, pixelstep, safetyheight, \
@@ -230,7 +290,8 @@ class Converter:
         self.roughing_delta = roughing_delta
         self.roughing_feed = roughing_feed
 
-        self.cache = {}
+        # tool_heights of image, worked out once per image
+        self.heights = None
 
         w, h = self.w, self.h = image.shape
         ts = self.ts = tool_shape.shape[0]
@@ -243,6 +304,7 @@ class Converter:
     def one_pass(self):
         g = self.g
         g.set_feed(self.feed)
+        self.surface()
 
         if self.convert_cols and self.cols_first_flag:
             self.g.set_plane(19)
@@ -279,11 +341,7 @@ class Converter:
             h1 = h + th
             nim1 = numpy.zeros((w1, h1), dtype=numpy.float32) + base_image.min()
             nim1[int(tw/2):int(tw/2+w), int(th/2):int(th/2+h)] = base_image
-            self.image = numpy.zeros((w,h), dtype=numpy.float32)
-            for j in range(0, w):
-                progress(j,w)
-                for i in range(0, h):
-                    self.image[j,i] = (nim1[j:j+tw,i:i+th] - rough).max()
+            self.image = tool_heights(nim1, rough)[:w, :h]
             self.feed = self.roughing_feed
             r = -self.roughing_delta
             m = self.image.min()
@@ -296,32 +354,32 @@ class Converter:
                 self.rd = m
                 self.one_pass()
             self.image = base_image
-            self.cache.clear()
+            self.heights = None
         self.feed = self.base_feed
         self.ro = 0
         self.rd = self.image.min()
         self.one_pass()
         g.end()
 
+    def surface(self):
+        """Z of the tool tip over the image for the current pass, clamped to
+        the pass depth, and its slopes along x and y"""
+        if self.heights is None:
+            self.heights = tool_heights(self.image, self.tool)
+        z = numpy.maximum(self.heights.astype(numpy.float64), self.rd) + self.ro
+        z = numpy.minimum(z, 0)
+        self.z = z
+        self.dz_dx = gradient(z, 1, self.pixelsize)
+        self.dz_dy = gradient(z, 0, self.pixelsize)
+
     def get_z(self, x, y):
-        try:
-            return min(0, max(self.rd, self.cache[x,y]) + self.ro)
-        except KeyError:
-            m1 = self.image[y:y+self.ts, x:x+self.ts]
-            self.cache[x,y] = d = (m1 - self.tool).max()
-            return min(0, max(self.rd, d) + self.ro)
-        
+        return float(self.z[y, x])
+
     def get_dz_dy(self, x, y):
-        y1 = max(0, y-1)
-        y2 = min(self.image.shape[0]-1, y+1)
-        dy = self.pixelsize * (y2-y1)
-        return (self.get_z(x, y2) - self.get_z(x, y1)) / dy
-        
+        return float(self.dz_dy[y, x])
+
     def get_dz_dx(self, x, y):
-        x1 = max(0, x-1)
-        x2 = min(self.image.shape[1]-1, x+1)
-        dx = self.pixelsize * (x2-x1)
-        return (self.get_z(x2, y) - self.get_z(x1, y)) / dx
+        return float(self.dz_dx[y, x])
 
     def mill_rows(self, convert_scan, primary):
         w1 = self.w1; h1 = self.h1;
@@ -333,12 +391,11 @@ class Converter:
         for j in jrange:
             progress(jrange.index(j), len(jrange))
             y = (w1-j) * pixelsize
-            scan = []
-            for i in irange:
-                x = i * pixelsize
-                milldata = (i, (x, y, self.get_z(i, j)),
-                    self.get_dz_dx(i, j), self.get_dz_dy(i, j))
-                scan.append(milldata)
+            z = self.z[j, :h1].tolist()
+            dz_dx = self.dz_dx[j, :h1].tolist()
+            dz_dy = self.dz_dy[j, :h1].tolist()
+            scan = [(i, (i * pixelsize, y, z[i]), dz_dx[i], dz_dy[i])
+                    for i in irange]
             for flag, points in convert_scan(primary, scan):
                 if flag:
                     self.entry_cut(self, points[0][0], j, points)
@@ -357,12 +414,11 @@ class Converter:
         for j in jrange:
             progress(jrange.index(j), len(jrange))
             x = j * pixelsize
-            scan = []
-            for i in irange:
-                y = (w1-i) * pixelsize
-                milldata = (i, (x, y, self.get_z(j, i)),
-                    self.get_dz_dy(j, i), self.get_dz_dx(j, i))
-                scan.append(milldata)
+            z = self.z[:w1, j].tolist()
+            dz_dx = self.dz_dx[:w1, j].tolist()
+            dz_dy = self.dz_dy[:w1, j].tolist()
+            scan = [(i, (x, (w1-i) * pixelsize, z[i]), dz_dy[i], dz_dx[i])
+                    for i in irange]
             for flag, points in convert_scan(primary, scan):
                 if flag:
                     self.entry_cut(self, j, points[0][0], points)
@@ -5863,20 +5863,22 @@ if __name__ == "__main__":
             if f.lower().endswith('.tcl'):
                 res = os.spawnvp(os.P_WAIT, "haltcl", ["haltcl", "-i", inifile, f])
             else:
-                res = os.spawnvp(os.P_WAIT, "halcmd", ["halcmd", "-i", inifile, "-f", f])
-                if res:
-                    LOG.error('postgui halfile error:{}'.format(res))
-                    raise SystemExit(res)
+                try:
+                    sys.stdout.write(hal.source(f, inifile))
+                except hal.error as e:
+                    LOG.error('postgui halfile error:{}'.format(e))
+                    raise SystemExit(1)
 
         postgui_halcmds = app.get_ini_info.get_postgui_halcmds()
         LOG.info("Postgui commands: yellow<{}>".format(postgui_halcmds))
         if postgui_halcmds is not None:
             for f in postgui_halcmds:
                 f = os.path.expanduser(f)
-                res = os.spawnvp(os.P_WAIT, "halcmd", ["halcmd"] + f.split())
-                if res:
-                    LOG.error('postgui command error:{}'.format(res))
-                    raise SystemExit(res)
+                try:
+                    sys.stdout.write(hal.command(*f.split()))
+                except hal.error as e:
+                    LOG.error('postgui command error:{}'.format(e))
+                    raise SystemExit(1)
 
 
     # start the event loop
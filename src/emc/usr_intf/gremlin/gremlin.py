@@ -62,6 +62,7 @@ import glnav
 
 import rs274.glcanon
 import rs274.interpret
+from rs274.properties import MotionLimits, ProgramProperties, count_lines
 import linuxcnc
 import gcode
 
@@ -78,6 +79,7 @@ class DummyProgress:
     def progress(self): pass
 
 class StatCanon(rs274.glcanon.GLCanon, rs274.interpret.StatMixin):
+    motion_batch_size = rs274.glcanon.MOTION_BATCH_SIZE
     def __init__(self, colors, geometry, lathe_view_option, stat, random):
         rs274.glcanon.GLCanon.__init__(self, colors, geometry)
         rs274.interpret.StatMixin.__init__(self, stat, random)
@@ -151,6 +153,7 @@ class Gremlin(Gtk.DrawingArea,rs274.glcanon.GlCanonDraw,glnav.GlNavBase):
         self.current_view = 'z'
 
         self.select_primed = None
+        self.program_properties = None
 
         self.connect_after('realize', self.realize)
         self.connect('configure_event', self.reshape)
@@ -348,10 +351,6 @@ class Gremlin(Gtk.DrawingArea,rs274.glcanon.GlCanonDraw,glnav.GlNavBase):
         return v*lu
 
     def calculate_gcode_properties(self, canon):
-        def dist(xxx_todo_changeme, xxx_todo_changeme1):
-            (x,y,z) = xxx_todo_changeme
-            (p,q,r) = xxx_todo_changeme1
-            return ((x-p)**2 + (y-q)**2 + (z-r)**2) ** .5
         def from_internal_units(pos, unit=None):
             if unit is None:
                 unit = self.stat.linear_units
@@ -382,7 +381,7 @@ class Gremlin(Gtk.DrawingArea,rs274.glcanon.GlCanonDraw,glnav.GlNavBase):
                 props['name'] = name
 
             size = os.stat(loaded_file).st_size
-            lines = sum(1 for line in open(loaded_file))
+            lines = count_lines(loaded_file)
             props['size'] = "%(size)s bytes\n%(lines)s gcode lines" % {'size': size, 'lines': lines}
 
             if self.metric_units:
@@ -399,21 +398,29 @@ class Gremlin(Gtk.DrawingArea,rs274.glcanon.GlCanonDraw,glnav.GlNavBase):
             mf = max_speed
             #print canon.traverse[0]
 
-            g0 = sum(dist(l[1][:3], l[2][:3]) for l in canon.traverse)
-            g1 = (sum(dist(l[1][:3], l[2][:3]) for l in canon.feed) +
-                sum(dist(l[1][:3], l[2][:3]) for l in canon.arcfeed))
-            gt = (sum(dist(l[1][:3], l[2][:3])/min(mf, l[3]) for l in canon.feed) +
-                sum(dist(l[1][:3], l[2][:3])/min(mf, l[3])  for l in canon.arcfeed) +
-                sum(dist(l[1][:3], l[2][:3])/mf  for l in canon.traverse) +
-                canon.dwell_time
-                )
+            # max_speed is in machine units, the canon in inches
+            units_per_inch = self.from_internal_linear_unit(1)
+            limits = MotionLimits.from_ini(self.inifile, units_per_inch)
+            p = ProgramProperties(canon, mf / units_per_inch, limits)
+            g0 = p.g0
+            g1 = p.g1
+            gt = p.run_time
 
             props['g0'] = "%f %s".replace("%f", fmt) % (self.from_internal_linear_unit(g0, conv), units)
             props['g1'] = "%f %s".replace("%f", fmt) % (self.from_internal_linear_unit(g1, conv), units)
-            if gt > 120:
-                props['run'] = "%.1f Minutes" % (gt/60)
-            else:
-                props['run'] = "%d Seconds" % (int(gt))
+            def format_time(t):
+                if t > 120:
+                    return "%.1f Minutes" % (t/60)
+                return "%d Seconds" % (int(t))
+            props['run'] = format_time(gt)
+            if p.accel_run_time is not None:
+                props['run_accel'] = format_time(p.accel_run_time)
+            props['tooltimes'] = ", ".join(
+                ("T%d: %s" % (tool, format_time(t))) if tool is not None
+                    else format_time(t)
+                for tool, t in p.tool_times)
+            # per line times, for screens that show the time left
+            self.program_properties = p
 
             props['toollist'] = canon.tool_list
 
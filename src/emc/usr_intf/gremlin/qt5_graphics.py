@@ -27,6 +27,8 @@ import _thread
 import glnav
 from rs274 import glcanon
 from rs274 import interpret
+from rs274.previewcache import PreviewCache
+from rs274.properties import MotionLimits, ProgramProperties, count_lines
 import linuxcnc
 import gcode
 
@@ -137,6 +139,7 @@ class Progress:
             print(".info.progress", text)
 
 class StatCanon(glcanon.GLCanon, interpret.StatMixin):
+    motion_batch_size = glcanon.MOTION_BATCH_SIZE
     def __init__(self, colors, geometry, is_foam, lathe_view_option, stat, random, text, linecount, progress, arcdivision):
         glcanon.GLCanon.__init__(self, colors, geometry, is_foam)
         interpret.StatMixin.__init__(self, stat, random)
@@ -146,6 +149,9 @@ class StatCanon(glcanon.GLCanon, interpret.StatMixin):
         self.progress = progress
         self.aborted = False
         self.arcdivision = arcdivision
+        # when set, the callbacks run in the preview loader thread and must not touch Qt
+        self.background = False
+        self.notify_messages = []
 
     def is_lathe(self): return self.lathe_view_option
 
@@ -164,11 +170,21 @@ class StatCanon(glcanon.GLCanon, interpret.StatMixin):
 
     def next_line(self, st):
         glcanon.GLCanon.next_line(self, st)
+        if self.background:
+            if self.notify:
+                self.notify_messages.append(self.notify_message)
+                self.notify = 0
+            return
         self.progress.update(self.lineno)
         if self.notify:
             self.output_notify_message(self.notify_message)
             self.notify = 0
 
+    def show_notifications(self):
+        for message in self.notify_messages:
+            self.output_notify_message(message)
+        del self.notify_messages[:]
+
     # this is class patched
     # output the text from the magic comment eg: (PREVIEW,notify,The text)
     def output_notify_message(self, message):
@@ -205,7 +221,12 @@ class Lcnc_3dGraphics(QOpenGLWidget,  glcanon.GlCanonDraw, glnav.GlNavBase):
             stat = fakeStatus()
 
         self.inifile = linuxcnc.ini(inifile)
+        cache_size = float(self.inifile.find("DISPLAY", "PREVIEW_CACHE_SIZE") or 0)
+        if cache_size > 0:
+            self.preview_cache = PreviewCache(max_bytes=int(cache_size * 1024 * 1024),
+                inifile=self.inifile, inipath=os.path.abspath(inifile))
         self.foam_option = bool(self.inifile.find("DISPLAY", "FOAM"))
+        self.use_vbo = bool(int(self.inifile.find("DISPLAY", "PREVIEW_VBO") or 0))
         try:
             trajcoordinates = self.inifile.find("TRAJ", "COORDINATES").lower().replace(" ","")
         except:
@@ -238,6 +259,9 @@ class Lcnc_3dGraphics(QOpenGLWidget,  glcanon.GlCanonDraw, glnav.GlNavBase):
         self.maxlat = 90
 
         self._current_file = None
+        self._background_load = None
+        # parse programs in a worker thread and draw them while they load
+        self.background_load = False
         self.highlight_line = None
         self.program_alpha = False
         self.use_joints_mode = True
@@ -245,6 +269,8 @@ class Lcnc_3dGraphics(QOpenGLWidget,  glcanon.GlCanonDraw, glnav.GlNavBase):
         self.show_limits = True
         self.show_extents_option = True
         self.gcode_properties = None
+        self.program_properties = None
+        self._line_count = 0
         self.show_live_plot = True
         self.show_velocity = True
         self.metric_units = True
@@ -359,6 +385,7 @@ class Lcnc_3dGraphics(QOpenGLWidget,  glcanon.GlCanonDraw, glnav.GlNavBase):
             return False
 
         lines = open(filename).readlines()
+        self._line_count = len(lines)
         progress = Progress(2, len(lines))
         # monkey patch function to call ours
         progress.emit_percent = self.emit_percent
@@ -376,9 +403,11 @@ class Lcnc_3dGraphics(QOpenGLWidget,  glcanon.GlCanonDraw, glnav.GlNavBase):
         progress.nextphase(len(lines))
 
 
+        self.cancel_background_load()
         td = tempfile.mkdtemp()
         self._current_file = filename
         load_result = True
+        canon = None
         try:
             random = int(self.inifile.find("EMCIO", "RANDOM_TOOLCHANGER") or 0)
             arcdivision = int(self.inifile.find("DISPLAY", "ARCDIVISION") or 64)
@@ -398,27 +427,75 @@ class Lcnc_3dGraphics(QOpenGLWidget,  glcanon.GlCanonDraw, glnav.GlNavBase):
             canon.parameter_file = temp_parameter
             unitcode = "G%d" % (20 + (s.linear_units == 1))
             initcode = self.inifile.find("RS274NGC", "RS274NGC_STARTUP_CODE") or ""
+            if self.background_load:
+                canon.background = True
+                self.start_preview(filename, canon, unitcode, initcode)
+                self._background_load = canon, progress, td, filename
+                QTimer.singleShot(100, self.poll_background_load)
+                return load_result
             result, seq = self.load_preview(filename, canon, unitcode, initcode)
-            if result > gcode.MIN_ERROR:
-                self.report_gcode_error(result, seq, filename)
-            self.logger.set_depth(self.from_internal_linear_unit(self.get_foam_z()),
-                       self.from_internal_linear_unit(self.get_foam_w()))
-            self.calculate_gcode_properties(canon)
+            self.finish_load(canon, filename, result, seq)
         except Exception as e:
             print (e)
             self.gcode_properties = None
             load_result = False
         finally:
-            shutil.rmtree(td)
-            if canon:
-                canon.progress = DummyProgress()
-            try:
-                progress.done()
-            except UnboundLocalError:
-                pass
+            if self._background_load is None:
+                self.cleanup_load(canon, progress, td)
         self._redraw()
         return load_result
 
+    def finish_load(self, canon, filename, result, seq):
+        if result > gcode.MIN_ERROR:
+            self.report_gcode_error(result, seq, filename)
+        self.logger.set_depth(self.from_internal_linear_unit(self.get_foam_z()),
+                   self.from_internal_linear_unit(self.get_foam_w()))
+        self.calculate_gcode_properties(canon)
+
+    def cleanup_load(self, canon, progress, td):
+        shutil.rmtree(td)
+        if canon:
+            canon.progress = DummyProgress()
+            canon.show_notifications()
+        progress.done()
+
+    def poll_background_load(self):
+        if self._background_load is None: return
+        canon, progress, td, filename = self._background_load
+        loader = self.poll_preview()
+        if loader is None:
+            progress.update(canon.lineno)
+            canon.show_notifications()
+            QTimer.singleShot(100, self.poll_background_load)
+            return
+        self._background_load = None
+        try:
+            if loader.exception is not None:
+                raise loader.exception
+            self.finish_load(canon, filename, loader.result, loader.seq)
+        except Exception as e:
+            print (e)
+            self.gcode_properties = None
+        finally:
+            self.cleanup_load(canon, progress, td)
+        self._redraw()
+        self.background_load_done()
+
+    def cancel_background_load(self):
+        if self._background_load is None: return
+        canon, progress, td, filename = self._background_load
+        self._background_load = None
+        self.cancel_preview()
+        self.cleanup_load(canon, progress, td)
+
+    # called when a background load has finished
+    # can be overridden in sub widgets
+    def background_load_done(self):
+        pass
+
+    def redraw_preview(self):
+        self.update()
+
     # monkey patched function from StatCanon class
     def output_notify_message(self, message):
         print("Preview Notify:", message)
@@ -434,10 +511,6 @@ class Lcnc_3dGraphics(QOpenGLWidget,  glcanon.GlCanonDraw, glnav.GlNavBase):
         return v*lu
 
     def calculate_gcode_properties(self, canon):
-        def dist(xxx_todo_changeme, xxx_todo_changeme1):
-            (x,y,z) = xxx_todo_changeme
-            (p,q,r) = xxx_todo_changeme1
-            return ((x-p)**2 + (y-q)**2 + (z-r)**2) ** .5
         def from_internal_units(pos, unit=None):
             if unit is None:
                 unit = self.stat.linear_units
@@ -468,7 +541,8 @@ class Lcnc_3dGraphics(QOpenGLWidget,  glcanon.GlCanonDraw, glnav.GlNavBase):
                 props['name'] = name
 
             size = os.stat(loaded_file).st_size
-            lines = sum(1 for line in open(loaded_file))
+            # counted when the file was loaded
+            lines = self._line_count
             props['size'] = "%(size)s bytes\n%(lines)s gcode lines" % {'size': size, 'lines': lines}
 
             # report props in gcode's units
@@ -483,21 +557,29 @@ class Lcnc_3dGraphics(QOpenGLWidget,  glcanon.GlCanonDraw, glnav.GlNavBase):
 
             mf = max_speed
 
-            g0 = sum(dist(l[1][:3], l[2][:3]) for l in canon.traverse)
-            g1 = (sum(dist(l[1][:3], l[2][:3]) for l in canon.feed) +
-                sum(dist(l[1][:3], l[2][:3]) for l in canon.arcfeed))
-            gt = (sum(dist(l[1][:3], l[2][:3])/min(mf, l[3]) for l in canon.feed) +
-                sum(dist(l[1][:3], l[2][:3])/min(mf, l[3])  for l in canon.arcfeed) +
-                sum(dist(l[1][:3], l[2][:3])/mf  for l in canon.traverse) +
-                canon.dwell_time
-                )
+            # max_speed is in machine units, the canon in inches
+            units_per_inch = self.from_internal_linear_unit(1)
+            limits = MotionLimits.from_ini(self.inifile, units_per_inch)
+            p = ProgramProperties(canon, mf / units_per_inch, limits)
+            g0 = p.g0
+            g1 = p.g1
+            gt = p.run_time
 
             props['g0'] = "%f %s".replace("%f", fmt) % (self.from_internal_linear_unit(g0, conv), units)
             props['g1'] = "%f %s".replace("%f", fmt) % (self.from_internal_linear_unit(g1, conv), units)
-            if gt > 120:
-                props['run'] = "%.1f Minutes" % (gt/60)
-            else:
-                props['run'] = "%d Seconds" % (int(gt))
+            def format_time(t):
+                if t > 120:
+                    return "%.1f Minutes" % (t/60)
+                return "%d Seconds" % (int(t))
+            props['run'] = format_time(gt)
+            if p.accel_run_time is not None:
+                props['run_accel'] = format_time(p.accel_run_time)
+            props['tooltimes'] = ", ".join(
+                ("T%d: %s" % (tool, format_time(t))) if tool is not None
+                    else format_time(t)
+                for tool, t in p.tool_times)
+            # per line times, for screens that show the time left
+            self.program_properties = p
 
             props['toollist'] = canon.tool_list
 
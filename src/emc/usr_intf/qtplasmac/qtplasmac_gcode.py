@@ -26,7 +26,7 @@ import linuxcnc
 import math
 import shutil
 import time
-from subprocess import run as RUN
+import hal
 
 INI = linuxcnc.ini(os.environ['INI_FILE_NAME'])
 DIR = os.path.dirname(os.environ['INI_FILE_NAME'])
@@ -59,14 +59,11 @@ class Filter():
         self.tmpMatNum = 1000000
         self.tmpMatNam = ''
         self.prefsFile = self.machine + '.prefs'
-        response = RUN(['halcmd', 'getp', self.cutTypePin], capture_output=True)
-        self.cutType = int(response.stdout.decode())
-        response = RUN(['halcmd', 'getp', self.matNumPin], capture_output=True)
-        self.currentMat = int(response.stdout.decode())
-        response = RUN(['halcmd', 'getp', 'plasmac.max-offset'], capture_output=True)
-        zMaxOffset = float(response.stdout.decode())
-        RUN(['halcmd', 'setp', self.convBlockPin, '0'])
-        RUN(['halcmd', 'setp', 'plasmac.tube-cut', '0'])
+        self.cutType = int(hal.getp(self.cutTypePin))
+        self.currentMat = int(hal.getp(self.matNumPin))
+        zMaxOffset = float(hal.getp('plasmac.max-offset'))
+        hal.setp(self.convBlockPin, '0')
+        hal.setp('plasmac.tube-cut', '0')
         self.metric = ['mm', 4]
         self.imperial = ['in', 6]
         self.units, self.fmt = self.imperial if INI.find('TRAJ', 'LINEAR_UNITS').lower() == 'inch' else self.metric
@@ -174,15 +171,15 @@ class Filter():
             self.pierceList['active'] = False
         # write the pierce extents hal pins
         if GUI == 'axis':
-            RUN(['halcmd', 'setp', 'axisui.x_min_pierce_extent', str(min(self.pierceList['X']) if self.pierceList['X'] else 0)])
-            RUN(['halcmd', 'setp', 'axisui.y_min_pierce_extent', str(min(self.pierceList['Y']) if self.pierceList['Y'] else 0)])
-            RUN(['halcmd', 'setp', 'axisui.x_max_pierce_extent', str(max(self.pierceList['X']) if self.pierceList['X'] else 0)])
-            RUN(['halcmd', 'setp', 'axisui.y_max_pierce_extent', str(max(self.pierceList['Y']) if self.pierceList['Y'] else 0)])
+            hal.setp('axisui.x_min_pierce_extent', str(min(self.pierceList['X']) if self.pierceList['X'] else 0))
+            hal.setp('axisui.y_min_pierce_extent', str(min(self.pierceList['Y']) if self.pierceList['Y'] else 0))
+            hal.setp('axisui.x_max_pierce_extent', str(max(self.pierceList['X']) if self.pierceList['X'] else 0))
+            hal.setp('axisui.y_max_pierce_extent', str(max(self.pierceList['Y']) if self.pierceList['Y'] else 0))
         else:
-            RUN(['halcmd', 'setp', 'qtplasmac.x_min_pierce_extent', str(min(self.pierceList['X']) if self.pierceList['X'] else 0)])
-            RUN(['halcmd', 'setp', 'qtplasmac.y_min_pierce_extent', str(min(self.pierceList['Y']) if self.pierceList['Y'] else 0)])
-            RUN(['halcmd', 'setp', 'qtplasmac.x_max_pierce_extent', str(max(self.pierceList['X']) if self.pierceList['X'] else 0)])
-            RUN(['halcmd', 'setp', 'qtplasmac.y_max_pierce_extent', str(max(self.pierceList['Y']) if self.pierceList['Y'] else 0)])
+            hal.setp('qtplasmac.x_min_pierce_extent', str(min(self.pierceList['X']) if self.pierceList['X'] else 0))
+            hal.setp('qtplasmac.y_min_pierce_extent', str(min(self.pierceList['Y']) if self.pierceList['Y'] else 0))
+            hal.setp('qtplasmac.x_max_pierce_extent', str(max(self.pierceList['X']) if self.pierceList['X'] else 0))
+            hal.setp('qtplasmac.y_max_pierce_extent', str(max(self.pierceList['Y']) if self.pierceList['Y'] else 0))
         # error and warning notifications
         if self.codeError or self.codeWarn:  # show errors if any
             self.write_errors()
@@ -235,7 +232,7 @@ class Filter():
                 # check if original is a conversational block
                 if line.startswith(';conversational block'):
                     self.convBlock['active'] = True
-                    RUN(['halcmd', 'setp', self.convBlockPin, '1'])
+                    hal.setp(self.convBlockPin, '1')
                 # remove leading and trailing whitespace and trailing periods
                 line = line.strip().rstrip('.')
                 # if empty line then no need to process
@@ -897,7 +894,7 @@ class Filter():
     def set_tube_cut(self, data):
         self.tubeCut = True
         self.zBypass = True
-        RUN(['halcmd', 'setp', 'plasmac.tube-cut', '1'])
+        hal.setp('plasmac.tube-cut', '1')
         self.lineNum += 3
         data = f'\n;tube cutting is experimental\n{data}\n'
         return data
@@ -937,7 +934,7 @@ class Filter():
             data = f'#<holes>=0 (disable hole sensing)\n{data}'
             self.holeEnable = False
         if self.firstMaterial:
-            RUN(['halcmd', 'setp', self.matNumPin, str(self.firstMaterial)])
+            hal.setp(self.matNumPin, str(self.firstMaterial))
         return data
 
     def set_gui_type(self):
@@ -1275,7 +1272,7 @@ class Filter():
         self.write_one_material(data, outFile, self.errorTempMat)
         outFile.close()
         self.materialDict[self.tmpMatNum] = [data[10], data[3]]
-        RUN(['halcmd', 'setp', self.matTmpPin, str(self.tmpMatNum)])
+        hal.setp(self.matTmpPin, str(self.tmpMatNum))
         self.currentMaterial[0] = self.tmpMatNum
         matDelay = time.time()
         while 1:
@@ -1284,9 +1281,9 @@ class Filter():
                 self.warnMatLoad.append(self.lineNum)
                 self.errorLines.append(self.lineNumOrg)
                 break
-            response = RUN(['halcmd', 'getp', self.matTmpPin], capture_output=True)
-            if not int(response.stdout.decode()):
+            if not int(hal.getp(self.matTmpPin)):
                 break
+            time.sleep(0.01)
 
     def rewrite_material_file(self, data, newMaterial):
         copyFile = f'{self.materialFile}.bkp'
@@ -1318,7 +1315,7 @@ class Filter():
             self.write_one_material(newMaterial, outFile, self.errorWriteMat)
         inFile.close()
         outFile.close()
-        RUN(['halcmd', 'setp', self.matReloadPin, '1'])
+        hal.setp(self.matReloadPin, '1')
         self.get_materials()
         matDelay = time.time()
         while 1:
@@ -1327,9 +1324,9 @@ class Filter():
                 self.warnMatLoad.append(self.lineNum)
                 self.errorLines.append(self.lineNumOrg)
                 break
-            response = RUN(['halcmd', 'getp', self.matReloadPin], capture_output=True)
-            if not int(response.stdout.decode()):
+            if not int(hal.getp(self.matReloadPin)):
                 break
+            time.sleep(0.01)
 
     def write_one_material(self, mat, file, err):
         try:
@@ -2,6 +2,9 @@
 
 import os
 import sys
+import time
+# --profile-startup counts from here
+START_TIME = time.time()
 import shutil
 import traceback
 import hal
@@ -51,6 +54,8 @@ use -g WIDTHxHEIGHT for just setting size or -g +XOFFSET+YOFFSET for just positi
           , Option( '-u', dest='usermod', default="", help='file path of user defined handler file')
           , Option( '-o', dest='useropts', action='append', metavar='USEROPTS', default=[]
                   , help='pass USEROPTS strings to handler under self.w.USEROPTIONS_ list variable')
+          , Option( '--profile-startup', action='store_true', dest='profile_startup', default=False
+                  , help="print the time each phase of the startup took")
           ]
 
 from PyQt5.QtCore import QObject, QEvent, pyqtSignal
@@ -84,6 +89,9 @@ class MyApplication(QtWidgets.QApplication):
 class QTVCP:
     def __init__(self):
         sys.excepthook = self.excepthook
+        from qtvcp.qt_startup import PROFILE
+        PROFILE.last = START_TIME
+        PROFILE.mark('import modules')
 
         SCRN_INIPATH = None
         usage = "usage: %prog [options] myfile.ui"
@@ -107,6 +115,7 @@ class QTVCP:
         # initialize QApp so we can pop up dialogs now.
         global APP
         APP = MyApplication(sys.argv)
+        PROFILE.mark('start application')
 
         # a specific path has been set to load from or...
         # no path set but -ini is present: default qtvcp screen...or
@@ -158,6 +167,7 @@ class QTVCP:
         # the Notify library is loaded because it uses DBusQtMainLoop
         # DBusQtMainLoop must be initialized after to work properly
         from qtvcp import qt_makepins, qt_makegui
+        PROFILE.mark('read INI and find paths')
 
         # keep track of python version during this transition
         ver = 'Python 3'
@@ -276,6 +286,7 @@ Pressing cancel will close linuxcnc.""" % target)
         HAL = self.halcomp
         # initialize the window
         self.w = window = qt_makegui.VCPWindow(self.hal, self.PATH)
+        PROFILE.mark('make HAL component and window')
 
         # give reference to user command line options
         if opts.useropts:
@@ -298,10 +309,12 @@ Pressing cancel will close linuxcnc.""" % target)
             LOG.debug('Adding the key events filter.')
             myFilter = qt_makegui.MyEventFilter(window)
             APP.installEventFilter(myFilter)
+            PROFILE.mark('load handler file')
 
         if not self.PATH.XML is None:
             # actually build the widgets
             window.instance(filename=self.PATH.XML)
+            PROFILE.mark('build widgets')
 
             # add a default program icon - this might be overridden later
             window.setWindowIcon(QtGui.QIcon(os.path.join(self.PATH.IMAGEDIR, 'linuxcncicon.png')))
@@ -319,6 +332,7 @@ Pressing cancel will close linuxcnc.""" % target)
 
         # make QT widget HAL pins
         self.panel = qt_makepins.QTPanel(self.hal, self.PATH, window, opts.debug)
+        PROFILE.mark('initialize widgets and HAL pins')
 
         # call handler file's initialized function
         if opts.usermod:
@@ -338,6 +352,8 @@ Pressing cancel will close linuxcnc.""" % target)
                 LOG.debug('''Calling the handler file's after_override__ function''')
                 window.handler_instance.after_override__()
 
+        PROFILE.mark('initialize handler')
+
         # set the default jog speeds before the forced update
         self.current_jog_rate = self.INFO.DEFAULT_LINEAR_JOG_VEL
         self.current_angular_jog_rate = self.INFO.DEFAULT_ANGULAR_JOG_VEL
@@ -350,12 +366,18 @@ Pressing cancel will close linuxcnc.""" % target)
         if opts.halfile:
             if opts.halfile[-4:] == ".tcl":
                 cmd = ["haltcl", opts.halfile]
+                res = subprocess.call(cmd, stdout=sys.stdout, stderr=sys.stderr)
+                if res:
+                    print("'%s' exited with %d" %(' '.join(cmd), res), file=sys.stderr)
+                    self.shutdown()
             else:
-                cmd = ["halcmd", "-f", opts.halfile]
-            res = subprocess.call(cmd, stdout=sys.stdout, stderr=sys.stderr)
-            if res:
-                print("'%s' exited with %d" %(' '.join(cmd), res), file=sys.stderr)
-                self.shutdown()
+                try:
+                    sys.stdout.write(hal.source(opts.halfile))
+                except hal.error as e:
+                    print("'%s' failed: %s" %(opts.halfile, e), file=sys.stderr)
+                    self.shutdown()
+
+        PROFILE.mark('update status and run HAL file')
 
         # User components are set up so report that we are ready
         LOG.debug('Set HAL ready.')
@@ -416,6 +438,7 @@ Pressing cancel will close linuxcnc.""" % target)
         # apply qss file or default theme
         else:
             window.apply_styles()
+        PROFILE.mark('apply styles')
 
         LOG.debug('Show window.')
         # maximize
@@ -428,9 +451,11 @@ Pressing cancel will close linuxcnc.""" % target)
             self.panel.set_preference_geometry()
 
         window.show()
+        PROFILE.mark('show window')
         if SCRN_INIPATH:
             self.postgui()
             self.postgui_cmd()
+            PROFILE.mark('run postgui HAL files')
             # if there is a valid INI based icon path, override the default icon.
             if INIICON !='' and os.path.exists(os.path.join(self.PATH.CONFIGPATH, INIICON)):
                 window.setWindowIcon(QtGui.QIcon(os.path.join(self.PATH.CONFIGPATH, INIICON)))
@@ -455,6 +480,10 @@ Pressing cancel will close linuxcnc.""" % target)
 
         LOG.info('Preference path: yellow<{}>'.format(self.PATH.PREFS_FILENAME))
 
+        PROFILE.mark('call before_loop__ functions')
+        if opts.profile_startup:
+            PROFILE.report()
+
         # start loop
         global _app
         _app = APP.exec()
@@ -470,9 +499,13 @@ Pressing cancel will close linuxcnc.""" % target)
                 f = os.path.expanduser(f)
                 if f.lower().endswith('.tcl'):
                     res = os.spawnvp(os.P_WAIT, "haltcl", ["haltcl", "-i",self.inipath, f])
+                    if res: raise SystemExit(res)
                 else:
-                    res = os.spawnvp(os.P_WAIT, "halcmd", ["halcmd", "-i",self.inipath,"-f", f])
-                if res: raise SystemExit(res)
+                    try:
+                        sys.stdout.write(hal.source(f, self.inipath))
+                    except hal.error as e:
+                        print(e, file=sys.stderr)
+                        raise SystemExit(1)
 
     def postgui_cmd(self):
         postgui_commands = self.INFO.POSTGUI_HAL_COMMANDS
@@ -480,8 +513,11 @@ Pressing cancel will close linuxcnc.""" % target)
         if postgui_commands is not None:
             for f in postgui_commands:
                 f = os.path.expanduser(f)
-                res = os.spawnvp(os.P_WAIT, "halcmd", ["halcmd"] + f.split())
-                if res: raise SystemExit(res)
+                try:
+                    sys.stdout.write(hal.command(*f.split()))
+                except hal.error as e:
+                    print(e, file=sys.stderr)
+                    raise SystemExit(1)
 
     # This can be called by control c or an early error.
     # close out HAL pins
@@ -511,6 +547,11 @@ Pressing cancel will close linuxcnc.""" % target)
             print(e)
             pass
 
+        # write the preference changes still held in memory
+        # (we leave with os._exit, so atexit functions do not run)
+        from preference_store import flush_all
+        flush_all()
+
         LOG.debug('Exiting HAL')
         if not HAL is None:
             HAL.exit()
@@ -59,6 +59,7 @@ def set_text(w, t):
         if ot != t: w.set_label(t)
 
 import linuxcnc
+import hal
 from touchy import emc_interface
 from touchy import mdi
 from touchy import hal_interface
@@ -889,8 +890,11 @@ if __name__ == "__main__":
             hwg = touchy()
         # load legacy postgui file if used
         if os.path.exists('touchy.hal'):
-            res = os.spawnvp(os.P_WAIT, "halcmd", ["halcmd", "-f", "touchy.hal"])
-            if res: raise SystemExit(res)
+            try:
+                sys.stdout.write(hal.source('touchy.hal'))
+            except hal.error as e:
+                print(e, file=sys.stderr)
+                raise SystemExit(1)
         #Attempt to support trivkins with non-default axis to joint assignments
         emc_interface.coordinates = touchy.trivkins(hwg)
         print("COORDINATES = %s" % emc_interface.coordinates)
@@ -902,7 +906,11 @@ if __name__ == "__main__":
             for f in postgui_halfile:
                 if f.lower().endswith('.tcl'):
                     res = os.spawnvp(os.P_WAIT, "haltcl", ["haltcl", "-i", inifile, f])
+                    if res: raise SystemExit(res)
                 else:
-                    res = os.spawnvp(os.P_WAIT, "halcmd", ["halcmd", "-i", inifile, "-f", f])
-                if res: raise SystemExit(res)
+                    try:
+                        sys.stdout.write(hal.source(f, inifile))
+                    except hal.error as e:
+                        print(e, file=sys.stderr)
+                        raise SystemExit(1)
         Gtk.main()
@@ -21,6 +21,11 @@
 #include <string>
 #include <map>
 #include <vector>
+#include <mutex>
+#include <signal.h>
+#include <fcntl.h>
+#include <sys/wait.h>
+#include <limits.h>
 using namespace std;
 
 #include "config.h"
@@ -28,6 +33,7 @@ using namespace std;
 #include <rtapi_mutex.h>
 #include "hal.h"
 #include "hal_priv.h"
+#include "utils/halcmd.h"
 
 #define EXCEPTION_IF_NOT_LIVE(retval) do { \
     if(self->hal_id <= 0) { \
@@ -523,16 +529,22 @@ static PyObject *pyhal_get_pin(PyObject *_self, PyObject *o) {
 
 
 static PyObject *pyhal_get_pins(PyObject *_self, PyObject * /*o*/) {
-  char *name;
   halobject *self = (halobject *)_self;
 
   EXCEPTION_IF_NOT_LIVE(NULL);
 
   PyObject *d = PyDict_New();
+  if(!d) return NULL;
   for(itemmap::iterator i = self->items->begin(); i != self->items->end(); ++i) {
     halitem * pin = &(i->second);
-    name = strdup(i->first.c_str());
-    PyDict_SetItemString(d, name, pyhal_read_common(pin));
+    PyObject *value = pyhal_read_common(pin);
+    // the dict takes its own reference to value
+    if(!value || PyDict_SetItemString(d, i->first.c_str(), value) < 0) {
+      Py_XDECREF(value);
+      Py_DECREF(d);
+      return NULL;
+    }
+    Py_DECREF(value);
   }
   return d;
 }
@@ -544,7 +556,7 @@ static PyObject *pyhal_ready(PyObject *_self, PyObject * /*o*/) {
     EXCEPTION_IF_NOT_LIVE(NULL);
     int res = hal_ready(self->hal_id);
     if(res) return pyhal_error(res);
-    return Py_None;
+    Py_RETURN_NONE;
 }
 
 static PyObject *pyhal_unready(PyObject *_self, PyObject * /*o*/) {
@@ -553,13 +565,13 @@ static PyObject *pyhal_unready(PyObject *_self, PyObject * /*o*/) {
     EXCEPTION_IF_NOT_LIVE(NULL);
     int res = hal_unready(self->hal_id);
     if(res) return pyhal_error(res);
-    return Py_None;
+    Py_RETURN_NONE;
 }
 
 static PyObject *pyhal_exit(PyObject *_self, PyObject * /*o*/) {
     halobject *self = (halobject *)_self;
     pyhal_exit_impl(self);
-    return Py_None;
+    Py_RETURN_NONE;
 }
 
 static PyObject *pyhal_repr(PyObject *_self) {
@@ -598,7 +610,7 @@ static PyObject *pyhal_get_prefix(PyObject *_self, PyObject *args) {
     EXCEPTION_IF_NOT_LIVE(NULL);
 
     if(!self->prefix)
-	return Py_None;
+	Py_RETURN_NONE;
 
     return PyUnicode_FromString(self->prefix);
 }
@@ -619,7 +631,7 @@ static PyObject *pyhal_set_prefix(PyObject *_self, PyObject *args) {
         return NULL;
     }
 
-    return Py_None;
+    Py_RETURN_NONE;
 }
 
 static PyMethodDef hal_methods[] = {
@@ -769,7 +781,7 @@ static PyObject * pyhal_pin_set(PyObject * _self, PyObject * value) {
     pyhalitem * self = (pyhalitem *) _self;
     if (pyhal_write_common(&self->pin, value) == -1)
 	return NULL;
-    return Py_None;
+    Py_RETURN_NONE;
 }
 
 static PyObject * pyhal_pin_get(PyObject * _self, PyObject *) {
@@ -798,7 +810,7 @@ static PyObject * pyhal_pin_is_pin(PyObject * _self, PyObject *) {
 static PyObject * pyhal_pin_get_name(PyObject * _self, PyObject *) {
     pyhalitem * self = (pyhalitem *) _self;
     if (!self->name)
-	return Py_None;
+	Py_RETURN_NONE;
     return PyUnicode_FromString(self->name);
 }
 
@@ -1275,6 +1287,361 @@ PyObject *get_value(PyObject * /*self*/, PyObject *args) {
 
 }
 
+/*######################################*/
+/* Resolved handles
+ *
+ * A handle is a pin, param or signal looked up by name once, then read
+ * through its address in shared memory instead of searching the HAL lists
+ * again.  HAL clears the name of a freed item (and a reused one gets a new
+ * name), so before each read the handle checks that the item it points to
+ * still has its name, or still has it as its old name when the handle was
+ * resolved through an alias; if not, it looks the name up again.  The
+ * signal a pin is linked to is followed on every read.
+ */
+
+enum handle_kind { HANDLE_PARAM, HANDLE_PIN, HANDLE_SIGNAL };
+
+struct pyhalhandle {
+    PyObject_HEAD
+    char name[HAL_NAME_LEN + 1];
+    handle_kind kind;
+    void *item;         /* the hal_param_t, hal_pin_t or hal_sig_t */
+};
+
+extern PyTypeObject halhandle_type;
+
+/* name -> handle, so each name is resolved once */
+static PyObject *handle_cache = NULL;
+
+/* a value read from shared memory under the mutex, converted later */
+struct handle_value {
+    hal_type_t type;
+    union paramunion u;
+};
+
+/* called with the HAL mutex held */
+static bool handle_find(pyhalhandle *h) {
+    hal_param_t *param = halpr_find_param_by_name(h->name);
+    if(param) {
+        h->kind = HANDLE_PARAM;
+        h->item = param;
+        return true;
+    }
+    hal_pin_t *pin = halpr_find_pin_by_name(h->name);
+    if(pin) {
+        h->kind = HANDLE_PIN;
+        h->item = pin;
+        return true;
+    }
+    hal_sig_t *sig = halpr_find_sig_by_name(h->name);
+    if(sig) {
+        h->kind = HANDLE_SIGNAL;
+        h->item = sig;
+        return true;
+    }
+    return false;
+}
+
+/* called with the HAL mutex held; whether the item the handle points to
+ * still has the handle's name, as its own name or, for a pin or param
+ * found by the name it had before being aliased, as its old name */
+static bool handle_item_named(pyhalhandle *h) {
+    const char *name;
+    const hal_oldname_t *oldname = NULL;
+    switch(h->kind) {
+        case HANDLE_PARAM: {
+            hal_param_t *param = (hal_param_t *)h->item;
+            name = param->name;
+            oldname = param->oldname ? SHMPTR(param->oldname) : NULL;
+            break;
+        }
+        case HANDLE_PIN: {
+            hal_pin_t *pin = (hal_pin_t *)h->item;
+            name = pin->name;
+            oldname = pin->oldname ? SHMPTR(pin->oldname) : NULL;
+            break;
+        }
+        default:
+            name = ((hal_sig_t *)h->item)->name;
+            break;
+    }
+    /* freed items have no name */
+    if(!name[0]) return false;
+    if(strcmp(name, h->name) == 0) return true;
+    return oldname && strcmp(oldname->name, h->name) == 0;
+}
+
+/* called with the HAL mutex held; false if the item is gone */
+static bool handle_read(pyhalhandle *h, handle_value *v) {
+    if(!handle_item_named(h) && !handle_find(h))
+        return false;
+    void *d_ptr;
+    switch(h->kind) {
+        case HANDLE_PARAM: {
+            hal_param_t *param = (hal_param_t *)h->item;
+            v->type = param->type;
+            d_ptr = SHMPTR(param->data_ptr);
+            break;
+        }
+        case HANDLE_PIN: {
+            hal_pin_t *pin = (hal_pin_t *)h->item;
+            v->type = pin->type;
+            if(pin->signal != 0) {
+                hal_sig_t *sig = (hal_sig_t *)SHMPTR(pin->signal);
+                d_ptr = SHMPTR(sig->data_ptr);
+            } else {
+                d_ptr = &(pin->dummysig);
+            }
+            break;
+        }
+        default: {
+            hal_sig_t *sig = (hal_sig_t *)h->item;
+            v->type = sig->type;
+            d_ptr = SHMPTR(sig->data_ptr);
+            break;
+        }
+    }
+    switch(v->type) {
+        case HAL_BIT: v->u.b = *(hal_bit_t *)d_ptr; break;
+        case HAL_U32: v->u.u32 = *(hal_u32_t *)d_ptr; break;
+        case HAL_S32: v->u.s32 = *(hal_s32_t *)d_ptr; break;
+        case HAL_U64: v->u.u64 = *(hal_u64_t *)d_ptr; break;
+        case HAL_S64: v->u.s64 = *(hal_s64_t *)d_ptr; break;
+        case HAL_FLOAT: v->u.f = *(hal_float_t *)d_ptr; break;
+        default: break;
+    }
+    return true;
+}
+
+static PyObject *handle_value_to_python(pyhalhandle *h, handle_value *v) {
+    switch(v->type) {
+        case HAL_BIT: return to_python((bool)v->u.b);
+        case HAL_U32: return to_python((rtapi_u32)v->u.u32);
+        case HAL_S32: return to_python((rtapi_s32)v->u.s32);
+        case HAL_U64: return to_python((rtapi_u64)v->u.u64);
+        case HAL_S64: return to_python((rtapi_s64)v->u.s64);
+        case HAL_FLOAT: return to_python((double)v->u.f);
+        default: break;
+    }
+    PyErr_Format(PyExc_RuntimeError,
+        "Can't get value: %s is of an unsupported type", h->name);
+    return NULL;
+}
+
+static bool check_shmem() {
+    if(!hal_shmem_base) {
+        PyErr_Format(PyExc_RuntimeError,
+                "Cannot call before creating component");
+        return false;
+    }
+    return true;
+}
+
+static PyObject *handle_not_found(pyhalhandle *h) {
+    PyErr_Format(PyExc_RuntimeError,
+        "Can't get value: pin / param / signal %s not found", h->name);
+    return NULL;
+}
+
+/* returns a new reference to the handle for name, or NULL if not found */
+static PyObject *handle_for(PyObject *name) {
+    PyObject *h = PyDict_GetItemWithError(handle_cache, name);
+    if(h) {
+        Py_INCREF(h);
+        return h;
+    }
+    if(PyErr_Occurred()) return NULL;
+    const char *s = PyUnicode_AsUTF8(name);
+    if(!s) return NULL;
+    if(strlen(s) > HAL_NAME_LEN) {
+        PyErr_Format(PyExc_RuntimeError,
+            "Can't get value: pin / param / signal %s not found", s);
+        return NULL;
+    }
+    pyhalhandle *self = PyObject_New(pyhalhandle, &halhandle_type);
+    if(!self) return NULL;
+    rtapi_snprintf(self->name, sizeof(self->name), "%s", s);
+    rtapi_mutex_get(&(hal_data->mutex));
+    bool found = handle_find(self);
+    rtapi_mutex_give(&(hal_data->mutex));
+    if(!found) {
+        handle_not_found(self);
+        Py_DECREF(self);
+        return NULL;
+    }
+    if(PyDict_SetItem(handle_cache, name, (PyObject *)self) < 0) {
+        Py_DECREF(self);
+        return NULL;
+    }
+    return (PyObject *)self;
+}
+
+PyObject *resolve(PyObject * /*self*/, PyObject *args) {
+    PyObject *name;
+    if(!PyArg_ParseTuple(args, "U", &name)) return NULL;
+    if(!check_shmem()) return NULL;
+    return handle_for(name);
+}
+
+PyObject *get_values(PyObject * /*self*/, PyObject *args) {
+    PyObject *items, *dflt = NULL;
+    if(!PyArg_ParseTuple(args, "O|O", &items, &dflt)) return NULL;
+    if(!check_shmem()) return NULL;
+    PyObject *seq = PySequence_Fast(items, "get_values expects a sequence");
+    if(!seq) return NULL;
+    Py_ssize_t n = PySequence_Fast_GET_SIZE(seq);
+
+    /* handles for all the items, None for names not found if there is a default */
+    std::vector<PyObject *> handles(n, (PyObject *)NULL);
+    PyObject *result = NULL;
+    for(Py_ssize_t i = 0; i < n; i++) {
+        PyObject *item = PySequence_Fast_GET_ITEM(seq, i);
+        if(PyObject_TypeCheck(item, &halhandle_type)) {
+            Py_INCREF(item);
+            handles[i] = item;
+        } else if(PyUnicode_Check(item)) {
+            handles[i] = handle_for(item);
+            if(!handles[i]) {
+                if(!dflt || !PyErr_ExceptionMatches(PyExc_RuntimeError)) goto done;
+                PyErr_Clear();
+            }
+        } else {
+            PyErr_Format(PyExc_TypeError,
+                "Expected a hal handle or a name, not %s", Py_TYPE(item)->tp_name);
+            goto done;
+        }
+    }
+
+    {
+        std::vector<handle_value> values(n);
+        std::vector<bool> found(n, false);
+        rtapi_mutex_get(&(hal_data->mutex));
+        for(Py_ssize_t i = 0; i < n; i++)
+            if(handles[i])
+                found[i] = handle_read((pyhalhandle *)handles[i], &values[i]);
+        rtapi_mutex_give(&(hal_data->mutex));
+
+        result = PyTuple_New(n);
+        if(!result) goto done;
+        for(Py_ssize_t i = 0; i < n; i++) {
+            PyObject *value;
+            if(found[i]) {
+                value = handle_value_to_python((pyhalhandle *)handles[i], &values[i]);
+            } else if(dflt) {
+                Py_INCREF(dflt);
+                value = dflt;
+            } else {
+                value = handle_not_found((pyhalhandle *)handles[i]);
+            }
+            if(!value) {
+                Py_CLEAR(result);
+                goto done;
+            }
+            PyTuple_SET_ITEM(result, i, value);
+        }
+    }
+
+done:
+    for(Py_ssize_t i = 0; i < n; i++) Py_XDECREF(handles[i]);
+    Py_DECREF(seq);
+    return result;
+}
+
+static PyObject *pyhalhandle_get(PyObject *_self, PyObject *) {
+    pyhalhandle *self = (pyhalhandle *)_self;
+    handle_value v;
+    rtapi_mutex_get(&(hal_data->mutex));
+    bool found = handle_read(self, &v);
+    rtapi_mutex_give(&(hal_data->mutex));
+    if(!found) return handle_not_found(self);
+    return handle_value_to_python(self, &v);
+}
+
+static PyObject *pyhalhandle_get_name(PyObject *_self, PyObject *) {
+    return PyUnicode_FromString(((pyhalhandle *)_self)->name);
+}
+
+static PyObject *pyhalhandle_get_type(PyObject *_self, PyObject *) {
+    pyhalhandle *self = (pyhalhandle *)_self;
+    handle_value v;
+    rtapi_mutex_get(&(hal_data->mutex));
+    bool found = handle_read(self, &v);
+    rtapi_mutex_give(&(hal_data->mutex));
+    if(!found) return handle_not_found(self);
+    return PyLong_FromLong(v.type);
+}
+
+static PyObject *pyhalhandle_repr(PyObject *_self) {
+    pyhalhandle *self = (pyhalhandle *)_self;
+    const char *kind = self->kind == HANDLE_PARAM ? "param" :
+        self->kind == HANDLE_PIN ? "pin" : "signal";
+    return PyUnicode_FromFormat("<hal %s handle \"%s\">", kind, self->name);
+}
+
+static PyMethodDef halhandle_methods[] = {
+    {"get", pyhalhandle_get, METH_NOARGS, "Get item value"},
+    {"get_name", pyhalhandle_get_name, METH_NOARGS, "Get item name"},
+    {"get_type", pyhalhandle_get_type, METH_NOARGS, "Get item type"},
+    {NULL, NULL, 0, NULL},
+};
+
+PyTypeObject halhandle_type = {
+    PyVarObject_HEAD_INIT(NULL, 0)
+    "hal.handle",              /*tp_name*/
+    sizeof(pyhalhandle),       /*tp_basicsize*/
+    0,                         /*tp_itemsize*/
+    (destructor)PyObject_Del,  /*tp_dealloc*/
+    0,                         /*tp_print*/
+    0,                         /*tp_getattr*/
+    0,                         /*tp_setattr*/
+    0,                         /*tp_compare*/
+    pyhalhandle_repr,          /*tp_repr*/
+    0,                         /*tp_as_number*/
+    0,                         /*tp_as_sequence*/
+    0,                         /*tp_as_mapping*/
+    0,                         /*tp_hash */
+    0,                         /*tp_call*/
+    0,                         /*tp_str*/
+    0,                         /*tp_getattro*/
+    0,                         /*tp_setattro*/
+    0,                         /*tp_as_buffer*/
+    Py_TPFLAGS_DEFAULT,        /*tp_flags*/
+    "Resolved HAL pin, param or signal", /*tp_doc*/
+    0,                         /*tp_traverse*/
+    0,                         /*tp_clear*/
+    0,                         /*tp_richcompare*/
+    0,                         /*tp_weaklistoffset*/
+    0,                         /*tp_iter*/
+    0,                         /*tp_iternext*/
+    halhandle_methods,         /*tp_methods*/
+    0,                         /*tp_members*/
+    0,                         /*tp_getset*/
+    0,                         /*tp_base*/
+    0,                         /*tp_dict*/
+    0,                         /*tp_descr_get*/
+    0,                         /*tp_descr_set*/
+    0,                         /*tp_dictoffset*/
+    0,                         /*tp_init*/
+    0,                         /*tp_alloc*/
+    0,                         /*tp_new*/
+    0,                         /*tp_free*/
+    0,                         /*tp_is_gc*/
+    0,                         /*tp_bases*/
+    0,                         /*tp_mro*/
+    0,                         /*tp_cache*/
+    0,                         /*tp_subclasses*/
+    0,                         /*tp_weaklink*/
+    0,                         /*tp_del*/
+    0,                         /*tp_version_tag*/
+    0,                         /*tp_finalize*/
+#if PY_VERSION_HEX >= 0x030800f0	// 3.8
+    0,                         /*tp_vectorcall*/
+#if PY_VERSION_HEX >= 0x030c00f0	// 3.12
+    0,                         /*tp_watched*/
+#endif
+#endif
+};
+
 /*######################################*/
 /* Get a dict of pin info for all pins in system */
 PyObject *get_info_pins(PyObject * /*self*/, PyObject * /*args*/) {
@@ -1582,7 +1949,7 @@ static PyObject *pyshm_repr(PyObject *_self) {
 static PyObject *shm_setsize(PyObject *_self, PyObject *args) {
     shmobject *self = (shmobject *)_self;
     if(!PyArg_ParseTuple(args, "k", &self->size)) return NULL;
-    return Py_None;
+    Py_RETURN_NONE;
 }
 
 
@@ -1597,7 +1964,7 @@ static PyObject *set_msg_level(PyObject * /*_self*/, PyObject *args) {
     if(!PyArg_ParseTuple(args, "i", &level)) return NULL;
     res = rtapi_set_msg_level(level);
     if(res) return pyhal_error(res);
-    return Py_None;
+    Py_RETURN_NONE;
 }
 
 static PyObject *get_msg_level(PyObject * /*_self*/, PyObject * /*args*/) {
@@ -1683,6 +2050,8 @@ struct streamobj {
     int key;
     bool creator;
     unsigned sampleno;
+    int last_underruns, last_overruns;
+    int batch_underruns, batch_overruns;
 };
 
 static int pystream_init(PyObject *_self, PyObject *args, PyObject * /*kw*/) {
@@ -1737,6 +2106,9 @@ static int pystream_init(PyObject *_self, PyObject *args, PyObject * /*kw*/) {
         }
     }
     self->pyelt = t;
+    self->last_underruns = hal_stream_num_underruns(&self->stream);
+    self->last_overruns = hal_stream_num_overruns(&self->stream);
+    self->batch_underruns = self->batch_overruns = 0;
 
     return 0;
 }
@@ -1745,10 +2117,10 @@ PyObject *stream_read(PyObject *_self, PyObject * /*unused*/) {
     streamobj *self = (streamobj *)_self;
     int n = PyBytes_Size(self->pyelt);
     if(n <= 0)
-        return Py_None;
+        Py_RETURN_NONE;
     vector<hal_stream_data> buf(n);
     if(hal_stream_read(&self->stream, buf.data(), &self->sampleno) < 0)
-        return Py_None;
+        Py_RETURN_NONE;
 
     PyObject *r = PyTuple_New(n);
     if(!r) return 0;
@@ -1802,12 +2174,92 @@ PyObject *stream_write(PyObject *_self, PyObject *args) {
     if(r < 0) {
         errno = -r; PyErr_SetFromErrno(PyExc_IOError); return 0;
     }
-    return Py_None;
+    Py_RETURN_NONE;
+}
+
+// The bulk operations copy whole samples between the stream and a buffer
+// laid out as the stream stores them: each sample is one hal_stream_data per
+// element, so the copy is a memcpy per sample.  They stop at an empty or
+// full stream without counting an underrun or overrun, and note how much
+// the stream's counters moved since the previous bulk operation.
+static void stream_batch_counts(streamobj *self) {
+    int underruns = hal_stream_num_underruns(&self->stream);
+    int overruns = hal_stream_num_overruns(&self->stream);
+    self->batch_underruns = underruns - self->last_underruns;
+    self->batch_overruns = overruns - self->last_overruns;
+    self->last_underruns = underruns;
+    self->last_overruns = overruns;
+}
+
+static bool stream_batch_buffer(streamobj *self, PyObject *o, Py_buffer *view,
+        int flags, Py_ssize_t *count) {
+    if(PyObject_GetBuffer(o, view, flags | PyBUF_C_CONTIGUOUS) < 0)
+        return false;
+    Py_ssize_t itemsize =
+        PyBytes_Size(self->pyelt) * sizeof(union hal_stream_data);
+    Py_ssize_t available = itemsize ? view->len / itemsize : 0;
+    if(itemsize && view->len % itemsize) {
+        PyErr_Format(PyExc_ValueError,
+            "buffer size %zd is not a multiple of the sample size %zd",
+            view->len, itemsize);
+        PyBuffer_Release(view);
+        return false;
+    }
+    if(*count < 0 || *count > available) *count = available;
+    return true;
+}
+
+PyObject *stream_read_into(PyObject *_self, PyObject *args) {
+    streamobj *self = (streamobj *)_self;
+    PyObject *o;
+    Py_ssize_t count = -1;
+    if(!PyArg_ParseTuple(args, "O|n:hal.stream.read_into", &o, &count))
+        return NULL;
+    Py_buffer view;
+    if(!stream_batch_buffer(self, o, &view, PyBUF_WRITABLE, &count))
+        return NULL;
+
+    Py_ssize_t stride = PyBytes_Size(self->pyelt);
+    union hal_stream_data *buf = (union hal_stream_data *)view.buf;
+    Py_ssize_t i;
+    Py_BEGIN_ALLOW_THREADS
+    for(i=0; i<count && hal_stream_readable(&self->stream); i++)
+        hal_stream_read(&self->stream, buf + i * stride, &self->sampleno);
+    Py_END_ALLOW_THREADS
+    PyBuffer_Release(&view);
+    stream_batch_counts(self);
+    return PyLong_FromSsize_t(i);
+}
+
+PyObject *stream_write_from(PyObject *_self, PyObject *args) {
+    streamobj *self = (streamobj *)_self;
+    PyObject *o;
+    Py_ssize_t count = -1;
+    if(!PyArg_ParseTuple(args, "O|n:hal.stream.write_from", &o, &count))
+        return NULL;
+    Py_buffer view;
+    if(!stream_batch_buffer(self, o, &view, PyBUF_SIMPLE, &count))
+        return NULL;
+
+    Py_ssize_t stride = PyBytes_Size(self->pyelt);
+    union hal_stream_data *buf = (union hal_stream_data *)view.buf;
+    Py_ssize_t i;
+    Py_BEGIN_ALLOW_THREADS
+    for(i=0; i<count && hal_stream_writable(&self->stream); i++)
+        hal_stream_write(&self->stream, buf + i * stride);
+    Py_END_ALLOW_THREADS
+    PyBuffer_Release(&view);
+    stream_batch_counts(self);
+    return PyLong_FromSsize_t(i);
 }
 
 static PyMethodDef stream_methods[] = {
     {"read", stream_read, METH_NOARGS, NULL},
     {"write", stream_write, METH_VARARGS, NULL},
+    {"read_into", stream_read_into, METH_VARARGS,
+        "Read up to count samples into a writable buffer; returns the number read"},
+    {"write_from", stream_write_from, METH_VARARGS,
+        "Write up to count samples from a buffer; returns the number written"},
     {}
 };
 
@@ -1833,6 +2285,10 @@ PyObject *stream_element_types(PyObject *_self, void * /*unused*/) {
 static PyMemberDef stream_members[] = {
     {"sampleno", T_UINT, offsetof(streamobj, sampleno), READONLY,
         "The number of the last successfully read sample"},
+    {"batch_underruns", T_INT, offsetof(streamobj, batch_underruns), READONLY,
+        "Underruns counted between the last two bulk reads or writes"},
+    {"batch_overruns", T_INT, offsetof(streamobj, batch_overruns), READONLY,
+        "Overruns counted between the last two bulk reads or writes"},
     {}
 };
 
@@ -1923,6 +2379,222 @@ PyTypeObject stream_type = {
 };
 
 
+// In-process halcmd: the commands of halcmd.c and halcmd_commands.cc run
+// in this process, with the same parser, instead of in a halcmd process.
+// Each call connects as a halcmd component for the time it runs, so no
+// component is left behind when the process ends without cleaning up.
+// What the commands print is returned, errors are raised as hal.error.
+
+static std::mutex halcmd_lock;
+static string halcmd_out, halcmd_err;
+// the programs loadusr started without waiting for them, until they exit
+static vector<pid_t> halcmd_children;
+
+static void halcmd_add_child(pid_t pid) {
+    halcmd_children.push_back(pid);
+}
+
+// reap the programs loadusr started that exited since the last call, so
+// they do not stay behind as zombies
+static void halcmd_reap_children() {
+    for(auto i = halcmd_children.begin(); i != halcmd_children.end(); ) {
+        int status;
+        if(waitpid(*i, &status, WNOHANG) == 0) ++i;
+        else i = halcmd_children.erase(i);
+    }
+}
+
+static void halcmd_append(string &s, const char *format, va_list ap) {
+    char buf[256];
+    va_list aq;
+    va_copy(aq, ap);
+    int n = vsnprintf(buf, sizeof(buf), format, aq);
+    va_end(aq);
+    if(n < 0) return;
+    if((size_t)n < sizeof(buf)) {
+        s.append(buf, n);
+        return;
+    }
+    vector<char> big(n + 1);
+    vsnprintf(big.data(), big.size(), format, ap);
+    s.append(big.data(), n);
+}
+
+void halcmd_output(const char *format, ...) {
+    va_list ap;
+    va_start(ap, format);
+    halcmd_append(halcmd_out, format, ap);
+    va_end(ap);
+}
+
+void halcmd_error(const char *format, ...) {
+    va_list ap;
+    char where[PATH_MAX + 32];
+    snprintf(where, sizeof(where), "%s:%d: ", halcmd_get_filename(), halcmd_get_linenumber());
+    halcmd_err += where;
+    va_start(ap, format);
+    halcmd_append(halcmd_err, format, ap);
+    va_end(ap);
+}
+
+void halcmd_warning(const char *format, ...) {
+    va_list ap;
+    fprintf(stderr, "%s:%d: Warning: ", halcmd_get_filename(), halcmd_get_linenumber());
+    va_start(ap, format);
+    vfprintf(stderr, format, ap);
+    va_end(ap);
+}
+
+void halcmd_info(const char *format, ...) {
+    va_list ap;
+    if(rtapi_get_msg_level() < RTAPI_MSG_INFO) return;
+    fprintf(stdout, "%s:%d: ", halcmd_get_filename(), halcmd_get_linenumber());
+    va_start(ap, format);
+    vfprintf(stdout, format, ap);
+    va_end(ap);
+}
+
+static int halcmd_run_tokens(vector<string> &args) {
+    vector<char *> tokens;
+    for(auto &a : args) tokens.push_back(&a[0]);
+    tokens.push_back(NULL);
+    halcmd_set_filename("<commandline>");
+    halcmd_set_linenumber(0);
+    return halcmd_parse_cmd(tokens.data());
+}
+
+static int halcmd_run_line(string &line) {
+    halcmd_set_filename("<commandline>");
+    halcmd_set_linenumber(0);
+    return halcmd_parse_line(&line[0]);
+}
+
+// the lines of filename, as 'halcmd -f filename' runs them
+static int halcmd_run_file(const char *filename) {
+    FILE *f = fopen(filename, "r");
+    if(!f) {
+        int result = -errno;
+        halcmd_set_filename("<commandline>");
+        halcmd_set_linenumber(0);
+        halcmd_error("Could not open command file '%s'\n", filename);
+        return result;
+    }
+    fcntl(fileno(f), F_SETFD, FD_CLOEXEC);
+    halcmd_set_filename(filename);
+
+    char raw_buf[MAX_CMD_LEN+1];
+    string line;
+    int linenumber = 1, result = 0;
+    while(fgets(raw_buf, MAX_CMD_LEN, f)) {
+        char *tokens[MAX_TOK+1];
+        halcmd_set_linenumber(linenumber++);
+        size_t len = strlen(raw_buf);
+        if(len && raw_buf[len-1] == '\n') raw_buf[--len] = 0;
+        // lines ending in a backslash continue on the next one
+        if(len && raw_buf[len-1] == '\\') {
+            raw_buf[len-1] = 0;
+            line += raw_buf;
+            continue;
+        }
+        line += raw_buf;
+        vector<char> eline(line.begin(), line.end());
+        eline.push_back(0);
+        line.clear();
+        result = halcmd_preprocess_line(eline.data(), tokens);
+        if(result == 0) {
+            if(strcasecmp(tokens[0], "quit") == 0 || strcasecmp(tokens[0], "exit") == 0)
+                break;
+            result = halcmd_parse_cmd(tokens);
+        }
+        if(result != 0) break;
+    }
+    fclose(f);
+    return result;
+}
+
+template<class F>
+static PyObject *halcmd_call(const char *inifile, F run) {
+    int result = 0;
+    FILE *ini = NULL;
+    if(inifile) {
+        ini = fopen(inifile, "r");
+        if(!ini) return PyErr_SetFromErrnoWithFilename(PyExc_IOError, inifile);
+        fcntl(fileno(ini), F_SETFD, FD_CLOEXEC);
+    }
+    string out, err;
+    Py_BEGIN_ALLOW_THREADS
+    {
+        std::lock_guard<std::mutex> guard(halcmd_lock);
+        halcmd_out.clear();
+        halcmd_err.clear();
+        halcmd_reap_children();
+        halcmd_child_started = halcmd_add_child;
+        // halcmd_startup() takes over the signals halcmd's own process
+        // exits on; give them back to Python
+        struct sigaction sigint, sigterm, sigpipe;
+        sigaction(SIGINT, NULL, &sigint);
+        sigaction(SIGTERM, NULL, &sigterm);
+        sigaction(SIGPIPE, NULL, &sigpipe);
+        result = halcmd_startup(1);
+        sigaction(SIGINT, &sigint, NULL);
+        sigaction(SIGTERM, &sigterm, NULL);
+        sigaction(SIGPIPE, &sigpipe, NULL);
+        if(result == 0) {
+            halcmd_inifile = ini;
+            result = run();
+            halcmd_inifile = NULL;
+            halcmd_shutdown();
+        } else {
+            if(halcmd_err.empty()) halcmd_err = "halcmd: hal_init() failed\n";
+        }
+        halcmd_reap_children();
+        out.swap(halcmd_out);
+        err.swap(halcmd_err);
+    }
+    Py_END_ALLOW_THREADS
+    if(ini) fclose(ini);
+    if(result != 0) {
+        while(!err.empty() && err.back() == '\n') err.pop_back();
+        PyErr_SetString(pyhal_error_type, err.empty() ? strerror(-result) : err.c_str());
+        return NULL;
+    }
+    return PyUnicode_DecodeUTF8(out.data(), out.size(), "replace");
+}
+
+static PyObject *command(PyObject * /*self*/, PyObject *args) {
+    vector<string> tokens;
+    Py_ssize_t n = PyTuple_Size(args);
+    if(n < 1 || n > MAX_TOK) {
+        PyErr_Format(PyExc_TypeError, "command() takes 1 to %d arguments", MAX_TOK);
+        return NULL;
+    }
+    for(Py_ssize_t i = 0; i < n; i++) {
+        const char *token = PyUnicode_AsUTF8(PyTuple_GetItem(args, i));
+        if(!token) return NULL;
+        tokens.push_back(token);
+    }
+    return halcmd_call(NULL, [&]() { return halcmd_run_tokens(tokens); });
+}
+
+static PyObject *command_line(PyObject * /*self*/, PyObject *args, PyObject *kw) {
+    const char *text, *inifile = NULL;
+    const char *kwlist[] = {"line", "inifile", NULL};
+    if(!PyArg_ParseTupleAndKeywords(args, kw, "s|z:command_line", (char**)kwlist, &text, &inifile))
+        return NULL;
+    string line(text);
+    return halcmd_call(inifile, [&]() { return halcmd_run_line(line); });
+}
+
+static PyObject *command_file(PyObject * /*self*/, PyObject *args, PyObject *kw) {
+    const char *filename, *inifile = NULL;
+    const char *kwlist[] = {"filename", "inifile", NULL};
+    if(!PyArg_ParseTupleAndKeywords(args, kw, "s|z:command_file", (char**)kwlist, &filename, &inifile))
+        return NULL;
+    string name(filename);
+    return halcmd_call(inifile, [&]() { return halcmd_run_file(name.c_str()); });
+}
+
+
 PyMethodDef module_methods[] = {
     {"pin_has_writer", pin_has_writer, METH_VARARGS,
 	".pin_has_writer('pin_name'): Return a FALSE value if a pin has no writers and TRUE if it does"},
@@ -1948,12 +2620,22 @@ PyMethodDef module_methods[] = {
 
     {"get_value", get_value, METH_VARARGS,
 	".get_value('name'): Gets the pin, param or signal value"},
+    {"resolve", resolve, METH_VARARGS,
+	".resolve('name'): Get a handle that reads the pin, param or signal without looking it up by name again"},
+    {"get_values", get_values, METH_VARARGS,
+	".get_values(items[, default]): Get a tuple of the values of items, handles or names, read under one lock; items not found give default if given"},
     {"get_info_pins", get_info_pins, METH_VARARGS,
 	".get_info_pins(): Get a list of dicts for all the pins; {NAME:, VALUE:, DIRECTION:}"},
     {"get_info_signals", get_info_signals, METH_VARARGS,
 	".get_info_signals(): Get a list of dicts for all the signals; {NAME:, VALUE:}"},
     {"get_info_params", get_info_params, METH_VARARGS,
 	".get_info_params(): Get a list of dicts for all the parameters; {NAME:, VALUE:}"},
+    {"command", command, METH_VARARGS,
+	".command('word', ...): Run one halcmd command, e.g. command('setp', 'pin', '1'); returns what it prints"},
+    {"command_line", (PyCFunction)(void(*)(void))command_line, METH_VARARGS | METH_KEYWORDS,
+	".command_line('line'[, inifile]): Run a line as halcmd reads it from a HAL file, with [SECTION]NAME taken from inifile; returns what it prints"},
+    {"command_file", (PyCFunction)(void(*)(void))command_file, METH_VARARGS | METH_KEYWORDS,
+	".command_file('filename'[, inifile]): Run a HAL file like 'halcmd -i inifile -f filename' does; returns what it prints"},
     {},
 };
 
@@ -2007,10 +2689,13 @@ PyMODINIT_FUNC PyInit__hal(void)
     PyType_Ready(&shm_type);
     PyType_Ready(&halpin_type);
     PyType_Ready(&stream_type);
+    PyType_Ready(&halhandle_type);
     PyModule_AddObject(m, "component", (PyObject*)&halobject_type);
     PyModule_AddObject(m, "shm", (PyObject*)&shm_type);
     PyModule_AddObject(m, "item", (PyObject*)&halpin_type);
     PyModule_AddObject(m, "stream", (PyObject*)&stream_type);
+    PyModule_AddObject(m, "handle", (PyObject*)&halhandle_type);
+    handle_cache = PyDict_New();
 
     PyModule_AddIntConstant(m, "MSG_NONE", RTAPI_MSG_NONE);
     PyModule_AddIntConstant(m, "MSG_ERR", RTAPI_MSG_ERR);
@@ -340,12 +340,16 @@ def main():
     if opts.halfile:
         if opts.halfile[-4:] == ".tcl":
             cmd = ["haltcl", opts.halfile]
+            res = subprocess.call(cmd, stdout=sys.stdout, stderr=sys.stderr)
+            if res:
+                print("'%s' exited with %d" %(' '.join(cmd), res), file=sys.stderr)
+                sys.exit(res)
         else:
-            cmd = ["halcmd", "-f", opts.halfile]
-        res = subprocess.call(cmd, stdout=sys.stdout, stderr=sys.stderr)
-        if res:
-            print("'%s' exited with %d" %(' '.join(cmd), res), file=sys.stderr)
-            sys.exit(res)
+            try:
+                sys.stdout.write(hal.source(opts.halfile))
+            except hal.error as e:
+                print("'%s' failed: %s" %(opts.halfile, e), file=sys.stderr)
+                sys.exit(1)
 
     # User components are set up so report that we are ready
     halcomp.ready()
@@ -66,75 +66,142 @@ class HalWrapper:
         self._drive[k] = v
 
 
+EV_KEY = linux_event.EV['EV_KEY']
+EV_REL = linux_event.EV['EV_REL']
+EV_ABS = linux_event.EV['EV_ABS']
+
+
+class RelAxis:
+    def __init__(self, comp, prefix):
+        self.position = comp.newpin(prefix + "-position", HAL_FLOAT, HAL_OUT)
+        self.counts = comp.newpin(prefix + "-counts", HAL_S32, HAL_OUT)
+        self.reset = comp.newpin(prefix + "-reset", HAL_BIT, HAL_IN)
+        self.scale = comp.newpin(prefix + "-scale", HAL_FLOAT, HAL_IN)
+        self.scale.set(1.)
+        self.last_scale = None
+
+    def event(self, value):
+        self.counts.set(self.counts.get() + value)
+
+    def update(self):
+        scale = self.scale.get() or 1
+        if self.reset.get():
+            self.counts.set(0)
+        self.position.set(self.counts.get() / scale)
+        self.last_scale = scale
+
+    def inputs_changed(self):
+        return self.reset.get() or (self.scale.get() or 1) != self.last_scale
+
+
+class AbsAxis:
+    def __init__(self, comp, prefix, absinfo):
+        self.position = comp.newpin(prefix + "-position", HAL_FLOAT, HAL_OUT)
+        self.counts = comp.newpin(prefix + "-counts", HAL_S32, HAL_OUT)
+        self.is_pos = comp.newpin(prefix + "-is-pos", HAL_BIT, HAL_OUT)
+        self.is_neg = comp.newpin(prefix + "-is-neg", HAL_BIT, HAL_OUT)
+        self.scale = comp.newpin(prefix + "-scale", HAL_FLOAT, HAL_IN)
+        self.offset = comp.newpin(prefix + "-offset", HAL_FLOAT, HAL_IN)
+        self.fuzz = comp.newpin(prefix + "-fuzz", HAL_S32, HAL_IN)
+        self.flat = comp.newpin(prefix + "-flat", HAL_S32, HAL_IN)
+        minimum = comp.newparam(prefix + "-min", HAL_S32, HAL_RO)
+        maximum = comp.newparam(prefix + "-max", HAL_S32, HAL_RO)
+        center = (absinfo.minimum + absinfo.maximum)/2.
+        halfrange = (absinfo.maximum - absinfo.minimum)/2. or 1
+        self.counts.set(absinfo.value)
+        self.position.set((absinfo.value - center) / halfrange)
+        self.scale.set(halfrange)
+        self.offset.set(center)
+        self.fuzz.set(absinfo.fuzz)
+        self.flat.set(absinfo.flat)
+        minimum.set(absinfo.minimum)
+        maximum.set(absinfo.maximum)
+        self.last_inputs = None
+
+    def event(self, value):
+        flat = self.flat.get()
+        center = int(self.offset.get())
+        if value >= center-flat and value <= center+flat:
+            value = center
+        if abs(value - self.counts.get()) > self.fuzz.get():
+            self.counts.set(value)
+
+    def update(self):
+        scale = self.scale.get() or 1
+        offset = self.offset.get()
+        position = (self.counts.get() - offset) / scale
+        self.position.set(position)
+        # Use .01 because my Joystick isn't exactly zero at rest. maybe should be a parameter?
+        self.is_neg.set(position < -.01)
+        self.is_pos.set(position > .01)
+        self.last_inputs = scale, offset
+
+    def inputs_changed(self):
+        return (self.scale.get() or 1, self.offset.get()) != self.last_inputs
+
+
+class Led:
+    def __init__(self, comp, prefix, code):
+        self.code = code
+        self.pin = comp.newpin(prefix, HAL_BIT, HAL_IN)
+        self.invert = comp.newpin(prefix + "-invert", HAL_BIT, HAL_IN)
+        self.last = 0
+
+
 class HalInputDevice:
-    def __init__(self, comp, idx, name, parts='KRAL'):
-        self.device = linux_event.InputDevice(name)
+    """The pins of one input device
+
+    The events are dispatched through tables mapping the integer event codes
+    of each type to the objects holding the pins they drive, so no names are
+    built or looked up while running.  Only the axes that received events are
+    recomputed; changes to the input pins are picked up by poll_inputs."""
+    def __init__(self, comp, idx, name, parts='KRAL', device=None):
+        if device is None:
+            device = linux_event.InputDevice(name)
+        self.device = device
 
         self.idx = idx
-        self.codes = set()
-        self.last = {}
-        self.rel_items = []
-        self.abs_items = []
         self.comp = comp
         self.parts = parts
+        self.keys = {}
+        self.rels = {}
+        self.abss = {}
+        self.leds = []
+        # event types handled, the others are silently ignored
+        self.tables = {}
 
         if 'K' in parts:
             for key in self.device.get_bits('EV_KEY'):
-                key = tohalname(key)
-                self.codes.add(key)
-                comp.newpin("%s.%s" % (idx, key), HAL_BIT, HAL_OUT)
-                comp.newpin("%s.%s-not" % (idx, key), HAL_BIT, HAL_OUT)
-                self.set(key + "-not", 1)
+                prefix = "%s.%s" % (idx, tohalname(key))
+                pin = comp.newpin(prefix, HAL_BIT, HAL_OUT)
+                not_pin = comp.newpin(prefix + "-not", HAL_BIT, HAL_OUT)
+                not_pin.set(1)
+                self.keys[linux_event.encode('EV_KEY', key)] = pin, not_pin
+            self.tables[EV_KEY] = self.keys
 
         if 'R' in parts:
             for axis in self.device.get_bits('EV_REL'):
-                name = tohalname(axis)
-                self.codes.add(name)
-                comp.newpin("%s.%s-position" % (idx, name), HAL_FLOAT, HAL_OUT)
-                comp.newpin("%s.%s-counts" % (idx, name), HAL_S32, HAL_OUT)
-                comp.newpin("%s.%s-reset" % (idx, name), HAL_BIT, HAL_IN)
-                comp.newpin("%s.%s-scale" % (idx, name), HAL_FLOAT, HAL_IN)
-                self.set(name + '-scale', 1.)
-                self.rel_items.append(name)
+                prefix = "%s.%s" % (idx, tohalname(axis))
+                self.rels[linux_event.encode('EV_REL', axis)] = RelAxis(comp, prefix)
+            self.tables[EV_REL] = self.rels
 
         if 'A' in parts:
             for axis in self.device.get_bits('EV_ABS'):
-                name = tohalname(axis)
-                self.codes.add(name)
+                prefix = "%s.%s" % (idx, tohalname(axis))
                 absinfo = self.device.get_absinfo(axis)
-                comp.newpin("%s.%s-position" % (idx, name), HAL_FLOAT, HAL_OUT)
-                comp.newpin("%s.%s-counts" % (idx, name), HAL_S32, HAL_OUT)
-                comp.newpin("%s.%s-is-pos" % (idx, name), HAL_BIT, HAL_OUT)
-                comp.newpin("%s.%s-is-neg" % (idx, name), HAL_BIT, HAL_OUT)
-                comp.newpin("%s.%s-scale" % (idx, name), HAL_FLOAT, HAL_IN)
-                comp.newpin("%s.%s-offset" % (idx, name), HAL_FLOAT, HAL_IN)
-                comp.newpin("%s.%s-fuzz" % (idx, name), HAL_S32, HAL_IN)
-                comp.newpin("%s.%s-flat" % (idx, name), HAL_S32, HAL_IN)
-                comp.newparam("%s.%s-min" % (idx, name), HAL_S32, HAL_RO)
-                comp.newparam("%s.%s-max" % (idx, name), HAL_S32, HAL_RO)
-                center = (absinfo.minimum + absinfo.maximum)/2.
-                halfrange = (absinfo.maximum - absinfo.minimum)/2. or 1
-                self.set(name + "-counts", absinfo.value)
-                self.set(name + "-position",
-                         (absinfo.value - center) / halfrange)
-                self.set(name + "-scale", halfrange)
-                self.set(name + "-offset", center)
-                self.set(name + "-fuzz", absinfo.fuzz)
-                self.set(name + "-flat", absinfo.flat)
-                self.set(name + "-min", absinfo.minimum)
-                self.set(name + "-max", absinfo.maximum)
-                self.abs_items.append(name)
-
-        self.ledmap = {}
+                self.abss[linux_event.encode('EV_ABS', axis)] = AbsAxis(comp, prefix, absinfo)
+            self.tables[EV_ABS] = self.abss
+
         if 'L' in parts:
             for led in self.device.get_bits('EV_LED'):
-                name = tohalname(led)
-                self.ledmap[name] = led
-                comp.newpin("%s.%s" % (idx, name), HAL_BIT, HAL_IN)
-                comp.newpin("%s.%s-invert" % (idx, name), HAL_BIT, HAL_IN)
-                self.last[name] = 0
+                prefix = "%s.%s" % (idx, tohalname(led))
+                self.leds.append(Led(comp, prefix, linux_event.encode('EV_LED', led)))
                 self.device.write_event('EV_LED', led, 0)
 
+        self.axes = list(self.rels.values()) + list(self.abss.values())
+        for axis in self.axes:
+            axis.update()
+
     def get(self, name):
         name = "%s.%s" % (self.idx, name)
         return self.comp[name]
@@ -143,100 +210,96 @@ class HalInputDevice:
         name = "%s.%s" % (self.idx, name)
         self.comp[name] = value
 
-    def update(self):
-        while self.device.readable():
-            ev = self.device.read_event()
-            if ev.type == 'EV_SYN':
-                continue
-            elif ev.type == 'EV_SND':
-                continue
-            elif ev.type == 'EV_MSC':
-                continue
-            elif ev.type == 'EV_LED':
-                continue
-            elif ev.type == 'EV_KEY' and 'K' not in self.parts:
+    def handle(self, events):
+        """Apply (type, code, value) events and update the axes they moved"""
+        tables = self.tables
+        keys = self.keys
+        touched = set()
+        for type, code, value in events:
+            table = tables.get(type)
+            if table is None:
                 continue
-            elif ev.type == 'EV_REL' and 'R' not in self.parts:
+            item = table.get(code)
+            if item is None:
+                print("Unexpected event", linux_event.EV_invert.get(type, type),
+                      linux_event.mapcode(type, code), file=sys.stderr)
                 continue
-            elif ev.type == 'EV_ABS' and 'A' not in self.parts:
-                continue
-            code = tohalname(ev.code)
-            if code not in self.codes:
-                print("Unexpected event", ev.type, ev.code, file=sys.stderr)
-                continue
-            if ev.type == 'EV_KEY':
-                if ev.value:
-                    self.set(code, 1)
-                    self.set(code + "-not", 0)
-                else:
-                    self.set(code, 0)
-                    self.set(code + "-not", 1)
-            elif ev.type == 'EV_REL':
-                self.set(code + "-counts",
-                         self.get(code + "-counts") + ev.value)
-            elif ev.type == 'EV_ABS':
-                flat = self.get(code + "-flat")
-                fuzz = self.get(code + "-fuzz")
-                center = int(self.get(code + "-offset"))
-                if ev.value < center-flat or ev.value > center+flat:
-                    value = ev.value
-                else:
-                    value = center
-                if abs(value - self.get(code + "-counts")) > fuzz:
-                    self.set(code + "-counts", value)
-
-        for a in self.abs_items:
-            value = self.get(a + "-counts")
-            scale = self.get(a + "-scale") or 1
-            offset = self.get(a + "-offset")
-            position = (value - offset) / scale
-            self.set(a + "-position", position)
-            # Use .01 because my Joystick isn't exactly zero at rest. maybe should be a parameter?
-            self.set(a + "-is-neg", (position < -.01))
-            self.set(a + "-is-pos", (position > .01))
-
-        for r in self.rel_items:
-            reset = self.get(r + "-reset")
-            scale = self.get(r + "-scale") or 1
-            if reset:
-                self.set(r + "-counts", 0)
-            self.set(r + "-position", self.get(r + "-counts") / scale)
-
-        for k, v in list(self.last.items()):
+            if table is keys:
+                item[0].set(value != 0)
+                item[1].set(value == 0)
+            else:
+                item.event(value)
+                touched.add(item)
+        for axis in touched:
+            axis.update()
+
+    def update(self):
+        """Handle the events waiting on the device"""
+        self.handle(self.device.read_events(256))
+
+    def has_inputs(self):
+        return bool(self.axes or self.leds)
+
+    def poll_inputs(self):
+        """Follow changes of the input pins"""
+        for axis in self.axes:
+            if axis.inputs_changed():
+                axis.update()
+
+        for led in self.leds:
             # Note: this is OK because the hal module always returns True or False for HAL_BIT values
-            u = self.comp["%s.%s" % (
-                self.idx, k)] != self.comp["%s.%s-invert" % (self.idx, k)]
-            if u != self.last[k]:
-                led = self.ledmap[k]
-                self.device.write_event('EV_LED', led, u)
-                self.last[k] = u
-
-
-h = component("hal_input")
-w = HalWrapper(h)
-h.setprefix("input")
-d = []
-i = 0
-parts = 'KRAL'
-for f in sys.argv[1:]:
-    if f.startswith("-"):
-        parts = f[1:]
-    else:
-        try:
-            d.append(HalInputDevice(w, i, f, parts))
-        except LookupError as detail:
-            raise SystemExit(detail)
-        parts = 'KRAL'
-        i += 1
-w.drive()
-h.ready()
-
-fds = [dev.device.fileno() for dev in d]
-try:
-    while 1:
-        select.select(fds, [], [], .01)
-        for i in d:
-            i.update()
-        w.drive()
-except KeyboardInterrupt:
-    pass
+            u = led.pin.get() != led.invert.get()
+            if u != led.last:
+                self.device.write_event('EV_LED', led.code, u)
+                led.last = u
+
+
+# how often the input pins are looked at, in seconds
+poll_period = .01
+
+
+def main():
+    h = component("hal_input")
+    w = HalWrapper(h)
+    h.setprefix("input")
+    d = []
+    i = 0
+    parts = 'KRAL'
+    for f in sys.argv[1:]:
+        if f.startswith("-"):
+            parts = f[1:]
+        else:
+            try:
+                d.append(HalInputDevice(w, i, f, parts))
+            except LookupError as detail:
+                raise SystemExit(detail)
+            parts = 'KRAL'
+            i += 1
+    w.drive()
+    h.ready()
+
+    # wait for events, waking up only to look at the input pins when there
+    # are any
+    poller = select.epoll()
+    devices = {}
+    for dev in d:
+        poller.register(dev.device.fileno(), select.EPOLLIN)
+        devices[dev.device.fileno()] = dev
+    polled = [dev for dev in d if dev.has_inputs()]
+    next_poll = time.monotonic()
+    try:
+        while 1:
+            timeout = max(next_poll - time.monotonic(), 0) if polled else -1
+            for fd, mask in poller.poll(timeout):
+                devices[fd].update()
+            now = time.monotonic()
+            if polled and now >= next_poll:
+                for dev in polled:
+                    dev.poll_inputs()
+                next_poll = now + poll_period
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -35,7 +35,8 @@ import linuxcnc
 
 class LinuxCNC2MQTT():
     def __init__(self, mqtt_host, mqtt_port, mqtt_prefix,
-                 mqtt_username, mqtt_password, dryrun=False):
+                 mqtt_username, mqtt_password, dryrun=False,
+                 client=None, quiet=False):
         print("Preparing LinuxCNC2MQTT")
         self.mqtt_host = mqtt_host
         self.mqtt_port = mqtt_port
@@ -44,10 +45,20 @@ class LinuxCNC2MQTT():
         self.mqtt_password = mqtt_password
 
         self.dryrun = dryrun
-        if not dryrun:
+        self.quiet = quiet
+        # Anything with a paho-like publish(topic, payload) method can
+        # stand in for the broker connection, for example in tests.
+        self.mqttc = client
+        if client is None and not dryrun:
             self.mqttc = self.mqtt_start(mqtt_host, mqtt_port,
                                          mqtt_username, mqtt_password)
 
+        # Change-only mode, see set_sampling()
+        self.sample_period = None
+        self.batch_period = 0
+        self.deadbands = {}
+        self.default_deadband = 0
+
     def mqtt_start(self, mqtt_host, mqtt_port, mqtt_username, mqtt_password):
         try:
             import paho.mqtt.client as mqtt
@@ -67,10 +78,17 @@ class LinuxCNC2MQTT():
         mqttc.loop_start()
         return mqttc
 
-    def create_pins(self, keys):
+    def create_pins(self, keys, stat_fields=()):
         self.keys = keys
-        self.lcncstat = linuxcnc.stat()
-        self.lcncstat.poll()
+        self.stat_fields = list(stat_fields)
+        self.lcncstat = None
+        if self.stat_fields:
+            self.lcncstat = linuxcnc.stat()
+        self.stat_generation = None
+        self.stat_values = {}
+        # Pins are resolved once they exist, names are looked up every time
+        self.items = list(keys)
+        self.missing = {}
         self.hal = hal.component('mqtt-publisher')
 
         self.hal.newpin('enable', hal.HAL_BIT, hal.HAL_IN)
@@ -81,37 +99,173 @@ class LinuxCNC2MQTT():
         self.hal['lastpublish'] = 0
         self.hal.ready()
 
+    def set_sampling(self, sample_period, deadbands=None, default_deadband=0,
+                     batch_period=0):
+        """Sample every sample_period seconds and only publish the values
+        that moved more than their deadband since they were last published.
+        With a batch_period the changes are collected and published together
+        at most that often.  A full snapshot is still published every
+        'period' seconds."""
+        self.sample_period = sample_period
+        self.deadbands = dict(deadbands or {})
+        self.default_deadband = default_deadband
+        self.batch_period = batch_period
+
+    def resolve_keys(self):
+        for i, item in enumerate(self.items):
+            if isinstance(item, str):
+                try:
+                    self.items[i] = hal.resolve(item)
+                except RuntimeError:
+                    pass
+
+    def read_stat(self):
+        "Return the requested linuxcnc.stat fields, polling only for changes."
+        try:
+            self.lcncstat.poll()
+        except linuxcnc.error as e:
+            if 'stat' not in self.missing:
+                print(f"warning: Unable to read linuxcnc status: {e}")
+                self.missing['stat'] = True
+            return self.stat_values
+        if self.stat_generation is None or \
+           self.lcncstat.changed_since(self.stat_generation):
+            for field in self.stat_fields:
+                try:
+                    self.stat_values['stat.' + field] = getattr(self.lcncstat, field)
+                except AttributeError:
+                    if field not in self.missing:
+                        print(f"warning: Unknown status field {field} not sent to MQTT")
+                        self.missing[field] = True
+            self.stat_generation = self.lcncstat.generation
+        return self.stat_values
+
+    def sample(self):
+        "Return the current value of every key and status field."
+        data = {}
+        for key, value in zip(self.keys, hal.get_values(self.items, None)):
+            if value is None:
+                # Only print warning once
+                if key not in self.missing:
+                    print(f"warning: Missing pin {key} not sent to MQTT")
+                    self.missing[key] = True
+            else:
+                data[key] = value
+        if self.lcncstat is not None:
+            data.update(self.read_stat())
+        return data
+
+    def deadband(self, key):
+        return self.deadbands.get(key, self.default_deadband)
+
+    def moved(self, key, old, new):
+        "Return True if new differs from old by more than the deadband of key."
+        band = self.deadband(key)
+        if not band or type(old) != type(new):
+            return old != new
+        if isinstance(new, (int, float)) and not isinstance(new, bool):
+            return abs(new - old) > band
+        if isinstance(new, tuple) and len(new) == len(old):
+            try:
+                return any(abs(n - o) > band for n, o in zip(new, old))
+            except TypeError:
+                pass
+        return old != new
+
+    def publish(self, topic, data):
+        payload = json.dumps(data, default=str)
+        if self.mqttc is not None:
+            if not self.quiet:
+                print(f"info: Publishing MQTT message ({topic}):", payload)
+            self.mqttc.publish(topic, payload)
+        else:
+            if not self.quiet:
+                print(f"info: Not publishing MQTT message ({topic}):", payload)
+        self.hal['lastpublish'] = time.time()
+
+    def publish_snapshot(self, data, now):
+        self.published = dict(data)
+        self.pending = []
+        data['mqtt-publisher.period'] = self.hal['period']
+        data['time'] = now
+        self.publish(self.mqtt_prefix, data)
+
+    def step(self, now, monotonic):
+        """Take one sample and publish what is due: a snapshot, the changes,
+        or a batch of changes.  now is the wall clock time stamped into the
+        messages, monotonic the time used for scheduling."""
+        data = self.sample()
+        if self.next_snapshot is None or monotonic >= self.next_snapshot:
+            self.resolve_keys()
+            self.publish_snapshot(data, now)
+            self.next_snapshot = monotonic + self.hal['period'] if self.hal['period'] else float('inf')
+            self.next_batch = monotonic + self.batch_period
+            return
+        published = self.published
+        changes = {key: value for key, value in data.items()
+                   if key not in published or self.moved(key, published[key], value)}
+        if changes:
+            published.update(changes)
+            changes['time'] = now
+            if self.batch_period:
+                self.pending.append(changes)
+            else:
+                self.publish(self.mqtt_prefix + '/changes', changes)
+        if self.pending and monotonic >= self.next_batch:
+            self.publish(self.mqtt_prefix + '/changes', self.pending)
+            self.pending = []
+            self.next_batch = monotonic + self.batch_period
+
+    def reset(self):
+        "Start over with a full snapshot on the next step."
+        self.next_snapshot = None
+        self.next_batch = 0
+        self.published = {}
+        self.pending = []
+
     def update_mqtt(self):
         "Run the endless loop fetching pin data and sending it to MQTT."
+        if self.sample_period:
+            return self.sample_mqtt()
+        self.resolve_keys()
         running = True
-        missing = {}
         while hal.component_exists('halui') and running:
-            data = {}
             if self.hal['enable']:
-                for key in self.keys:
-                    try:
-                         data[key] = hal.get_value(key)
-                    except RuntimeError as e:
-                        # Only print warning once
-                        if key not in missing:
-                            print(f"warning: Missing pin {key} not sent to MQTT")
-                            missing[key] = True
+                data = self.sample()
                 data['mqtt-publisher.period'] = self.hal['period']
-                if not self.dryrun:
-                    print(f"info: Publishing MQTT message ({self.mqtt_prefix}):", json.dumps(data))
-                    self.mqttc.publish(self.mqtt_prefix, json.dumps(data))
-                else:
-                    print("info: Not publishing MQTT message ({self.mqtt_prefix}):", json.dumps(data))
-                self.hal['lastpublish'] = time.time()
+                self.publish(self.mqtt_prefix, data)
             try:
                 time.sleep(self.hal['period'])
             except KeyboardInterrupt as e:
                 running = False
 
+    def sample_mqtt(self):
+        "Run the endless loop sampling pin data and sending changes to MQTT."
+        self.resolve_keys()
+        self.reset()
+        running = True
+        deadline = time.monotonic()
+        while hal.component_exists('halui') and running:
+            if self.hal['enable']:
+                self.step(time.time(), time.monotonic())
+            else:
+                # Everything is published again once reenabled
+                self.reset()
+            deadline += self.sample_period
+            delay = deadline - time.monotonic()
+            if delay < 0:
+                # Running late, skip the missed samples
+                deadline -= delay
+                delay = 0
+            try:
+                time.sleep(delay)
+            except KeyboardInterrupt as e:
+                running = False
+
     @staticmethod
     def usage():
         return """
-mqtt-publisher [options] [keys=pin1,pin2,...]
+mqtt-publisher [options] [keys=pin1,pin2,...] [stat=field1,field2,...]
 """
     @staticmethod
     def main():
@@ -131,6 +285,16 @@ mqtt-publisher [options] [keys=pin1,pin2,...]
             Option( '--mqtt-prefix', dest='mqttprefix', metavar='PREFIX',
                     default='devices/linuxcnc/machine',
                     help='The prefix to use when publishing to the MQTT broker.  Default is "devices/linuxcnc/machine".'),
+            Option( '--sample-period', dest='sampleperiod', metavar='SECONDS', type=float,
+                    help='Sample the values this often and only publish those that changed.'),
+            Option( '--deadband', dest='deadbands', metavar='[KEY=]VALUE', action='append',
+                    default=[],
+                    help='Only publish a change of a number larger than VALUE, for KEY or for all keys.'),
+            Option( '--batch-period', dest='batchperiod', metavar='SECONDS', type=float,
+                    default=0,
+                    help='Collect the changes and publish them together this often.'),
+            Option( '--quiet', dest='quiet', action='store_true',
+                    help='Do not print the published messages.'),
             ]
 
         parser = OptionParser(usage=LinuxCNC2MQTT.usage())
@@ -145,14 +309,33 @@ mqtt-publisher [options] [keys=pin1,pin2,...]
             parser.print_help()
             sys.exit(1)
 
+        stat_fields = []
         for extra in args:
             if 0 == extra.find('keys='):
                 keys.extend(extra.split('=')[1].split(','))
+            elif 0 == extra.find('stat='):
+                stat_fields.extend(extra.split('=')[1].split(','))
+
+        deadbands = {}
+        default_deadband = 0
+        try:
+            for deadband in opts.deadbands:
+                key, sep, value = deadband.rpartition('=')
+                if sep:
+                    deadbands[key] = float(value)
+                else:
+                    default_deadband = float(value)
+        except ValueError:
+            parser.error(f"invalid deadband: {deadband}")
 
         h = LinuxCNC2MQTT(opts.mqttbroker, opts.mqttport, opts.mqttprefix,
-                          opts.mqttuser, opts.mqttpassword, dryrun=opts.dryrun)
+                          opts.mqttuser, opts.mqttpassword, dryrun=opts.dryrun,
+                          quiet=opts.quiet)
 
-        h.create_pins(keys)
+        h.create_pins(keys, stat_fields)
+        if opts.sampleperiod:
+            h.set_sampling(opts.sampleperiod, deadbands, default_deadband,
+                           opts.batchperiod)
         h.update_mqtt()
 
 if __name__ == "__main__":
@@ -19,16 +19,27 @@ Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
 import sys
 import os
 import time
+import hashlib
+import json
+import tempfile
 import numpy as np
 try:
     from scipy.interpolate import griddata
-except Exception as e:
-    print(e,'Is python3-scipy installed?')
+except ImportError as e:
+    # only needed for probe points that are not on a regular grid
+    griddata = None
+    print(e, 'Is python3-scipy installed?', file=sys.stderr)
 from enum import Enum, IntEnum, unique
 import linuxcnc
 import hal
 
-update = 0.05   # this is how often the z external offset value is updated based on current x & y position 
+update = 0.05   # default for how often the z external offset value is updated based on current x & y position
+min_update = 0.002
+
+# bump when the layout of the cached grids changes
+CACHE_VERSION = 1
+# how many grids are kept in the cache
+CACHE_SIZE = 10
 
 @unique
 class States(Enum):
@@ -45,67 +56,250 @@ class Methods(IntEnum):
     LINEAR = 1
     NEAREST = 2
 
+# Bicubic Hermite basis: the coefficients of a cell are M F M^T, F holding the
+# values and derivatives at its corners
+HERMITE = np.array([[1, 0, 0, 0],
+                    [0, 0, 1, 0],
+                    [-3, 3, -2, -1],
+                    [2, -2, 1, 1]], dtype=np.float64)
+
+class CompensationGrid:
+    """Z offsets on a regular grid of nodes, as per-cell polynomial coefficients
+
+    Each cell holds the coefficients a[i][j] of z = sum a[i][j] u^i v^j, u and v
+    being the position within the cell (0 to 1), so evaluating a position only
+    takes the cell's coefficients: 4x4 for cubic, 2x2 for linear.  For nearest
+    every node is a cell of its own holding its value."""
+    def __init__(self, origin, step, coefficients):
+        self.x0, self.y0 = float(origin[0]), float(origin[1])
+        self.dx, self.dy = float(step[0]), float(step[1])
+        self.coefficients = coefficients
+        self.nx, self.ny, self.order = coefficients.shape[:3]
+        # the cells run from node 0 to node n-1 of the grid, nearest uses
+        # every node
+        self.nearest = self.order == 1
+
+    @classmethod
+    def from_nodes(cls, origin, step, z, method):
+        """Build the coefficients from the node values z[ix, iy]"""
+        z = np.asarray(z, dtype=np.float64)
+        if method == Methods.NEAREST:
+            return cls(origin, step, z[:, :, None, None].astype(np.float32))
+        f00 = z[:-1, :-1]
+        f10 = z[1:, :-1]
+        f01 = z[:-1, 1:]
+        f11 = z[1:, 1:]
+        if method == Methods.LINEAR:
+            a = np.empty(f00.shape + (2, 2))
+            a[..., 0, 0] = f00
+            a[..., 1, 0] = f10 - f00
+            a[..., 0, 1] = f01 - f00
+            a[..., 1, 1] = f11 - f10 - f01 + f00
+            return cls(origin, step, a.astype(np.float32))
+        # derivatives in grid units, central differences inside the grid
+        zx = np.gradient(z, axis=0) if z.shape[0] > 1 else np.zeros_like(z)
+        zy = np.gradient(z, axis=1) if z.shape[1] > 1 else np.zeros_like(z)
+        zxy = np.gradient(zx, axis=1) if z.shape[1] > 1 else np.zeros_like(z)
+        def corners(v):
+            return np.stack([np.stack([v[:-1, :-1], v[:-1, 1:]], -1),
+                             np.stack([v[1:, :-1], v[1:, 1:]], -1)], -2)
+        F = np.empty(f00.shape + (4, 4))
+        F[..., :2, :2] = corners(z)
+        F[..., :2, 2:] = corners(zy)
+        F[..., 2:, :2] = corners(zx)
+        F[..., 2:, 2:] = corners(zxy)
+        a = np.einsum('ik,...kl,jl->...ij', HERMITE, F, HERMITE)
+        return cls(origin, step, a.astype(np.float32))
+
+    @classmethod
+    def from_points(cls, x, y, z, method, resolution=0):
+        """Build the grid from probed points
+
+        When the points already form a regular grid and no resolution is
+        given, they are its nodes.  Otherwise the nodes are interpolated from
+        the points with griddata, every resolution units or, with no
+        resolution, about as many of them as there are points."""
+        x = np.around(np.asarray(x, dtype=np.float64), 3)
+        y = np.around(np.asarray(y, dtype=np.float64), 3)
+        z = np.asarray(z, dtype=np.float64)
+        ux = np.unique(x)
+        uy = np.unique(y)
+        if len(ux) < 2 or len(uy) < 2:
+            raise ValueError("the probe points must span an area")
+        if not resolution:
+            nodes = cls._regular_nodes(x, y, z, ux, uy)
+            if nodes is not None:
+                return cls.from_nodes((ux[0], uy[0]), (ux[1] - ux[0], uy[1] - uy[0]),
+                                      nodes, method)
+            resolution = np.sqrt((ux[-1] - ux[0]) * (uy[-1] - uy[0]) / len(z))
+        if griddata is None:
+            raise ImportError("python3-scipy is needed for probe points that are "
+                              "not on a regular grid or for a set resolution")
+        nx = int(np.ceil((ux[-1] - ux[0]) / resolution)) + 1
+        ny = int(np.ceil((uy[-1] - uy[0]) / resolution)) + 1
+        gx = np.linspace(ux[0], ux[-1], max(nx, 2))
+        gy = np.linspace(uy[0], uy[-1], max(ny, 2))
+        xi, yi = np.meshgrid(gx, gy, indexing='ij')
+        name = {Methods.CUBIC: 'cubic', Methods.LINEAR: 'linear'}.get(method, 'nearest')
+        zi = griddata((x, y), z, (xi, yi), method=name)
+        # outside the probed area only the nearest points are known
+        outside = np.isnan(zi)
+        if outside.any():
+            zi[outside] = griddata((x, y), z, (xi[outside], yi[outside]), method='nearest')
+        return cls.from_nodes((gx[0], gy[0]), (gx[1] - gx[0], gy[1] - gy[0]), zi, method)
+
+    @staticmethod
+    def _regular_nodes(x, y, z, ux, uy):
+        step_x = np.diff(ux)
+        step_y = np.diff(uy)
+        if len(z) != len(ux) * len(uy):
+            return None
+        if not (np.allclose(step_x, step_x[0], rtol=1e-3) and
+                np.allclose(step_y, step_y[0], rtol=1e-3)):
+            return None
+        nodes = np.full((len(ux), len(uy)), np.nan)
+        nodes[np.searchsorted(ux, x), np.searchsorted(uy, y)] = z
+        if np.isnan(nodes).any():
+            return None
+        return nodes
+
+    def evaluate(self, x, y, fade=1.0):
+        """Offset at x, y scaled by fade, clamped to the edges of the grid"""
+        fx = (x - self.x0) / self.dx
+        fy = (y - self.y0) / self.dy
+        if self.nearest:
+            ix = min(max(int(round(fx)), 0), self.nx - 1)
+            iy = min(max(int(round(fy)), 0), self.ny - 1)
+            return float(self.coefficients[ix, iy, 0, 0]) * fade
+        ix = min(max(int(np.floor(fx)), 0), self.nx - 1)
+        iy = min(max(int(np.floor(fy)), 0), self.ny - 1)
+        u = min(max(fx - ix, 0.0), 1.0)
+        v = min(max(fy - iy, 0.0), 1.0)
+        a = self.coefficients[ix, iy]
+        if self.order == 2:
+            return float(a[0, 0] + a[1, 0] * u + (a[0, 1] + a[1, 1] * u) * v) * fade
+        pu = np.array((1.0, u, u * u, u * u * u))
+        pv = np.array((1.0, v, v * v, v * v * v))
+        return float(pu.dot(a).dot(pv)) * fade
+
+    def save(self, path):
+        """Store the grid where load() can map it"""
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(prefix='.tmp-', suffix='.npy', dir=directory)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                np.save(f, self.coefficients)
+            with open(tmp[:-4] + '.json', 'w') as f:
+                json.dump({'origin': (self.x0, self.y0), 'step': (self.dx, self.dy)}, f)
+            # the grid is looked for by its .npy file, so it goes last
+            os.replace(tmp[:-4] + '.json', path[:-4] + '.json')
+            os.replace(tmp, path)
+        except Exception:
+            for name in (tmp, tmp[:-4] + '.json'):
+                try:
+                    os.unlink(name)
+                except OSError:
+                    pass
+            raise
+
+    @classmethod
+    def load(cls, path):
+        """Map a grid stored by save(), or return None"""
+        try:
+            with open(path[:-4] + '.json') as f:
+                info = json.load(f)
+            coefficients = np.load(path, mmap_mode='r')
+        except (OSError, ValueError):
+            return None
+        # the least recently used grids are the ones pruned
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return cls(info['origin'], info['step'], coefficients)
+
+def fade_scale(z, fade_height):
+    """How much of the compensation applies at height z"""
+    if fade_height == 0:
+        return 1.0
+    if z < fade_height:
+        return min((fade_height - z) / fade_height, 1.0)
+    return 0.0
+
+def cache_directory():
+    base = os.environ.get('XDG_CACHE_HOME') or os.path.expanduser('~/.cache')
+    return os.path.join(base, 'linuxcnc', 'z_level_compensation')
+
+def prune_cache(directory, keep=CACHE_SIZE):
+    """Remove all but the keep most recently used grids from the cache"""
+    try:
+        names = [name for name in os.listdir(directory)
+                 if name.endswith('.npy') and not name.startswith('.')]
+    except OSError:
+        return
+    def used(name):
+        try:
+            return os.stat(os.path.join(directory, name)).st_mtime
+        except OSError:
+            return 0
+    names.sort(key=used, reverse=True)
+    for name in names[keep:]:
+        for path in (name, name[:-4] + '.json'):
+            try:
+                os.unlink(os.path.join(directory, path))
+            except OSError:
+                pass
+
 class Compensation:
     def __init__(self):
         self.scale = 0.001
         self.filename = "probe_points.txt"
+        self.grid = None
 
-    def loadMap(self):
-        # data coordinates and values
-        self.data = np.loadtxt(self.filename, dtype = float, delimiter = " ", usecols = (0, 1, 2))
-        self.x_data = np.around(self.data[:, 0], 1)
-        self.y_data = np.around(self.data[:, 1], 1)
-        self.z_data = self.data[:, 2]
-
-        # get the x and y, min and max values from the data
-        self.xMin = int(np.min(self.x_data))
-        self.xMax = int(np.max(self.x_data))
-        self.yMin = int(np.min(self.y_data))
-        self.yMax = int(np.max(self.y_data))
-
-        # target grid to interpolate to, 1 grid per mm
-        self.xSteps = (self.xMax-self.xMin) + 1
-        self.ySteps = (self.yMax-self.yMin) + 1
-        self.x = np.linspace(self.xMin, self.xMax, self.xSteps)
-        self.y = np.linspace(self.yMin, self.yMax, self.ySteps)
-        self.xi, self.yi = np.meshgrid(self.x, self.y)
-
-        if self.h.method == int(Methods.CUBIC):
-            method = 'cubic'
-        elif self.h.method == int(Methods.LINEAR):
-            method = 'linear'
-        elif self.h.method == int(Methods.NEAREST):
-            method = 'nearest'
-        else:
-            method = 'cubic'
+    def method(self):
+        try:
+            return Methods(self.h['method'])
+        except ValueError:
             print("ERROR: z_level_compensation: HAL pin interpolation \
-method {} not recognised (outside 0-2). Defaulting to cubic(0).".format(self.h.method))
-        # interpolate, zi has all the offset values but need to be transposed
-        self.zi = griddata((self.x_data, self.y_data), self.z_data, (self.xi, self.yi), method = method)
-        self.zi = np.transpose(self.zi)
+method {} not recognised (outside 0-2). Defaulting to cubic(0).".format(self.h['method']))
+            return Methods.CUBIC
+
+    def mapKey(self):
+        """What the grid depends on: the probe file, the method and the resolution"""
+        st = os.stat(self.filename)
+        text = repr((CACHE_VERSION, os.path.abspath(self.filename), st.st_size,
+                     st.st_mtime_ns, int(self.method()), self.h['resolution']))
+        return hashlib.blake2b(text.encode(), digest_size=20).hexdigest()
 
-    def compensate(self):
+    def loadMap(self):
+        # the grid of a probe file seen before is mapped from the cache
+        key = self.mapKey()
+        path = os.path.join(cache_directory(), key + '.npy')
+        grid = CompensationGrid.load(path)
+        if grid is None:
+            # data coordinates and values
+            data = np.loadtxt(self.filename, dtype = float, delimiter = " ", usecols = (0, 1, 2), ndmin = 2)
+            grid = CompensationGrid.from_points(data[:, 0], data[:, 1], data[:, 2],
+                                                self.method(), self.h['resolution'])
+            try:
+                grid.save(path)
+            except OSError as e:
+                print("z_level_compensation: could not cache the map: {}".format(e))
+            prune_cache(cache_directory())
+        self.grid = grid
+        return key
+
+    def compensate(self, fade=1.0):
         x = self.h['x-pos'] - self.stat.g5x_offset[0]
         y = self.h['y-pos'] - self.stat.g5x_offset[1]
-        # get nearest integer position
-        self.xpos = int(round(x))
-        self.ypos = int(round(y))
-        
-        # clamp the range
-        self.xpos = self.xMin if self.xpos < self.xMin else self.xMax if self.xpos > self.xMax else self.xpos
-        self.ypos = self.yMin if self.ypos < self.yMin else self.yMax if self.ypos > self.yMax else self.ypos
-        
-        # location in the offset map array
-        self.Xn = self.xpos - self.xMin
-        self.Yn = self.ypos - self.yMin
-        
-        # get the nearest compensation offset and convert to counts (s32) with a scale (float) 
+
+        # get the compensation offset and convert to counts (s32) with a scale (float)
         # Requested offset == counts * scale
-        zo = self.zi[self.Xn, self.Yn]
         try:
-            compensation = int(zo / self.scale)
-        except:
-            compensation = 0.0
+            compensation = int(round(self.grid.evaluate(x, y, fade) / self.scale))
+        except (AttributeError, ValueError, OverflowError):
+            compensation = 0
         return compensation
 
     def run(self):
@@ -119,16 +313,25 @@ method {} not recognised (outside 0-2). Defaulting to cubic(0).".format(self.h.m
         self.h.newpin("z-pos", hal.HAL_FLOAT, hal.HAL_IN)
         self.h.newpin("fade-height", hal.HAL_FLOAT, hal.HAL_IN)
         self.h.newpin("method", hal.HAL_S32, hal.HAL_IN)
+        self.h.newpin("resolution", hal.HAL_FLOAT, hal.HAL_IN)
+        self.h.newpin("update-period", hal.HAL_FLOAT, hal.HAL_IN)
+        self.h["update-period"] = update
         self.h.ready()
         self.stat = linuxcnc.stat()
         
         currentState = States.START
         prevState = States.STOP
-        fadeHeight = self.h["fade-height"]
+        deadline = time.monotonic()
 
         try:
             while True:
-                time.sleep(update)
+                deadline += max(self.h["update-period"], min_update)
+                delay = deadline - time.monotonic()
+                if delay < 0:
+                    # running late, don't try to catch up
+                    deadline -= delay
+                    delay = 0
+                time.sleep(delay)
                 
                 # get linuxcnc task_state status for machine on / off transitions
                 try:
@@ -141,7 +344,7 @@ method {} not recognised (outside 0-2). Defaulting to cubic(0).".format(self.h.m
                         prevState = currentState
 
                     # do start-up tasks
-                    prevMapTime = 0
+                    prevMapKey = None
                     self.h["counts"] = 0
                     currentState = States.IDLE
                 
@@ -156,31 +359,30 @@ method {} not recognised (outside 0-2). Defaulting to cubic(0).".format(self.h.m
                 elif currentState == States.LOADMAP:
                     if currentState != prevState:
                         prevState = currentState
-                    mapTime = os.path.getmtime(self.filename)
-                    if mapTime != prevMapTime:
-                        self.loadMap()
-                        prevMapTime = mapTime
+                    try:
+                        if self.mapKey() != prevMapKey:
+                            prevMapKey = self.loadMap()
+                    except (OSError, ValueError, ImportError) as e:
+                        print("ERROR: z_level_compensation: could not load {}: {}".format(self.filename, e))
+                        self.grid = None
+                        prevMapKey = None
+                    mapSettings = (self.h["method"], self.h["resolution"])
                     currentState = States.RUNNING
                 
                 elif currentState == States.RUNNING:
                     if currentState != prevState:
                         prevState = currentState
                     if self.h["enable-in"]:
-                        zPos = self.h["z-pos"]
-                        if fadeHeight == 0:
-                            compScale = 1
-                        elif zPos < fadeHeight:
-                            compScale = (fadeHeight - zPos)/fadeHeight
-                            if compScale > 1:
-                                compScale = 1
-                        else:
-                            compScale = 0
+                        if (self.h["method"], self.h["resolution"]) != mapSettings:
+                            # rebuild the map for the new settings
+                            currentState = States.LOADMAP
+                            continue
+                        compScale = fade_scale(self.h["z-pos"], self.h["fade-height"])
                         if self.stat.task_state == linuxcnc.STATE_ON:
                             # get the compensation if machine power is on, else set to 0
                             # otherwise we lose compensation eoffset if machine power is cycled 
                             # when compensation is enabled
-                            compensation = self.compensate()
-                            self.h["counts"] = compensation * compScale
+                            self.h["counts"] = self.compensate(compScale)
                             self.h["scale"] = self.scale
                         else:
                             self.h["counts"] = 0
@@ -203,5 +405,6 @@ method {} not recognised (outside 0-2). Defaulting to cubic(0).".format(self.h.m
         except KeyboardInterrupt:
             raise SystemExit
 
-comp = Compensation()
-comp.run()
+if __name__ == "__main__":
+    comp = Compensation()
+    comp.run()
@@ -88,6 +88,7 @@ int halcmd_done = 0;		/* used to break out of processing loop */
 int scriptmode = 0;	/* used to make output "script friendly" (suppress headers) */
 int echo_mode = 0;
 char comp_name[HAL_NAME_LEN+1];	/* name for this instance of halcmd */
+void (*halcmd_child_started)(pid_t pid) = NULL;	/* see halcmd.h */
 
 static void quit(int);
 
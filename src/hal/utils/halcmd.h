@@ -40,6 +40,7 @@
 #ifndef HALCMD_H
 #define HALCMD_H
 #include <stdio.h>
+#include <sys/types.h>
 #include "hal.h"
 
 RTAPI_BEGIN_DECLS
@@ -112,6 +113,11 @@ extern int halcmd_ncommands;
 
 extern FILE *halcmd_inifile;
 
+/* if set, called with the pid of each program loadusr started and did not
+   wait for; a process running halcmd commands and carrying on afterwards
+   has to reap them */
+extern void (*halcmd_child_started)(pid_t pid);
+
 #define MAX_TOK 32
 #define MAX_CMD_LEN 1024
 #define MAX_EXPECTED_SIGS 999
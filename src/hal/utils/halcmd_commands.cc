@@ -1638,6 +1638,7 @@ int do_loadusr_cmd(const char *args[])
 	/* print success message */
 	halcmd_info("Program '%s' finished\n", prog_name);
     } else {
+	if (halcmd_child_started) halcmd_child_started(pid);
 	/* print success message */
 	halcmd_info("Program '%s' started\n", prog_name);
     }
@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+import os
+
+from qtvcp.lib.ripper import gcode_ripper
+
+gcode_ripper.QUIET = True
+NC_FILES = os.path.join(os.environ["EMC2_HOME"], "nc_files")
+
+def value(v):
+    # a coordinate the g-code has not set yet is a complex number; only
+    # that it is unset matters, the writers leave it out
+    if isinstance(v, complex):
+        return "*"
+    text = "%.5f" % v
+    return "0.00000" if text == "-0.00000" else text
+
+def show(title, code, bounds=None):
+    print(title)
+    for line in code:
+        if gcode_ripper.is_move(line):
+            print("G%d" % line[0], " | ".join(
+                " ".join(value(v) for v in p) if isinstance(p, list) else value(p)
+                for p in line[1:]))
+        else:
+            print(repr(line))
+    if bounds is not None:
+        print("bounds", " ".join(value(v) for v in bounds))
+
+# file, arcs read as lines, probed
+for name, arc2line, probe in (("plasmatest.ngc", False, False),
+                              ("3dtest.ngc", True, True),
+                              ("hole-circle.ngc", False, True)):
+    print("#", name, "arcs as lines" if arc2line else "arcs")
+    rip = gcode_ripper.G_Code_Rip()
+    print("messages", rip.Read_G_Code(os.path.join(NC_FILES, name), XYarc2line=arc2line,
+                                      arc_angle=10, units="in", Accuracy=0.001))
+    show("read", rip.g_code_data)
+
+    code, minx, maxx, miny, maxy, minz, maxz = \
+        rip.scale_rotate_code(rip.g_code_data, [2.0, 2.0, 1.5, 0.5], 30)
+    show("scaled and rotated", code, (minx, maxx, miny, maxy, minz, maxz))
+    code = rip.scale_translate(code, translate=[minx, miny, 0.0])
+
+    rip.split_code(code, shift=[(maxx - minx) / 2, (maxy - miny) / 2, 0], angle=20)
+    show("left", rip.left_side)
+    show("right", rip.right_side)
+    left = rip.scale_rotate_code(rip.left_side, [1, 1, 1, 1], 180)
+    show("left turned", left[0], left[1:])
+
+    if probe:
+        nX, nY = 4, 3
+        rip.probe_code(code, nX, nY, 2, 0, 0, (maxx - minx) / (nX - 1), (maxy - miny) / (nY - 1))
+        show("probed", rip.probe_gcode)
+        for point in rip.probe_coords:
+            print("probe", point[0], point[1], value(point[2]), value(point[3]))
@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+
+import sys
+
+import linuxcnc
+from hal_glib import GStat
+
+retval = 0
+
+c = linuxcnc.command()
+c.state(linuxcnc.STATE_ESTOP_RESET)
+c.state(linuxcnc.STATE_ON)
+c.mode(linuxcnc.MODE_MANUAL)
+c.wait_complete()
+
+class Stat(linuxcnc.stat):
+    polls = 0
+    def poll(self):
+        Stat.polls += 1
+        linuxcnc.stat.poll(self)
+
+gstat = GStat(Stat())
+results = []
+
+def periodic(w):
+    # as seen from a handler: the status update() polled, until a command
+    results.append(('before', gstat.is_man_mode(), gstat.is_mdi_mode()))
+    c.mode(linuxcnc.MODE_MDI)
+    c.wait_complete()
+    results.append(('after', gstat.is_man_mode(), gstat.is_mdi_mode(),
+                    gstat.check_for_modes([linuxcnc.MODE_MDI])[0]))
+
+handler = gstat.connect('periodic', periodic)
+gstat.update()
+gstat.disconnect(handler)
+
+expected = [('before', True, False), ('after', False, True, True)]
+if results != expected:
+    print("handler saw %s, expected %s" % (results, expected))
+    retval = 1
+else:
+    print("handlers see the mode set by their own command")
+
+# the next update sees the change too
+gstat.update()
+if not gstat.is_mdi_mode():
+    print("update() lost the MDI mode")
+    retval = 1
+
+# handlers run by forced_update() share its status too
+def forced_update(w):
+    polls = Stat.polls
+    results.append((gstat.is_mdi_mode(), gstat.check_for_modes([linuxcnc.MODE_MDI])[0],
+                    Stat.polls - polls))
+
+results = []
+handler = gstat.connect('forced-update', forced_update)
+gstat.forced_update()
+gstat.disconnect(handler)
+if results != [(True, True, 0)]:
+    print("forced_update() handler saw %s" % results)
+    retval = 1
+else:
+    print("forced_update() handlers do not poll again")
+
+sys.exit(retval)
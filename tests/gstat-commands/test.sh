@@ -0,0 +1,3 @@
+#!/bin/bash
+
+linuxcnc -r test.ini
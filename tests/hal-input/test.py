@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+import importlib.machinery
+import os
+import shutil
+import struct
+import sys
+import tempfile
+import time
+import types
+
+import hal
+import linux_event
+
+loader = importlib.machinery.SourceFileLoader('hal_input', shutil.which('hal_input'))
+hal_input = types.ModuleType(loader.name)
+loader.exec_module(hal_input)
+
+EV = linux_event.EV
+
+def record(f, events):
+    for type, code, value in events:
+        f.write(struct.pack(linux_event.Event.format, 0, 0, EV[type],
+                            linux_event.encode(type, code), value))
+        f.write(struct.pack(linux_event.Event.format, 0, 0, EV['EV_SYN'], 0, 0))
+
+def synthetic(f, turns=2000):
+    """A jog pendant: a wheel turning, a joystick moving and buttons"""
+    events = []
+    for i in range(turns):
+        events.append(('EV_REL', 'REL_WHEEL', 1 if i % 4 else -1))
+        events.append(('EV_ABS', 'ABS_X', (i * 37) % 256))
+        events.append(('EV_ABS', 'ABS_Y', 255 - (i * 37) % 256))
+        if i % 50 == 0:
+            events.append(('EV_KEY', 'BTN_0', (i // 50) % 2))
+    events.append(('EV_ABS', 'ABS_X', 0))
+    events.append(('EV_ABS', 'ABS_X', 255))
+    events.append(('EV_ABS', 'ABS_Y', 128))
+    events.append(('EV_KEY', 'BTN_1', 1))
+    record(f, events)
+
+recordings = sys.argv[1:]
+if not recordings:
+    f = tempfile.NamedTemporaryFile(suffix='.events', delete=False)
+    with f:
+        synthetic(f)
+    recordings = [f.name]
+
+c = hal.component("hal-input-test")
+devices = []
+for i, recording in enumerate(recordings):
+    device = linux_event.RecordedDevice(recording)
+    devices.append(hal_input.HalInputDevice(c, i, recording, device=device))
+c.ready()
+
+for recording, dev in zip(recordings, devices):
+    start = time.perf_counter()
+    while dev.device.readable():
+        dev.update()
+    elapsed = time.perf_counter() - start
+    print("%s: %d events in %.3f s, %.0f events/s" % (
+        recording, len(dev.device.events), elapsed,
+        len(dev.device.events) / max(elapsed, 1e-9)), file=sys.stderr)
+
+if not sys.argv[1:]:
+    os.unlink(recordings[0])
+    for name in ("0.rel-wheel-counts", "0.rel-wheel-position",
+                 "0.abs-x-counts", "0.abs-x-position", "0.abs-x-is-pos",
+                 "0.abs-y-counts", "0.abs-y-position", "0.abs-y-is-neg",
+                 "0.btn-0", "0.btn-0-not", "0.btn-1", "0.btn-1-not"):
+        print(name, c[name])
+
+    # input pins are picked up by poll_inputs
+    c["0.rel-wheel-scale"] = 4
+    c["0.abs-x-offset"] = 255
+    devices[0].poll_inputs()
+    print("0.rel-wheel-position", c["0.rel-wheel-position"])
+    print("0.abs-x-position", c["0.abs-x-position"])
+    c["0.rel-wheel-reset"] = 1
+    devices[0].poll_inputs()
+    print("0.rel-wheel-counts", c["0.rel-wheel-counts"])
@@ -1,5 +1,6 @@
 #!/usr/bin/env python3
 import hal
+import numpy
 
 c = hal.component("stream_test")
 try:
@@ -9,5 +10,35 @@ except:
 else:
     assert False, "hal.stream should fail with invalid cfg arg"
 
+# bulk writes stop at a full stream, bulk reads at an empty one
+s = hal.stream(c, hal.streamer_base, 10, "fbsu")
+dtype = hal.stream_dtype(s.element_types)
+assert dtype.itemsize == 32
+data = numpy.zeros(12, dtype)
+data['f0'] = numpy.arange(12) / 4.
+data['f1'] = numpy.arange(12) % 2
+data['f2'] = -numpy.arange(12)
+data['f3'] = numpy.arange(12) * 1000
+assert s.write_from(data) == s.maxdepth - 1
+assert s.batch_overruns == 0
+
+got = numpy.zeros(12, dtype)
+n = s.read_into(got)
+assert n == s.maxdepth - 1
+assert s.batch_underruns == 0
+assert (got[:n] == data[:n]).all()
+assert s.read() is None
+
+s.write((1.5, True, -2, 3))
+assert s.read_into(got, 1) == 1
+assert got[0].tolist() == (1.5, True, -2, 3)
+
+try:
+    s.read_into(bytearray(31))
+except ValueError:
+    pass
+else:
+    assert False, "read_into should fail with a partial sample"
+
 c.ready()
 print("pass")
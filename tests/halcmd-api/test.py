@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+import os
+import tempfile
+import time
+
+import hal
+
+h = hal.component("api")
+h.newpin("out", hal.HAL_FLOAT, hal.HAL_OUT)
+h.newpin("in", hal.HAL_FLOAT, hal.HAL_IN)
+h.newpin("out2", hal.HAL_S32, hal.HAL_OUT)
+h.newpin("in2", hal.HAL_S32, hal.HAL_IN)
+h.newparam("gain", hal.HAL_FLOAT, hal.HAL_RW)
+h.ready()
+
+tempdir = tempfile.mkdtemp()
+def write(name, text):
+    path = os.path.join(tempdir, name)
+    with open(path, "w") as f:
+        f.write(text)
+    return path
+
+def run(name, f):
+    try:
+        print(name, repr(f()))
+    except hal.error as e:
+        print(name, "error:", str(e).replace(tempdir, "TMP"))
+
+# setp, getp and net
+run("setp", lambda: hal.setp("api.gain", 1.5))
+print("gain", h["gain"])
+run("getp", lambda: hal.getp("api.gain"))
+run("net", lambda: hal.net("sig-float", "api.out", "api.in"))
+h["out"] = 4.25
+print("in", h["in"])
+run("getp in", lambda: hal.getp("api.in"))
+run("sets writer", lambda: hal.sets("sig-float", 3))
+run("newsig", lambda: hal.command("newsig", "sig-free", "float"))
+run("sets", lambda: hal.sets("sig-free", 0.5))
+run("gets", lambda: hal.command("gets", "sig-free"))
+run("getp missing", lambda: hal.getp("api.missing"))
+
+# a HAL file with a continued line, INI file substitutions and quit
+good = write("good.hal", """# comment
+net [TEST]SIGNAL \\
+    api.out2 \\
+    api.in2
+setp api.gain [TEST]GAIN
+quit
+setp api.missing 1
+""")
+run("source", lambda: hal.source(good, "test.ini"))
+h["out2"] = 7
+print("in2", h["in2"], "gain", h["gain"])
+run("signal", lambda: hal.command("gets", "from-ini"))
+
+# the first error stops the file, with halcmd's file:line: message
+bad = write("bad.hal", "setp api.gain 3\n\nsetp api.missing 1\nsetp api.gain 4\n")
+run("source bad", lambda: hal.source(bad))
+print("gain", h["gain"])
+run("source missing", lambda: hal.source(os.path.join(tempdir, "missing.hal")))
+
+def zombies():
+    count = 0
+    for pid in os.listdir("/proc"):
+        try:
+            with open("/proc/%s/stat" % pid) as f:
+                fields = f.read().rsplit(")", 1)[1].split()
+        except (OSError, IndexError):
+            continue
+        if fields[0] == "Z" and int(fields[1]) == os.getpid():
+            count += 1
+    return count
+
+# programs loadusr does not wait for are reaped by the next call
+run("loadusr", lambda: hal.loadusr("true"))
+deadline = time.time() + 10
+while not zombies() and time.time() < deadline:
+    time.sleep(0.05)
+print("zombies before", zombies())
+run("getp", lambda: hal.getp("api.gain"))
+print("zombies after", zombies())
+
+h.exit()
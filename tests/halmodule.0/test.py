@@ -83,6 +83,71 @@ try:
 
     try_set_pin(pu, 0)
     try_set_pin(pu, -1)
+
+    # handles resolved once and read without looking the names up again
+    def try_get(name, f):
+        try:
+            print("{} {}".format(name, f()))
+        except RuntimeError as e:
+            print("{} fail: {}".format(name, e))
+
+    h["s"] = 5
+    rs = hal.resolve("x.s")
+    print("resolve {} {} {}".format(rs.get_name(), rs.get_type() == hal.HAL_S32, rs.get()))
+    h["s"] = 6
+    try_get("handle x.s", rs.get)
+    print("resolve same handle {}".format(hal.resolve("x.s") is rs))
+    try_get("handle x.param", hal.resolve("x.param").get)
+    try_get("resolve not-found", lambda: hal.resolve("x.not-found"))
+
+    # get_values takes handles and names; missing names give the default
+    h["u"] = 7
+    h["f"] = 0.5
+    try_get("get_values", lambda: hal.get_values([rs, "x.u", "x.f"]))
+    try_get("get_values missing", lambda: hal.get_values(["x.s", "x.missing"]))
+    try_get("get_values default", lambda: hal.get_values(["x.s", "x.missing"], None))
+    try_get("get_values default -1", lambda: hal.get_values(["x.missing"], -1))
+
+    # signals, and pins followed to the signal they are linked to
+    hal.net("sig-s", "x.s")
+    rsig = hal.resolve("sig-s")
+    h["s"] = 8
+    try_get("handle sig-s", rsig.get)
+    try_get("handle x.s linked", rs.get)
+    hal.command("unlinkp", "x.s")
+    h["s"] = 9
+    try_get("handle x.s unlinked", rs.get)
+    try_get("handle sig-s unlinked", rsig.get)
+    hal.command("delsig", "sig-s")
+    try_get("handle sig-s deleted", rsig.get)
+    try_get("get_values sig-s deleted", lambda: hal.get_values([rsig], None))
+
+    # a handle resolved through an alias, or the name before it
+    hal.command("alias", "pin", "x.u", "x.u-alias")
+    ralias = hal.resolve("x.u-alias")
+    rold = hal.resolve("x.u")
+    h["u"] = 10
+    try_get("handle x.u-alias", ralias.get)
+    try_get("handle x.u aliased", rold.get)
+    hal.command("unalias", "pin", "x.u")
+    try_get("handle x.u-alias unaliased", ralias.get)
+    try_get("handle x.u unaliased", rold.get)
+
+    # a handle to a pin of a component that is gone, then back
+    y = hal.component("y")
+    y.newpin("p", hal.HAL_FLOAT, hal.HAL_OUT)
+    y.ready()
+    y["p"] = 1.5
+    rp = hal.resolve("y.p")
+    try_get("handle y.p", rp.get)
+    y.exit()
+    try_get("handle y.p unloaded", rp.get)
+    y = hal.component("y")
+    y.newpin("p", hal.HAL_FLOAT, hal.HAL_OUT)
+    y.ready()
+    y["p"] = 2.5
+    try_get("handle y.p reloaded", rp.get)
+    y.exit()
 except:
     import traceback
     print("Exception: {}".format(traceback.format_exc()))
@@ -0,0 +1,30 @@
+#!/usr/bin/env python3
+import resource
+
+import hal
+
+h = hal.component("getpins-test")
+for i in range(20):
+    h.newpin("long-pin-name-%02d" % i, hal.HAL_FLOAT, hal.HAL_OUT)
+    h.newparam("long-param-name-%02d" % i, hal.HAL_S32, hal.HAL_RW)
+h.ready()
+
+def rss():
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * resource.getpagesize()
+
+# as often as a vismach PinWatch polls in about an hour and a half
+for i in range(2000):
+    h["long-pin-name-00"] = i + .5
+    pins = h.getpins()
+before = rss()
+for i in range(200000):
+    h["long-pin-name-00"] = i + .5
+    pins = h.getpins()
+grown = rss() - before
+assert pins["long-pin-name-00"] == i + .5 and len(pins) == 40, pins
+# leaking the names and values would take hundreds of megabytes
+assert grown < 4 << 20, grown
+
+h.exit()
+print("pass")
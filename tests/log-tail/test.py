@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+import os
+import tempfile
+import time
+
+import log_tail
+from log_tail import LogTail, LogRotator, LogIndex
+
+log = os.path.join(tempfile.mkdtemp(), "machine_log.txt")
+
+def append(text):
+    with open(log, "a") as f:
+        f.write(text)
+
+# the first read shows the last lines, later ones what was appended
+append("".join("line %d\n" % i for i in range(50)))
+tail = LogTail(log, lines=10)
+assert tail.changed()
+reset, text = tail.read()
+assert reset and text == "".join("line %d\n" % i for i in range(40, 50)), text
+assert not tail.changed()
+assert tail.read() == (False, "")
+
+# a line being written waits for its end
+append("line 50\nline 5")
+assert tail.changed()
+assert tail.read() == (False, "line 50\n")
+append("1 done\n")
+assert tail.read() == (False, "line 51 done\n")
+
+# lines longer than a chunk are read back from the end of the log
+append("x" * log_tail.CHUNK + "\nlast\n")
+assert LogTail(log, lines=2).read() == (True, "x" * log_tail.CHUNK + "\nlast\n")
+tail.reset()
+reset, text = tail.read()
+assert reset and text.startswith("line 44\n") and text.endswith("last\n"), text
+
+# rotate by size, keeping two old logs
+index = LogIndex(log, keep=2)
+rotator = LogRotator(log, max_size=100, max_age=0, keep=2)
+assert rotator.check()
+assert not os.path.exists(log) and os.path.exists(log + ".1")
+assert not rotator.check()
+append("Spindle started\nEstop pressed\n")
+assert not rotator.check()
+assert tail.read() == (True, "Spindle started\nEstop pressed\n")
+
+# search the log and the rotated one, newest first, ignoring case
+found = index.search("line 4")
+assert [(os.path.basename(n), number) for n, number, line in found][:3] == \
+    [("machine_log.txt.1", 50), ("machine_log.txt.1", 49), ("machine_log.txt.1", 48)], found
+assert len(found) == 11 and found[-1][2] == "line 4", found
+assert index.search("ESTOP") == [(log, 2, "Estop pressed")]
+assert index.search("estop pressed", limit=1) == [(log, 2, "Estop pressed")]
+assert [line for n, number, line in index.search("51 done")] == ["line 51 done"]
+assert index.search("line 51 done now") == []
+assert index.search("tarted") == [(log, 1, "Spindle started")]
+assert len(index.search("line", limit=5)) == 5
+indexed = set(index.indexes)
+
+# appended lines are indexed, the rotated file keeps its index
+append("Estop reset\n")
+found = index.search("estop")
+assert [line for n, number, line in found] == ["Estop reset", "Estop pressed"], found
+assert set(index.indexes) == indexed
+
+# rotate again: both files are found by the indexes made before
+rotator.rotate()
+append("Machine on\n")
+found = index.search("estop")
+assert [(os.path.basename(n), number) for n, number, line in found] == \
+    [("machine_log.txt.1", 3), ("machine_log.txt.1", 2)], found
+assert indexed < set(index.indexes)
+assert index.search("machine on") == [(log, 1, "Machine on")]
+
+# the oldest log is dropped after keep rotations, and its index with it
+rotator.rotate()
+assert not os.path.exists(log) and not os.path.exists(log + ".3")
+assert index.search("line 49") == []
+assert [os.path.basename(n) for n, number, line in index.search("estop")] == ["machine_log.txt.2"] * 2
+assert len(index.indexes) == 2
+
+# a log truncated and written again is read and indexed again
+append("Program started\n")
+assert index.search("program") == [(log, 1, "Program started")]
+with open(log, "w") as f:
+    f.write("Tool changed\nProgram paused\n")
+assert index.search("program") == [(log, 2, "Program paused")]
+assert tail.read()[0]
+assert tail.read() == (False, "")
+
+# rotate by age: the age counts from when the log was started, not from
+# its last line, also for a rotator made again when the screen restarts
+aged = os.path.join(os.path.dirname(log), "aged_log.txt")
+def start_screen():
+    rotator = LogRotator(aged, max_size=0, max_age=100, keep=2)
+    rotated = rotator.check()
+    with open(aged, "a") as f:
+        f.write("Screen started\n")
+    return rotated
+def started(ago):
+    os.utime(aged + ".started", (time.time() - ago, time.time() - ago))
+assert not start_screen()
+started(50)
+assert not start_screen()
+started(150)
+assert start_screen()
+assert os.path.exists(aged + ".1") and not os.path.exists(aged + ".2")
+assert not start_screen()
+# a log emptied by the screen starts again when it is written
+started(150)
+open(aged, "w").close()
+assert not start_screen()
+assert not start_screen()
+assert not os.path.exists(aged + ".2")
+
+print("pass")
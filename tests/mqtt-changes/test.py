@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+import importlib.machinery
+import json
+import shutil
+import types
+
+import hal
+
+loader = importlib.machinery.SourceFileLoader(
+    'mqtt_publisher', shutil.which('mqtt-publisher'))
+mqtt_publisher = types.ModuleType(loader.name)
+loader.exec_module(mqtt_publisher)
+
+class Broker:
+    "Stands in for the paho client, keeps the messages published"
+    def __init__(self):
+        self.messages = []
+
+    def publish(self, topic, payload):
+        self.messages.append((topic, json.loads(payload)))
+
+def show(broker):
+    for topic, data in broker.messages:
+        frames = data if isinstance(data, list) else [data]
+        for frame in frames:
+            frame.pop('time')
+        print(topic, json.dumps(data, sort_keys=True))
+    del broker.messages[:]
+
+h = hal.component("x")
+h.newpin("f", hal.HAL_FLOAT, hal.HAL_OUT)
+h.newpin("s", hal.HAL_S32, hal.HAL_OUT)
+h.newpin("b", hal.HAL_BIT, hal.HAL_OUT)
+h.ready()
+
+broker = Broker()
+m = mqtt_publisher.LinuxCNC2MQTT('localhost', 1883, 'test', None, None,
+                                 client=broker, quiet=True)
+m.create_pins(['x.f', 'x.s', 'x.b', 'x.missing'])
+m.hal['period'] = 10
+
+print("changes")
+m.set_sampling(0.01, {'x.f': 0.5})
+m.reset()
+m.step(0, 0)
+show(broker)
+h['f'] = 0.25
+m.step(0, 0.01)
+show(broker)
+h['f'] = 0.75
+h['s'] = 1
+m.step(0, 0.02)
+show(broker)
+h['b'] = 1
+m.step(0, 0.03)
+m.step(0, 0.04)
+show(broker)
+m.step(0, 10)
+show(broker)
+
+print("batches")
+m.set_sampling(0.01, {}, 0.5, batch_period=0.1)
+m.reset()
+m.step(0, 0)
+show(broker)
+h['f'] = 1
+m.step(0, 0.01)
+h['f'] = 1.5
+m.step(0, 0.02)
+h['s'] = 2
+m.step(0, 0.03)
+show(broker)
+m.step(0, 0.1)
+show(broker)
+m.step(0, 0.2)
+show(broker)
@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+import configparser
+import os
+import sys
+import tempfile
+import threading
+
+from preference_store import PreferenceStore
+
+class Preferences(PreferenceStore, configparser.RawConfigParser):
+    pass
+
+def read(fn):
+    parser = configparser.RawConfigParser()
+    parser.read(fn)
+    return parser
+
+fn = os.path.join(tempfile.mkdtemp(), "prefs")
+with open(fn, "w") as f:
+    f.write("[DEFAULT]\nkept = 1\n\n[section]\noption = a\n")
+
+# changes made since the file changed under the store are replayed on the
+# new contents, new empty sections included
+store = Preferences(fn, delay=None)
+store.add_section("empty")
+store.add_section("new")
+store.set("new", "option", "b")
+store.remove_section("section")
+with open(fn, "a") as f:
+    f.write("\n[other]\noption = c\n")
+store.flush()
+parser = read(fn)
+assert parser.sections() == ["other", "empty", "new"], parser.sections()
+assert parser.get("new", "option") == "b"
+assert parser.get("other", "kept") == "1"
+assert store.sections() == parser.sections()
+
+# reads on this thread while flush() reloads the file on another one
+stop = threading.Event()
+def writer():
+    i = 0
+    while not stop.is_set():
+        i += 1
+        store.set("DEFAULT", "count", str(i))
+        with open(fn, "a") as f:
+            f.write("\n")
+        store.flush()
+# switch threads often, so reads land in the middle of a reload
+sys.setswitchinterval(1e-6)
+thread = threading.Thread(target=writer)
+thread.start()
+try:
+    for i in range(20000):
+        assert store.get("new", "option") == "b"
+        assert store.get("other", "kept") == "1"
+        assert store.has_option("other", "option")
+        assert dict(store.items("new"))["option"] == "b"
+finally:
+    stop.set()
+    thread.join()
+
+print("pass")
@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+import os
+import tempfile
+import types
+
+import gcode
+import numpy
+from rs274.glcanon import GLCanon
+from rs274.interpret import StatMixin
+from rs274.segments import motion_dtype
+
+stat = types.SimpleNamespace(tool_table=[],
+        axis_mask=7, linear_units=1., angular_units=1., block_delete=0)
+
+tempdir = tempfile.mkdtemp()
+open(os.path.join(tempdir, "test.var"), "w").close()
+
+class Colors(dict):
+    def __missing__(self, key): return (1., 1., 1.)
+
+class Canon(GLCanon, StatMixin):
+    def __init__(self, batch):
+        GLCanon.__init__(self, Colors(), "XYZ")
+        StatMixin.__init__(self, stat, 0)
+        self.motion_batch_size = batch
+        self.batches = 0
+        self.parameter_file = os.path.join(tempdir, "test.var")
+
+    def check_abort(self): pass
+    def is_lathe(self): return False
+
+    def motion_batch(self, buffer):
+        # canon.state is the state of the line of the last motion in a batch,
+        # as it would be after the same motions one by one
+        records = numpy.frombuffer(buffer, motion_dtype)
+        assert self.lineno == records['lineno'][-1], (self.lineno, records['lineno'])
+        assert self.state.sequence_number == self.lineno
+        self.batches += 1
+        GLCanon.motion_batch(self, buffer)
+
+def parse(batch):
+    canon = Canon(batch)
+    result, seq = gcode.parse("test.ngc", canon, "G20", "")
+    assert result <= gcode.MIN_ERROR, gcode.strerror(result)
+    return canon
+
+reference = parse(0)
+assert reference.batches == 0
+for batch in 1, 7, 4096:
+    canon = parse(batch)
+    assert canon.batches, batch
+    for name in 'traverse', 'feed', 'arcfeed':
+        a, b = getattr(reference, name), getattr(canon, name)
+        assert len(a) == len(b), (batch, name, len(a), len(b))
+        for column in 'lineno', 'feedrate', 'tooloffset':
+            assert (getattr(a, column) == getattr(b, column)).all(), (batch, name, column)
+        for column in 'start', 'end':
+            assert numpy.allclose(getattr(a, column), getattr(b, column), atol=1e-9), (batch, name, column)
+    assert canon.dwells == reference.dwells
+    assert canon.lineno == reference.lineno
+    assert canon.state.gcodes == reference.state.gcodes
+    assert canon.state.mcodes == reference.state.mcodes
+    assert numpy.allclose(canon.lo, reference.lo)
+print("pass")
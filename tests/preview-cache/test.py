@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+import os
+import shutil
+import tempfile
+import types
+
+import gcode
+import numpy
+from rs274.glcanon import GLCanon
+from rs274.interpret import StatMixin
+from rs274.previewcache import PreviewCache
+
+stat = types.SimpleNamespace(tool_table=[],
+        axis_mask=7, linear_units=1., angular_units=1., block_delete=0)
+
+tempdir = tempfile.mkdtemp()
+open(os.path.join(tempdir, "test.var"), "w").close()
+
+class Colors(dict):
+    def __missing__(self, key): return (1., 1., 1.)
+
+class Canon(GLCanon, StatMixin):
+    def __init__(self):
+        GLCanon.__init__(self, Colors(), "XYZ")
+        StatMixin.__init__(self, stat, 0)
+        self.parameter_file = os.path.join(tempdir, "test.var")
+        self.notify_messages = []
+
+    def check_abort(self): pass
+    def is_lathe(self): return False
+
+    def next_line(self, st):
+        GLCanon.next_line(self, st)
+        if self.notify:
+            self.notify_messages.append(self.notify_message)
+            self.notify = 0
+
+program = os.path.join(tempdir, "test.ngc")
+def write_program(feed):
+    with open(program, "w") as f:
+        f.write("""G10 L2 P2 X1 Y2 Z3
+G55
+G92 X0.5
+G43.1 Z0.25
+G0 X1 Y1
+(PREVIEW,notify,first message)
+G1 X2 F%d
+G2 X3 Y2 I0.5 J0.5
+G4 P1
+(PREVIEW,notify,second message)
+G0 Z1
+M2
+""" % feed)
+
+cache = PreviewCache(os.path.join(tempdir, "cache"))
+args = ("G20", "")
+
+def parse():
+    canon = Canon()
+    result, seq = gcode.parse(program, canon, *args)
+    assert result <= gcode.MIN_ERROR, gcode.strerror(result)
+    return canon, result, seq
+
+write_program(10)
+key = cache.key(program, args, "test")
+assert key is not None
+assert cache.load(key, Canon()) is None
+
+reference, result, seq = parse()
+assert reference.notify_messages == ["first message", "second message"]
+assert cache.store(key, reference, result, seq)
+
+# a hit gives back the same preview and state as the parse
+canon = Canon()
+assert cache.load(key, canon) == (result, seq)
+for name in 'traverse', 'feed', 'arcfeed':
+    a, b = getattr(reference, name), getattr(canon, name)
+    assert len(a) == len(b) > 0, name
+    for column in 'lineno', 'start', 'end', 'feedrate', 'tooloffset':
+        assert numpy.array_equal(getattr(a, column), getattr(b, column)), (name, column)
+assert canon.dwells == reference.dwells
+for name in ('xo', 'yo', 'zo', 'g5x_offset_x', 'g5x_offset_y', 'g5x_offset_z',
+             'g92_offset_x', 'g5x_index', 'lineno'):
+    assert getattr(canon, name) == getattr(reference, name), name
+assert canon.zo == 0.25
+assert tuple(canon.lo) == tuple(reference.lo)
+assert canon.state.gcodes == reference.state.gcodes
+assert canon.state.mcodes == reference.state.mcodes
+assert canon.notify_messages == reference.notify_messages
+
+# the same key is found again by another cache on the same directory
+assert PreviewCache(cache.directory).load(key, Canon()) == (result, seq)
+
+# editing the program misses, and the old entry is dropped once over the limit
+write_program(20)
+new_key = cache.key(program, args, "test")
+assert new_key != key
+assert cache.load(new_key, Canon()) is None
+assert cache.key(program, ("G21", ""), "test") != new_key
+assert cache.key(program, args, "other") != new_key
+
+canon, result, seq = parse()
+cache.max_bytes = 1
+cache.store(new_key, canon, result, seq)
+assert cache.load(key, Canon()) is None
+
+cache.clear()
+assert not os.path.exists(cache.directory)
+shutil.rmtree(tempdir)
+print("pass")
@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+import os
+import tempfile
+import time
+import types
+
+import gcode
+from rs274.glcanon import GLCanon
+from rs274.interpret import StatMixin
+from rs274.loader import PreviewLoader, parse_if_idle
+
+stat = types.SimpleNamespace(tool_table=[],
+        axis_mask=7, linear_units=1., angular_units=1., block_delete=0)
+
+tempdir = tempfile.mkdtemp()
+open(os.path.join(tempdir, "test.var"), "w").close()
+
+class Colors(dict):
+    def __missing__(self, key): return (1., 1., 1.)
+
+class Canon(GLCanon, StatMixin):
+    def __init__(self):
+        GLCanon.__init__(self, Colors(), "XYZ")
+        StatMixin.__init__(self, stat, 0)
+        self.parameter_file = os.path.join(tempdir, "test.var")
+        self.aborted = False
+
+    def check_abort(self):
+        if self.aborted: raise KeyboardInterrupt
+    def is_lathe(self): return False
+
+loader = PreviewLoader("test.ngc", Canon(), "G20", "").start()
+while not loader.segment_count(): time.sleep(.01)
+
+start = time.time()
+assert parse_if_idle("", Canon(), "G0 X1", "M2") is None
+# a parse waiting for the load would take many seconds
+assert time.time() - start < 1, time.time() - start
+assert not loader.done()
+
+loader.cancel()
+assert loader.wait(10)
+assert loader.interrupted
+
+canon = Canon()
+short = os.path.join(tempdir, "short.ngc")
+with open(short, "w") as f: f.write("G1 X1 F10\nM2\n")
+result, seq = parse_if_idle(short, canon, "G20", "")
+assert result <= gcode.MIN_ERROR, gcode.strerror(result)
+assert len(canon.feed) == 1
+print("pass")
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+import os
+import random
+import tempfile
+import types
+
+import gcode
+import numpy
+from rs274.glcanon import GLCanon
+from rs274.interpret import StatMixin
+from rs274.spatial import display_coords
+
+stat = types.SimpleNamespace(tool_table=[],
+        axis_mask=7, linear_units=1., angular_units=1., block_delete=0)
+
+tempdir = tempfile.mkdtemp()
+open(os.path.join(tempdir, "test.var"), "w").close()
+
+class Colors(dict):
+    def __missing__(self, key): return (1., 1., 1.)
+
+class Canon(GLCanon, StatMixin):
+    def __init__(self):
+        GLCanon.__init__(self, Colors(), "XYZ")
+        StatMixin.__init__(self, stat, 0)
+        self.parameter_file = os.path.join(tempdir, "test.var")
+
+    def check_abort(self): pass
+    def is_lathe(self): return False
+
+random.seed(1)
+program = os.path.join(tempdir, "test.ngc")
+with open(program, "w") as f:
+    f.write("G17 F10\n")
+    for i in range(2000):
+        x, y, z = (random.uniform(-5, 5) for j in range(3))
+        move = random.choice(("G0", "G1", "G1", "G2"))
+        if move == "G2":
+            f.write("G2 X%.4f Y%.4f Z%.4f R20\n" % (x, y, z))
+        else:
+            f.write("%s X%.4f Y%.4f Z%.4f\n" % (move, x, y, z))
+    f.write("M2\n")
+
+canon = Canon()
+result, seq = gcode.parse(program, canon, "G20", "")
+assert result <= gcode.MIN_ERROR, gcode.strerror(result)
+assert len(canon.feed) and len(canon.arcfeed)
+canon.build_indexes()
+
+start = numpy.concatenate([display_coords(s.start, "XYZ") for s in (canon.feed, canon.arcfeed)])
+end = numpy.concatenate([display_coords(s.end, "XYZ") for s in (canon.feed, canon.arcfeed)])
+lineno = numpy.concatenate([canon.feed.lineno, canon.arcfeed.lineno])
+
+def distance(point):
+    d = end - start
+    length2 = (d * d).sum(axis=1)
+    t = ((point - start) * d).sum(axis=1) / numpy.where(length2 == 0, 1, length2)
+    t = numpy.clip(t, 0, 1)
+    return numpy.sqrt(((start + t[:, None] * d - point) ** 2).sum(axis=1))
+
+for i in range(300):
+    point = numpy.array([random.uniform(-7, 7) for j in range(3)])
+    line = canon.line_near(list(point) + [0] * 6)
+    d = distance(point)
+    # another segment may be just as near
+    assert numpy.isclose(d[lineno == line].min(), d.min()), (point, line)
+
+# a pick during a load keeps the index it built until the load is done
+index = canon.spatial_index()
+canon.feed.append(1, (0,)*9, (1,)*9, 1, (0, 0, 0))
+assert canon.spatial_index() is index
+canon.build_indexes()
+assert canon.spatial_index() is not index
+assert len(canon.spatial_index()) == len(index) + 1
+print("pass")
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+import os
+import tempfile
+import types
+
+import gcode
+import numpy
+from rs274.glcanon import GLCanon
+from rs274.interpret import StatMixin
+from rs274.spatial import display_coords
+from rs274.vbo import program_vertices, color_table, color_names
+
+stat = types.SimpleNamespace(tool_table=[],
+        axis_mask=7, linear_units=1., angular_units=1., block_delete=0)
+
+tempdir = tempfile.mkdtemp()
+open(os.path.join(tempdir, "test.var"), "w").close()
+
+class Colors(dict):
+    def __missing__(self, key): return (1., 1., 1.)
+
+class Canon(GLCanon, StatMixin):
+    def __init__(self):
+        GLCanon.__init__(self, Colors(), "XYZ")
+        StatMixin.__init__(self, stat, 0)
+        self.parameter_file = os.path.join(tempdir, "test.var")
+
+    def check_abort(self): pass
+    def is_lathe(self): return False
+
+canon = Canon()
+result, seq = gcode.parse("test.ngc", canon, "G20", "")
+assert result <= gcode.MIN_ERROR, gcode.strerror(result)
+stores = canon.traverse, canon.feed, canon.arcfeed
+assert all(len(store) for store in stores)
+
+positions, attributes, rapids = program_vertices(canon)
+assert positions.dtype == attributes.dtype == numpy.float32
+assert positions.shape == (len(attributes), 3)
+# one GL_LINES pair per segment, in store order, rapids first
+assert len(positions) == 2 * sum(len(store) for store in stores)
+assert rapids == 2 * len(canon.traverse)
+lines, kinds = attributes[:, 0], attributes[:, 1]
+first = 0
+for kind, store in enumerate(stores):
+    last = first + 2 * len(store)
+    assert (kinds[first:last] == kind).all(), kind
+    assert (lines[first:last:2] == store.lineno).all(), kind
+    assert (lines[first+1:last:2] == store.lineno).all(), kind
+    assert numpy.allclose(positions[first:last:2], display_coords(store.start, "XYZ"), atol=1e-6)
+    assert numpy.allclose(positions[first+1:last:2], display_coords(store.end, "XYZ"), atol=1e-6)
+    first = last
+
+# foam draws every store twice, on the XY and UV planes
+canon.is_foam = True
+canon.foam_z, canon.foam_w = .5, 1.5
+foam, foam_attributes, foam_rapids = program_vertices(canon)
+assert len(foam) == 2 * len(positions)
+assert foam_rapids == 2 * rapids
+assert set(foam_attributes[:foam_rapids, 1]) == {3, 6}
+assert set(foam_attributes[foam_rapids:, 1]) == {4, 5, 7, 8}
+plane = foam_attributes[:, 1] // 3
+assert numpy.allclose(foam[plane == 1, 2], canon.foam_z)
+assert numpy.allclose(foam[plane == 2, 2], canon.foam_w)
+assert (plane != 0).all()
+
+empty = program_vertices(None)
+assert empty[0].shape == (0, 3) and empty[1].shape == (0, 2) and empty[2] == 0
+
+# the _xy and _uv colors fall back to the plain ones
+colors = {'traverse': (.1, .2, .3), 'straight_feed': (.4, .5, .6), 'arc_feed': (.7, .8, .9),
+          'straight_feed_uv': (0., 0., 1.), 'traverse_alpha': .5}
+table = color_table(colors)
+assert table.shape == (len(color_names), 4) and table.dtype == numpy.float32
+rows = dict(zip(color_names, table.tolist()))
+assert numpy.allclose(rows['traverse'], (.1, .2, .3, .5))
+assert numpy.allclose(rows['traverse_xy'], (.1, .2, .3, 1/3.))
+assert numpy.allclose(rows['arc_feed_uv'], (.7, .8, .9, 1/3.))
+assert numpy.allclose(rows['straight_feed_uv'], (0, 0, 1, 1/3.))
+print("pass")
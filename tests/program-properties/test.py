@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+import os
+import tempfile
+import types
+
+import numpy
+from rs274.properties import (MotionLimits, ProgramProperties, count_lines,
+        lengths, property_names, trapezoid_times)
+from rs274.segments import SegmentStore
+
+def point(x, y, z): return (x, y, z, 0, 0, 0, 0, 0, 0)
+
+canon = types.SimpleNamespace(
+    traverse=SegmentStore(has_feedrate=False),
+    feed=SegmentStore(), arcfeed=SegmentStore(),
+    dwell_time=2.,
+    # line 5 dwells 2 seconds after the first tool change
+    dwell_durations=[(5, 2., 1)],
+    # T7 after one traverse, one feed and no arcs
+    tool_changes=[(7, 1, 1, 0)])
+canon.traverse.append(1, point(0, 0, 0), point(3, 4, 0), 0, (0, 0, 0))
+canon.feed.append(2, point(3, 4, 0), point(3, 4, -1), .5, (0, 0, 0))
+canon.feed.append(3, point(3, 4, -1), point(6, 4, -1), 10, (0, 0, 0))
+canon.arcfeed.append(4, point(6, 4, -1), point(7, 4, -1), 1, (0, 0, 0))
+canon.arcfeed.append(4, point(7, 4, -1), point(8, 4, -1), 1, (0, 0, 0))
+
+# at most 2 in/s: 2.5s of rapid, 2s and 1.5s of feed, 2s of arcs, 2s of dwell
+p = ProgramProperties(canon, 2.)
+assert numpy.isclose(p.g0, 5) and numpy.isclose(p.g1, 6)
+assert numpy.isclose(p.run_time, 10)
+assert p.accel_run_time is None
+assert [t for t, s in p.tool_times] == [None, 7]
+assert numpy.allclose([s for t, s in p.tool_times], [4.5, 5.5])
+assert numpy.allclose(p.line_times, [0, 2.5, 2, 1.5, 2, 2])
+assert numpy.isclose(p.time_to_line(3), 4.5)
+assert numpy.isclose(p.cumulative_times()[-1], p.run_time)
+
+# without acceleration limits the trapezoidal model is the simple one
+unlimited = MotionLimits([numpy.inf] * 3, [numpy.inf] * 3)
+assert numpy.isclose(ProgramProperties(canon, 2., unlimited).accel_run_time, 10)
+
+# 5 inches along (.6, .8) at 2 in/s: the Y axis limits the acceleration to
+# 1.25 in/s^2, so 1.6s up, 1.6s down and 1.8 inches at full speed
+limits = MotionLimits([10] * 3, [1] * 3)
+times = trapezoid_times(canon.traverse, lengths(canon.traverse), 2., limits, True)
+assert numpy.allclose(times, [4.1])
+# collinear arc segments don't stop at their joint: 1.5s each instead of 2s
+times = trapezoid_times(canon.arcfeed, lengths(canon.arcfeed), 2., limits)
+assert numpy.allclose(times, [1.5, 1.5])
+accel = ProgramProperties(canon, 2., limits)
+assert accel.accel_run_time > accel.run_time
+# the per-tool and per-line times use the trapezoidal model
+assert numpy.isclose(sum(s for t, s in accel.tool_times), accel.accel_run_time)
+assert numpy.isclose(accel.line_times[4], 3)
+
+class Ini(dict):
+    def find(self, section, option): return self.get((section, option))
+ini = Ini({('AXIS_X', 'MAX_VELOCITY'): '254', ('AXIS_X', 'MAX_ACCELERATION'): '2540',
+           ('TRAJ', 'MAX_LINEAR_VELOCITY'): '127'})
+limits = MotionLimits.from_ini(ini, 25.4)
+assert numpy.allclose(limits.max_velocity[0], 10) and numpy.isinf(limits.max_velocity[1])
+assert numpy.allclose(limits.max_acceleration[0], 100)
+assert numpy.isclose(limits.max_linear_velocity, 5)
+assert numpy.isinf(limits.max_linear_acceleration)
+assert MotionLimits.from_ini(Ini(), 1) is None
+
+with tempfile.TemporaryDirectory() as d:
+    for text, n in (b"", 0), (b"G0 X1\n", 1), (b"G0 X1\nM2", 2), (b"\n" * 3, 3):
+        name = os.path.join(d, "test.ngc")
+        with open(name, "wb") as f: f.write(text)
+        assert count_lines(name) == n, (text, n)
+
+assert property_names['run_accel'] and property_names['tooltimes']
+print("pass")
@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+import os
+import tempfile
+import time
+import numpy
+import hal
+import stream_scope
+
+c = hal.component("stream_scope_test")
+stream = stream_scope.attach_sampler(c)
+c.ready()
+
+scope = stream_scope.StreamScope(stream, window=1000, capacity=3000, period=0.0001)
+assert scope.channels == 1
+
+deadline = time.time() + 10
+while scope.buffer.total < 5000 and time.time() < deadline:
+    scope.poll()
+    time.sleep(0.01)
+assert scope.buffer.total >= 5000, scope.buffer.total
+
+# threadtest counts up in the fast thread and is reset to 0 by the slow one,
+# so consecutive samples step by one except at the resets
+start, data = scope.view()
+assert data.shape == (1000, 1), data.shape
+steps = numpy.diff(data[:, 0])
+assert ((steps == 1) | (data[1:, 0] == 1)).all(), data[:, 0]
+
+scope.set_mode("single")
+scope.level = 5
+while scope.captured is None and time.time() < deadline:
+    scope.poll()
+    time.sleep(0.01)
+assert scope.captured is not None
+start, data = scope.view()
+assert data[500, 0] == 5 and data[499, 0] < 5, data[495:505, 0]
+
+filename = os.path.join(tempfile.mkdtemp(), "scope.csv")
+assert scope.export(filename, ["count"]) == 1000
+assert open(filename).readline().strip() == "time,count"
+# with the whole window before the trigger, the sample after the newest one
+# (the oldest, in a full buffer) is not taken for a crossing
+class Stream:
+    element_types = "f"
+scope = stream_scope.StreamScope(Stream(), window=4, capacity=10)
+scope.set_mode("normal")
+scope.level = 5
+scope.position = 1.
+scope.buffer.extend(numpy.array([[10.]] + [[0.]] * 9))
+scope.search()
+assert scope.captured is None, scope.captured
+scope.buffer.extend(numpy.array([[10.]]))
+scope.search()
+assert scope.trigger == 10, scope.trigger
+start, data = scope.view()
+assert start == 6 and (data == 0).all(), (start, data)
+print("pass")
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+import collections
+import os
+import random
+import sys
+import tempfile
+import types
+
+from rs274.interpret import StatMixin
+
+Tool = collections.namedtuple("Tool", "id pocket")
+
+def linear_index(tools, tool_nr):
+    for index, tool in enumerate(tools[1:], 1):
+        if tool.id == tool_nr:
+            return index
+    return 0
+
+random.seed(1)
+tool_table = [Tool(-1, 0)] + [Tool(random.randint(1, 12), p) for p in range(1, 21)]
+stat = types.SimpleNamespace(tool_table=tool_table, angular_units=1., linear_units=1.)
+
+for changer in (0, 1):
+    canon = StatMixin(stat, changer)
+    for i in range(500):
+        tool_nr = random.randint(-1, 14)
+        assert canon.get_index(tool_nr) == linear_index(canon.tools, tool_nr), (changer, i, tool_nr)
+        canon.change_tool(tool_nr)
+        expected = {}
+        for index, tool in enumerate(canon.tools[1:], 1):
+            expected.setdefault(tool.id, []).append(index)
+        assert canon.tool_indexes == expected, (changer, i)
+
+# qt_tstat only needs the qtvcp core for its signals and settings
+class Status:
+    def __init__(self): self.emitted = []
+    def connect(self, signal, callback): pass
+    def emit(self, signal, *args): self.emitted.append(signal)
+    def is_status_valid(self): return True
+
+tempdir = tempfile.mkdtemp()
+toolfile = os.path.join(tempdir, "tool.tbl")
+core = types.ModuleType("qtvcp.core")
+core.Status = Status
+core.Info = lambda: types.SimpleNamespace(TOOL_FILE_PATH=toolfile, MACHINE_IS_LATHE=False)
+core.Action = lambda: None
+sys.modules["qtvcp.core"] = core
+
+from qtvcp import qt_tstat
+
+class TStat(qt_tstat._TStat):
+    _instanceNum = 0
+
+lines = ["T%d P%d Z%.1f D0.25 ;tool %d\n" % (t, t + 10, t / 10, t) for t in range(1, 6)]
+def write(lines, mtime):
+    with open(toolfile, "w") as f:
+        f.writelines(lines)
+    os.utime(toolfile, ns=(mtime, mtime))
+write(lines, 10**9)
+
+tstat = TStat()
+parsed = []
+def parse_line(rawline, parse_line=tstat._parse_line):
+    parsed.append(rawline)
+    return parse_line(rawline)
+tstat._parse_line = parse_line
+
+info = tstat.GET_TOOL_INFO(3)
+assert info[tstat.NUM] == 3 and info[tstat.POCKET] == 13, info
+assert info[tstat.Z] == .3 and info[tstat.COMMENTS] == "tool 3", info
+assert tstat.GET_TOOL_INFO(9)[tstat.COMMENTS] == "No Tool"
+assert tstat.GET_POCKET_INFO(14)[tstat.NUM] == 4
+assert tstat.GET_POCKET_INFO(3) is None
+assert len(parsed) == 5, parsed
+
+# unchanged file: nothing is parsed again, the models handed out are copies
+models = tstat.GET_TOOL_MODELS()
+assert len(models[0]) == 5 and not models[1]
+models[0][0][tstat.Z] = 99
+info[tstat.Z] = 99
+assert tstat.GET_TOOL_INFO(1)[tstat.Z] == .1
+assert tstat.GET_TOOL_INFO(3)[tstat.Z] == .3
+assert len(parsed) == 5, parsed
+
+# an edited line is the only one parsed again
+lines[1] = "T2 P12 Z0.7 ;tool 2 edited\n"
+write(lines, 2 * 10**9)
+assert tstat.GET_TOOL_INFO(2)[tstat.Z] == .7
+assert parsed[5:] == [lines[1]], parsed
+
+# periodic_check emits once per change of the file
+status = qt_tstat.STATUS
+for i in range(30):
+    tstat.periodic_check(None)
+assert status.emitted == ["toolfile-stale"], status.emitted
+write(lines[:4], 3 * 10**9)
+for i in range(30):
+    tstat.periodic_check(None)
+assert status.emitted == ["toolfile-stale"] * 2, status.emitted
+assert tstat.GET_TOOL_INFO(5)[tstat.COMMENTS] == "No Tool"
+assert tstat.GET_POCKET_INFO(15) is None
+
+# wear offsets are looked up by tool number, never by pocket, even where
+# they share a pocket with a tool
+write(lines[:4] + ["T10001 P0 X0.001 ;wear 1\n", "T10002 P11 X0.002 ;wear 2\n"], 4 * 10**9)
+assert tstat.GET_TOOL_INFO(10002)[tstat.COMMENTS] == "wear 2"
+assert tstat.GET_POCKET_INFO(0) is None
+assert tstat.GET_POCKET_INFO(11)[tstat.NUM] == 1
+models = tstat.GET_TOOL_MODELS()
+assert len(models[0]) == 4 and len(models[1]) == 2, models
+
+os.unlink(toolfile)
+assert tstat.GET_TOOL_MODELS() is None
+assert tstat.GET_TOOL_INFO(1)[tstat.COMMENTS] == "No Tool"
+
+print("pass")
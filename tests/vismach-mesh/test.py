@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+import os
+import tempfile
+
+import numpy
+
+tempdir = tempfile.mkdtemp()
+os.environ["XDG_CACHE_HOME"] = os.path.join(tempdir, "cache")
+
+import vismach_mesh
+from vismach_mesh import Mesh, STL_FACET
+
+def same(a, b):
+    return numpy.allclose(a, b, atol=1e-6)
+
+# a unit square at z=1 facing up, and the side at x=0 facing -x
+corners = numpy.array([[[0, 0, 1], [1, 0, 1], [1, 1, 1]],
+                       [[0, 0, 1], [1, 1, 1], [0, 1, 1]],
+                       [[0, 0, 0], [0, 0, 1], [0, 1, 1]]], numpy.float32)
+normals = numpy.array([[0, 0, 1], [0, 0, 1], [-1, 0, 0]], numpy.float32)
+
+# binary STL, the first normal left zero as many exporters do; the header
+# starts with "solid" like some binary files do
+facets = numpy.zeros(len(corners), STL_FACET)
+facets['corners'] = corners
+facets['normal'] = normals
+facets['normal'][0] = 0
+binary = os.path.join(tempdir, "part.stl")
+with open(binary, "wb") as f:
+    f.write(b"solid binary".ljust(80, b" "))
+    f.write(numpy.uint32(len(facets)).tobytes())
+    f.write(facets.tobytes())
+mesh = vismach_mesh.read_stl(binary)
+assert len(mesh) == 3
+assert same(mesh.corners, corners)
+assert same(mesh.normals, normals[:, None, :].repeat(3, 1))
+
+# ASCII STL
+lines = ["solid ascii"]
+for triangle, normal in zip(corners, normals):
+    lines.append("facet normal %g %g %g" % tuple(normal))
+    lines.append("outer loop")
+    lines.extend("vertex %g %g %g" % tuple(c) for c in triangle)
+    lines.append("endloop")
+    lines.append("endfacet")
+lines.append("endsolid ascii")
+ascii = os.path.join(tempdir, "ascii.stl")
+with open(ascii, "w") as f:
+    f.write("\n".join(lines))
+for mesh in (vismach_mesh.read_stl(ascii), vismach_mesh.read_stl(data="\n".join(lines)),
+             vismach_mesh.read_stl(data=lines)):
+    assert len(mesh) == 3
+    assert same(mesh.corners, corners)
+    assert same(mesh.normals, normals[:, None, :].repeat(3, 1))
+
+# OBJ: polygons as fans, negative indices, texture coordinates, w
+# coordinates, comments and corners without normals
+obj = """# a square and a side
+o square
+v 0 0 1
+v 1 0 1 1.0
+v 1 1 1
+v 0 1 1
+vt 0.5 0.5
+vn 0 0 1
+f 1/1/1 2/1/1 3/1/1 4/1/1
+v 0 0 0
+g f
+f -1 1//1 4/1 # comment
+"""
+mesh = vismach_mesh.read_obj(data=obj)
+assert len(mesh) == 3
+assert same(mesh.corners, corners)
+assert same(mesh.normals, normals[:, None, :].repeat(3, 1))
+assert len(vismach_mesh.read_obj(data="v 0 0 0\nvt 0 0\n")) == 0
+try:
+    vismach_mesh.read_obj(data="v 0 0\nf 1 1 1\n")
+except ValueError:
+    pass
+else:
+    raise AssertionError("a vertex needs three coordinates")
+
+# a mesh read from a file is cached until the file changes
+objfile = os.path.join(tempdir, "part.obj")
+with open(objfile, "w") as f:
+    f.write(obj)
+mesh = vismach_mesh.load(objfile)
+assert not isinstance(mesh.data, numpy.memmap)
+assert len(os.listdir(vismach_mesh.cache_directory())) == 1
+mesh = vismach_mesh.load(objfile)
+assert isinstance(mesh.data, numpy.memmap)
+assert same(mesh.corners, corners)
+with open(objfile, "w") as f:
+    f.write(obj.replace("v 0 0 0\n", "v 0 0 2\n"))
+mesh = vismach_mesh.load(objfile)
+assert not isinstance(mesh.data, numpy.memmap)
+assert same(mesh.corners[2, 0], (0, 0, 2))
+assert len(os.listdir(vismach_mesh.cache_directory())) == 2
+
+# decimate a finely divided sphere to a budget
+n = 60
+theta, phi = numpy.meshgrid(numpy.linspace(0, numpy.pi, n), numpy.linspace(0, 2 * numpy.pi, 2 * n),
+                            indexing="ij")
+points = numpy.stack([numpy.sin(theta) * numpy.cos(phi), numpy.sin(theta) * numpy.sin(phi),
+                      numpy.cos(theta)], -1)
+a, b, c, d = points[:-1, :-1], points[1:, :-1], points[1:, 1:], points[:-1, 1:]
+triangles = numpy.concatenate([numpy.stack([a, b, c], -2), numpy.stack([a, c, d], -2)]).reshape(-1, 3, 3)
+sphere = Mesh.from_triangles(triangles, vismach_mesh.face_normals(triangles))
+assert sphere.decimated(None) is sphere
+assert sphere.decimated(len(sphere)) is sphere
+for budget in (5000, 500):
+    small = sphere.decimated(budget)
+    assert 0 < len(small) <= budget, (budget, len(small))
+    radius = numpy.sqrt((small.corners ** 2).sum(-1))
+    assert radius.max() < 1.01 and radius.min() > .7, (radius.min(), radius.max())
+    assert same(numpy.sqrt((small.normals ** 2).sum(-1)), 1)
+
+# tiny triangles that share no vertices all collapse, so they are kept
+soup = numpy.random.default_rng(1).uniform(-1, 1, (200, 1, 3)) + \
+    numpy.array([[0, 0, 0], [1e-4, 0, 0], [0, 1e-4, 0]])
+soup = Mesh.from_triangles(soup, vismach_mesh.face_normals(soup))
+assert soup.decimated(50) is soup
+
+print("pass")
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+import importlib.machinery
+import os
+import random
+import shutil
+import tempfile
+import types
+
+import numpy as np
+
+loader = importlib.machinery.SourceFileLoader(
+    'z_level_compensation', shutil.which('z_level_compensation'))
+zlc = types.ModuleType(loader.name)
+loader.exec_module(zlc)
+Grid = zlc.CompensationGrid
+Methods = zlc.Methods
+
+def close(a, b, tol=1e-5):
+    return abs(a - b) <= tol * max(1, abs(b))
+
+def plane(x, y):
+    return .01 * x - .02 * y + .5
+
+# nodes at x = 10, 12.5, ... and y = -5, -4, ...
+origin, step = (10., -5.), (2.5, 1.)
+gx = origin[0] + step[0] * np.arange(6)
+gy = origin[1] + step[1] * np.arange(5)
+nodes = plane(gx[:, None], gy[None, :])
+
+random.seed(1)
+points = [(random.uniform(gx[0], gx[-1]), random.uniform(gy[0], gy[-1])) for i in range(200)]
+
+# linear and cubic both follow a plane everywhere, and go through the nodes
+for method in (Methods.LINEAR, Methods.CUBIC):
+    grid = Grid.from_nodes(origin, step, nodes, method)
+    for x, y in points:
+        assert close(grid.evaluate(x, y), plane(x, y)), (method, x, y)
+    for i, x in enumerate(gx):
+        for j, y in enumerate(gy):
+            assert close(grid.evaluate(x, y), nodes[i, j]), (method, x, y)
+    # clamped to the edges outside the grid, and scaled by fade
+    assert close(grid.evaluate(gx[0] - 100, gy[-1] + 100), nodes[0, -1])
+    assert close(grid.evaluate(gx[-1] + 1, gy[2]), nodes[-1, 2])
+    assert close(grid.evaluate(11, -3, .25), .25 * plane(11, -3))
+
+# cubic goes through the nodes of a curved surface, smoothly across cells
+bumps = np.sin(gx[:, None] / 3) * np.cos(gy[None, :] / 2)
+grid = Grid.from_nodes(origin, step, bumps, Methods.CUBIC)
+for i, x in enumerate(gx):
+    for j, y in enumerate(gy):
+        assert close(grid.evaluate(x, y), bumps[i, j]), (x, y)
+for x in gx[1:-1]:
+    left = (grid.evaluate(x - 1e-3, -2.5) - grid.evaluate(x - 2e-3, -2.5)) / 1e-3
+    right = (grid.evaluate(x + 2e-3, -2.5) - grid.evaluate(x + 1e-3, -2.5)) / 1e-3
+    assert abs(left - right) < 1e-2, (x, left, right)
+
+# nearest takes the value of the closest node
+grid = Grid.from_nodes(origin, step, nodes, Methods.NEAREST)
+assert grid.nearest
+assert close(grid.evaluate(11.2, -4.4), nodes[0, 1])
+assert close(grid.evaluate(11.3, -4.6), nodes[1, 0])
+assert close(grid.evaluate(-100, 100), nodes[0, -1])
+
+# probe points on a regular grid, in any order, are the nodes
+probe = [(x, y, plane(x, y)) for x in gx for y in gy]
+random.shuffle(probe)
+x, y, z = np.array(probe).T
+grid = Grid.from_points(x, y, z, Methods.LINEAR)
+assert (grid.nx, grid.ny) == (5, 4)
+assert close(grid.x0, gx[0]) and close(grid.dy, step[1])
+for px, py in points:
+    assert close(grid.evaluate(px, py), plane(px, py))
+
+try:
+    Grid.from_points([1, 1, 1], [0, 1, 2], [0, 0, 0], Methods.LINEAR)
+except ValueError:
+    pass
+else:
+    raise AssertionError("a line of probe points is not an area")
+
+# points off the grid are interpolated with scipy, or fail plainly without it
+x, y = np.array(points).T
+try:
+    grid = Grid.from_points(x, y, plane(x, y), Methods.LINEAR, 1.)
+except ImportError:
+    assert zlc.griddata is None
+else:
+    assert zlc.griddata is not None
+    assert close(grid.evaluate(15, -2), plane(15, -2), 1e-3)
+
+# save and map again, prune all but the most recently used
+cache = tempfile.mkdtemp()
+grid = Grid.from_nodes(origin, step, bumps, Methods.CUBIC)
+paths = [os.path.join(cache, "%d.npy" % i) for i in range(5)]
+for i, path in enumerate(paths):
+    grid.save(path)
+    os.utime(path, (i, i))
+assert Grid.load(os.path.join(cache, "missing.npy")) is None
+loaded = Grid.load(paths[0])
+assert np.array_equal(loaded.coefficients, grid.coefficients)
+assert close(loaded.evaluate(13, -1), grid.evaluate(13, -1))
+zlc.prune_cache(cache, 2)
+assert sorted(os.listdir(cache)) == ["0.json", "0.npy", "4.json", "4.npy"], os.listdir(cache)
+
+assert zlc.fade_scale(5, 0) == 1
+assert zlc.fade_scale(-1, 2) == 1
+assert zlc.fade_scale(.5, 2) == .75
+assert zlc.fade_scale(3, 2) == 0
+
+print("pass")